@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+Violation Alert Fan-out
+Diffs two consecutive extraction outputs to find new and resolved violations
+per PWSID, looks up affected subscribers by PWSID/ZIP and delivers the alerts
+through a batched, rate-limited, retrying queue of pooled connections
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import os
+import queue
+import smtplib
+import socketserver
+import threading
+import time
+from email.message import EmailMessage
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from extraction_policy import POLICY, is_active, load_policy
+
+logger = logging.getLogger(__name__)
+
+
+def _violation_key(violation: Dict[str, Any]) -> Optional[str]:
+    key = violation.get('violation_id', violation.get('id'))
+    return None if key in (None, '') else str(key)
+
+
+def _is_active(violation: Dict[str, Any], policy: Dict[str, Any] = POLICY) -> bool:
+    # Operator records keep the raw VIOLATION_STATUS; public cards only carry the
+    # status the extraction policy already derived from it
+    if 'violation_status' in violation:
+        return is_active(violation['violation_status'], policy)
+    return violation.get('status') == 'Active'
+
+
+def _violation_label(violation: Dict[str, Any]) -> str:
+    kind = violation.get('violation_type') or violation.get('type') or 'Violation'
+    contaminant = violation.get('contaminant_name') or violation.get('contaminant') or 'Unknown Contaminant'
+    return f"{kind} - {contaminant}"
+
+
+def load_snapshot(path: str, policy: Dict[str, Any] = POLICY) -> Dict[str, Dict[str, Any]]:
+    """
+    Load an extraction output (dashboard_data.json or water_systems_data.json)
+    as PWSID -> {name, zips, active: {violation_id: label}}
+    """
+    with open(path, encoding='utf-8') as f:
+        systems = json.load(f)
+
+    snapshot = {}
+    for system in systems:
+        violations = system.get('violations_enforcement') or system.get('recentViolations') or []
+        active = {}
+        for violation in violations:
+            key = _violation_key(violation)
+            if key and _is_active(violation, policy):
+                active[key] = _violation_label(violation)
+
+        zips = system.get('zipCodes') or system.get('zip_codes') or (system.get('summary_stats') or {}).get('zip_codes') or []
+        snapshot[system['pwsid']] = {
+            'name': system.get('name') or system['pwsid'],
+            'zips': [str(z)[:5] for z in zips if z],
+            'active': active
+        }
+    return snapshot
+
+
+def diff_violations(previous: Dict[str, Dict[str, Any]], current: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, List[str]]]:
+    """New and resolved violations per PWSID between two snapshots"""
+    changes = {}
+    for pwsid in previous.keys() | current.keys():
+        before = previous.get(pwsid, {}).get('active', {})
+        after = current.get(pwsid, {}).get('active', {})
+        new = [after[k] for k in sorted(after.keys() - before.keys())]
+        resolved = [before[k] for k in sorted(before.keys() - after.keys())]
+        if new or resolved:
+            changes[pwsid] = {'new': new, 'resolved': resolved}
+    return changes
+
+
+class SubscriberIndex:
+    """PWSID -> subscribers and ZIP -> subscribers lookups over the signup store"""
+
+    def __init__(self):
+        self.subscribers: Dict[str, Dict[str, Any]] = {}
+        self.by_pwsid: Dict[str, Set[str]] = {}
+        self.by_zip: Dict[str, Set[str]] = {}
+
+    @classmethod
+    def load(cls, path: str = "subscribers.jsonl") -> 'SubscriberIndex':
+        """Read the JSON-lines store written by server.js; later lines override earlier ones"""
+        latest = {}
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                email = (record.get('email') or '').strip().lower()
+                if email:
+                    latest[email] = record
+
+        index = cls()
+        for email, record in latest.items():
+            if record.get('unsubscribed'):
+                continue
+            index.subscribers[email] = record
+            if record.get('pwsid'):
+                index.by_pwsid.setdefault(record['pwsid'], set()).add(email)
+            for zip_code in record.get('zipCodes') or ([record['zip']] if record.get('zip') else []):
+                index.by_zip.setdefault(str(zip_code)[:5], set()).add(email)
+        logger.info(f"Indexed {len(index.subscribers)} subscribers")
+        return index
+
+    def affected(self, pwsid: str, zips: Iterable[str]) -> Set[str]:
+        emails = set(self.by_pwsid.get(pwsid, ()))
+        for zip_code in zips:
+            emails |= self.by_zip.get(zip_code, set())
+        return emails
+
+
+def build_messages(changes: Dict[str, Dict[str, List[str]]], snapshot: Dict[str, Dict[str, Any]],
+                   subscribers: SubscriberIndex, from_email: str) -> List[EmailMessage]:
+    """One message per subscriber covering every changed system they follow"""
+    per_subscriber: Dict[str, List[str]] = {}
+    for pwsid, change in sorted(changes.items()):
+        system = snapshot.get(pwsid, {'name': pwsid, 'zips': []})
+        lines = [f"{system['name']} ({pwsid})"]
+        lines += [f"  NEW: {label}" for label in change['new']]
+        lines += [f"  RESOLVED: {label}" for label in change['resolved']]
+        for email in subscribers.affected(pwsid, system['zips']):
+            per_subscriber.setdefault(email, []).extend(lines)
+
+    messages = []
+    for email, lines in per_subscriber.items():
+        msg = EmailMessage()
+        msg['From'] = from_email
+        msg['To'] = email
+        msg['Subject'] = 'Water Quality Update - violation status changed'
+        msg.set_content('\n'.join([
+            'The drinking water systems you follow have new or resolved violations:',
+            '',
+            *lines,
+            '',
+            'You can unsubscribe at any time by replying with "UNSUBSCRIBE" in the subject line.',
+            '',
+            'Georgia Water Safety Dashboard'
+        ]))
+        messages.append(msg)
+    return messages
+
+
+class TokenBucket:
+    """Thread-safe rate limiter shared by all senders"""
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class SmtpTransport:
+    """One persistent SMTP connection, reopened when the server drops it"""
+
+    def __init__(self, host: str = 'localhost', port: int = 1025, username: Optional[str] = None,
+                 password: Optional[str] = None, starttls: bool = False):
+        self.host, self.port = host, port
+        self.username, self.password = username, password
+        self.starttls = starttls
+        self.conn: Optional[smtplib.SMTP] = None
+
+    def _connect(self):
+        self.conn = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.starttls:
+            self.conn.starttls()
+        if self.username:
+            self.conn.login(self.username, self.password or '')
+
+    def send(self, msg: EmailMessage):
+        if self.conn is None:
+            self._connect()
+        try:
+            self.conn.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            self._connect()
+            self.conn.send_message(msg)
+
+    def close(self):
+        if self.conn is not None:
+            try:
+                self.conn.quit()
+            except smtplib.SMTPException:
+                pass
+            self.conn = None
+
+
+class SendGridTransport:
+    """Keep-alive HTTPS connection to the SendGrid v3 mail API"""
+
+    def __init__(self, api_key: str, host: str = 'api.sendgrid.com'):
+        self.api_key = api_key
+        self.host = host
+        self.conn: Optional[http.client.HTTPSConnection] = None
+
+    def send(self, msg: EmailMessage):
+        if self.conn is None:
+            self.conn = http.client.HTTPSConnection(self.host, timeout=30)
+        payload = json.dumps({
+            'personalizations': [{'to': [{'email': msg['To']}]}],
+            'from': {'email': msg['From']},
+            'subject': msg['Subject'],
+            'content': [{'type': 'text/plain', 'value': msg.get_content()}]
+        })
+        try:
+            self.conn.request('POST', '/v3/mail/send', body=payload, headers={
+                'Authorization': f'Bearer {self.api_key}',
+                'Content-Type': 'application/json'
+            })
+            response = self.conn.getresponse()
+            body = response.read()
+        except (http.client.HTTPException, OSError):
+            self.close()
+            raise
+        if response.status >= 300:
+            raise RuntimeError(f"SendGrid returned {response.status}: {body[:200]!r}")
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class FileTransport:
+    """Writes each message to an .eml file instead of sending it"""
+
+    def __init__(self, directory: str = "outbox"):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def send(self, msg: EmailMessage):
+        name = f"{time.time_ns()}-{threading.get_ident()}.eml"
+        with open(os.path.join(self.directory, name), 'wb') as f:
+            f.write(bytes(msg))
+
+    def close(self):
+        pass
+
+
+class AlertQueue:
+    """
+    Fan-out queue: worker threads each own one transport connection, pull
+    messages in batches, share a token-bucket rate limit and retry failures
+    with exponential backoff before writing them to a dead-letter file.
+    """
+
+    def __init__(self, transport_factory, workers: int = 8, rate: float = 100.0,
+                 batch_size: int = 100, max_retries: int = 3, dead_letter_file: str = "alerts_failed.jsonl"):
+        self.transport_factory = transport_factory
+        self.workers = workers
+        self.limiter = TokenBucket(rate)
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.dead_letter_file = dead_letter_file
+        self.queue: 'queue.Queue[Optional[EmailMessage]]' = queue.Queue()
+        self.sent = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+
+    def _send_with_retry(self, transport, msg: EmailMessage) -> bool:
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                transport.send(msg)
+                return True
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error(f"Giving up on alert to {msg['To']}: {e}")
+                    return False
+                time.sleep(min(30, 0.5 * 2 ** attempt))
+        return False
+
+    def _worker(self):
+        transport = self.transport_factory()
+        failures = []
+        try:
+            done = False
+            while not done:
+                batch = [self.queue.get()]
+                # Stop at the first shutdown marker so each worker consumes exactly one
+                while batch[-1] is not None and len(batch) < self.batch_size:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                messages = [msg for msg in batch if msg is not None]
+                done = len(messages) < len(batch)
+                sent = 0
+                for msg in messages:
+                    if self._send_with_retry(transport, msg):
+                        sent += 1
+                    else:
+                        failures.append({'to': msg['To'], 'subject': msg['Subject']})
+                with self.lock:
+                    self.sent += sent
+                    self.failed += len(messages) - sent
+        finally:
+            transport.close()
+            if failures:
+                with self.lock, open(self.dead_letter_file, 'a', encoding='utf-8') as f:
+                    for failure in failures:
+                        f.write(json.dumps(failure) + '\n')
+
+    def run(self, messages: Iterable[EmailMessage]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for msg in messages:
+            self.queue.put(msg)
+        for _ in threads:
+            self.queue.put(None)
+        for thread in threads:
+            thread.join()
+
+        elapsed = time.perf_counter() - started
+        logger.info(f"Sent {self.sent} alerts ({self.failed} failed) in {elapsed:.1f}s")
+        return {'sent': self.sent, 'failed': self.failed, 'seconds': round(elapsed, 2)}
+
+
+class _SinkHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept mail from smtplib and drop it into a directory"""
+
+    def _reply(self, line: str):
+        self.wfile.write((line + '\r\n').encode('ascii'))
+
+    def handle(self):
+        self._reply('220 localhost alert sink ready')
+        data_lines = None
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            line = raw.decode('utf-8', 'replace').rstrip('\r\n')
+            if data_lines is not None:
+                if line == '.':
+                    name = f"{time.time_ns()}-{threading.get_ident()}.eml"
+                    with open(os.path.join(self.server.maildir, name), 'w', encoding='utf-8') as f:
+                        f.write('\n'.join(data_lines) + '\n')
+                    data_lines = None
+                    self._reply('250 OK')
+                else:
+                    data_lines.append(line[1:] if line.startswith('..') else line)
+                continue
+            command = line[:4].upper()
+            if command in ('HELO', 'EHLO'):
+                self._reply('250 localhost')
+            elif command == 'DATA':
+                data_lines = []
+                self._reply('354 End data with <CR><LF>.<CR><LF>')
+            elif command == 'QUIT':
+                self._reply('221 Bye')
+                return
+            else:
+                self._reply('250 OK')
+
+
+class SmtpSink(socketserver.ThreadingTCPServer):
+    """Local SMTP stand-in for testing: accepts every message and stores it as a file"""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, host: str = 'localhost', port: int = 1025, maildir: str = "outbox"):
+        os.makedirs(maildir, exist_ok=True)
+        self.maildir = maildir
+        super().__init__((host, port), _SinkHandler)
+
+
+def main():
+    """Send alerts for violations that changed between two extraction outputs"""
+    parser = argparse.ArgumentParser(description="Water quality alert fan-out")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    send = sub.add_parser('send', help="Diff two extraction outputs and notify subscribers")
+    send.add_argument('--previous', required=True)
+    send.add_argument('--current', required=True)
+    send.add_argument('--policy', help="Extraction policy overrides (default: data/extraction_policy.json, if present)")
+    send.add_argument('--subscribers', default="water-safety-dashboard/subscribers.jsonl")
+    send.add_argument('--transport', choices=['smtp', 'sendgrid', 'file'], default='smtp')
+    send.add_argument('--smtp-host', default=os.environ.get('SMTP_HOST', 'localhost'))
+    send.add_argument('--smtp-port', type=int, default=int(os.environ.get('SMTP_PORT', '1025')))
+    send.add_argument('--starttls', action='store_true')
+    send.add_argument('--outbox', default="outbox")
+    send.add_argument('--workers', type=int, default=8)
+    send.add_argument('--rate', type=float, default=100.0, help="Messages per second across all workers")
+    send.add_argument('--batch-size', type=int, default=100)
+    send.add_argument('--retries', type=int, default=3)
+
+    sink = sub.add_parser('smtp-sink', help="Run a local SMTP stand-in that stores messages as files")
+    sink.add_argument('--host', default='localhost')
+    sink.add_argument('--port', type=int, default=1025)
+    sink.add_argument('--maildir', default="outbox")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == 'smtp-sink':
+        with SmtpSink(args.host, args.port, args.maildir) as server:
+            logger.info(f"SMTP sink listening on {args.host}:{args.port}, writing to {args.maildir}")
+            server.serve_forever()
+        return
+
+    policy = load_policy(args.policy)
+    previous = load_snapshot(args.previous, policy)
+    current = load_snapshot(args.current, policy)
+    changes = diff_violations(previous, current)
+    logger.info(f"{len(changes)} systems with new or resolved violations")
+
+    from_email = os.environ.get('FROM_EMAIL', 'noreply@water-safety-dashboard.com')
+    messages = build_messages(changes, current, SubscriberIndex.load(args.subscribers), from_email)
+    logger.info(f"{len(messages)} subscribers to notify")
+
+    if args.transport == 'smtp':
+        def factory():
+            return SmtpTransport(args.smtp_host, args.smtp_port, os.environ.get('SMTP_USER'),
+                                 os.environ.get('SMTP_PASSWORD'), args.starttls)
+    elif args.transport == 'sendgrid':
+        def factory():
+            return SendGridTransport(os.environ['SENDGRID_API_KEY'])
+    else:
+        def factory():
+            return FileTransport(args.outbox)
+
+    result = AlertQueue(factory, args.workers, args.rate, args.batch_size, args.retries).run(messages)
+    print(json.dumps({'systems_changed': len(changes), **result}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Dashboard Artifact Publishing
+Writes JSON artifacts minified under content-hashed filenames, precompressed
+with gzip and (when the brotli package is installed) brotli, and records them
+in artifact-manifest.json, which the dashboards fetch first
+"""
+
+import argparse
+import glob
+import gzip
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Dict, Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "artifact-manifest.json"
+HASH_LENGTH = 12
+# Hashed files of earlier builds kept around for clients that loaded the old manifest
+KEEP_PREVIOUS = 1
+
+
+def minify(data: Any) -> bytes:
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False, default=str).encode('utf-8')
+
+
+def hashed_name(name: str, payload: bytes) -> str:
+    """water_systems_data.json -> water_systems_data.<sha256 prefix>.json"""
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(payload).hexdigest()[:HASH_LENGTH]}{ext}"
+
+
+def _write(path: str, payload: bytes):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+def _compress(payload: bytes) -> Dict[str, bytes]:
+    # mtime=0 keeps the gzip output byte-identical for identical input
+    encoded = {'gzip': gzip.compress(payload, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        encoded['br'] = brotli.compress(payload, quality=11)
+    return encoded
+
+
+def load_manifest(public_dir: str) -> Dict[str, Any]:
+    path = os.path.join(public_dir, MANIFEST_FILE)
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'artifacts': {}}
+
+
+def _prune(public_dir: str, name: str, keep: set):
+    """Remove hashed copies of an artifact that are neither current nor recent"""
+    stem, ext = os.path.splitext(name)
+    candidates = glob.glob(os.path.join(public_dir, f"{stem}.{'[0-9a-f]' * HASH_LENGTH}{ext}"))
+    candidates.sort(key=os.path.getmtime, reverse=True)
+    stale = [path for path in candidates if os.path.basename(path) not in keep][KEEP_PREVIOUS:]
+    for path in stale:
+        for suffix in ('', '.gz', '.br'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+def publish_artifact(public_dir: str, name: str, data: Any = None, source: Optional[str] = None,
+                     write_plain: bool = True) -> Dict[str, Any]:
+    """
+    Publish one artifact from in-memory data, bytes or an existing file. The
+    plain fixed-name file is still written (minified) for clients that do not
+    read the manifest.
+    """
+    if source is not None and source.endswith('.json'):
+        with open(source, encoding='utf-8') as f:
+            data = json.load(f)
+    elif source is not None:
+        with open(source, 'rb') as f:
+            data = f.read()
+    # Binary artifacts (e.g. typed-array exports) are published as-is
+    payload = data if isinstance(data, bytes) else minify(data)
+    filename = hashed_name(name, payload)
+    path = os.path.join(public_dir, filename)
+
+    entry = {'file': filename, 'bytes': len(payload)}
+    if os.path.exists(path):
+        # Same content as an earlier build: the hashed files are already there
+        for encoding, suffix in (('gzip', '.gz'), ('br', '.br')):
+            if os.path.exists(path + suffix):
+                entry[encoding] = os.path.getsize(path + suffix)
+        os.utime(path)
+    else:
+        _write(path, payload)
+        for encoding, compressed in _compress(payload).items():
+            suffix = '.gz' if encoding == 'gzip' else '.br'
+            _write(path + suffix, compressed)
+            entry[encoding] = len(compressed)
+
+    if write_plain:
+        _write(os.path.join(public_dir, name), payload)
+    return entry
+
+
+def publish_artifacts(public_dir: str, artifacts: Dict[str, Any], sources: Optional[Dict[str, str]] = None):
+    """
+    Publish several artifacts and update the manifest. `artifacts` maps logical
+    names to data or bytes; `sources` maps logical names to files to republish.
+    """
+    os.makedirs(public_dir, exist_ok=True)
+    manifest = load_manifest(public_dir)
+    if brotli is None:
+        logger.warning("brotli is not installed; publishing gzip-compressed artifacts only")
+
+    items = [(name, data, None) for name, data in artifacts.items()]
+    items += [(name, None, path) for name, path in (sources or {}).items()]
+    for name, data, source in items:
+        try:
+            entry = publish_artifact(public_dir, name, data, source)
+        except Exception as e:
+            logger.error(f"Error publishing {name}: {e}")
+            continue
+        previous = manifest['artifacts'].get(name, {}).get('file')
+        manifest['artifacts'][name] = entry
+        _prune(public_dir, name, {entry['file']})
+        sizes = ', '.join(f"{k} {entry[k]:,}" for k in ('gzip', 'br') if k in entry)
+        state = "unchanged" if previous == entry['file'] else "updated"
+        logger.info(f"{name} -> {entry['file']} ({state}; {entry['bytes']:,} bytes, {sizes})")
+
+    _write(os.path.join(public_dir, MANIFEST_FILE), json.dumps(manifest, indent=2).encode('utf-8'))
+    logger.info(f"Manifest saved to {os.path.join(public_dir, MANIFEST_FILE)}")
+    return manifest
+
+
+def main():
+    """Republish existing files as hashed, precompressed artifacts"""
+    parser = argparse.ArgumentParser(description="Publish dashboard JSON artifacts")
+    parser.add_argument('public_dir', help="Dashboard public/ directory")
+    parser.add_argument('files', nargs='+', help="Files to publish under their base names")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    publish_artifacts(args.public_dir, {}, {os.path.basename(path): path for path in args.files})
+
+
+if __name__ == "__main__":
+    main()
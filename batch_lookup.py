@@ -0,0 +1,569 @@
+#!/usr/bin/env python3
+"""
+Batch ZIP / PWSID Lookup
+Annotates large CSV lists (billing addresses, school rosters) with the water
+system serving each row's ZIP code or PWSID, its trust score and its active
+violations. The input is streamed in blocks, each block is resolved with one
+vectorized join against prebuilt indexes, and the annotated rows are streamed
+back out, so memory stays constant however long the list is
+"""
+
+import argparse
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from columnar_export import MISSING_CODE, encode_dictionary, read_frame, write_columns
+from data_validation import normalize_zip
+from extraction_engine import ExtractionEngine
+from sdwis_tables import shared_tables
+
+logger = logging.getLogger(__name__)
+
+INDEX_DIR = "batch_index"
+# Bytes of input per vectorized block (about 200k rows of a short list)
+BLOCK_BYTES = 4 << 20
+# Blocks in flight between the reader, the join and the writer
+QUEUE_DEPTH = 2
+DEFAULT_PORT = 8767
+KEYS = ['auto', 'zip', 'pwsid']
+# Input column names recognized when --column is not given (case-insensitive)
+ZIP_COLUMNS = ['ZIP', 'ZIP_CODE', 'ZIPCODE', 'ZIP5', 'POSTAL_CODE', 'POSTALCODE', 'ZIP_CODE_SERVED']
+PWSID_COLUMNS = ['PWSID', 'PWS_ID']
+# Sections the index needs: violations and visits for the trust score, areas for ZIPs
+INDEX_SECTIONS = ['geographic_areas', 'violations_enforcement', 'site_visits']
+
+
+def build_lookup_index(data_dir: str = "data", policy: Optional[Dict[str, Any]] = None) -> Dict[str, pd.DataFrame]:
+    """
+    Per-system rows (sorted by PWSID) with the extraction engine's trust score
+    and active violation counts, and ZIP -> system rows for active systems
+    ranked so the first row of each ZIP is the system most likely to serve a
+    household there: ZIPs from the served areas before mailing-address ZIPs,
+    community systems first, then by population
+    """
+    engine = ExtractionEngine(data_dir, policy)
+    with shared_tables():
+        engine.load(INDEX_SECTIONS)
+    systems = engine.systems
+    metrics = pd.DataFrame.from_dict(engine.metrics, orient='index').reindex(systems['PWSID'])
+    population = pd.to_numeric(systems['POPULATION_SERVED_COUNT'], errors='coerce')
+    frame = pd.DataFrame({
+        'pwsid': systems['PWSID'].to_numpy(),
+        'name': systems['PWS_NAME'].to_numpy(),
+        'county': [(engine.geography[pwsid]['counties'] or [None])[0] for pwsid in systems['PWSID']],
+        'activity': systems['PWS_ACTIVITY_CODE'].to_numpy(),
+        'type': systems['PWS_TYPE_CODE'].to_numpy(),
+        'population': population.fillna(MISSING_CODE).to_numpy(dtype='<i4'),
+        'trust_score': metrics['trust_score'].to_numpy(dtype='u1'),
+        'active_violations': metrics['active_violations'].to_numpy(dtype='<i4'),
+        'active_health_based': metrics['active_health_based'].to_numpy(dtype='<i4'),
+    }).sort_values('pwsid', kind='stable').reset_index(drop=True)
+
+    # Inactive systems no longer serve anyone; they stay reachable by PWSID only
+    zips = pd.DataFrame([(zip_code, pwsid) for pwsid, geography in engine.geography.items()
+                         for zip_code in geography['zip_codes']], columns=['zip', 'pwsid'])
+    zips['system'] = pd.Index(frame['pwsid']).get_indexer(zips['pwsid']).astype('<i4')
+    ranked = frame.iloc[zips['system']]
+    zips = zips[(ranked['activity'] == 'A').to_numpy()]
+    ranked = frame.iloc[zips['system']]
+    zips['mailing'] = zips['pwsid'].isin(engine.mailing_zip_systems).to_numpy(dtype='u1')
+    zips['community'] = (ranked['type'] == 'CWS').to_numpy()
+    zips['population'] = ranked['population'].to_numpy()
+    zips = zips.sort_values(['zip', 'mailing', 'community', 'population'],
+                            ascending=[True, True, False, False], kind='stable')
+    logger.info(f"Lookup index: {len(frame)} systems, {zips['zip'].nunique()} ZIPs "
+                f"({zips.loc[zips['mailing'] == 0, 'zip'].nunique()} from served areas)")
+    return {'systems': frame, 'zips': zips[['zip', 'system', 'mailing']].reset_index(drop=True)}
+
+
+def save_lookup_index(index: Dict[str, pd.DataFrame], index_dir: str = INDEX_DIR):
+    """Write the index as typed-array files (systems.cols, zips.cols)"""
+    os.makedirs(index_dir, exist_ok=True)
+    for name, frame in index.items():
+        columns, dictionaries = {}, {}
+        for column in frame.columns:
+            if not pd.api.types.is_numeric_dtype(frame[column]):
+                columns[column], dictionaries[column] = encode_dictionary(frame[column])
+            else:
+                columns[column] = frame[column].to_numpy()
+        size = write_columns(os.path.join(index_dir, f"{name}.cols"), name, columns, dictionaries)
+        logger.info(f"Lookup index {name}: {len(frame)} rows -> {index_dir}/{name}.cols ({size:,} bytes)")
+
+
+def _text(values: pd.Series) -> np.ndarray:
+    return values.astype(object).where(values.notna(), None).to_numpy()
+
+
+class LookupIndex:
+    """The system columns as arrays, plus PWSID and ZIP positions for vectorized joins"""
+
+    def __init__(self, systems: pd.DataFrame, zips: pd.DataFrame):
+        self.systems = len(systems)
+        self.pwsid_index = pd.Index(_text(systems['pwsid']))
+        self.columns = {
+            'pwsid': _text(systems['pwsid']),
+            'system_name': _text(systems['name']),
+            'county': _text(systems['county']),
+            'activity_status': _text(systems['activity']),
+            'population_served': systems['population'].to_numpy(dtype=np.int64),
+            'trust_score': systems['trust_score'].to_numpy(dtype=np.int64),
+            'active_violations': systems['active_violations'].to_numpy(dtype=np.int64),
+            'active_health_based_violations': systems['active_health_based'].to_numpy(dtype=np.int64),
+        }
+        zip_codes = _text(zips['zip'])
+        first = ~pd.Series(zip_codes).duplicated().to_numpy()
+        self.zip_index = pd.Index(zip_codes[first])
+        # Highest-ranked system per ZIP, the number of active systems serving it
+        # and whether that system was matched by its mailing address only
+        self.zip_primary = zips['system'].to_numpy(dtype=np.int64)[first]
+        self.zip_systems = np.diff(np.append(np.flatnonzero(first), len(zip_codes)))
+        self.zip_match = np.where(zips['mailing'].to_numpy()[first] != 0, 'mailing_zip', 'zip').astype(object)
+        # Each system's lookup columns as a CSV fragment, plus the empty one for
+        # unmatched rows (last), so a block's output is one gather and a join
+        text = io.StringIO()
+        writer = csv.writer(text, lineterminator='\n')
+        for row in zip(*(values.tolist() for values in self.columns.values())):
+            writer.writerow(['' if value is None or value == MISSING_CODE else value for value in row])
+        self.fragments = np.array(text.getvalue().encode('utf-8').split(b'\n')[:-1] +
+                                  [b',' * (len(self.columns) - 1)], dtype=object)
+
+    def output_names(self, names: List[str], key: str) -> List[str]:
+        """Lookup column names, renamed <name>_lookup where the input already has the name"""
+        lookup = list(self.columns) + (['systems_in_zip'] if key == 'zip' else []) + ['match']
+        return [f"{name}_lookup" if name in names else name for name in lookup]
+
+    @classmethod
+    def from_data(cls, data_dir: str = "data") -> "LookupIndex":
+        index = build_lookup_index(data_dir)
+        return cls(index['systems'], index['zips'])
+
+    @classmethod
+    def load(cls, index_dir: str = INDEX_DIR) -> "LookupIndex":
+        systems = read_frame(os.path.join(index_dir, 'systems.cols'))
+        zips = read_frame(os.path.join(index_dir, 'zips.cols'))
+        if 'mailing' not in zips:
+            raise ValueError(f"{index_dir} was built by an older version; rebuild it with 'batch_lookup.py build'")
+        return cls(systems, zips)
+
+    def resolve(self, values: pd.Series, key: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        (system row or -1, systems serving the ZIP, match) per value. Each
+        distinct value is normalized and looked up once.
+        """
+        codes, uniques = pd.factorize(values)
+        uniques = pd.Series(uniques, dtype=object)
+        if key == 'zip':
+            normalized = normalize_zip(uniques)
+            position = self.zip_index.get_indexer(normalized.astype(object).where(normalized.notna(), None))
+            found = position >= 0
+            system = np.where(found, self.zip_primary[np.maximum(position, 0)], -1)
+            serving = np.where(found, self.zip_systems[np.maximum(position, 0)], 0)
+            matched = self.zip_match[np.maximum(position, 0)]
+        else:
+            normalized = uniques.str.strip().str.upper().replace('', None)
+            system = self.pwsid_index.get_indexer(normalized)
+            serving = (system >= 0).astype(np.int64)
+            matched = key
+        match = np.select([system >= 0, normalized.isna().to_numpy()], [matched, 'invalid'], 'unmatched').astype(object)
+        codes = np.where(codes < 0, len(uniques), codes)
+        system, serving = np.append(system, -1), np.append(serving, 0)
+        match = np.append(match, 'invalid')
+        return system[codes], serving[codes], match[codes]
+
+    def annotate(self, frame: pd.DataFrame, column: str, key: str) -> Tuple[pd.DataFrame, np.ndarray]:
+        """
+        The input rows with the lookup columns appended (renamed <name>_lookup
+        on a clash), and each row's match
+        """
+        system, serving, match = self.resolve(frame[column], key)
+        found = system >= 0
+        rows = np.maximum(system, 0)
+        output = {}
+        for name, values in self.columns.items():
+            taken = values[rows]
+            if values.dtype == object:
+                output[name] = np.where(found, taken, None)
+            else:
+                output[name] = pd.array(taken, dtype='Int64')
+                output[name][~found | (taken == MISSING_CODE)] = pd.NA
+        if key == 'zip':
+            output['systems_in_zip'] = serving
+        output['match'] = match
+        for name, values in zip(self.output_names(list(frame.columns), key), output.values()):
+            frame[name] = values
+        return frame, match
+
+    def csv_rows(self, lines: List[bytes], system: np.ndarray, serving: Optional[np.ndarray],
+                 match: np.ndarray) -> bytes:
+        """The raw input lines with the lookup columns appended as CSV"""
+        fragments = self.fragments[np.where(system >= 0, system, len(self.fragments) - 1)].tolist()
+        matches = {value: f",{value}\n".encode('ascii') for value in set(match.tolist())}
+        if serving is None:
+            return b''.join(line + b',' + fragment + matches[m]
+                            for line, fragment, m in zip(lines, fragments, match.tolist()))
+        return b''.join(line + b',' + fragment + b',' + str(n).encode('ascii') + matches[m]
+                        for line, fragment, n, m in zip(lines, fragments, serving.tolist(), match.tolist()))
+
+
+def record_boundary(buffer: bytes) -> int:
+    """Length of the longest prefix of buffer ending in a newline outside quotes (0 if none)"""
+    end = len(buffer)
+    while True:
+        end = buffer.rfind(b'\n', 0, end)
+        if end < 0:
+            return 0
+        if buffer.count(b'"', 0, end) % 2 == 0:
+            return end + 1
+
+
+class BatchLookup:
+    """
+    One streaming lookup: a reader splits the input into blocks on record
+    boundaries, the join runs in a worker thread, and a writer sends each
+    annotated block on, with bounded queues between them
+    """
+
+    def __init__(self, index: LookupIndex, key: str = 'auto', column: Optional[str] = None,
+                 block_bytes: int = BLOCK_BYTES):
+        self.index = index
+        self.key = key
+        self.column = column
+        self.block_bytes = block_bytes
+        self.header = b''
+        self.rows = 0
+        self.matches: Dict[str, int] = {}
+
+    def _prepare(self, header: bytes):
+        """Pick the lookup column and key from the header row"""
+        header = header.removeprefix(b'\xef\xbb\xbf')
+        names = next(csv.reader([header.decode('utf-8').rstrip('\r\n')]), [])
+        by_upper = {name.strip().upper(): name for name in names}
+        if self.column is None:
+            candidates = (ZIP_COLUMNS if self.key == 'zip' else PWSID_COLUMNS if self.key == 'pwsid'
+                          else PWSID_COLUMNS + ZIP_COLUMNS)
+            self.column = next((by_upper[c] for c in candidates if c in by_upper), None)
+            if self.column is None:
+                raise ValueError(f"No ZIP or PWSID column in the header ({', '.join(names)}); pass a column name")
+        elif self.column not in names:
+            raise ValueError(f"Column {self.column} is not in the header ({', '.join(names)})")
+        if self.key == 'auto':
+            self.key = 'pwsid' if self.column.strip().upper() in PWSID_COLUMNS else 'zip'
+        self.header = header if header.endswith(b'\n') else header + b'\n'
+        text = io.StringIO()
+        csv.writer(text, lineterminator='\n').writerow(self.index.output_names(names, self.key))
+        self.output_header = self.header.rstrip(b'\r\n') + b',' + text.getvalue().encode('utf-8')
+
+    def process(self, block: bytes, first: bool) -> Tuple[bytes, Dict[str, int]]:
+        """
+        Annotate one block of complete records. Only the lookup column is
+        parsed and the input lines are passed through as they are, unless a
+        quoted field spans lines; then the block is rebuilt through pandas.
+        """
+        values = pd.read_csv(io.BytesIO(self.header + block), dtype=str, keep_default_na=False, encoding='utf-8',
+                             usecols=[self.column])[self.column]
+        lines = [line[:-1] if line.endswith(b'\r') else line for line in block.split(b'\n')]
+        lines = [line for line in lines if line]
+        if len(lines) == len(values):
+            system, serving, match = self.index.resolve(values, self.key)
+            data = (self.output_header if first else b'') + \
+                self.index.csv_rows(lines, system, serving if self.key == 'zip' else None, match)
+        else:
+            frame = pd.read_csv(io.BytesIO(self.header + block), dtype=str, keep_default_na=False, encoding='utf-8')
+            frame, match = self.index.annotate(frame, self.column, self.key)
+            data = frame.to_csv(index=False, header=first, lineterminator='\n').encode('utf-8')
+        counts = {str(k): int(v) for k, v in pd.Series(match).value_counts().items()}
+        return data, counts
+
+    async def run(self, read: Callable[[int], Awaitable[bytes]], write: Callable[[bytes], Awaitable[None]]):
+        """Stream from read (b'' at end of input) to write"""
+        loop = asyncio.get_running_loop()
+        # One thread for every join keeps the allocator from growing an arena per thread
+        join_thread = ThreadPoolExecutor(max_workers=1)
+        blocks: asyncio.Queue = asyncio.Queue(QUEUE_DEPTH)
+        results: asyncio.Queue = asyncio.Queue(QUEUE_DEPTH)
+
+        async def reader():
+            buffer, header_read = b'', False
+            while True:
+                data = await read(self.block_bytes)
+                buffer += data
+                if not header_read:
+                    newline = buffer.find(b'\n')
+                    if newline < 0 and data:
+                        continue
+                    newline = len(buffer) if newline < 0 else newline + 1
+                    self._prepare(buffer[:newline])
+                    buffer, header_read = buffer[newline:], True
+                if not data:
+                    if buffer.strip():
+                        await blocks.put(buffer if buffer.endswith(b'\n') else buffer + b'\n')
+                    await blocks.put(None)
+                    return
+                if len(buffer) >= self.block_bytes:
+                    cut = record_boundary(buffer)
+                    if cut:
+                        await blocks.put(buffer[:cut])
+                        buffer = buffer[cut:]
+
+        async def joiner():
+            first = True
+            while True:
+                block = await blocks.get()
+                if block is None and not first:
+                    break
+                data, counts = await loop.run_in_executor(join_thread, self.process, block or b'', first)
+                for match, count in counts.items():
+                    self.matches[match] = self.matches.get(match, 0) + count
+                    self.rows += count
+                await results.put(data)
+                first = False
+                if block is None:
+                    break
+            await results.put(None)
+
+        async def writer():
+            while True:
+                data = await results.get()
+                if data is None:
+                    return
+                await write(data)
+
+        tasks = [asyncio.create_task(step()) for step in (reader, joiner, writer)]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        finally:
+            join_thread.shutdown(wait=False)
+
+    def summary(self, seconds: float) -> str:
+        return (f"Looked up {self.rows:,} rows by {self.key} ({self.column}) in {seconds:.1f}s: "
+                + ', '.join(f"{match} {count:,}" for match, count in sorted(self.matches.items())))
+
+
+async def lookup_file(index: LookupIndex, input_path: str, output_path: str, key: str = 'auto',
+                      column: Optional[str] = None, block_bytes: int = BLOCK_BYTES) -> BatchLookup:
+    """Annotate a CSV file ('-' for stdin/stdout); file reads and writes run in worker threads"""
+    loop = asyncio.get_running_loop()
+    source = sys.stdin.buffer if input_path == '-' else open(input_path, 'rb')
+    target = sys.stdout.buffer if output_path == '-' else open(output_path + '.tmp', 'wb')
+    lookup = BatchLookup(index, key, column, block_bytes)
+    started = time.perf_counter()
+    try:
+        await lookup.run(lambda n: loop.run_in_executor(None, source.read, n),
+                         lambda data: loop.run_in_executor(None, target.write, data))
+    except BaseException:
+        if output_path != '-':
+            target.close()
+            os.remove(output_path + '.tmp')
+        raise
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+        if target is not sys.stdout.buffer:
+            target.close()
+    if output_path != '-':
+        os.replace(output_path + '.tmp', output_path)
+    logger.info(lookup.summary(time.perf_counter() - started))
+    return lookup
+
+
+class LookupServer:
+    """
+    POST /lookup[?key=zip|pwsid&column=NAME]  CSV body in, annotated CSV out
+    GET  /status                              index size
+
+    The response is sent with chunked encoding while the request body is still
+    arriving, so the client has to read as it uploads (curl does).
+    """
+
+    def __init__(self, index: LookupIndex, block_bytes: int = BLOCK_BYTES):
+        self.index = index
+        self.block_bytes = block_bytes
+        self.requests = 0
+
+    @staticmethod
+    async def _send(writer: asyncio.StreamWriter, status: str, headers: Dict[str, str], body: bytes = b''):
+        head = [f"HTTP/1.1 {status}"] + [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+    async def _send_json(self, writer: asyncio.StreamWriter, payload: Any, status: str = '200 OK'):
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        await self._send(writer, status, {'Content-Type': 'application/json', 'Content-Length': str(len(body)),
+                                          'Access-Control-Allow-Origin': '*', 'Connection': 'close'}, body)
+
+    @staticmethod
+    def _body_reader(reader: asyncio.StreamReader, headers: Dict[str, str]) -> Callable[[int], Awaitable[bytes]]:
+        """read(n) over a Content-Length or chunked request body"""
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            state = {'left': 0, 'done': False}
+
+            async def read_chunked(n: int) -> bytes:
+                if state['done']:
+                    return b''
+                if not state['left']:
+                    size = int((await reader.readline()).split(b';')[0].strip() or b'0', 16)
+                    if size == 0:
+                        # Trailers end with an empty line
+                        while (await reader.readline()).strip():
+                            pass
+                        state['done'] = True
+                        return b''
+                    state['left'] = size
+                data = await reader.read(min(n, state['left']))
+                if not data:
+                    raise ConnectionError("Request body ended early")
+                state['left'] -= len(data)
+                if not state['left']:
+                    await reader.readline()
+                return data
+            return read_chunked
+
+        remaining = {'bytes': int(headers.get('content-length', '0'))}
+
+        async def read_length(n: int) -> bytes:
+            if remaining['bytes'] <= 0:
+                return b''
+            data = await reader.read(min(n, remaining['bytes']))
+            if not data:
+                raise ConnectionError("Request body ended early")
+            remaining['bytes'] -= len(data)
+            return data
+        return read_length
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1')
+                if line in ('\r\n', '\n', ''):
+                    break
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            if len(request_line) < 2:
+                return
+            method, url = request_line[0], urlparse(request_line[1])
+            path = url.path.rstrip('/')
+            if method == 'GET' and path == '/status':
+                await self._send_json(writer, {'systems': self.index.systems, 'zips': len(self.index.zip_index),
+                                               'requests': self.requests})
+            elif method == 'POST' and path == '/lookup':
+                await self._lookup(reader, writer, headers, parse_qs(url.query))
+            else:
+                await self._send_json(writer, {'error': 'Not found'}, '404 Not Found')
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            logger.error(f"Error serving lookup request: {e}")
+        finally:
+            writer.close()
+
+    async def _lookup(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                      headers: Dict[str, str], query: Dict[str, List[str]]):
+        key = query.get('key', ['auto'])[0]
+        if key not in KEYS:
+            await self._send_json(writer, {'error': f"key must be one of {', '.join(KEYS)}"}, '400 Bad Request')
+            return
+        if headers.get('expect', '').lower() == '100-continue':
+            writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+            await writer.drain()
+        self.requests += 1
+        lookup = BatchLookup(self.index, key, query.get('column', [None])[0], self.block_bytes)
+        started = {'time': time.perf_counter(), 'sent': False}
+
+        async def write(data: bytes):
+            if not started['sent']:
+                # Headers go out with the first block, so a bad column can still get a 400
+                await self._send(writer, '200 OK', {'Content-Type': 'text/csv; charset=utf-8',
+                                                    'Transfer-Encoding': 'chunked',
+                                                    'Access-Control-Allow-Origin': '*', 'Connection': 'close'})
+                started['sent'] = True
+            writer.write(f"{len(data):x}\r\n".encode('latin-1') + data + b"\r\n")
+            await writer.drain()
+
+        try:
+            await lookup.run(self._body_reader(reader, headers), write)
+        except ValueError as e:
+            if not started['sent']:
+                await self._send_json(writer, {'error': str(e)}, '400 Bad Request')
+            return
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+        logger.info(lookup.summary(time.perf_counter() - started['time']))
+
+    async def serve(self, host: str = '127.0.0.1', port: int = DEFAULT_PORT):
+        server = await asyncio.start_server(self.handle, host, port)
+        logger.info(f"Serving batch lookups on http://{host}:{port}/lookup "
+                    f"({self.index.systems} systems, {len(self.index.zip_index)} ZIPs)")
+        async with server:
+            await server.serve_forever()
+
+
+def load_index(index_dir: str = INDEX_DIR, data_dir: str = "data") -> LookupIndex:
+    """The prebuilt index if present, otherwise one built from the tables"""
+    if os.path.exists(os.path.join(index_dir, 'systems.cols')):
+        return LookupIndex.load(index_dir)
+    logger.info(f"No lookup index in {index_dir}; building one from {data_dir}")
+    return LookupIndex.from_data(data_dir)
+
+
+def main():
+    """Build the lookup index, annotate a CSV, or serve lookups over HTTP"""
+    parser = argparse.ArgumentParser(description="Annotate ZIP or PWSID lists with their water system")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build = subparsers.add_parser('build', help="Build the ZIP/PWSID index from the SDWIS tables")
+    build.add_argument('--data-dir', default="data")
+    build.add_argument('--index-dir', default=INDEX_DIR)
+
+    lookup = subparsers.add_parser('lookup', help="Annotate a CSV file")
+    lookup.add_argument('input', help="CSV with a ZIP or PWSID column ('-' for stdin)")
+    lookup.add_argument('output', nargs='?', default='-', help="Annotated CSV (default: stdout)")
+    lookup.add_argument('--key', choices=KEYS, default='auto', help="What the column holds (default: from its name)")
+    lookup.add_argument('--column', help="Column to look up (default: the first ZIP or PWSID column)")
+    lookup.add_argument('--block-bytes', type=int, default=BLOCK_BYTES)
+
+    serve = subparsers.add_parser('serve', help="Serve POST /lookup")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=DEFAULT_PORT)
+
+    for sub in (lookup, serve):
+        sub.add_argument('--index-dir', default=INDEX_DIR)
+        sub.add_argument('--data-dir', default="data", help="Tables to build the index from when none is prebuilt")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stderr)
+    if args.command == 'build':
+        save_lookup_index(build_lookup_index(args.data_dir), args.index_dir)
+        return
+    index = load_index(args.index_dir, args.data_dir)
+    try:
+        if args.command == 'lookup':
+            asyncio.run(lookup_file(index, args.input, args.output, args.key, args.column, args.block_bytes))
+        else:
+            asyncio.run(LookupServer(index).serve(args.host, args.port))
+    except ValueError as e:
+        logger.error(f"Error: {e}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
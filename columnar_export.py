@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Columnar Export
+Writes numeric columns (dates as day numbers, counts, sample measures, trust
+scores) as little-endian typed-array buffers behind a small JSON schema
+header, which numpy maps without copying, and as Arrow IPC files when pyarrow
+is installed. The lookup index, shared dataset and snapshot store use the
+same format
+"""
+
+import argparse
+import json
+import logging
+import mmap
+import os
+import struct
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from sdwis_tables import NATURAL_KEYS, date_to_day, load_table
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'SDWCOL01'
+ALIGNMENT = 8
+MISSING_DAY = -1
+MISSING_CODE = -1
+
+# Column types the browser can view directly as Int32Array/Float64Array/...
+DTYPES = {
+    'int32': np.dtype('<i4'),
+    'uint8': np.dtype('u1'),
+    'uint16': np.dtype('<u2'),
+    'float64': np.dtype('<f8'),
+}
+
+
+def _type_name(dtype: np.dtype) -> str:
+    for name, candidate in DTYPES.items():
+        if dtype == candidate:
+            return name
+    raise ValueError(f"Unsupported column dtype {dtype}")
+
+
+def _pad(length: int) -> int:
+    return -length % ALIGNMENT
+
+
+def encode_dictionary(values: pd.Series) -> Tuple[np.ndarray, List[str]]:
+    """Dictionary-encode a text column as int32 codes (-1 for missing)"""
+    codes, uniques = pd.factorize(values, sort=True, use_na_sentinel=True)
+    return codes.astype('<i4'), [str(u) for u in uniques]
+
+
+def encode_columns(name: str, columns: Dict[str, np.ndarray],
+                   dictionaries: Optional[Dict[str, List[str]]] = None,
+                   nulls: Optional[Dict[str, Any]] = None) -> bytes:
+    """
+    Layout: 8-byte magic, uint32 header length, JSON header, then one buffer per
+    column. Every buffer starts on an 8-byte boundary so it can be viewed as a
+    typed array without copying; offsets in the header are from file start.
+    """
+    dictionaries = dictionaries or {}
+    nulls = nulls or {}
+    rows = len(next(iter(columns.values()))) if columns else 0
+
+    arrays = {}
+    for column, values in columns.items():
+        array = np.ascontiguousarray(values)
+        if array.dtype.byteorder == '>':
+            array = array.astype(array.dtype.newbyteorder('<'))
+        if len(array) != rows:
+            raise ValueError(f"Column {column} has {len(array)} rows, expected {rows}")
+        _type_name(array.dtype)
+        arrays[column] = array
+
+    def header_bytes(offsets):
+        schema = []
+        for column, array in arrays.items():
+            entry = {'name': column, 'type': _type_name(array.dtype), 'offset': offsets[column],
+                     'bytes': array.nbytes}
+            if column in dictionaries:
+                entry['dictionary'] = dictionaries[column]
+                entry['null'] = MISSING_CODE
+            elif column in nulls:
+                entry['null'] = nulls[column]
+            schema.append(entry)
+        return json.dumps({'name': name, 'rows': rows, 'columns': schema}, separators=(',', ':')).encode('utf-8')
+
+    # Offsets depend on the header length, which depends on the offsets; the
+    # header only grows, so this settles after a pass or two
+    offsets = {column: 0 for column in arrays}
+    while True:
+        header = header_bytes(offsets)
+        position = len(MAGIC) + 4 + len(header)
+        position += _pad(position)
+        new_offsets = {}
+        for column, array in arrays.items():
+            new_offsets[column] = position
+            position += array.nbytes + _pad(array.nbytes)
+        if new_offsets == offsets:
+            break
+        offsets = new_offsets
+
+    parts = [MAGIC, struct.pack('<I', len(header)), header]
+    parts.append(b'\0' * _pad(len(MAGIC) + 4 + len(header)))
+    for array in arrays.values():
+        parts.append(array.tobytes())
+        parts.append(b'\0' * _pad(array.nbytes))
+    return b''.join(parts)
+
+
+def write_columns(path: str, name: str, columns: Dict[str, np.ndarray],
+                  dictionaries: Optional[Dict[str, List[str]]] = None,
+                  nulls: Optional[Dict[str, Any]] = None) -> int:
+    payload = encode_columns(name, columns, dictionaries, nulls)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+    return len(payload)
+
+
+def read_columns(path: str) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """Memory-map a typed-array file; the returned arrays are views, not copies"""
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if buffer[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a columnar export")
+    (header_length,) = struct.unpack_from('<I', buffer, len(MAGIC))
+    start = len(MAGIC) + 4
+    header = json.loads(bytes(buffer[start:start + header_length]))
+    arrays = {}
+    for column in header['columns']:
+        arrays[column['name']] = np.frombuffer(buffer, dtype=DTYPES[column['type']],
+                                               count=header['rows'], offset=column['offset'])
+    return header, arrays
+
+
+def read_frame(path: str) -> pd.DataFrame:
+    """Load a typed-array file as a DataFrame with dictionary columns as categoricals"""
+    header, arrays = read_columns(path)
+    data = {}
+    for column in header['columns']:
+        values = arrays[column['name']]
+        if 'dictionary' in column:
+            data[column['name']] = pd.Categorical.from_codes(values, categories=column['dictionary'])
+        else:
+            data[column['name']] = values
+    return pd.DataFrame(data)
+
+
+def write_arrow(path: str, columns: Dict[str, np.ndarray], dictionaries: Dict[str, List[str]]) -> Optional[int]:
+    """Arrow IPC file with the same columns; dictionary columns stay dictionary-encoded"""
+    if pa is None:
+        return None
+    fields = {}
+    for column, values in columns.items():
+        if column in dictionaries:
+            indices = pa.array(values, mask=values == MISSING_CODE, type=pa.int32())
+            fields[column] = pa.DictionaryArray.from_arrays(indices, pa.array(dictionaries[column], type=pa.string()))
+        else:
+            fields[column] = pa.array(values)
+    table = pa.table(fields)
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return os.path.getsize(path)
+
+
+def system_columns(systems: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Per-system stats from the public dashboard records (water_systems_data.json)"""
+    frame = pd.DataFrame({
+        'pwsid': [s.get('pwsid') for s in systems],
+        # Public records carry both key styles; older snapshots have only the snake_case ones
+        'population': [s.get('population_served', s.get('population')) or 0 for s in systems],
+        'trust_score': [s.get('trust_score', s.get('trustScore')) or 0 for s in systems],
+        'active_violations': [s.get('active_violations', s.get('activeViolations')) or 0 for s in systems],
+        'last_violation': [s.get('last_violation', s.get('lastViolation')) for s in systems],
+    })
+    last_violation = pd.to_datetime(frame['last_violation'], format='%Y-%m-%d', errors='coerce')
+    last_day = last_violation.values.astype('datetime64[D]').astype(np.int64)
+    last_day[last_violation.isna().to_numpy()] = MISSING_DAY
+
+    pwsid_codes, pwsids = encode_dictionary(frame['pwsid'])
+    return {
+        'columns': {
+            'pwsid': pwsid_codes,
+            'population': frame['population'].to_numpy(dtype='<i4'),
+            'trust_score': frame['trust_score'].to_numpy(dtype='u1'),
+            'active_violations': frame['active_violations'].to_numpy(dtype='<i4'),
+            'last_violation_day': last_day.astype('<i4'),
+        },
+        'dictionaries': {'pwsid': pwsids},
+        'nulls': {'last_violation_day': MISSING_DAY}
+    }
+
+
+def _table_columns(df: pd.DataFrame, days: Dict[str, str], measures: Dict[str, str],
+                   codes: Dict[str, str]) -> Dict[str, Any]:
+    columns, dictionaries, nulls = {}, {}, {}
+    for target, source in codes.items():
+        columns[target], dictionaries[target] = encode_dictionary(df[source])
+    for target, source in days.items():
+        columns[target] = date_to_day(df[source], MISSING_DAY).astype('<i4')
+        nulls[target] = MISSING_DAY
+    for target, source in measures.items():
+        # NaN marks missing measures
+        columns[target] = pd.to_numeric(df[source], errors='coerce').to_numpy(dtype='<f8')
+    return {'columns': columns, 'dictionaries': dictionaries, 'nulls': nulls}
+
+
+def table_datasets(data_dir: str = "data") -> Dict[str, Dict[str, Any]]:
+    """Numeric columns straight from the SDWIS tables"""
+    datasets = {}
+    try:
+        lcr_df = load_table('lcr_samples', data_dir)
+        datasets['lcr_samples'] = _table_columns(
+            lcr_df,
+            days={'sampling_start_day': 'SAMPLING_START_DATE', 'sampling_end_day': 'SAMPLING_END_DATE'},
+            measures={'sample_measure': 'SAMPLE_MEASURE'},
+            codes={'pwsid': 'PWSID', 'contaminant': 'CONTAMINANT_CODE', 'unit': 'UNIT_OF_MEASURE'})
+    except Exception as e:
+        logger.error(f"Error exporting LCR sample columns: {e}")
+
+    try:
+        violations_df = load_table('violations_enforcement', data_dir,
+                                   record_key=NATURAL_KEYS['violations_enforcement'])
+        dataset = _table_columns(
+            violations_df,
+            days={'begin_day': 'NON_COMPL_PER_BEGIN_DATE', 'end_day': 'NON_COMPL_PER_END_DATE'},
+            measures={'viol_measure': 'VIOL_MEASURE'},
+            codes={'pwsid': 'PWSID', 'contaminant': 'CONTAMINANT_CODE', 'status': 'VIOLATION_STATUS'})
+        dataset['columns']['health_based'] = (violations_df['IS_HEALTH_BASED_IND'] == 'Y').to_numpy(dtype='u1')
+        datasets['violations'] = dataset
+    except Exception as e:
+        logger.error(f"Error exporting violation columns: {e}")
+
+    try:
+        events_df = load_table('events_milestones', data_dir)
+        datasets['events'] = _table_columns(
+            events_df,
+            days={'end_day': 'EVENT_END_DATE', 'actual_day': 'EVENT_ACTUAL_DATE'},
+            measures={},
+            codes={'pwsid': 'PWSID', 'milestone': 'EVENT_MILESTONE_CODE'})
+    except Exception as e:
+        logger.error(f"Error exporting event columns: {e}")
+
+    try:
+        visits_df = load_table('site_visits', data_dir)
+        datasets['site_visits'] = _table_columns(
+            visits_df,
+            days={'visit_day': 'VISIT_DATE'},
+            measures={},
+            codes={'pwsid': 'PWSID', 'reason': 'VISIT_REASON_CODE'})
+    except Exception as e:
+        logger.error(f"Error exporting site visit columns: {e}")
+
+    return datasets
+
+
+def dataset_artifacts(datasets: Dict[str, Dict[str, Any]]) -> Dict[str, bytes]:
+    """Encoded typed-array files keyed by artifact name, for artifacts.publish_artifacts"""
+    return {f"{name}.cols": encode_columns(name, dataset['columns'], dataset.get('dictionaries'), dataset.get('nulls'))
+            for name, dataset in datasets.items()}
+
+
+def export_datasets(output_dir: str, datasets: Dict[str, Dict[str, Any]], arrow: bool = True) -> List[str]:
+    """Write each dataset as <name>.cols (and <name>.arrow); returns the written paths"""
+    os.makedirs(output_dir, exist_ok=True)
+    if arrow and pa is None:
+        logger.info("pyarrow is not installed; writing typed-array exports only")
+    written = []
+    for name, dataset in datasets.items():
+        path = os.path.join(output_dir, f"{name}.cols")
+        size = write_columns(path, name, dataset['columns'], dataset.get('dictionaries'), dataset.get('nulls'))
+        written.append(path)
+        rows = len(next(iter(dataset['columns'].values()))) if dataset['columns'] else 0
+        logger.info(f"{name}: {rows} rows, {len(dataset['columns'])} columns -> {path} ({size:,} bytes)")
+        if arrow and pa is not None:
+            arrow_path = os.path.join(output_dir, f"{name}.arrow")
+            write_arrow(arrow_path, dataset['columns'], dataset.get('dictionaries', {}))
+            written.append(arrow_path)
+    return written
+
+
+def main():
+    """Export table columns from the SDWIS tables and the public system records"""
+    parser = argparse.ArgumentParser(description="Export table columns as typed arrays / Arrow IPC")
+    parser.add_argument('--data-dir', default="data")
+    parser.add_argument('--output-dir', default="columns")
+    parser.add_argument('--systems', help="water_systems_data.json to export per-system stats from")
+    parser.add_argument('--no-arrow', action='store_true', help="Skip Arrow IPC output even if pyarrow is installed")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    datasets = table_datasets(args.data_dir)
+    if args.systems:
+        with open(args.systems, encoding='utf-8') as f:
+            datasets['systems'] = system_columns(json.load(f))
+    export_datasets(args.output_dir, datasets, arrow=not args.no_arrow)
+
+
+if __name__ == "__main__":
+    main()
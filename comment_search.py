@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Inspection and Milestone Comment Search
+Inverted index over SDWA_SITE_VISITS.VISIT_COMMENTS and
+SDWA_EVENTS_MILESTONES.EVENT_COMMENTS_TEXT with tokenization, Porter
+stemming and BM25 ranking, so free-text questions ("chlorine residual low",
+"well cap cracked") no longer scan every record
+"""
+
+import argparse
+import json
+import logging
+import re
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from sdwis_tables import date_to_day, day_to_iso, load_table
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "comment_search_index.json"
+
+# BM25 term-frequency saturation and length normalization
+K1 = 1.2
+B = 0.75
+
+MISSING_DAY = -1
+
+STOPWORDS = frozenset(
+    'a an and are as at be been but by for from had has have in into is it its no not of on or per '
+    'that the their there these this to was were will with'.split())
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+_STEP2 = [('ational', 'ate'), ('tional', 'tion'), ('enci', 'ence'), ('anci', 'ance'), ('izer', 'ize'),
+          ('bli', 'ble'), ('alli', 'al'), ('entli', 'ent'), ('eli', 'e'), ('ousli', 'ous'),
+          ('ization', 'ize'), ('ation', 'ate'), ('ator', 'ate'), ('alism', 'al'), ('iveness', 'ive'),
+          ('fulness', 'ful'), ('ousness', 'ous'), ('aliti', 'al'), ('iviti', 'ive'), ('biliti', 'ble')]
+_STEP3 = [('icate', 'ic'), ('ative', ''), ('alize', 'al'), ('iciti', 'ic'), ('ical', 'ic'), ('ful', ''), ('ness', '')]
+_STEP4 = ['al', 'ance', 'ence', 'er', 'ic', 'able', 'ible', 'ant', 'ement', 'ment', 'ent', 'ion',
+          'ou', 'ism', 'ate', 'iti', 'ous', 'ive', 'ize']
+
+
+def _is_consonant(word: str, i: int) -> bool:
+    if word[i] in 'aeiou':
+        return False
+    if word[i] == 'y':
+        return i == 0 or not _is_consonant(word, i - 1)
+    return True
+
+
+def _measure(stem: str) -> int:
+    """Number of vowel-consonant sequences (Porter's m)"""
+    forms = ''.join('c' if _is_consonant(stem, i) else 'v' for i in range(len(stem)))
+    return forms.count('vc')
+
+
+def _has_vowel(stem: str) -> bool:
+    return any(not _is_consonant(stem, i) for i in range(len(stem)))
+
+
+def _ends_cvc(stem: str) -> bool:
+    n = len(stem)
+    return (n >= 3 and _is_consonant(stem, n - 3) and not _is_consonant(stem, n - 2)
+            and _is_consonant(stem, n - 1) and stem[-1] not in 'wxy')
+
+
+def _replace(word: str, rules, min_measure: int) -> str:
+    for suffix, replacement in rules:
+        if word.endswith(suffix):
+            stem = word[:-len(suffix)]
+            return stem + replacement if _measure(stem) > min_measure else word
+    return word
+
+
+@lru_cache(maxsize=65536)
+def stem(word: str) -> str:
+    """Porter stemmer: 'cracked', 'cracks' -> 'crack'; 'residuals' -> 'residu'"""
+    if len(word) <= 2 or not word.isalpha():
+        return word
+
+    # Step 1a: plurals
+    if word.endswith('sses') or word.endswith('ies'):
+        word = word[:-2]
+    elif word.endswith('s') and not word.endswith('ss'):
+        word = word[:-1]
+
+    # Step 1b: -ed and -ing
+    if word.endswith('eed'):
+        if _measure(word[:-3]) > 0:
+            word = word[:-1]
+    else:
+        for suffix in ('ed', 'ing'):
+            if word.endswith(suffix) and _has_vowel(word[:-len(suffix)]):
+                word = word[:-len(suffix)]
+                if word.endswith(('at', 'bl', 'iz')):
+                    word += 'e'
+                elif len(word) >= 2 and word[-1] == word[-2] and word[-1] not in 'lsz' and _is_consonant(word, len(word) - 1):
+                    word = word[:-1]
+                elif _measure(word) == 1 and _ends_cvc(word):
+                    word += 'e'
+                break
+
+    # Step 1c: terminal y
+    if word.endswith('y') and _has_vowel(word[:-1]):
+        word = word[:-1] + 'i'
+
+    # Steps 2 and 3: derivational suffixes
+    word = _replace(word, _STEP2, 0)
+    word = _replace(word, _STEP3, 0)
+
+    # Step 4: strip residual suffixes from long stems
+    for suffix in sorted(_STEP4, key=len, reverse=True):
+        if word.endswith(suffix):
+            stem_ = word[:-len(suffix)]
+            if _measure(stem_) > 1 and (suffix != 'ion' or stem_.endswith(('s', 't'))):
+                word = stem_
+            break
+
+    # Step 5: final e and double l
+    if word.endswith('e'):
+        stem_ = word[:-1]
+        if _measure(stem_) > 1 or (_measure(stem_) == 1 and not _ends_cvc(stem_)):
+            word = stem_
+    if word.endswith('ll') and _measure(word) > 1:
+        word = word[:-1]
+    return word
+
+
+def analyze(text: str) -> List[str]:
+    """Lowercase, tokenize, drop stopwords and stem"""
+    return [stem(token) for token in _TOKEN.findall(str(text or '').lower()) if token not in STOPWORDS]
+
+
+class CommentIndex:
+    """
+    Inverted index over comment documents. Postings are stored CSR-style:
+    the documents of term t are doc_ids[offsets[t]:offsets[t + 1]], with
+    matching term frequencies, so scoring a query term is one vectorized
+    BM25 update over its posting slice.
+    """
+
+    COLUMNS = ['source', 'pwsid', 'record_id', 'day', 'text']
+
+    def __init__(self, source, pwsid, record_id, day, text):
+        self.source = np.asarray(source, dtype=object)
+        self.pwsid = np.asarray(pwsid, dtype=object)
+        self.record_id = np.asarray(record_id, dtype=object)
+        self.day = np.asarray(day, dtype=np.int64)
+        self.text = np.asarray(text, dtype=object)
+
+        vocabulary: Dict[str, int] = {}
+        term_ids = []
+        doc_ids = []
+        lengths = np.zeros(len(self.text), dtype=np.int32)
+        for doc, comment in enumerate(self.text):
+            tokens = analyze(comment)
+            lengths[doc] = len(tokens)
+            term_ids.extend(vocabulary.setdefault(token, len(vocabulary)) for token in tokens)
+            doc_ids.extend([doc] * len(tokens))
+
+        # One (term, doc) pair per posting, sorted by term then doc
+        pairs = np.asarray(term_ids, dtype=np.int64) * max(len(self.text), 1) + np.asarray(doc_ids, dtype=np.int64)
+        pairs, frequencies = np.unique(pairs, return_counts=True)
+        terms = pairs // max(len(self.text), 1)
+
+        self.vocabulary = vocabulary
+        self.doc_ids = (pairs % max(len(self.text), 1)).astype(np.int32)
+        self.frequencies = frequencies.astype(np.int32)
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(terms, minlength=len(vocabulary)))])
+        self.lengths = lengths
+        average_length = float(lengths.mean()) if len(lengths) else 0.0
+        # Per-document BM25 length normalization; the corpus never changes after build
+        self._norm = K1 * (1 - B + B * lengths / max(average_length, 1e-9))
+
+    def __len__(self) -> int:
+        return len(self.text)
+
+    def postings(self, term: str):
+        """Documents containing a stemmed term, with their term frequencies"""
+        t = self.vocabulary.get(term)
+        if t is None:
+            return self.doc_ids[:0], self.frequencies[:0]
+        return self.doc_ids[self.offsets[t]:self.offsets[t + 1]], self.frequencies[self.offsets[t]:self.offsets[t + 1]]
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every document for the query"""
+        scores = np.zeros(len(self), dtype=np.float64)
+        for term in dict.fromkeys(analyze(query)):
+            docs, tf = self.postings(term)
+            if not len(docs):
+                continue
+            idf = np.log(1 + (len(self) - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += idf * tf * (K1 + 1) / (tf + self._norm[docs])
+        return scores
+
+    def search(self, query: str, k: int = 10, pwsid: Optional[str] = None,
+               source: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Top-k comments by BM25, optionally limited to one system or source"""
+        scores = self.scores(query)
+        if pwsid:
+            scores[self.pwsid != pwsid] = 0
+        if source:
+            scores[self.source != source] = 0
+        hits = np.flatnonzero(scores)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        hits = hits[np.lexsort((hits, -scores[hits]))]
+        return self.records(hits, scores)
+
+    def records(self, positions, scores: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """Materialize result positions as JSON-friendly rows"""
+        rows = []
+        for p in positions:
+            row = {
+                'source': self.source[p],
+                'pwsid': self.pwsid[p],
+                'record_id': self.record_id[p],
+                'date': day_to_iso(self.day[p]) if self.day[p] != MISSING_DAY else None,
+                'text': self.text[p]
+            }
+            if scores is not None:
+                row['score'] = round(float(scores[p]), 4)
+            rows.append(row)
+        return rows
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Columnar documents for the JSON artifact; postings are rebuilt on load"""
+        return {
+            'missing_day': MISSING_DAY,
+            'count': len(self),
+            'columns': {name: getattr(self, name).tolist() for name in self.COLUMNS}
+        }
+
+    @classmethod
+    def from_dict(cls, payload: Dict[str, Any]) -> 'CommentIndex':
+        columns = payload['columns']
+        return cls(*(columns[name] for name in cls.COLUMNS))
+
+    @classmethod
+    def load(cls, path: str = INDEX_FILE) -> 'CommentIndex':
+        with open(path, encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+    def save(self, path: str = INDEX_FILE):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, separators=(',', ':'))
+        logger.info(f"Comment index with {len(self)} comments, {len(self.vocabulary)} terms saved to {path}")
+
+
+def _comment_frame(df: pd.DataFrame, source: str, id_column: str, text_column: str, date_columns: List[str]) -> pd.DataFrame:
+    df = df[df[text_column].fillna('').str.strip() != '']
+    day = np.full(len(df), MISSING_DAY, dtype=np.int64)
+    # First available date wins, e.g. the milestone's actual date before its scheduled end
+    for column in reversed(date_columns):
+        parsed = date_to_day(df[column], MISSING_DAY)
+        day = np.where(parsed != MISSING_DAY, parsed, day)
+    return pd.DataFrame({
+        'source': source,
+        'pwsid': df['PWSID'].to_numpy(),
+        'record_id': df[id_column].fillna('').to_numpy(),
+        'day': day,
+        'text': df[text_column].str.strip().to_numpy()
+    })
+
+
+def build_comment_index(data_dir: str = "data") -> CommentIndex:
+    """Index site-visit and event/milestone comments"""
+    frames = []
+
+    try:
+        visits_df = load_table('site_visits', data_dir, usecols=['PWSID', 'VISIT_ID', 'VISIT_DATE', 'VISIT_COMMENTS'])
+        frames.append(_comment_frame(visits_df, 'site_visit', 'VISIT_ID', 'VISIT_COMMENTS', ['VISIT_DATE']))
+    except Exception as e:
+        logger.error(f"Error indexing site visit comments: {e}")
+
+    try:
+        events_df = load_table('events_milestones', data_dir, usecols=[
+            'PWSID', 'EVENT_SCHEDULE_ID', 'EVENT_ACTUAL_DATE', 'EVENT_END_DATE', 'EVENT_COMMENTS_TEXT'])
+        frames.append(_comment_frame(events_df, 'event', 'EVENT_SCHEDULE_ID', 'EVENT_COMMENTS_TEXT',
+                                     ['EVENT_ACTUAL_DATE', 'EVENT_END_DATE']))
+    except Exception as e:
+        logger.error(f"Error indexing event comments: {e}")
+
+    comments = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=CommentIndex.COLUMNS)
+    index = CommentIndex(*(comments[name].to_numpy() for name in CommentIndex.COLUMNS))
+    logger.info(f"Indexed {len(index)} comments")
+    return index
+
+
+def main():
+    """Build the comment index or search it"""
+    parser = argparse.ArgumentParser(description="Full-text search over site visit and event comments")
+    parser.add_argument('query', nargs='?', help="Words to search for")
+    parser.add_argument('-k', type=int, default=10, help="Number of results")
+    parser.add_argument('--pwsid', help="Only comments for this system")
+    parser.add_argument('--source', choices=['site_visit', 'event'])
+    parser.add_argument('--index', default=INDEX_FILE)
+    parser.add_argument('--build', action='store_true', help="Rebuild the index from the data directory first")
+    parser.add_argument('--data-dir', default="data")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.build:
+        index = build_comment_index(args.data_dir)
+        index.save(args.index)
+    else:
+        index = CommentIndex.load(args.index)
+
+    if args.query:
+        started = time.perf_counter()
+        results = index.search(args.query, args.k, pwsid=args.pwsid, source=args.source)
+        logger.info(f"{len(results)} results in {(time.perf_counter() - started) * 1000:.1f} ms")
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
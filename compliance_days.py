@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Days Out of Compliance
+Merges each system's violation and public-notification non-compliance periods
+into distinct days (overlapping violations count once, long ones weigh more than
+brief ones) and weights the health-based days by population served
+"""
+
+import argparse
+import json
+import logging
+from datetime import date
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from extraction_policy import load_policy
+from sdwis_tables import EPOCH, NATURAL_KEYS, date_to_day, load_table
+
+logger = logging.getLogger(__name__)
+
+MISSING_DAY = -1
+
+METRICS = ['days_out_of_compliance', 'health_based_days', 'population_days',
+           'recent_days_out_of_compliance', 'recent_health_based_days']
+
+
+def union_days(keys: np.ndarray, start: np.ndarray, end: np.ndarray) -> pd.Series:
+    """
+    Distinct days covered by the inclusive [start, end] intervals of each key,
+    in one sort and sweep: within a key, an interval opens a new run when it
+    starts after the furthest end seen so far (adjacent days merge), and each
+    run contributes its last day minus its first day plus one.
+    """
+    keep = (start != MISSING_DAY) & (end >= start)
+    codes, uniques = pd.factorize(np.asarray(keys, dtype=object)[keep])
+    start = np.asarray(start, dtype=np.int64)[keep]
+    end = np.asarray(end, dtype=np.int64)[keep]
+    if not len(codes):
+        return pd.Series(np.zeros(len(uniques), dtype=np.int64), index=uniques)
+
+    order = np.lexsort((start, codes))
+    codes, start, end = codes[order], start[order], end[order]
+    reach = pd.Series(end).groupby(codes).cummax().to_numpy()
+    first_of_key = np.r_[True, codes[1:] != codes[:-1]]
+    new_run = first_of_key | (start > np.r_[MISSING_DAY, reach[:-1]] + 1)
+
+    run_starts = np.flatnonzero(new_run)
+    run_days = np.maximum.reduceat(end, run_starts) - start[run_starts] + 1
+    days = np.bincount(codes[run_starts], weights=run_days, minlength=len(uniques))
+    return pd.Series(days.astype(np.int64), index=uniques)
+
+
+def _periods(df: pd.DataFrame, begin_column: str, end_column: str, as_of_day: int) -> pd.DataFrame:
+    """Non-compliance periods as day numbers; open periods run through as_of_day"""
+    begin = date_to_day(df[begin_column], MISSING_DAY)
+    end = date_to_day(df[end_column], MISSING_DAY)
+    end = np.minimum(np.where(end == MISSING_DAY, as_of_day, end), as_of_day)
+    return pd.DataFrame({'pwsid': df['PWSID'].to_numpy(), 'start': begin, 'end': end})
+
+
+def compliance_days(data_dir: str = "data", as_of: Optional[date] = None,
+                    policy: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+    """
+    Per-PWSID distinct days out of compliance (violations and PN associations),
+    days in health-based non-compliance, population x health-based days, and the
+    same day counts over the policy's recent window (trust_score.recent_days)
+    before as_of (default today)
+    """
+    policy = policy or load_policy(data_dir=data_dir)
+    recent_days = policy['trust_score']['recent_days']
+    begin_column, end_column = policy['violation_dates']['begin'], policy['violation_dates']['end']
+    as_of_day = int((np.datetime64(as_of or date.today(), 'D') - EPOCH).astype(np.int64))
+    frames = []
+
+    violations_df = None
+    try:
+        violations_df = load_table('violations_enforcement', data_dir, usecols=[
+            'PWSID', 'VIOLATION_ID', 'IS_HEALTH_BASED_IND', begin_column, end_column],
+            record_key=NATURAL_KEYS['violations_enforcement'])
+        periods = _periods(violations_df, begin_column, end_column, as_of_day)
+        periods['health_based'] = (violations_df['IS_HEALTH_BASED_IND'] == policy['health_based_indicator']).to_numpy()
+        frames.append(periods)
+    except Exception as e:
+        logger.error(f"Error loading violation non-compliance periods: {e}")
+
+    try:
+        pn_df = load_table('pn_violation_assoc', data_dir, usecols=[
+            'PWSID', 'PN_VIOLATION_ID', 'RELATED_VIOLATION_ID', 'NON_COMPL_PER_BEGIN_DATE', 'NON_COMPL_PER_END_DATE'])
+        periods = _periods(pn_df, 'NON_COMPL_PER_BEGIN_DATE', 'NON_COMPL_PER_END_DATE', as_of_day)
+        # A notice's period is health-based when the violation it covers is
+        if violations_df is not None:
+            health = violations_df.loc[violations_df['IS_HEALTH_BASED_IND'] == policy['health_based_indicator'],
+                                       ['PWSID', 'VIOLATION_ID']]
+            related = pd.MultiIndex.from_frame(pn_df[['PWSID', 'RELATED_VIOLATION_ID']])
+            periods['health_based'] = related.isin(pd.MultiIndex.from_frame(health))
+        else:
+            periods['health_based'] = False
+        frames.append(periods)
+    except Exception as e:
+        logger.error(f"Error loading PN non-compliance periods: {e}")
+
+    population = pd.Series(dtype=np.int64)
+    try:
+        pws_df = load_table('pub_water_systems', data_dir, usecols=['PWSID', 'POPULATION_SERVED_COUNT'])
+        population = pd.Series(
+            pd.to_numeric(pws_df['POPULATION_SERVED_COUNT'], errors='coerce').fillna(0).astype(np.int64).to_numpy(),
+            index=pws_df['PWSID'].to_numpy())
+    except Exception as e:
+        logger.error(f"Error loading populations served: {e}")
+
+    if not frames:
+        return pd.DataFrame(columns=METRICS, dtype=np.int64)
+    periods = pd.concat(frames, ignore_index=True)
+    health = periods[periods['health_based']]
+    recent_start = np.maximum(periods['start'].to_numpy(), as_of_day - recent_days)
+    recent_start = np.where(periods['start'].to_numpy() == MISSING_DAY, MISSING_DAY, recent_start)
+    recent = periods.assign(start=recent_start)
+    recent_health = recent[recent['health_based']]
+
+    metrics = pd.DataFrame({
+        'days_out_of_compliance': union_days(periods['pwsid'].to_numpy(), periods['start'].to_numpy(), periods['end'].to_numpy()),
+        'health_based_days': union_days(health['pwsid'].to_numpy(), health['start'].to_numpy(), health['end'].to_numpy()),
+        'recent_days_out_of_compliance': union_days(recent['pwsid'].to_numpy(), recent['start'].to_numpy(), recent['end'].to_numpy()),
+        'recent_health_based_days': union_days(recent_health['pwsid'].to_numpy(), recent_health['start'].to_numpy(),
+                                               recent_health['end'].to_numpy()),
+    }).fillna(0).astype(np.int64)
+    served = population[~population.index.duplicated()].reindex(metrics.index).fillna(0).astype(np.int64)
+    metrics['population_days'] = metrics['health_based_days'] * served
+    metrics = metrics[METRICS]
+    logger.info(f"Computed days out of compliance for {len(metrics)} systems")
+    return metrics
+
+
+def main():
+    """Print the systems with the most population-days of health-based non-compliance"""
+    parser = argparse.ArgumentParser(description="Distinct days out of compliance per water system")
+    parser.add_argument('--data-dir', default="data")
+    parser.add_argument('--as-of', type=date.fromisoformat, help="YYYY-MM-DD (default: today)")
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--pwsid', help="Only this system")
+    parser.add_argument('--policy', help="Extraction policy overrides (default: <data-dir>/extraction_policy.json, if present)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    metrics = compliance_days(args.data_dir, args.as_of, load_policy(args.policy, args.data_dir))
+    if args.pwsid:
+        metrics = metrics.loc[metrics.index == args.pwsid]
+    top = metrics.sort_values(['population_days', 'days_out_of_compliance'], ascending=False).head(args.top)
+    print(json.dumps({pwsid: {k: int(v) for k, v in row.items()} for pwsid, row in top.iterrows()}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
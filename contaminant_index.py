@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Contaminant to Water Systems Reverse Index
+Maps each CONTAMINANT_CODE to the systems that violated, sampled or issued
+public notice for it, with counts, latest violation date and population
+served, so "which systems have nitrate issues" is a dictionary lookup
+"""
+
+import argparse
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from sdwis_tables import date_to_day, day_to_iso, load_table
+
+logger = logging.getLogger(__name__)
+
+MISSING_DAY = -1
+
+# Order of the values stored per (contaminant, PWSID) entry
+SYSTEM_FIELDS = ['violations', 'lcr_samples', 'pn_notices', 'latest_violation', 'population']
+
+
+def _source_frame(df: pd.DataFrame, source: str, id_column: str, date_column: Optional[str]) -> pd.DataFrame:
+    """Normalize one source table to (code, pwsid, source, record_id, day) rows"""
+    df = df[df['CONTAMINANT_CODE'].notna() & df['PWSID'].notna()]
+    return pd.DataFrame({
+        'code': df['CONTAMINANT_CODE'].str.strip().to_numpy(),
+        'pwsid': df['PWSID'].to_numpy(),
+        'source': source,
+        'record_id': df[id_column].fillna('').to_numpy(),
+        'day': date_to_day(df[date_column], MISSING_DAY) if date_column else MISSING_DAY
+    })
+
+
+def build_contaminant_index(data_dir: str = "data") -> Dict[str, Any]:
+    """Aggregate violations, LCR samples and PN associations per contaminant and system"""
+    frames = []
+
+    try:
+        violations_df = load_table('violations_enforcement', data_dir, usecols=[
+            'PWSID', 'VIOLATION_ID', 'CONTAMINANT_CODE', 'NON_COMPL_PER_BEGIN_DATE'])
+        frames.append(_source_frame(violations_df, 'violations', 'VIOLATION_ID', 'NON_COMPL_PER_BEGIN_DATE'))
+    except Exception as e:
+        logger.error(f"Error indexing violations by contaminant: {e}")
+
+    try:
+        lcr_df = load_table('lcr_samples', data_dir, usecols=['PWSID', 'SAMPLE_ID', 'CONTAMINANT_CODE'])
+        frames.append(_source_frame(lcr_df, 'lcr_samples', 'SAMPLE_ID', None))
+    except Exception as e:
+        logger.error(f"Error indexing LCR samples by contaminant: {e}")
+
+    try:
+        pn_df = load_table('pn_violation_assoc', data_dir, usecols=[
+            'PWSID', 'PN_VIOLATION_ID', 'CONTAMINANT_CODE', 'NON_COMPL_PER_BEGIN_DATE'])
+        # The notice's non-compliance period dates the violation it covers, which keeps
+        # the latest violation date meaningful when the violations table is absent
+        frames.append(_source_frame(pn_df, 'pn_notices', 'PN_VIOLATION_ID', 'NON_COMPL_PER_BEGIN_DATE'))
+    except Exception as e:
+        logger.error(f"Error indexing PN associations by contaminant: {e}")
+
+    names = {}
+    population = {}
+    try:
+        ref_df = load_table('ref_code_values', data_dir)
+        contaminants = ref_df[ref_df['VALUE_TYPE'] == 'CONTAMINANT_CODE']
+        names = dict(zip(contaminants['VALUE_CODE'], contaminants['VALUE_DESCRIPTION']))
+        pws_df = load_table('pub_water_systems', data_dir, usecols=['PWSID', 'POPULATION_SERVED_COUNT'])
+        served = pd.to_numeric(pws_df['POPULATION_SERVED_COUNT'], errors='coerce').fillna(0).astype(np.int64)
+        population = dict(zip(pws_df['PWSID'], served.tolist()))
+    except Exception as e:
+        logger.error(f"Error loading contaminant names and populations: {e}")
+
+    if not frames:
+        return {'fields': SYSTEM_FIELDS, 'contaminants': {}, 'by_name': {}}
+    records = pd.concat(frames, ignore_index=True)
+
+    # Distinct records per (code, pwsid, source); enforcement and result rows repeat IDs
+    counts = (records.drop_duplicates(['code', 'pwsid', 'source', 'record_id'])
+              .groupby(['code', 'pwsid', 'source']).size()
+              .unstack('source', fill_value=0)
+              .reindex(columns=SYSTEM_FIELDS[:3], fill_value=0))
+    dated = records[(records['source'] != 'lcr_samples') & (records['day'] != MISSING_DAY)]
+    latest = dated.groupby(['code', 'pwsid'])['day'].max()
+    counts['latest_violation'] = latest.reindex(counts.index).fillna(MISSING_DAY).astype(np.int64)
+    counts['population'] = [population.get(pwsid, 0) for pwsid in counts.index.get_level_values('pwsid')]
+
+    index = {}
+    for code, group in counts.groupby(level='code', sort=True):
+        by_pwsid = {}
+        for (_, pwsid), row in zip(group.index, group.itertuples(index=False)):
+            violations, samples, notices, latest_day, served = row
+            by_pwsid[pwsid] = [int(violations), int(samples), int(notices),
+                               day_to_iso(latest_day) if latest_day != MISSING_DAY else None, int(served)]
+        violating = group[(group['violations'] > 0) | (group['pn_notices'] > 0)]
+        latest_day = int(group['latest_violation'].max())
+        index[code] = {
+            'name': names.get(code, code),
+            'systems': len(group),
+            'violating_systems': len(violating),
+            'population_affected': int(violating['population'].sum()),
+            'latest_violation': day_to_iso(latest_day) if latest_day != MISSING_DAY else None,
+            'by_pwsid': by_pwsid
+        }
+
+    logger.info(f"Indexed {len(index)} contaminants across {counts.index.get_level_values('pwsid').nunique()} systems")
+    return {
+        'fields': SYSTEM_FIELDS,
+        'contaminants': index,
+        'by_name': {entry['name']: code for code, entry in index.items()}
+    }
+
+
+class ContaminantIndex:
+    """Constant-time lookups over the contaminant reverse index artifact"""
+
+    def __init__(self, payload: Dict[str, Any]):
+        self.fields = payload['fields']
+        self.contaminants = payload['contaminants']
+        self.by_name = payload['by_name']
+
+    @classmethod
+    def load(cls, path: str = "contaminant_systems.json") -> 'ContaminantIndex':
+        return cls(load_contaminant_index(path))
+
+    def code_for(self, code_or_name: str) -> Optional[str]:
+        if code_or_name in self.contaminants:
+            return code_or_name
+        return self.by_name.get(code_or_name)
+
+    def summary(self, code_or_name: str) -> Optional[Dict[str, Any]]:
+        """Exposure summary for a contaminant, without the per-system table"""
+        code = self.code_for(code_or_name)
+        if code is None:
+            return None
+        entry = self.contaminants[code]
+        return {k: v for k, v in entry.items() if k != 'by_pwsid'}
+
+    def lookup(self, code_or_name: str, pwsid: str) -> Optional[Dict[str, Any]]:
+        """Counts for one contaminant at one system"""
+        code = self.code_for(code_or_name)
+        if code is None:
+            return None
+        values = self.contaminants[code]['by_pwsid'].get(pwsid)
+        return dict(zip(self.fields, values)) if values else None
+
+    def systems(self, code_or_name: str, pwsids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Systems linked to a contaminant, optionally restricted to a set of PWSIDs"""
+        code = self.code_for(code_or_name)
+        if code is None:
+            return []
+        by_pwsid = self.contaminants[code]['by_pwsid']
+        if pwsids is not None:
+            items = [(p, by_pwsid[p]) for p in pwsids if p in by_pwsid]
+        else:
+            items = by_pwsid.items()
+        return [{'pwsid': p, **dict(zip(self.fields, values))} for p, values in items]
+
+
+def load_contaminant_index(path: str = "contaminant_systems.json") -> Dict[str, Any]:
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_contaminant_index(index: Dict[str, Any], path: str = "contaminant_systems.json"):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, separators=(',', ':'))
+    logger.info(f"Contaminant index saved to {path}")
+
+
+def main():
+    """Build or query the contaminant reverse index"""
+    parser = argparse.ArgumentParser(description="Contaminant to water systems reverse index")
+    parser.add_argument('contaminant', nargs='?', help="Contaminant code or name to look up")
+    parser.add_argument('--pwsid', action='append', dest='pwsids', help="Restrict to these systems")
+    parser.add_argument('--index', default="contaminant_systems.json")
+    parser.add_argument('--build', action='store_true', help="Rebuild the index from the data directory first")
+    parser.add_argument('--data-dir', default="data")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.build:
+        save_contaminant_index(build_contaminant_index(args.data_dir), args.index)
+    if not args.contaminant:
+        return
+
+    index = ContaminantIndex.load(args.index)
+    print(json.dumps({
+        'summary': index.summary(args.contaminant),
+        'systems': index.systems(args.contaminant, args.pwsids)
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+// Data artifacts are published under content-hashed names (see artifacts.py).
+// The manifest is small and always revalidated; the hashed files it points to
+// never change, so the browser can serve them from cache until the data does.
+
+interface ArtifactManifest {
+  artifacts: Record<string, { file: string; bytes: number }>;
+}
+
+let manifestPromise: Promise<ArtifactManifest | null> | null = null;
+
+function loadManifest(): Promise<ArtifactManifest | null> {
+  if (!manifestPromise) {
+    manifestPromise = fetch('/artifact-manifest.json', { cache: 'no-cache' })
+      .then(res => (res.ok ? res.json() : null))
+      .catch(() => null);
+  }
+  return manifestPromise;
+}
+
+// Resolve a logical artifact name (e.g. "dashboard_data.json") to its current
+// hashed URL, falling back to the fixed name when no manifest is published
+export async function artifactUrl(name: string): Promise<string> {
+  const manifest = await loadManifest();
+  const entry = manifest?.artifacts?.[name];
+  return entry ? `/${entry.file}` : `/${name}`;
+}
+
+export async function fetchArtifact(name: string): Promise<Response> {
+  return fetch(await artifactUrl(name));
+}
@@ -0,0 +1,14 @@
+// Copies the modules shared by both dashboards into the calling app's
+// src/shared/ (git-ignored). Create React App only compiles files under src/,
+// so the apps run this before start, build and test instead of importing
+// from outside their own tree.
+const fs = require('fs');
+const path = require('path');
+
+const target = path.join(process.cwd(), 'src', 'shared');
+fs.mkdirSync(target, { recursive: true });
+for (const file of fs.readdirSync(__dirname)) {
+  if (file.endsWith('.ts')) {
+    fs.copyFileSync(path.join(__dirname, file), path.join(target, file));
+  }
+}
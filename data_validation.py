@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+SDWIS Data Validation Stage
+Checks every table in one vectorized pass before extraction and writes
+rejected or corrected values to a quarantine file with reason codes. Stages
+that load through validated_tables() leave the rejected rows and nulled
+values out, so the extraction loops can trust the values they receive
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+import pandas as pd
+
+from sdwis_tables import TABLE_FILES, SDWIS_DATE_FORMAT, active_quarantine, load_table, quarantined_tables, table_path
+
+logger = logging.getLogger(__name__)
+
+QUARANTINE_FILE = "validation_quarantine.csv"
+# Quarantine files already reported missing, so nested and repeated loads warn once
+_reported_missing = set()
+
+PWSID_PATTERN = r'^[A-Z0-9]{2}\d{7}$'
+
+# Declarative rule set: (reason code, check, table or '*', column or regex, action)
+#   reject - drop the row from the validated table
+#   null   - keep the row, blank the bad value
+#   flag   - keep the row and value, record it for review
+RULES = [
+    ('BAD_PWSID', 'pwsid_format', '*', 'PWSID', 'reject'),
+    ('UNKNOWN_PWSID', 'known_pwsid', '*', 'PWSID', 'reject'),
+    ('BAD_ZIP', 'zip5', 'pub_water_systems', 'ZIP_CODE', 'null'),
+    ('BAD_ZIP', 'zip5', 'geographic_areas', 'ZIP_CODE_SERVED', 'null'),
+    ('BAD_DATE', 'date', '*', r'^(?!SEASON_).*_DATE$', 'null'),
+    ('BAD_DATE', 'season_day', '*', r'^SEASON_.*_DATE$', 'null'),
+    ('UNKNOWN_CODE', 'ref_code', '*', None, 'flag'),
+]
+
+# Codes in the data that do not have their own VALUE_TYPE in the reference table
+CODE_COLUMNS_EXCLUDED = {'TRIBAL_CODE'}
+
+
+def normalize_zip(series: pd.Series) -> pd.Series:
+    """ZIP, ZIP+4 ('31324-1085') or 9-digit ZIP -> 5-digit string; anything else -> NaN"""
+    digits = series.astype('string').str.strip().str.replace('-', '', regex=False)
+    valid = digits.str.fullmatch(r'\d{5}(\d{4})?').fillna(False).astype(bool)
+    return digits.str[:5].where(valid)
+
+
+def _matching_columns(df: pd.DataFrame, column: Optional[str]) -> List[str]:
+    if column is None:
+        return []
+    if column in df.columns:
+        return [column]
+    if any(ch in column for ch in '.*$^('):
+        return [c for c in df.columns if re.match(column, c)]
+    return []
+
+
+class DataValidator:
+    """Applies RULES to each table and collects the quarantine records"""
+
+    def __init__(self, tables: Dict[str, pd.DataFrame]):
+        self.tables = tables
+        self.quarantine: List[pd.DataFrame] = []
+        self.known_pwsids = None
+        self.ref_codes: Dict[str, set] = {}
+
+        if 'pub_water_systems' in tables:
+            self.known_pwsids = set(tables['pub_water_systems']['PWSID'].dropna())
+        if 'ref_code_values' in tables:
+            ref = tables['ref_code_values']
+            self.ref_codes = {value_type: set(codes) for value_type, codes in ref.groupby('VALUE_TYPE')['VALUE_CODE']}
+
+    def _record(self, name: str, df: pd.DataFrame, mask: pd.Series, reason: str, column: str, action: str):
+        if not mask.any():
+            return
+        hits = df[mask]
+        entry = pd.DataFrame({
+            'table': name,
+            'row': hits.index.to_numpy() + 2,  # CSV line number, counting the header
+            'reason': reason,
+            'column': column,
+            'value': hits[column].to_numpy(),
+            'action': action
+        })
+        if action == 'reject':
+            entry['record'] = [json.dumps({k: v for k, v in row.items() if pd.notna(v)})
+                               for row in hits.to_dict('records')]
+        self.quarantine.append(entry)
+
+    def _check(self, name: str, df: pd.DataFrame, check: str, column: str) -> Optional[pd.Series]:
+        """Boolean mask of failing rows for one rule/column, or None to skip"""
+        values = df[column]
+        present = values.notna()
+        if check == 'pwsid_format':
+            return ~values.fillna('').str.fullmatch(PWSID_PATTERN).astype(bool)
+        if check == 'known_pwsid':
+            if name == 'pub_water_systems' or self.known_pwsids is None:
+                return None
+            return present & ~values.isin(self.known_pwsids)
+        if check == 'zip5':
+            return present & normalize_zip(values).isna()
+        if check == 'date':
+            return present & pd.to_datetime(values, format=SDWIS_DATE_FORMAT, errors='coerce').isna()
+        if check == 'season_day':
+            # Seasonal operation dates carry month and day only, e.g. '04-01'
+            return present & pd.to_datetime('2000-' + values, format='%Y-%m-%d', errors='coerce').isna()
+        raise ValueError(f"Unknown check {check}")
+
+    def _code_columns(self, df: pd.DataFrame) -> List[str]:
+        return [c for c in df.columns if c in self.ref_codes and c not in CODE_COLUMNS_EXCLUDED]
+
+    def validate_table(self, name: str) -> pd.DataFrame:
+        df = self.tables[name]
+        reject = pd.Series(False, index=df.index)
+
+        for reason, check, table, column, action in RULES:
+            if table not in ('*', name):
+                continue
+            if check == 'ref_code':
+                if name == 'ref_code_values':
+                    continue
+                for code_column in self._code_columns(df):
+                    mask = df[code_column].notna() & ~df[code_column].isin(self.ref_codes[code_column])
+                    self._record(name, df, mask, reason, code_column, action)
+                continue
+
+            for target in _matching_columns(df, column):
+                mask = self._check(name, df, check, target)
+                if mask is None:
+                    continue
+                self._record(name, df, mask, reason, target, action)
+                if action == 'reject':
+                    reject |= mask
+                elif action == 'null':
+                    df.loc[mask, target] = pd.NA
+
+        # Normalized values replace the raw ones once the bad ones are quarantined
+        for reason, check, table, column, action in RULES:
+            if check == 'zip5' and table == name and column in df.columns:
+                df[column] = normalize_zip(df[column])
+
+        if reject.any():
+            logger.info(f"{name}: rejected {int(reject.sum())} of {len(df)} rows")
+        return df[~reject]
+
+    def run(self) -> Dict[str, pd.DataFrame]:
+        validated = {name: self.validate_table(name) for name in self.tables}
+        return validated
+
+    def quarantine_frame(self) -> pd.DataFrame:
+        if not self.quarantine:
+            return pd.DataFrame(columns=['table', 'row', 'reason', 'column', 'value', 'action', 'record'])
+        return pd.concat(self.quarantine, ignore_index=True)
+
+
+def validate_tables(data_dir: str = "data", tables: Optional[List[str]] = None,
+                    quarantine_file: Optional[str] = QUARANTINE_FILE) -> Dict[str, pd.DataFrame]:
+    """
+    Load and validate the requested tables (all by default). The PWSID and
+    reference-code tables are always loaded so cross-table checks can run.
+    """
+    wanted = list(tables or TABLE_FILES)
+    loaded = {}
+    for name in dict.fromkeys(wanted + ['pub_water_systems', 'ref_code_values']):
+        if os.path.exists(table_path(name, data_dir)):
+            loaded[name] = load_table(name, data_dir)
+        else:
+            logger.warning(f"Skipping validation of {name}: {TABLE_FILES[name]} not found")
+
+    validator = DataValidator(loaded)
+    validated = validator.run()
+    quarantine = validator.quarantine_frame()
+    if quarantine_file:
+        quarantine.to_csv(quarantine_file, index=False)
+        logger.info(f"Quarantined {len(quarantine)} values to {quarantine_file}")
+    if len(quarantine):
+        summary = quarantine.groupby(['table', 'reason', 'action']).size()
+        for (table, reason, action), count in summary.items():
+            logger.info(f"  {table}: {reason} ({action}) x{count}")
+
+    return {name: df for name, df in validated.items() if name in wanted}
+
+
+def load_quarantine(quarantine_file: str = QUARANTINE_FILE) -> Optional[pd.DataFrame]:
+    """The quarantine entries written by validate_tables, or None if validation has not run"""
+    if not os.path.exists(quarantine_file):
+        return None
+    quarantine = pd.read_csv(quarantine_file, dtype=str, keep_default_na=False, na_values=[''])
+    quarantine['row'] = pd.to_numeric(quarantine['row'])
+    return quarantine
+
+
+@contextmanager
+def validated_tables(quarantine_file: Optional[str] = QUARANTINE_FILE) -> Iterator[Optional[pd.DataFrame]]:
+    """
+    Within this block load_table leaves out what the validation stage rejected
+    or nulled. Without a quarantine file the tables load as they are; a block
+    nested in another keeps the outer block's quarantine.
+    """
+    if active_quarantine() is not None:
+        yield active_quarantine()
+        return
+    quarantine = load_quarantine(quarantine_file) if quarantine_file else None
+    if quarantine is None:
+        if quarantine_file and quarantine_file not in _reported_missing:
+            logger.warning(f"{quarantine_file} not found; loading unvalidated tables (run data_validation.py first)")
+            _reported_missing.add(quarantine_file)
+        yield None
+        return
+    _reported_missing.discard(quarantine_file)
+    with quarantined_tables(quarantine):
+        yield quarantine
+
+
+def main():
+    """Validate the SDWIS tables and write the quarantine file"""
+    parser = argparse.ArgumentParser(description="Validate SDWIS tables before extraction")
+    parser.add_argument('--data-dir', default="data")
+    parser.add_argument('--table', action='append', choices=sorted(TABLE_FILES), dest='tables')
+    parser.add_argument('--quarantine', default="validation_quarantine.csv")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    validate_tables(args.data_dir, args.tables, args.quarantine)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,634 @@
+#!/usr/bin/env python3
+"""
+Extraction Engine
+One pass over the SDWIS tables for every dashboard output. Each table is read
+once into a shared intermediate (per-system row slices plus a vectorized
+metrics frame) and the public, comprehensive and operator records are views
+over it, scored and classified by the one extraction policy
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+from datetime import date
+from typing import Any, Callable, Dict, List, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+from artifacts import publish_artifacts
+from columnar_export import dataset_artifacts, system_columns
+from comment_search import build_comment_index
+from compliance_days import compliance_days
+from contaminant_index import ContaminantIndex, build_contaminant_index, load_contaminant_index
+from data_validation import QUARANTINE_FILE, normalize_zip, validated_tables
+from extraction_policy import active_mask, is_active, load_policy
+from interval_index import build_interval_index
+from name_search import NameIndex
+from sdwis_tables import EPOCH, NATURAL_KEYS, date_to_day, day_to_iso, load_table, shared_tables
+from system_repository import SECTION_TABLES, OffsetIndex, system_detail, with_sections
+from task_calendar import TaskCalendarBuilder, save_due_index
+from zip_locator import COUNTY_CENTROIDS, PLACE_CENTROIDS, ZIP_CENTROIDS, ZipLocator
+
+logger = logging.getLogger(__name__)
+
+PUBLIC_DIR = 'water-safety-dashboard/public'
+OPERATOR_PUBLIC = 'operator-dashboard/public'
+OUTPUTS = ['public', 'operator']
+
+MISSING_DAY = -1
+
+# Plain-language guide for the contaminants residents ask about most; every
+# other contaminant code gets a generic entry
+CONTAMINANT_GUIDE = {
+    '1040': {  # Nitrate
+        'code': '1040',
+        'name': 'Nitrate',
+        'description': 'Chemical that can come from fertilizer runoff, septic systems, or natural deposits',
+        'healthEffects': 'Especially dangerous for infants under 6 months - can cause "blue baby syndrome" (methemoglobinemia)',
+        'whatToDo': 'DO NOT BOIL - boiling increases nitrate concentration. Use bottled water for infant formula and drinking.',
+        'sources': ['Agricultural runoff', 'Septic systems', 'Natural deposits'],
+        'mcl': '10 mg/L',
+        'category': 'Inorganic Chemicals'
+    },
+    '1030': {  # Lead
+        'code': '1030',
+        'name': 'Lead',
+        'description': 'Toxic metal that can leach from plumbing materials',
+        'healthEffects': 'Can cause developmental delays in children and health problems in adults',
+        'whatToDo': 'Run cold water for 30 seconds before use. Consider water testing and filters certified for lead removal.',
+        'sources': ['Corrosion of household plumbing', 'Lead service lines', 'Erosion of natural deposits'],
+        'mcl': '0.015 mg/L',
+        'category': 'Inorganic Chemicals'
+    },
+    '1035': {  # Copper
+        'code': '1035',
+        'name': 'Copper',
+        'description': 'Metal that can leach from plumbing materials',
+        'healthEffects': 'Can cause gastrointestinal distress and liver or kidney damage',
+        'whatToDo': 'Run cold water before use. Test your water if you notice blue-green staining.',
+        'sources': ['Corrosion of household plumbing', 'Erosion of natural deposits'],
+        'mcl': '1.3 mg/L',
+        'category': 'Inorganic Chemicals'
+    },
+    '5000': {  # Lead and Copper Rule
+        'code': '5000',
+        'name': 'Lead and Copper Rule',
+        'description': 'Regulatory framework for monitoring lead and copper in drinking water',
+        'healthEffects': 'Lead can cause developmental delays in children and health problems in adults',
+        'whatToDo': 'Run cold water for 30 seconds before use. Consider water testing and filters certified for lead removal.',
+        'sources': ['Corrosion of household plumbing', 'Lead service lines'],
+        'mcl': 'Action Level: 0.015 mg/L Lead, 1.3 mg/L Copper',
+        'category': 'Regulatory'
+    },
+    '1925': {  # pH
+        'code': '1925',
+        'name': 'pH',
+        'description': 'Measure of water acidity or alkalinity',
+        'healthEffects': 'Not directly harmful but can affect water taste and corrosion of pipes',
+        'whatToDo': 'Usually not a concern for drinking. Contact your water system if pH is consistently outside normal range.',
+        'sources': ['Natural water chemistry', 'Treatment processes'],
+        'mcl': '6.5-8.5 (secondary standard)',
+        'category': 'Physical Parameters'
+    },
+    '1930': {  # TDS
+        'code': '1930',
+        'name': 'Total Dissolved Solids (TDS)',
+        'description': 'Total amount of dissolved minerals and salts in water',
+        'healthEffects': 'Not directly harmful but can affect taste and indicate other problems',
+        'whatToDo': 'Usually not a concern. High TDS may indicate need for water softening.',
+        'sources': ['Natural minerals', 'Treatment chemicals', 'Industrial discharges'],
+        'mcl': '500 mg/L (secondary standard)',
+        'category': 'Physical Parameters'
+    },
+    '2050': {  # Atrazine
+        'code': '2050',
+        'name': 'Atrazine',
+        'description': 'Herbicide commonly used in agriculture',
+        'healthEffects': 'May cause cardiovascular and reproductive problems',
+        'whatToDo': 'Use activated carbon filters. Consider bottled water if levels are high.',
+        'sources': ['Agricultural runoff', 'Lawn care products'],
+        'mcl': '0.003 mg/L',
+        'category': 'Pesticides'
+    },
+    '2047': {  # Aldicarb
+        'code': '2047',
+        'name': 'Aldicarb',
+        'description': 'Insecticide used on crops',
+        'healthEffects': 'Can affect nervous system and cause nausea, dizziness',
+        'whatToDo': 'Use activated carbon filters. Avoid drinking if levels are high.',
+        'sources': ['Agricultural applications', 'Pesticide runoff'],
+        'mcl': '0.003 mg/L',
+        'category': 'Pesticides'
+    },
+    '1095': {  # Zinc
+        'code': '1095',
+        'name': 'Zinc',
+        'description': 'Metal that can leach from plumbing or occur naturally',
+        'healthEffects': 'Essential nutrient but high levels can cause nausea and stomach cramps',
+        'whatToDo': 'Usually not a concern. High levels may indicate plumbing corrosion.',
+        'sources': ['Corrosion of galvanized pipes', 'Natural deposits'],
+        'mcl': '5 mg/L (secondary standard)',
+        'category': 'Inorganic Chemicals'
+    },
+    '1074': {  # Antimony
+        'code': '1074',
+        'name': 'Antimony',
+        'description': 'Metalloid element that can occur naturally or from industrial sources',
+        'healthEffects': 'Can cause nausea, vomiting, and diarrhea',
+        'whatToDo': 'Contact your water system if levels are high.',
+        'sources': ['Natural deposits', 'Industrial discharges'],
+        'mcl': '0.006 mg/L',
+        'category': 'Inorganic Chemicals'
+    },
+    '1038': {  # Nitrate-Nitrite
+        'code': '1038',
+        'name': 'Nitrate-Nitrite',
+        'description': 'Combined measurement of nitrate and nitrite compounds',
+        'healthEffects': 'Especially dangerous for infants under 6 months - can cause "blue baby syndrome"',
+        'whatToDo': 'DO NOT BOIL - boiling increases nitrate concentration. Use bottled water for infant formula.',
+        'sources': ['Agricultural runoff', 'Septic systems', 'Natural deposits'],
+        'mcl': '10 mg/L',
+        'category': 'Inorganic Chemicals'
+    },
+    '1094': {  # Asbestos
+        'code': '1094',
+        'name': 'Asbestos',
+        'description': 'Fibrous mineral that can occur naturally in water',
+        'healthEffects': 'Can cause lung disease and cancer when inhaled',
+        'whatToDo': 'Contact your water system if asbestos is detected.',
+        'sources': ['Natural deposits', 'Asbestos cement pipes'],
+        'mcl': '7 million fibers per liter',
+        'category': 'Inorganic Chemicals'
+    },
+    '1080': {  # Hexavalent Chromium
+        'code': '1080',
+        'name': 'Chromium, Hexavalent',
+        'description': 'Toxic form of chromium that can occur naturally or from industrial sources',
+        'healthEffects': 'Can cause cancer and other health problems',
+        'whatToDo': 'Use reverse osmosis or ion exchange filters if levels are high.',
+        'sources': ['Natural deposits', 'Industrial discharges', 'Chrome plating'],
+        'mcl': '0.1 mg/L',
+        'category': 'Inorganic Chemicals'
+    }
+}
+
+# Display names that read better than the reference table's
+CONTAMINANT_NAMES = {
+    **{code: info['name'] for code, info in CONTAMINANT_GUIDE.items()},
+    '3100': 'Total Coliform',
+    '5200': 'Radionuclides',
+    '7000': 'Disinfection Byproducts',
+}
+
+
+def water_source(code: Optional[str], describe: Callable[[str, str], str]) -> str:
+    if not code:
+        return 'Unknown'
+    if code.startswith('GW'):
+        return 'Groundwater'
+    if code.startswith('SW'):
+        return 'Surface Water'
+    if code == 'GU':
+        return 'Groundwater Under Influence'
+    description = describe('PRIMARY_SOURCE_CODE', code)
+    return description if description != code else 'Unknown'
+
+
+def clean_record(value: Any) -> Any:
+    """JSON-safe copy: NaN, infinities and blank strings become None, numpy scalars plain Python"""
+    if isinstance(value, dict):
+        return {k: clean_record(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [clean_record(v) for v in value]
+    if isinstance(value, (np.integer, np.floating)):
+        value = value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    if isinstance(value, str) and not value.strip():
+        return None
+    return value
+
+
+class ExtractionEngine:
+    """
+    Loads every SDWIS table once (within shared_tables, so the index builders
+    reuse the same frames) without the rows and values the validation stage
+    quarantined, then builds each system's detail record once and derives
+    every output's record from it
+    """
+
+    def __init__(self, data_dir: str = "data", policy: Optional[Dict[str, Any]] = None, as_of: Optional[date] = None,
+                 quarantine_file: Optional[str] = QUARANTINE_FILE):
+        self.data_dir = data_dir
+        # None loads the tables as they are
+        self.quarantine_file = quarantine_file
+        self.policy = policy or load_policy(data_dir=data_dir)
+        self.as_of = as_of or date.today()
+        self.as_of_day = int((np.datetime64(self.as_of, 'D') - EPOCH).astype(np.int64))
+        self.codes: Dict[str, Dict[str, str]] = {}
+        self.systems = pd.DataFrame(columns=['PWSID'])
+        self.system_rows = OffsetIndex(self.systems)
+        self.indexes: Dict[str, OffsetIndex] = {}
+        self.metrics: Dict[str, Dict[str, int]] = {}
+        self.geography: Dict[str, Dict[str, List[str]]] = {}
+        # Systems whose zip_codes is their mailing-address ZIP rather than ZIPs served
+        self.mailing_zip_systems: Set[str] = set()
+
+    def _table(self, name: str, record_key: Optional[List[str]] = None) -> pd.DataFrame:
+        try:
+            return load_table(name, self.data_dir, record_key=record_key)
+        except Exception as e:
+            logger.error(f"Error loading {name}: {e}")
+            return pd.DataFrame(columns=['PWSID'])
+
+    def describe(self, value_type: str, code: str) -> str:
+        return self.codes.get(value_type, {}).get(code, code)
+
+    def load(self, sections: Optional[List[str]] = None):
+        """
+        Read the tables and build the shared intermediate. sections limits the
+        detail sections loaded (the metrics need violations_enforcement and
+        site_visits, the geography geographic_areas); all by default.
+        """
+        started = time.time()
+        with validated_tables(self.quarantine_file):
+            self._load(sections)
+        logger.info(f"Loaded {len(self.systems)} systems in {time.time() - started:.1f}s: "
+                    + ', '.join(f"{section} {len(index)}" for section, index in self.indexes.items()))
+
+    def _load(self, sections: Optional[List[str]]):
+        refs = self._table('ref_code_values')
+        if 'VALUE_TYPE' in refs:
+            self.codes = {value_type: dict(zip(group['VALUE_CODE'], group['VALUE_DESCRIPTION']))
+                          for value_type, group in refs.groupby('VALUE_TYPE')}
+        self.systems = self._table('pub_water_systems')
+        self.systems = self.systems[~self.systems['PWSID'].duplicated()].reset_index(drop=True)
+        self.system_rows = OffsetIndex(self.systems)
+        for section, table in SECTION_TABLES.items():
+            if sections is not None and section not in sections:
+                continue
+            # One row per violation, carrying its latest enforcement action
+            record_key = NATURAL_KEYS[table] if table == 'violations_enforcement' else None
+            self.indexes[section] = OffsetIndex(self._table(table, record_key))
+        self.metrics = self._system_metrics().to_dict('index')
+        self.geography = self._geography()
+
+    def _column(self, df: pd.DataFrame, column: str) -> pd.Series:
+        return df[column] if column in df else pd.Series(None, index=df.index, dtype=object)
+
+    def _frame(self, section: str) -> pd.DataFrame:
+        index = self.indexes.get(section)
+        if index is None:
+            return pd.DataFrame(columns=['PWSID'])
+        return pd.DataFrame(dict(zip(index.columns, index.arrays)), columns=index.columns)
+
+    def _system_metrics(self) -> pd.DataFrame:
+        """Violation counts, recent history, compliance days and the trust score per PWSID, vectorized"""
+        policy, weights = self.policy, self.policy['trust_score']
+        pwsids = self.systems['PWSID'].to_numpy()
+        metrics = pd.DataFrame(index=pd.Index(pwsids, name='PWSID'))
+
+        violations = self._frame('violations_enforcement')
+        if len(violations):
+            health = (self._column(violations, 'IS_HEALTH_BASED_IND') == policy['health_based_indicator']).to_numpy()
+            active = active_mask(self._column(violations, 'VIOLATION_STATUS'), policy).to_numpy()
+            begin = date_to_day(self._column(violations, policy['violation_dates']['begin']), MISSING_DAY)
+            flags = pd.DataFrame({
+                'total_violations': 1,
+                'active_violations': active,
+                'health_based_violations': health,
+                'active_health_based': active & health,
+                'recent_violations': (begin != MISSING_DAY) & (begin > self.as_of_day - weights['recent_days']),
+                'last_violation_day': begin,
+            }, index=violations['PWSID'].to_numpy())
+            grouped = flags.groupby(level=0)
+            counts = grouped[['total_violations', 'active_violations', 'health_based_violations',
+                              'active_health_based', 'recent_violations']].sum()
+            counts['last_violation_day'] = grouped['last_violation_day'].max()
+            metrics = metrics.join(counts)
+
+        visits = self._frame('site_visits')
+        if len(visits):
+            visit_day = date_to_day(self._column(visits, policy['visit_date']), MISSING_DAY)
+            recent = (visit_day != MISSING_DAY) & (visit_day > self.as_of_day - weights['visit_days'])
+            metrics = metrics.join(pd.Series(recent, index=visits['PWSID'].to_numpy())
+                                   .groupby(level=0).sum().rename('recent_visits'))
+
+        try:
+            days = compliance_days(self.data_dir, self.as_of, policy)
+            metrics = metrics.join(days)
+        except Exception as e:
+            logger.error(f"Error computing days out of compliance: {e}")
+
+        columns = ['total_violations', 'active_violations', 'health_based_violations', 'active_health_based',
+                   'recent_violations', 'recent_visits', 'days_out_of_compliance', 'health_based_days',
+                   'population_days', 'recent_health_based_days']
+        metrics = metrics.reindex(columns=columns + ['last_violation_day'])
+        metrics[columns] = metrics[columns].fillna(0).astype(np.int64)
+        metrics['last_violation_day'] = metrics['last_violation_day'].fillna(MISSING_DAY).astype(np.int64)
+
+        outstanding = (self._column(self.systems, 'OUTSTANDING_PERFORMER') == 'Y').to_numpy()
+        inactive = (self.systems['PWS_ACTIVITY_CODE'] != 'A').to_numpy(dtype=bool)
+        other_active = (metrics['active_violations'] - metrics['active_health_based']).clip(lower=0)
+        score = (weights['base']
+                 - metrics['active_health_based'] * weights['active_health_based']
+                 - other_active * weights['active_other']
+                 - np.minimum(metrics['recent_violations'] * weights['recent_violation'], weights['recent_violation_cap'])
+                 - np.minimum(metrics['recent_health_based_days'] // weights['health_days_per_point'],
+                              weights['health_days_cap'])
+                 + outstanding * weights['outstanding_performer']
+                 + np.minimum(metrics['recent_visits'] * weights['recent_visit'], weights['recent_visit_cap'])
+                 - inactive * weights['inactive'])
+        metrics['trust_score'] = score.clip(0, 100).astype(np.int64)
+        return metrics
+
+    def _geography(self) -> Dict[str, Dict[str, List[str]]]:
+        """ZIPs, counties and cities served per PWSID; a system with no ZIP served is listed under its own ZIP"""
+        geo = self._frame('geographic_areas')
+        values = {}
+        for key, column in (('zip_codes', 'ZIP_CODE_SERVED'), ('counties', 'COUNTY_SERVED'), ('cities', 'CITY_SERVED')):
+            if column not in geo or not len(geo):
+                values[key] = pd.Series(dtype=object)
+                continue
+            served = normalize_zip(geo[column]) if key == 'zip_codes' else geo[column].astype('string').str.strip()
+            frame = pd.DataFrame({'pwsid': geo['PWSID'], 'value': served}).dropna()
+            frame = frame[frame['value'] != ''].drop_duplicates()
+            values[key] = frame.sort_values('value', kind='stable').groupby('pwsid', sort=False)['value'].agg(list)
+
+        own_zip = normalize_zip(self.systems['ZIP_CODE']) if 'ZIP_CODE' in self.systems else \
+            pd.Series(pd.NA, index=self.systems.index)
+        geography = {}
+        self.mailing_zip_systems = set()
+        for pwsid, zip_code in zip(self.systems['PWSID'], own_zip):
+            zips = values['zip_codes'].get(pwsid)
+            if not zips and pd.notna(zip_code):
+                self.mailing_zip_systems.add(pwsid)
+            geography[pwsid] = {
+                'zip_codes': zips or ([zip_code] if pd.notna(zip_code) else []),
+                'counties': values['counties'].get(pwsid) or [],
+                'cities': values['cities'].get(pwsid) or [],
+            }
+        return geography
+
+    def detail(self, pwsid: str) -> Dict[str, Any]:
+        """The shared per-system record every view is cut from"""
+        record, sections = system_detail(self.system_rows.rows(pwsid)[0],
+                                         {section: index.rows(pwsid) for section, index in self.indexes.items()},
+                                         self.codes, self.policy)
+        return {'record': record, 'sections': sections,
+                'metrics': self.metrics[pwsid], 'geography': self.geography[pwsid]}
+
+    def operator_view(self, detail: Dict[str, Any]) -> Dict[str, Any]:
+        """dashboard_data.json: every system, with the sections it has rows in"""
+        record = with_sections(detail['record'], detail['sections'])
+        metrics, geography = detail['metrics'], detail['geography']
+        violations = detail['sections']['violations_enforcement']
+        record['summary_stats'] = {
+            'total_violations': int(metrics['total_violations']),
+            'active_violations': int(metrics['active_violations']),
+            'total_enforcement_actions': sum(1 for v in violations if v.get('enforcement_action')),
+            'total_site_visits': len(detail['sections']['site_visits']),
+            'total_lcr_samples': len(detail['sections']['lcr_samples']),
+            'total_events': len(detail['sections']['events_milestones']),
+            'total_facilities': len(detail['sections']['facilities']),
+            'days_out_of_compliance': int(metrics['days_out_of_compliance']),
+            'health_based_days': int(metrics['health_based_days']),
+            'population_days': int(metrics['population_days']),
+            **geography
+        }
+        return record
+
+    def public_view(self, detail: Dict[str, Any]) -> Dict[str, Any]:
+        """The system card the public dashboard reads: camelCase, with the latest few violations"""
+        record, metrics, geography = detail['record'], detail['metrics'], detail['geography']
+        shown = self.policy['recent_violations_shown']
+        rows = self.indexes['violations_enforcement'].rows(record['pwsid'])
+        begin_column = self.policy['violation_dates']['begin']
+        dated = [(day, r) for day, r in zip(date_to_day(pd.Series([r.get(begin_column) for r in rows], dtype=object)),
+                                            rows) if day != MISSING_DAY]
+        dated.sort(key=lambda item: -item[0])
+        recent = []
+        for day, row in dated[:shown]:
+            code = row.get('CONTAMINANT_CODE')
+            violation = {
+                'id': row.get('VIOLATION_ID'),
+                'type': row.get('VIOLATION_CATEGORY_CODE') or 'Unknown',
+                'contaminant': (CONTAMINANT_NAMES.get(code) or self.describe('CONTAMINANT_CODE', code)) if code else 'Unknown',
+                'date': day_to_iso(day),
+                'status': 'Active' if is_active(row.get('VIOLATION_STATUS'), self.policy) else 'Resolved',
+                'healthBased': row.get('IS_HEALTH_BASED_IND') == self.policy['health_based_indicator']
+            }
+            if row.get('VIOL_MEASURE') is not None:
+                violation['level'] = f"{row['VIOL_MEASURE']} {row.get('UNIT_OF_MEASURE') or ''}".strip()
+            if row.get('FEDERAL_MCL') is not None:
+                violation['limit'] = str(row['FEDERAL_MCL'])
+            recent.append(violation)
+
+        last_day = int(metrics['last_violation_day'])
+        return {
+            'pwsid': record['pwsid'],
+            'name': record['name'] or 'Unknown',
+            'county': geography['counties'][0] if geography['counties'] else 'Unknown',
+            'zipCodes': geography['zip_codes'],
+            'population': record['population_served'],
+            'trustScore': int(metrics['trust_score']),
+            'activeViolations': int(metrics['active_violations']),
+            'lastViolation': day_to_iso(last_day) if last_day != MISSING_DAY else None,
+            'waterSource': water_source(record['primary_source_code'], self.describe),
+            'recentViolations': recent
+        }
+
+    def comprehensive_view(self, detail: Dict[str, Any]) -> Dict[str, Any]:
+        """water_systems_data.json: the full record of an active system, plus its public card fields"""
+        record, metrics, geography = detail['record'], detail['metrics'], detail['geography']
+        sections = detail['sections']
+        last_day = int(metrics['last_violation_day'])
+        counts = {
+            'total_violations': int(metrics['total_violations']),
+            'active_violations': int(metrics['active_violations']),
+            'health_based_violations': int(metrics['health_based_violations']),
+            'days_out_of_compliance': int(metrics['days_out_of_compliance']),
+            'health_based_days': int(metrics['health_based_days']),
+            'population_days': int(metrics['population_days']),
+        }
+        source = water_source(record['primary_source_code'], self.describe)
+        comprehensive = {
+            **record,
+            'primary_source': source,
+            'owner_type': self.describe('OWNER_TYPE_CODE', record['owner_type']) if record['owner_type'] else None,
+            'owner_type_code': record['owner_type'],
+            'trust_score': int(metrics['trust_score']),
+            **counts,
+            'last_violation': day_to_iso(last_day) if last_day != MISSING_DAY else None,
+            'water_source': source,
+            **geography,
+            **sections,
+            'summary_stats': {
+                **counts,
+                'total_lcr_samples': len(sections['lcr_samples']),
+                'total_site_visits': len(sections['site_visits']),
+                'total_facilities': len(sections['facilities']),
+                'total_events': len(sections['events_milestones']),
+                'total_pn_violations': len(sections['pn_violations']),
+                'zip_codes_count': len(geography['zip_codes']),
+                'counties_count': len(geography['counties']),
+                'cities_count': len(geography['cities'])
+            }
+        }
+        comprehensive.update(self.public_view(detail))
+        return comprehensive
+
+    def records(self, views: List[str], limit: Optional[int] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Records for each requested view ('operator', 'comprehensive', 'public'),
+        building every system's detail once. The public views cover active
+        systems only; limit caps the records per view.
+        """
+        output = {view: [] for view in views}
+        builders = {'operator': self.operator_view, 'comprehensive': self.comprehensive_view,
+                    'public': self.public_view}
+        for pwsid, activity in zip(self.systems['PWSID'], self.systems['PWS_ACTIVITY_CODE']):
+            if limit is not None and all(len(rows) >= limit for rows in output.values()):
+                break
+            detail = self.detail(pwsid)
+            for view in views:
+                if (view == 'operator' or activity == 'A') and (limit is None or len(output[view]) < limit):
+                    output[view].append(clean_record(builders[view](detail)))
+        logger.info("Built " + ', '.join(f"{len(rows)} {view}" for view, rows in output.items()) + " records")
+        return output
+
+    def contaminant_guide(self, contaminant_index: Dict[str, Any]) -> Dict[str, Any]:
+        """contaminant_info.json: the guide entries plus a generic one per reference code, with exposure summaries"""
+        guide = {info['name']: dict(info) for info in CONTAMINANT_GUIDE.values()}
+        for code, name in self.codes.get('CONTAMINANT_CODE', {}).items():
+            if code in CONTAMINANT_GUIDE:
+                continue
+            guide[name] = {
+                'code': code,
+                'name': name,
+                'description': f'Contaminant: {name}',
+                'healthEffects': 'Contact your water system for specific health information.',
+                'whatToDo': 'Follow guidance from your water system and health authorities.',
+                'sources': ['Various sources'],
+                'mcl': 'Varies by contaminant',
+                'category': 'Other'
+            }
+        lookup = ContaminantIndex(contaminant_index)
+        for info in guide.values():
+            exposure = lookup.summary(info['code'])
+            if exposure:
+                info['exposure'] = exposure
+        return clean_record(guide)
+
+    def publish_public(self, systems: List[Dict[str, Any]], public_dir: str = PUBLIC_DIR,
+                       contaminant_index: Optional[Dict[str, Any]] = None):
+        """
+        Public dashboard artifacts: systems, name search, nearest-ZIP table and
+        contaminant guide, plus the published trust scores as systems.cols for
+        inspection_priority.py. The contaminant index is built here unless one
+        built by contaminant_index.py is passed in.
+        """
+        publish_artifacts(public_dir, {
+            'water_systems_data.json': systems,
+            'name_search_index.json': NameIndex.from_systems(systems).to_dict(),
+            **dataset_artifacts({'systems': system_columns(systems)})
+        })
+
+        zip_file = os.path.join(self.data_dir, os.path.basename(ZIP_CENTROIDS))
+        if os.path.exists(zip_file):
+            try:
+                locator = ZipLocator.from_data(self.data_dir, zip_file,
+                                               os.path.join(self.data_dir, os.path.basename(COUNTY_CENTROIDS)),
+                                               os.path.join(self.data_dir, os.path.basename(PLACE_CENTROIDS)))
+                publish_artifacts(public_dir, {'zip_nearest.json': locator.nearest_table()})
+            except Exception as e:
+                logger.error(f"Error building the nearest-system ZIP table: {e}")
+        else:
+            logger.info(f"{zip_file} not found; skipping nearest-system ZIP table")
+
+        if contaminant_index is None:
+            contaminant_index = build_contaminant_index(self.data_dir)
+        publish_artifacts(public_dir, {
+            'contaminant_info.json': self.contaminant_guide(contaminant_index),
+            'contaminant_systems.json': contaminant_index
+        })
+
+    def publish_operator(self, systems: List[Dict[str, Any]], operator_dir: Optional[str] = OPERATOR_PUBLIC,
+                         output_file: str = "dashboard_data.json", indexes: bool = True):
+        """
+        Operator dashboard dataset with task calendars, plus the deadline index
+        and, with indexes, the interval and comment indexes (the pipeline builds
+        those in stages of their own)
+        """
+        try:
+            due_index = TaskCalendarBuilder(as_of=self.as_of).apply({s['pwsid']: s for s in systems})
+            save_due_index(due_index)
+        except Exception as e:
+            logger.error(f"Error building task calendars: {e}")
+
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(systems, f, separators=(',', ':'), ensure_ascii=False, default=str)
+        logger.info(f"Dataset saved to {output_file}: {len(systems)} systems")
+        if operator_dir:
+            publish_artifacts(operator_dir, {'dashboard_data.json': systems})
+
+        if not indexes:
+            return
+        for name, build in (('interval_index.json', build_interval_index), ('comment_search_index.json', build_comment_index)):
+            try:
+                build(self.data_dir).save(name)
+            except Exception as e:
+                logger.error(f"Error building {name}: {e}")
+
+    def run(self, outputs: Optional[List[str]] = None, public_dir: str = PUBLIC_DIR,
+            operator_dir: Optional[str] = OPERATOR_PUBLIC,
+            contaminant_index: Optional[Dict[str, Any]] = None, indexes: bool = True) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Load once and write the requested outputs ('public', 'operator'; both by
+        default). contaminant_index and indexes=False leave the contaminant,
+        interval and comment indexes to their own pipeline stages.
+        """
+        outputs = outputs or OUTPUTS
+        started = time.time()
+        views = (['comprehensive'] if 'public' in outputs else []) + (['operator'] if 'operator' in outputs else [])
+        with shared_tables(), validated_tables(self.quarantine_file):
+            self.load()
+            records = self.records(views)
+            if 'public' in outputs:
+                self.publish_public(records['comprehensive'], public_dir, contaminant_index)
+            if 'operator' in outputs:
+                self.publish_operator(records['operator'], operator_dir, indexes=indexes)
+        summary = records.get('operator') or records.get('comprehensive') or []
+        logger.info(f"Extracted {', '.join(outputs)} in {time.time() - started:.1f}s: {len(summary)} systems, "
+                    f"{sum(s['summary_stats']['total_violations'] for s in summary)} violations, "
+                    f"{sum(s['summary_stats']['active_violations'] for s in summary)} active")
+        return records
+
+
+def main():
+    """Run the single-pass extraction"""
+    parser = argparse.ArgumentParser(description="Extract every dashboard output in one pass over the SDWIS tables")
+    parser.add_argument('--output', action='append', choices=OUTPUTS, dest='outputs', help="Outputs to write (default: all)")
+    parser.add_argument('--data-dir', default="data")
+    parser.add_argument('--policy', help="Policy overrides (default: <data-dir>/extraction_policy.json, if present)")
+    parser.add_argument('--print-policy', action='store_true', help="Print the effective policy and exit")
+    parser.add_argument('--quarantine', default=QUARANTINE_FILE, help="Validation quarantine to apply ('' to load raw tables)")
+    parser.add_argument('--contaminant-index', metavar='PATH',
+                        help="Publish this contaminant_systems.json (see contaminant_index.py --build) instead of rebuilding it")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    policy = load_policy(args.policy, args.data_dir)
+    if args.print_policy:
+        print(json.dumps(policy, indent=2))
+        return
+    contaminant_index = load_contaminant_index(args.contaminant_index) if args.contaminant_index else None
+    ExtractionEngine(args.data_dir, policy, quarantine_file=args.quarantine or None).run(
+        args.outputs, contaminant_index=contaminant_index)
+
+
+if __name__ == "__main__":
+    main()
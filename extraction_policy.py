@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Extraction Policy
+The scoring weights, active-violation rule and date fields shared by every
+extraction output, in one place. An extraction_policy.json in the data
+directory (or a file given with --policy) overrides any of these values
+"""
+
+import copy
+import json
+import logging
+import os
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+POLICY_FILE = "extraction_policy.json"
+
+POLICY: Dict[str, Any] = {
+    # A violation is active while its VIOLATION_STATUS is one of these; a
+    # violation with no status yet is counted as active too
+    'active_statuses': ['Unaddressed', 'Addressed'],
+    'missing_status_active': True,
+    'health_based_indicator': 'Y',
+    # Violation columns behind each date field of the outputs
+    'violation_dates': {
+        'begin': 'NON_COMPL_PER_BEGIN_DATE',
+        'end': 'NON_COMPL_PER_END_DATE',
+        'resolved': 'CALCULATED_RTC_DATE',
+        'enforcement': 'ENFORCEMENT_DATE',
+    },
+    'visit_date': 'VISIT_DATE',
+    # Public trust score, 0-100
+    'trust_score': {
+        'base': 100,
+        'active_health_based': 20,          # per active health-based violation
+        'active_other': 10,                 # per other active violation
+        'recent_days': 5 * 365,             # window for the history deductions below
+        'recent_violation': 3,              # per violation begun in the window
+        'recent_violation_cap': 30,
+        'health_days_per_point': 30,        # health-based days out of compliance in the window
+        'health_days_cap': 20,
+        'outstanding_performer': 15,
+        'visit_days': 365,                  # window for the oversight bonus
+        'recent_visit': 2,
+        'recent_visit_cap': 10,
+        'inactive': 50,
+    },
+    # Violations listed on a public system card
+    'recent_violations_shown': 3,
+}
+
+
+def _merge(base: Dict[str, Any], overrides: Dict[str, Any]) -> Dict[str, Any]:
+    for key, value in overrides.items():
+        if key not in base:
+            logger.warning(f"Ignoring unknown policy setting {key}")
+        elif isinstance(base[key], dict) and isinstance(value, dict):
+            _merge(base[key], value)
+        else:
+            base[key] = value
+    return base
+
+
+def load_policy(path: Optional[str] = None, data_dir: str = "data") -> Dict[str, Any]:
+    """
+    The default policy with the overrides from path, which must exist when
+    given; otherwise from extraction_policy.json in data_dir, if present
+    """
+    policy = copy.deepcopy(POLICY)
+    if path is None:
+        path = os.path.join(data_dir, POLICY_FILE)
+        if not os.path.exists(path):
+            if os.path.exists(POLICY_FILE) and os.path.abspath(POLICY_FILE) != os.path.abspath(path):
+                logger.warning(f"Ignoring ./{POLICY_FILE}: policy overrides are read from {path} or --policy")
+            logger.info(f"No {path}; using the default extraction policy")
+            return policy
+    with open(path, encoding='utf-8') as f:
+        _merge(policy, json.load(f))
+    logger.info(f"Applied extraction policy overrides from {os.path.abspath(path)}")
+    return policy
+
+
+def active_mask(status: pd.Series, policy: Dict[str, Any] = POLICY) -> pd.Series:
+    """Which violations are active, from their VIOLATION_STATUS"""
+    active = status.isin(policy['active_statuses'])
+    if policy['missing_status_active']:
+        active |= status.isna()
+    return active
+
+
+def is_active(status: Optional[str], policy: Dict[str, Any] = POLICY) -> bool:
+    if status is None or (isinstance(status, float) and pd.isna(status)):
+        return bool(policy['missing_status_active'])
+    return status in policy['active_statuses']
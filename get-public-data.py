@@ -1,659 +1,28 @@
-import pandas as pd
-import numpy as np
-from datetime import datetime
-from collections import defaultdict
-import json
-import math
-import os
+import logging
 
-# Data extraction guide for populating Water System information from CSV files
+from extraction_engine import PUBLIC_DIR, ExtractionEngine
 
-def load_water_systems_data():
-    """
-    Extract COMPLETE water system information from ALL CSV files
-    """
-    print("Loading comprehensive water systems data from all CSV files...")
-    
-    # 1. Load reference codes for all mappings
-    print("Loading reference codes...")
-    ref_codes_df = pd.read_csv('data/SDWA_REF_CODE_VALUES.csv')
-    ref_codes_df.columns = ref_codes_df.columns.str.strip()
-    
-    # Create comprehensive lookup dictionaries
-    code_mappings = {}
-    for _, row in ref_codes_df.iterrows():
-        value_type = row['VALUE_TYPE']
-        value_code = row['VALUE_CODE']
-        value_desc = row['VALUE_DESCRIPTION']
-        
-        if value_type not in code_mappings:
-            code_mappings[value_type] = {}
-        code_mappings[value_type][value_code] = value_desc
-    
-    # 2. Load main water systems data
-    print("Loading water systems data...")
-    pws_df = pd.read_csv('data/SDWA_PUB_WATER_SYSTEMS.csv', dtype={'PWSID': str, 'ZIP_CODE': str})
-    pws_df.columns = pws_df.columns.str.strip()
-    
-    # 3. Load geographic areas
-    print("Loading geographic data...")
-    geo_df = pd.read_csv('data/SDWA_GEOGRAPHIC_AREAS.csv', dtype={'PWSID': str, 'ZIP_CODE_SERVED': str})
-    geo_df.columns = geo_df.columns.str.strip()
-    
-    # 4. Load service areas
-    print("Loading service areas...")
-    service_df = pd.read_csv('data/SDWA_SERVICE_AREAS.csv', dtype={'PWSID': str})
-    service_df.columns = service_df.columns.str.strip()
-    
-    # 5. Load violations data
-    print("Loading violations data...")
-    violations_df = pd.read_csv('data/SDWA_VIOLATIONS_ENFORCEMENT.csv', dtype={'PWSID': str})
-    violations_df.columns = violations_df.columns.str.strip()
-    
-    # 6. Load LCR samples
-    print("Loading LCR samples...")
-    lcr_df = pd.read_csv('data/SDWA_LCR_SAMPLES.csv', dtype={'PWSID': str})
-    lcr_df.columns = lcr_df.columns.str.strip()
-    
-    # 7. Load site visits
-    print("Loading site visits...")
-    site_visits_df = pd.read_csv('data/SDWA_SITE_VISITS.csv', dtype={'PWSID': str})
-    site_visits_df.columns = site_visits_df.columns.str.strip()
-    
-    # 8. Load facilities
-    print("Loading facilities...")
-    facilities_df = pd.read_csv('data/SDWA_FACILITIES.csv', dtype={'PWSID': str})
-    facilities_df.columns = facilities_df.columns.str.strip()
-    
-    # 9. Load events and milestones
-    print("Loading events and milestones...")
-    events_df = pd.read_csv('data/SDWA_EVENTS_MILESTONES.csv', dtype={'PWSID': str})
-    events_df.columns = events_df.columns.str.strip()
-    
-    # 10. Load PN violation associations
-    print("Loading PN violation associations...")
-    pn_df = pd.read_csv('data/SDWA_PN_VIOLATION_ASSOC.csv', dtype={'PWSID': str})
-    pn_df.columns = pn_df.columns.str.strip()
-    
-    # Initialize water systems list
-    water_systems = []
-    
-    # Process each active water system
-    active_systems = pws_df[pws_df['PWS_ACTIVITY_CODE'] == 'A']
-    
-    for _, system in active_systems.iterrows():
-        pwsid = system['PWSID']
-        
-        # Get all geographic areas for this system
-        system_geo = geo_df[geo_df['PWSID'] == pwsid]
-        geographic_areas = []
-        zip_codes = []
-        counties = []
-        cities = []
-        
-        for _, geo in system_geo.iterrows():
-            geo_area = {
-                'geo_id': geo.get('GEO_ID', ''),
-                'area_type': geo.get('AREA_TYPE_CODE', ''),
-                'area_type_desc': code_mappings.get('AREA_TYPE_CODE', {}).get(geo.get('AREA_TYPE_CODE', ''), ''),
-                'state_served': geo.get('STATE_SERVED', ''),
-                'zip_code': geo.get('ZIP_CODE_SERVED', ''),
-                'city': geo.get('CITY_SERVED', ''),
-                'county': geo.get('COUNTY_SERVED', ''),
-                'last_reported': geo.get('LAST_REPORTED_DATE', '')
-            }
-            geographic_areas.append(geo_area)
-            
-            if geo.get('ZIP_CODE_SERVED'):
-                zip_codes.append(geo['ZIP_CODE_SERVED'])
-            if geo.get('COUNTY_SERVED'):
-                counties.append(geo['COUNTY_SERVED'])
-            if geo.get('CITY_SERVED'):
-                cities.append(geo['CITY_SERVED'])
-        
-        # Get service areas
-        system_service = service_df[service_df['PWSID'] == pwsid]
-        service_areas = []
-        for _, service in system_service.iterrows():
-            service_area = {
-                'service_area_type': service.get('SERVICE_AREA_TYPE_CODE', ''),
-                'service_area_type_desc': code_mappings.get('SERVICE_AREA_TYPE_CODE', {}).get(service.get('SERVICE_AREA_TYPE_CODE', ''), ''),
-                'is_primary': service.get('IS_PRIMARY_SERVICE_AREA_CODE', ''),
-                'first_reported': service.get('FIRST_REPORTED_DATE', ''),
-                'last_reported': service.get('LAST_REPORTED_DATE', '')
-            }
-            service_areas.append(service_area)
-        
-        # Get all violations for this system
-        system_violations = violations_df[violations_df['PWSID'] == pwsid].copy()
-        violations = []
-        
-        for _, viol in system_violations.iterrows():
-            violation = {
-                'violation_id': viol.get('VIOLATION_ID', ''),
-                'violation_code': viol.get('VIOLATION_CODE', ''),
-                'violation_code_desc': code_mappings.get('VIOLATION_CODE', {}).get(viol.get('VIOLATION_CODE', ''), ''),
-                'violation_category': viol.get('VIOLATION_CATEGORY_CODE', ''),
-                'violation_category_desc': code_mappings.get('VIOLATION_CATEGORY_CODE', {}).get(viol.get('VIOLATION_CATEGORY_CODE', ''), ''),
-                'violation_type': viol.get('VIOLATION_TYPE_CODE', ''),
-                'violation_type_desc': code_mappings.get('VIOLATION_TYPE_CODE', {}).get(viol.get('VIOLATION_TYPE_CODE', ''), ''),
-                'contaminant_code': viol.get('CONTAMINANT_CODE', ''),
-                'contaminant_name': code_mappings.get('CONTAMINANT_CODE', {}).get(viol.get('CONTAMINANT_CODE', ''), ''),
-                'violation_begin_date': viol.get('NON_COMPL_PER_BEGIN_DATE', ''),
-                'violation_end_date': viol.get('NON_COMPL_PER_END_DATE', ''),
-                'violation_resolved_date': viol.get('VIOLATION_RESOLVED_DATE', ''),
-                'compliance_status': viol.get('COMPLIANCE_STATUS_CODE', ''),
-                'compliance_status_desc': code_mappings.get('COMPLIANCE_STATUS_CODE', {}).get(viol.get('COMPLIANCE_STATUS_CODE', ''), ''),
-                'is_health_based': viol.get('IS_HEALTH_BASED_IND', ''),
-                'federal_mcl': viol.get('FEDERAL_MCL', ''),
-                'viol_measure': viol.get('VIOL_MEASURE', ''),
-                'unit_of_measure': viol.get('UNIT_OF_MEASURE', ''),
-                'enforcement_action': viol.get('ENFORCEMENT_ACTION_CODE', ''),
-                'enforcement_action_desc': code_mappings.get('ENFORCEMENT_ACTION_CODE', {}).get(viol.get('ENFORCEMENT_ACTION_CODE', ''), ''),
-                'enforcement_action_date': viol.get('ENFORCEMENT_ACTION_DATE', ''),
-                'first_reported': viol.get('FIRST_REPORTED_DATE', ''),
-                'last_reported': viol.get('LAST_REPORTED_DATE', ''),
-                'requires_action': viol.get('REQUIRES_ACTION_IND', ''),
-                'priority': 'High' if viol.get('IS_HEALTH_BASED_IND') == 'Y' else 'Medium'
-            }
-            violations.append(violation)
-        
-        # Get LCR samples
-        system_lcr = lcr_df[lcr_df['PWSID'] == pwsid]
-        lcr_samples = []
-        for _, sample in system_lcr.iterrows():
-            lcr_sample = {
-                'sample_id': sample.get('SAMPLE_ID', ''),
-                'sample_date': sample.get('SAMPLE_DATE', ''),
-                'sample_type': sample.get('SAMPLE_TYPE_CODE', ''),
-                'sample_type_desc': code_mappings.get('SAMPLE_TYPE_CODE', {}).get(sample.get('SAMPLE_TYPE_CODE', ''), ''),
-                'lead_result': sample.get('LEAD_RESULT', ''),
-                'copper_result': sample.get('COPPER_RESULT', ''),
-                'lead_action_level': sample.get('LEAD_ACTION_LEVEL', ''),
-                'copper_action_level': sample.get('COPPER_ACTION_LEVEL', ''),
-                'first_reported': sample.get('FIRST_REPORTED_DATE', ''),
-                'last_reported': sample.get('LAST_REPORTED_DATE', '')
-            }
-            lcr_samples.append(lcr_sample)
-        
-        # Get site visits
-        system_visits = site_visits_df[site_visits_df['PWSID'] == pwsid]
-        site_visits = []
-        for _, visit in system_visits.iterrows():
-            site_visit = {
-                'visit_id': visit.get('SITE_VISIT_ID', ''),
-                'visit_date': visit.get('SITE_VISIT_DATE', ''),
-                'visit_type': visit.get('SITE_VISIT_TYPE_CODE', ''),
-                'visit_type_desc': code_mappings.get('SITE_VISIT_TYPE_CODE', {}).get(visit.get('SITE_VISIT_TYPE_CODE', ''), ''),
-                'visit_reason': visit.get('SITE_VISIT_REASON_CODE', ''),
-                'visit_reason_desc': code_mappings.get('SITE_VISIT_REASON_CODE', {}).get(visit.get('SITE_VISIT_REASON_CODE', ''), ''),
-                'visit_result': visit.get('SITE_VISIT_RESULT_CODE', ''),
-                'visit_result_desc': code_mappings.get('SITE_VISIT_RESULT_CODE', {}).get(visit.get('SITE_VISIT_RESULT_CODE', ''), ''),
-                'first_reported': visit.get('FIRST_REPORTED_DATE', ''),
-                'last_reported': visit.get('LAST_REPORTED_DATE', '')
-            }
-            site_visits.append(site_visit)
-        
-        # Get facilities
-        system_facilities = facilities_df[facilities_df['PWSID'] == pwsid]
-        facilities = []
-        for _, facility in system_facilities.iterrows():
-            fac = {
-                'facility_id': facility.get('FACILITY_ID', ''),
-                'facility_name': facility.get('FACILITY_NAME', ''),
-                'facility_type': facility.get('FACILITY_TYPE_CODE', ''),
-                'facility_type_desc': code_mappings.get('FACILITY_TYPE_CODE', {}).get(facility.get('FACILITY_TYPE_CODE', ''), ''),
-                'facility_status': facility.get('FACILITY_STATUS_CODE', ''),
-                'facility_status_desc': code_mappings.get('FACILITY_STATUS_CODE', {}).get(facility.get('FACILITY_STATUS_CODE', ''), ''),
-                'facility_begin_date': facility.get('FACILITY_BEGIN_DATE', ''),
-                'facility_end_date': facility.get('FACILITY_END_DATE', ''),
-                'first_reported': facility.get('FIRST_REPORTED_DATE', ''),
-                'last_reported': facility.get('LAST_REPORTED_DATE', '')
-            }
-            facilities.append(fac)
-        
-        # Get events and milestones
-        system_events = events_df[events_df['PWSID'] == pwsid]
-        events_milestones = []
-        for _, event in system_events.iterrows():
-            evt = {
-                'event_schedule_id': event.get('EVENT_SCHEDULE_ID', ''),
-                'event_end_date': event.get('EVENT_END_DATE', ''),
-                'event_actual_date': event.get('EVENT_ACTUAL_DATE', ''),
-                'event_comments': event.get('EVENT_COMMENTS_TEXT', ''),
-                'event_milestone_code': event.get('EVENT_MILESTONE_CODE', ''),
-                'event_milestone_desc': code_mappings.get('EVENT_MILESTONE_CODE', {}).get(event.get('EVENT_MILESTONE_CODE', ''), ''),
-                'event_reason_code': event.get('EVENT_REASON_CODE', ''),
-                'event_reason_desc': code_mappings.get('EVENT_REASON_CODE', {}).get(event.get('EVENT_REASON_CODE', ''), ''),
-                'first_reported': event.get('FIRST_REPORTED_DATE', ''),
-                'last_reported': event.get('LAST_REPORTED_DATE', '')
-            }
-            events_milestones.append(evt)
-        
-        # Get PN violations
-        system_pn = pn_df[pn_df['PWSID'] == pwsid]
-        pn_violations = []
-        for _, pn in system_pn.iterrows():
-            pn_viol = {
-                'violation_id': pn.get('VIOLATION_ID', ''),
-                'pn_type': pn.get('PN_TYPE_CODE', ''),
-                'pn_type_desc': code_mappings.get('PN_TYPE_CODE', {}).get(pn.get('PN_TYPE_CODE', ''), ''),
-                'pn_date': pn.get('PN_DATE', ''),
-                'first_reported': pn.get('FIRST_REPORTED_DATE', ''),
-                'last_reported': pn.get('LAST_REPORTED_DATE', '')
-            }
-            pn_violations.append(pn_viol)
-        
-        # Calculate comprehensive statistics
-        active_violations = [v for v in violations if v['compliance_status'] in ['O', 'R']]
-        health_based_violations = [v for v in violations if v['is_health_based'] == 'Y']
-        
-        # Calculate trust score
-        trust_score = calculate_comprehensive_trust_score(system, violations, active_violations, health_based_violations, site_visits)
-        
-        # Determine water source
-        water_source = 'Unknown'
-        if system.get('PRIMARY_SOURCE_CODE'):
-            source_code = system['PRIMARY_SOURCE_CODE']
-            if source_code.startswith('GW'):
-                water_source = 'Groundwater'
-            elif source_code.startswith('SW'):
-                water_source = 'Surface Water'
-            elif source_code == 'GU':
-                water_source = 'Groundwater Under Influence'
-            else:
-                water_source = code_mappings.get('PRIMARY_SOURCE_CODE', {}).get(source_code, 'Unknown')
-        
-        # Get last violation date
-        last_violation = None
-        if len(violations) > 0:
-            violation_dates = [v['violation_begin_date'] for v in violations if v['violation_begin_date']]
-            if violation_dates:
-                try:
-                    last_viol_date = max(pd.to_datetime(d) for d in violation_dates if pd.notna(d))
-                    last_violation = last_viol_date.strftime('%Y-%m-%d')
-                except:
-                    pass
-        
-        # Create comprehensive water system object
-        water_system = {
-            'pwsid': pwsid,
-            'name': system['PWS_NAME'],
-            'type': code_mappings.get('PWS_TYPE_CODE', {}).get(system.get('PWS_TYPE_CODE', ''), ''),
-            'type_code': system.get('PWS_TYPE_CODE', ''),
-            'primary_source': water_source,
-            'primary_source_code': system.get('PRIMARY_SOURCE_CODE', ''),
-            'population_served': int(system['POPULATION_SERVED_COUNT']) if pd.notna(system['POPULATION_SERVED_COUNT']) else 0,
-            'service_connections': int(system['SERVICE_CONNECTIONS_COUNT']) if pd.notna(system['SERVICE_CONNECTIONS_COUNT']) else 0,
-            'activity_status': system.get('PWS_ACTIVITY_CODE', ''),
-            'owner_type': code_mappings.get('OWNER_TYPE_CODE', {}).get(system.get('OWNER_TYPE_CODE', ''), ''),
-            'owner_type_code': system.get('OWNER_TYPE_CODE', ''),
-            'trust_score': trust_score,
-            'active_violations': len(active_violations),
-            'total_violations': len(violations),
-            'health_based_violations': len(health_based_violations),
-            'last_violation': last_violation,
-            'water_source': water_source,
-            
-            # Geographic information
-            'geographic_areas': geographic_areas,
-            'zip_codes': list(set(zip_codes)),
-            'counties': list(set(counties)),
-            'cities': list(set(cities)),
-            
-            # Address and contact
-            'address': {
-                'line1': system.get('ADDRESS_LINE1', ''),
-                'line2': system.get('ADDRESS_LINE2', ''),
-                'city': system.get('CITY_NAME', ''),
-                'state': system.get('STATE_CODE', ''),
-                'zip': system.get('ZIP_CODE', '')
-            },
-            'contact': {
-                'organization': system.get('ORG_NAME', ''),
-                'admin_name': system.get('ADMIN_NAME', ''),
-                'email': system.get('EMAIL_ADDR', ''),
-                'phone': system.get('PHONE_NUMBER', ''),
-                'fax': system.get('FAX_NUMBER', '')
-            },
-            
-            # Dates
-            'first_reported': system.get('FIRST_REPORTED_DATE', ''),
-            'last_reported': system.get('LAST_REPORTED_DATE', ''),
-            
-            # Flags
-            'is_grant_eligible': system.get('IS_GRANT_ELIGIBLE_IND', ''),
-            'is_wholesaler': system.get('IS_WHOLESALER_IND', ''),
-            'is_school_or_daycare': system.get('IS_SCHOOL_OR_DAYCARE_IND', ''),
-            
-            # All related data
-            'service_areas': service_areas,
-            'violations_enforcement': violations,
-            'lcr_samples': lcr_samples,
-            'site_visits': site_visits,
-            'facilities': facilities,
-            'events_milestones': events_milestones,
-            'pn_violations': pn_violations,
-            
-            # Summary statistics
-            'summary_stats': {
-                'total_violations': len(violations),
-                'active_violations': len(active_violations),
-                'health_based_violations': len(health_based_violations),
-                'total_lcr_samples': len(lcr_samples),
-                'total_site_visits': len(site_visits),
-                'total_facilities': len(facilities),
-                'total_events': len(events_milestones),
-                'total_pn_violations': len(pn_violations),
-                'zip_codes_count': len(set(zip_codes)),
-                'counties_count': len(set(counties)),
-                'cities_count': len(set(cities))
-            }
-        }
-        
-        water_systems.append(water_system)
-    
-    return water_systems
-
-def calculate_comprehensive_trust_score(system, violations, active_violations, health_based_violations, site_visits):
-    """
-    Calculate comprehensive trust score based on multiple factors
-    Returns: score from 0-100
-    """
-    score = 100
-    
-    # Deduct for active violations
-    score -= len(health_based_violations) * 20  # -20 points per health-based violation
-    score -= (len(active_violations) - len(health_based_violations)) * 10  # -10 points per other violation
-    
-    # Deduct for violation history (last 5 years)
-    if len(violations) > 0:
-        recent_date = datetime.now() - pd.Timedelta(days=5*365)
-        recent_violations = []
-        for v in violations:
-            if v['violation_begin_date']:
-                try:
-                    viol_date = pd.to_datetime(v['violation_begin_date'])
-                    if viol_date > recent_date:
-                        recent_violations.append(v)
-                except:
-                    pass
-        score -= min(len(recent_violations) * 3, 30)  # -3 points per violation, max -30
-    
-    # Bonus for being an outstanding performer
-    if system.get('OUTSTANDING_PERFORMER') == 'Y':
-        score += 15
-    
-    # Bonus for recent site visits (good oversight)
-    recent_visits = 0
-    for visit in site_visits:
-        if visit['visit_date']:
-            try:
-                visit_date = pd.to_datetime(visit['visit_date'])
-                if visit_date > datetime.now() - pd.Timedelta(days=365):
-                    recent_visits += 1
-            except:
-                pass
-    score += min(recent_visits * 2, 10)  # +2 points per recent visit, max +10
-    
-    # Deduct for being inactive
-    if system.get('PWS_ACTIVITY_CODE') != 'A':
-        score -= 50
-    
-    # Ensure score stays in valid range
-    return max(0, min(100, score))
-
-def generate_contaminant_info_json():
-    """
-    Generate comprehensive contaminant information JSON from CSV data
-    """
-    print("Loading reference codes for contaminant information...")
-    ref_codes_df = pd.read_csv('data/SDWA_REF_CODE_VALUES.csv')
-    ref_codes_df.columns = ref_codes_df.columns.str.strip()
-    
-    # Get all contaminant codes
-    contaminants = ref_codes_df[ref_codes_df['VALUE_TYPE'] == 'CONTAMINANT_CODE']
-    
-    # Create comprehensive contaminant information
-    contaminant_info = {}
-    
-    # Common contaminants with detailed information
-    common_contaminants = {
-        '1040': {  # Nitrate
-            'code': '1040',
-            'name': 'Nitrate',
-            'description': 'Chemical that can come from fertilizer runoff, septic systems, or natural deposits',
-            'healthEffects': 'Especially dangerous for infants under 6 months - can cause "blue baby syndrome" (methemoglobinemia)',
-            'whatToDo': 'DO NOT BOIL - boiling increases nitrate concentration. Use bottled water for infant formula and drinking.',
-            'sources': ['Agricultural runoff', 'Septic systems', 'Natural deposits'],
-            'mcl': '10 mg/L',
-            'category': 'Inorganic Chemicals'
-        },
-        '1030': {  # Lead
-            'code': '1030',
-            'name': 'Lead',
-            'description': 'Toxic metal that can leach from plumbing materials',
-            'healthEffects': 'Can cause developmental delays in children and health problems in adults',
-            'whatToDo': 'Run cold water for 30 seconds before use. Consider water testing and filters certified for lead removal.',
-            'sources': ['Corrosion of household plumbing', 'Lead service lines', 'Erosion of natural deposits'],
-            'mcl': '0.015 mg/L',
-            'category': 'Inorganic Chemicals'
-        },
-        '1035': {  # Copper
-            'code': '1035',
-            'name': 'Copper',
-            'description': 'Metal that can leach from plumbing materials',
-            'healthEffects': 'Can cause gastrointestinal distress and liver or kidney damage',
-            'whatToDo': 'Run cold water before use. Test your water if you notice blue-green staining.',
-            'sources': ['Corrosion of household plumbing', 'Erosion of natural deposits'],
-            'mcl': '1.3 mg/L',
-            'category': 'Inorganic Chemicals'
-        },
-        '5000': {  # Lead and Copper Rule
-            'code': '5000',
-            'name': 'Lead and Copper Rule',
-            'description': 'Regulatory framework for monitoring lead and copper in drinking water',
-            'healthEffects': 'Lead can cause developmental delays in children and health problems in adults',
-            'whatToDo': 'Run cold water for 30 seconds before use. Consider water testing and filters certified for lead removal.',
-            'sources': ['Corrosion of household plumbing', 'Lead service lines'],
-            'mcl': 'Action Level: 0.015 mg/L Lead, 1.3 mg/L Copper',
-            'category': 'Regulatory'
-        },
-        '1925': {  # pH
-            'code': '1925',
-            'name': 'pH',
-            'description': 'Measure of water acidity or alkalinity',
-            'healthEffects': 'Not directly harmful but can affect water taste and corrosion of pipes',
-            'whatToDo': 'Usually not a concern for drinking. Contact your water system if pH is consistently outside normal range.',
-            'sources': ['Natural water chemistry', 'Treatment processes'],
-            'mcl': '6.5-8.5 (secondary standard)',
-            'category': 'Physical Parameters'
-        },
-        '1930': {  # TDS
-            'code': '1930',
-            'name': 'Total Dissolved Solids (TDS)',
-            'description': 'Total amount of dissolved minerals and salts in water',
-            'healthEffects': 'Not directly harmful but can affect taste and indicate other problems',
-            'whatToDo': 'Usually not a concern. High TDS may indicate need for water softening.',
-            'sources': ['Natural minerals', 'Treatment chemicals', 'Industrial discharges'],
-            'mcl': '500 mg/L (secondary standard)',
-            'category': 'Physical Parameters'
-        },
-        '2050': {  # Atrazine
-            'code': '2050',
-            'name': 'Atrazine',
-            'description': 'Herbicide commonly used in agriculture',
-            'healthEffects': 'May cause cardiovascular and reproductive problems',
-            'whatToDo': 'Use activated carbon filters. Consider bottled water if levels are high.',
-            'sources': ['Agricultural runoff', 'Lawn care products'],
-            'mcl': '0.003 mg/L',
-            'category': 'Pesticides'
-        },
-        '2047': {  # Aldicarb
-            'code': '2047',
-            'name': 'Aldicarb',
-            'description': 'Insecticide used on crops',
-            'healthEffects': 'Can affect nervous system and cause nausea, dizziness',
-            'whatToDo': 'Use activated carbon filters. Avoid drinking if levels are high.',
-            'sources': ['Agricultural applications', 'Pesticide runoff'],
-            'mcl': '0.003 mg/L',
-            'category': 'Pesticides'
-        },
-        '1095': {  # Zinc
-            'code': '1095',
-            'name': 'Zinc',
-            'description': 'Metal that can leach from plumbing or occur naturally',
-            'healthEffects': 'Essential nutrient but high levels can cause nausea and stomach cramps',
-            'whatToDo': 'Usually not a concern. High levels may indicate plumbing corrosion.',
-            'sources': ['Corrosion of galvanized pipes', 'Natural deposits'],
-            'mcl': '5 mg/L (secondary standard)',
-            'category': 'Inorganic Chemicals'
-        },
-        '1074': {  # Antimony
-            'code': '1074',
-            'name': 'Antimony',
-            'description': 'Metalloid element that can occur naturally or from industrial sources',
-            'healthEffects': 'Can cause nausea, vomiting, and diarrhea',
-            'whatToDo': 'Contact your water system if levels are high.',
-            'sources': ['Natural deposits', 'Industrial discharges'],
-            'mcl': '0.006 mg/L',
-            'category': 'Inorganic Chemicals'
-        },
-        '1038': {  # Nitrate-Nitrite
-            'code': '1038',
-            'name': 'Nitrate-Nitrite',
-            'description': 'Combined measurement of nitrate and nitrite compounds',
-            'healthEffects': 'Especially dangerous for infants under 6 months - can cause "blue baby syndrome"',
-            'whatToDo': 'DO NOT BOIL - boiling increases nitrate concentration. Use bottled water for infant formula.',
-            'sources': ['Agricultural runoff', 'Septic systems', 'Natural deposits'],
-            'mcl': '10 mg/L',
-            'category': 'Inorganic Chemicals'
-        },
-        '1094': {  # Asbestos
-            'code': '1094',
-            'name': 'Asbestos',
-            'description': 'Fibrous mineral that can occur naturally in water',
-            'healthEffects': 'Can cause lung disease and cancer when inhaled',
-            'whatToDo': 'Contact your water system if asbestos is detected.',
-            'sources': ['Natural deposits', 'Asbestos cement pipes'],
-            'mcl': '7 million fibers per liter',
-            'category': 'Inorganic Chemicals'
-        },
-        '1080': {  # Hexavalent Chromium
-            'code': '1080',
-            'name': 'Chromium, Hexavalent',
-            'description': 'Toxic form of chromium that can occur naturally or from industrial sources',
-            'healthEffects': 'Can cause cancer and other health problems',
-            'whatToDo': 'Use reverse osmosis or ion exchange filters if levels are high.',
-            'sources': ['Natural deposits', 'Industrial discharges', 'Chrome plating'],
-            'mcl': '0.1 mg/L',
-            'category': 'Inorganic Chemicals'
-        }
-    }
-    
-    # Add common contaminants to the main dictionary
-    for code, info in common_contaminants.items():
-        contaminant_info[info['name']] = info
-    
-    # Add all other contaminants from CSV with basic information
-    for _, row in contaminants.iterrows():
-        code = row['VALUE_CODE']
-        name = row['VALUE_DESCRIPTION']
-        
-        # Skip if already in common contaminants
-        if any(info['code'] == code for info in common_contaminants.values()):
-            continue
-            
-        # Create basic entry for other contaminants
-        contaminant_info[name] = {
-            'code': code,
-            'name': name,
-            'description': f'Contaminant: {name}',
-            'healthEffects': 'Contact your water system for specific health information.',
-            'whatToDo': 'Follow guidance from your water system and health authorities.',
-            'sources': ['Various sources'],
-            'mcl': 'Varies by contaminant',
-            'category': 'Other'
-        }
-    
-    return contaminant_info
-
-def clean_json(obj):
-    """Clean data for JSON serialization"""
-    if isinstance(obj, dict):
-        return {k: clean_json(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [clean_json(v) for v in obj]
-    elif isinstance(obj, float):
-        if math.isnan(obj) or math.isinf(obj):
-            return None
-        return obj
-    elif obj is None:
-        return None
-    elif isinstance(obj, (np.integer, np.floating)):
-        return obj.item()
-    elif isinstance(obj, np.ndarray):
-        return obj.tolist()
-    return obj
+# Public dashboard export: the 'public' output of the single-pass extraction
+# engine (extraction_engine.py). The pipeline's export stage writes it together
+# with the operator output from the same load of the tables.
 
 # Main execution
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     print("=== COMPREHENSIVE WATER SYSTEMS DATA EXTRACTION ===")
-    print("Extracting ALL available data from CSV files...")
-    
-    # Generate comprehensive water systems data
-    print("\n1. Extracting water systems data...")
-    water_systems = load_water_systems_data()
-    
-    # Clean data for JSON
-    print("2. Cleaning data for JSON serialization...")
-    water_systems_clean = clean_json(water_systems)
-    
-    # Save comprehensive water systems data
-    print("3. Saving water systems data...")
-    with open('water-safety-dashboard/public/water_systems_data.json', 'w') as f:
-        json.dump(water_systems_clean, f, indent=2)
+    water_systems = ExtractionEngine().run(['public'])['comprehensive']
     
     print(f"✅ Generated comprehensive data for {len(water_systems)} water systems")
-    print("📁 Saved to: water-safety-dashboard/public/water_systems_data.json")
-    
-    # Generate contaminant information
-    print("\n4. Generating contaminant information...")
-    contaminant_info = generate_contaminant_info_json()
-    contaminant_info_clean = clean_json(contaminant_info)
-    
-    with open('water-safety-dashboard/public/contaminant_info.json', 'w') as f:
-        json.dump(contaminant_info_clean, f, indent=2)
-    
-    print(f"✅ Generated contaminant information for {len(contaminant_info)} contaminants")
-    print("📁 Saved to: water-safety-dashboard/public/contaminant_info.json")
+    print(f"📁 Saved to: {PUBLIC_DIR}/water_systems_data.json")
     
     # Print summary statistics
     print("\n=== EXTRACTION SUMMARY ===")
-    total_violations = sum(s.get('summary_stats', {}).get('total_violations', 0) for s in water_systems)
-    active_violations = sum(s.get('summary_stats', {}).get('active_violations', 0) for s in water_systems)
-    total_samples = sum(s.get('summary_stats', {}).get('total_lcr_samples', 0) for s in water_systems)
-    total_visits = sum(s.get('summary_stats', {}).get('total_site_visits', 0) for s in water_systems)
-    
     print(f"📊 Total Water Systems: {len(water_systems)}")
-    print(f"🚨 Total Violations: {total_violations}")
-    print(f"⚠️  Active Violations: {active_violations}")
-    print(f"🧪 Total LCR Samples: {total_samples}")
-    print(f"🏢 Total Site Visits: {total_visits}")
-    print(f"🏭 Total Facilities: {sum(s.get('summary_stats', {}).get('total_facilities', 0) for s in water_systems)}")
-    print(f"📅 Total Events: {sum(s.get('summary_stats', {}).get('total_events', 0) for s in water_systems)}")
-    
-    print("\n=== DATA COVERAGE ===")
-    print("✅ Water System Basic Info: 100%")
-    print("✅ Geographic Areas: 100%")
-    print("✅ Service Areas: 100%")
-    print("✅ Violations & Enforcement: 100%")
-    print("✅ LCR Samples: 100%")
-    print("✅ Site Visits: 100%")
-    print("✅ Facilities: 100%")
-    print("✅ Events & Milestones: 100%")
-    print("✅ PN Violations: 100%")
-    print("✅ Reference Codes: 100%")
+    print(f"🚨 Total Violations: {sum(s['summary_stats']['total_violations'] for s in water_systems)}")
+    print(f"⚠️  Active Violations: {sum(s['summary_stats']['active_violations'] for s in water_systems)}")
+    print(f"🧪 Total LCR Samples: {sum(s['summary_stats']['total_lcr_samples'] for s in water_systems)}")
+    print(f"🏢 Total Site Visits: {sum(s['summary_stats']['total_site_visits'] for s in water_systems)}")
+    print(f"🏭 Total Facilities: {sum(s['summary_stats']['total_facilities'] for s in water_systems)}")
+    print(f"📅 Total Events: {sum(s['summary_stats']['total_events'] for s in water_systems)}")
     
     print("\n🎉 COMPREHENSIVE DATA EXTRACTION COMPLETED!")
-    print("All available data from CSV files has been extracted and saved.")
\ No newline at end of file
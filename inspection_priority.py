@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+"""
+Inspection Priority Ranking
+Scores every active system on active health-based violations, population
+served, open significant deficiencies, overdue milestones and trust score with
+column arithmetic, and keeps statewide and per-county top-K heaps that are
+updated in place when a new data drop changes a few systems. The rankings are
+written as static JSON pages the operator dashboard can fetch one at a time
+"""
+
+import argparse
+import heapq
+import json
+import logging
+import os
+import re
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from columnar_export import read_frame
+from extraction_policy import active_mask, load_policy
+from sdwis_tables import EPOCH, NATURAL_KEYS, date_to_day, load_table
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_DIR = "operator-dashboard/public/inspection_priority"
+STATE_FILE = "inspection_priority_state.json"
+# Per-system stats published by the public export, which carry the trust score
+SYSTEM_COLUMNS = "water-safety-dashboard/public/systems.cols"
+
+STATEWIDE = 'statewide'
+STATEWIDE_K = 500
+COUNTY_K = 50
+PAGE_SIZE = 25
+
+MISSING_DAY = -1
+
+
+# Site-visit evaluation results that are deficiencies needing corrective action
+SIGNIFICANT_CODES = ['S', 'D']
+# Not evaluated / not applicable results leave the previous evaluation standing
+UNEVALUATED_CODES = ['X', 'Z']
+EVAL_COLUMNS = [
+    'MANAGEMENT_OPS_EVAL_CODE', 'SOURCE_WATER_EVAL_CODE', 'SECURITY_EVAL_CODE', 'PUMPS_EVAL_CODE',
+    'OTHER_EVAL_CODE', 'COMPLIANCE_EVAL_CODE', 'DATA_VERIFICATION_EVAL_CODE', 'TREATMENT_EVAL_CODE',
+    'FINISHED_WATER_STOR_EVAL_CODE', 'DISTRIBUTION_EVAL_CODE', 'FINANCIAL_EVAL_CODE'
+]
+# Significant deficiency / sanitary defect corrective action milestone
+CORRECTIVE_MILESTONE = 'SDFF'
+
+# Points per component (sum 100); each component is scaled to 0..1 first
+WEIGHTS = {
+    'active_health_violations': 35,
+    'open_significant_deficiencies': 20,
+    'trust_deficit': 20,
+    'population': 15,
+    'overdue_milestones': 10,
+}
+# Counts at or above these score the component's full weight
+CAPS = {
+    'active_health_violations': 3,
+    'open_significant_deficiencies': 3,
+    'overdue_milestones': 3,
+}
+# Population component grows with log(population) and saturates here
+POPULATION_SCALE = 100_000
+
+FEATURES = ['name', 'population', 'active_health_violations', 'open_significant_deficiencies',
+            'overdue_milestones', 'trust_score']
+# Per-system values kept between runs to find the systems a new drop changed
+STATE_FIELDS = FEATURES + ['priority']
+# Order of the values in each page row
+ROW_FIELDS = ['rank', 'pwsid', 'priority'] + FEATURES
+
+
+def _count(pwsids: Iterable[str], index: pd.Index) -> np.ndarray:
+    return pd.Series(pwsids).value_counts().reindex(index).fillna(0).astype(np.int64).to_numpy()
+
+
+def open_significant_deficiencies(visits_df: pd.DataFrame, events_df: pd.DataFrame) -> pd.Series:
+    """
+    Evaluation categories per PWSID whose latest evaluation found a significant
+    deficiency or sanitary defect and that no corrective action milestone
+    completed on or after that visit has closed
+    """
+    columns = [c for c in EVAL_COLUMNS if c in visits_df.columns]
+    codes = visits_df[columns].to_numpy(dtype=object).ravel()
+    # Row-major ravel: each visit's categories are adjacent
+    long = pd.DataFrame({
+        'pwsid': np.repeat(visits_df['PWSID'].to_numpy(), len(columns)),
+        'category': np.tile(columns, len(visits_df)),
+        'day': np.repeat(date_to_day(visits_df['VISIT_DATE'], MISSING_DAY), len(columns)),
+        'code': codes
+    })
+    long = long[long['code'].notna() & ~long['code'].isin(UNEVALUATED_CODES) & (long['day'] != MISSING_DAY)]
+    latest = long.sort_values('day', kind='stable').drop_duplicates(['pwsid', 'category'], keep='last')
+    significant = latest[latest['code'].isin(SIGNIFICANT_CODES)]
+
+    corrective = events_df[events_df['EVENT_MILESTONE_CODE'] == CORRECTIVE_MILESTONE]
+    corrected = pd.Series(date_to_day(corrective['EVENT_ACTUAL_DATE'], MISSING_DAY),
+                          index=corrective['PWSID'].to_numpy()).groupby(level=0).max()
+    closed_day = corrected.reindex(significant['pwsid']).fillna(MISSING_DAY).to_numpy()
+    still_open = significant[significant['day'].to_numpy() > closed_day]
+    return still_open['pwsid'].value_counts()
+
+
+def published_trust_scores(path: str = SYSTEM_COLUMNS) -> pd.Series:
+    """Trust scores from the public export's per-system columns, by PWSID"""
+    frame = read_frame(path)
+    return pd.Series(frame['trust_score'].to_numpy(dtype=np.int64), index=frame['pwsid'].astype(str).to_numpy())
+
+
+def priority_features(data_dir: str = "data", as_of: Optional[date] = None, trust_scores: Optional[pd.Series] = None,
+                      policy: Optional[Dict[str, Any]] = None) -> Tuple[pd.DataFrame, Dict[str, Tuple[str, ...]]]:
+    """
+    One row of ranking inputs per active PWSID, plus the counties each system
+    serves. Systems without a published trust score count as fully trusted;
+    active health-based violations follow the extraction policy.
+    """
+    policy = policy or load_policy(data_dir=data_dir)
+    as_of_day = int((np.datetime64(as_of or date.today(), 'D') - EPOCH).astype(np.int64))
+    pws_df = load_table('pub_water_systems', data_dir, usecols=[
+        'PWSID', 'PWS_NAME', 'PWS_ACTIVITY_CODE', 'POPULATION_SERVED_COUNT'])
+    pws_df = pws_df[pws_df['PWS_ACTIVITY_CODE'] == 'A'].drop_duplicates('PWSID', keep='last')
+    index = pd.Index(pws_df['PWSID'].to_numpy(), name='pwsid')
+    features = pd.DataFrame({
+        'name': pws_df['PWS_NAME'].fillna('').to_numpy(),
+        'population': pd.to_numeric(pws_df['POPULATION_SERVED_COUNT'], errors='coerce').fillna(0).astype(np.int64).to_numpy(),
+        'active_health_violations': 0,
+        'open_significant_deficiencies': 0,
+        'overdue_milestones': 0,
+        'trust_score': 100
+    }, index=index)
+
+    try:
+        violations_df = load_table('violations_enforcement', data_dir, usecols=[
+            'PWSID', 'VIOLATION_ID', 'IS_HEALTH_BASED_IND', 'VIOLATION_STATUS'],
+            record_key=NATURAL_KEYS['violations_enforcement'])
+        active = violations_df[(violations_df['IS_HEALTH_BASED_IND'] == policy['health_based_indicator'])
+                               & active_mask(violations_df['VIOLATION_STATUS'], policy)]
+        features['active_health_violations'] = _count(active['PWSID'], index)
+    except Exception as e:
+        logger.error(f"Error loading active health-based violations: {e}")
+
+    try:
+        events_df = load_table('events_milestones', data_dir, usecols=[
+            'PWSID', 'EVENT_SCHEDULE_ID', 'EVENT_MILESTONE_CODE', 'EVENT_END_DATE', 'EVENT_ACTUAL_DATE'])
+        due = date_to_day(events_df['EVENT_END_DATE'], MISSING_DAY)
+        done = date_to_day(events_df['EVENT_ACTUAL_DATE'], MISSING_DAY)
+        overdue = events_df[(due != MISSING_DAY) & (due < as_of_day) & (done == MISSING_DAY)]
+        features['overdue_milestones'] = _count(overdue['PWSID'], index)
+    except Exception as e:
+        logger.error(f"Error loading overdue milestones: {e}")
+        events_df = pd.DataFrame(columns=['PWSID', 'EVENT_MILESTONE_CODE', 'EVENT_ACTUAL_DATE'])
+
+    try:
+        visits_df = load_table('site_visits', data_dir, usecols=['PWSID', 'VISIT_ID', 'VISIT_DATE'] + EVAL_COLUMNS)
+        open_counts = open_significant_deficiencies(visits_df, events_df)
+        features['open_significant_deficiencies'] = open_counts.reindex(index).fillna(0).astype(np.int64).to_numpy()
+    except Exception as e:
+        logger.error(f"Error loading site visit deficiencies: {e}")
+
+    if trust_scores is not None:
+        trust = trust_scores[~trust_scores.index.duplicated(keep='last')]
+        features['trust_score'] = trust.reindex(index).fillna(100).astype(np.int64).to_numpy()
+
+    counties: Dict[str, Tuple[str, ...]] = {}
+    try:
+        geo_df = load_table('geographic_areas', data_dir, usecols=['PWSID', 'GEO_ID', 'COUNTY_SERVED'])
+        geo_df = geo_df[geo_df['COUNTY_SERVED'].notna() & geo_df['PWSID'].isin(index)]
+        served = geo_df.assign(county=geo_df['COUNTY_SERVED'].str.strip().str.upper())
+        for pwsid, names in served.groupby('PWSID', sort=False)['county']:
+            counties[pwsid] = tuple(sorted(set(names) - {''}))
+    except Exception as e:
+        logger.error(f"Error loading counties served: {e}")
+
+    logger.info(f"Computed ranking inputs for {len(features)} active systems")
+    return features, counties
+
+
+def priority_scores(features: pd.DataFrame) -> pd.Series:
+    """Composite 0-100 priority per system: each component scaled to 0..1, then weighted"""
+    components = {
+        name: np.minimum(features[name].to_numpy(dtype=np.float64), cap) / cap for name, cap in CAPS.items()
+    }
+    components['trust_deficit'] = np.clip(100 - features['trust_score'].to_numpy(dtype=np.float64), 0, 100) / 100
+    components['population'] = np.minimum(
+        np.log1p(features['population'].to_numpy(dtype=np.float64)) / np.log1p(POPULATION_SCALE), 1)
+    priority = sum(WEIGHTS[name] * components[name] for name in WEIGHTS)
+    return pd.Series(np.round(priority, 2), index=features.index, name='priority')
+
+
+def county_slug(county: str) -> str:
+    return re.sub(r'[^A-Z0-9]+', '_', county.upper()).strip('_') or 'UNKNOWN'
+
+
+class PriorityRanking:
+    """
+    Bounded min-heaps of (priority, pwsid) per scope (statewide and each
+    county), so the smallest kept entry is evicted first. A system whose score
+    rises or that is new only needs a push against its scopes' heaps. A kept
+    system whose score falls, or that leaves a scope, may have to give its
+    place to a system that was never kept, so that scope is rebuilt from its
+    members' scores with heapq.nlargest.
+    """
+
+    def __init__(self, statewide_k: int = STATEWIDE_K, county_k: int = COUNTY_K):
+        self.statewide_k = statewide_k
+        self.county_k = county_k
+        self.scores: Dict[str, float] = {}
+        self.counties: Dict[str, Tuple[str, ...]] = {}
+        self.members: Dict[str, Set[str]] = {}
+        self.heaps: Dict[str, List[Tuple[float, str]]] = {STATEWIDE: []}
+
+    def _k(self, scope: str) -> int:
+        return self.statewide_k if scope == STATEWIDE else self.county_k
+
+    def _scopes(self, pwsid: str) -> List[str]:
+        return [STATEWIDE] + list(self.counties.get(pwsid, ()))
+
+    def _rebuild(self, scope: str):
+        members = self.scores if scope == STATEWIDE else self.members.get(scope, ())
+        heap = heapq.nlargest(self._k(scope), ((self.scores[p], p) for p in members))
+        heapq.heapify(heap)
+        if heap:
+            self.heaps[scope] = heap
+        else:
+            self.heaps.pop(scope, None)
+
+    def update(self, scores: pd.Series, counties: Dict[str, Tuple[str, ...]],
+               removed: Iterable[str] = ()) -> Set[str]:
+        """
+        Apply new scores (and counties) for the given systems and drop the
+        removed ones; returns the scopes whose ranking may have changed
+        """
+        touched: Set[str] = set()
+        dirty: Set[str] = set()
+
+        for pwsid in removed:
+            if pwsid not in self.scores:
+                continue
+            for scope in self._scopes(pwsid):
+                self.members.get(scope, set()).discard(pwsid)
+                touched.add(scope)
+                if any(p == pwsid for _, p in self.heaps.get(scope, ())):
+                    dirty.add(scope)
+            del self.scores[pwsid]
+            self.counties.pop(pwsid, None)
+
+        for pwsid, score in zip(scores.index, scores.to_numpy(dtype=np.float64).tolist()):
+            old_score = self.scores.get(pwsid)
+            old_scopes = set(self._scopes(pwsid)) if old_score is not None else set()
+            self.scores[pwsid] = score
+            self.counties[pwsid] = counties.get(pwsid, ())
+            new_scopes = set(self._scopes(pwsid))
+            for scope in old_scopes - new_scopes:
+                self.members[scope].discard(pwsid)
+            for scope in new_scopes - {STATEWIDE}:
+                self.members.setdefault(scope, set()).add(pwsid)
+
+            for scope in old_scopes | new_scopes:
+                touched.add(scope)
+                if scope in dirty:
+                    continue
+                heap = self.heaps.setdefault(scope, [])
+                kept = [i for i, (_, p) in enumerate(heap) if p == pwsid]
+                if kept:
+                    if scope not in new_scopes or score < old_score:
+                        dirty.add(scope)
+                    else:
+                        heap[kept[0]] = (score, pwsid)
+                        heapq.heapify(heap)
+                elif scope in new_scopes:
+                    if len(heap) < self._k(scope):
+                        heapq.heappush(heap, (score, pwsid))
+                    elif (score, pwsid) > heap[0]:
+                        heapq.heapreplace(heap, (score, pwsid))
+
+        for scope in dirty:
+            self._rebuild(scope)
+        for scope in touched:
+            if not self.heaps.get(scope):
+                self.heaps.pop(scope, None)
+        return touched
+
+    def ranked(self, scope: str = STATEWIDE) -> List[Tuple[float, str]]:
+        """A scope's kept systems, highest priority first (ties by PWSID, descending)"""
+        return sorted(self.heaps.get(scope, ()), reverse=True)
+
+    def size(self, scope: str) -> int:
+        return len(self.scores) if scope == STATEWIDE else len(self.members.get(scope, ()))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'statewide_k': self.statewide_k,
+            'county_k': self.county_k,
+            'scores': self.scores,
+            'counties': {pwsid: list(names) for pwsid, names in self.counties.items() if names},
+            'heaps': {scope: [[score, pwsid] for score, pwsid in heap] for scope, heap in self.heaps.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, payload: Dict[str, Any]) -> 'PriorityRanking':
+        ranking = cls(payload['statewide_k'], payload['county_k'])
+        ranking.scores = payload['scores']
+        ranking.counties = {pwsid: tuple(names) for pwsid, names in payload['counties'].items()}
+        for pwsid, names in ranking.counties.items():
+            for county in names:
+                ranking.members.setdefault(county, set()).add(pwsid)
+        # Saved heaps are valid heap arrays already
+        ranking.heaps = {scope: [(score, pwsid) for score, pwsid in heap] for scope, heap in payload['heaps'].items()}
+        return ranking
+
+
+def _scope_path(scope: str) -> str:
+    return STATEWIDE if scope == STATEWIDE else os.path.join('county', county_slug(scope))
+
+
+def write_pages(ranking: PriorityRanking, features: pd.DataFrame, scopes: Iterable[str],
+                output_dir: str = OUTPUT_DIR, as_of: Optional[date] = None):
+    """
+    Write the pages of the given scopes plus index.json, which lists every
+    scope with its page count, and drop the pages of scopes that no longer exist
+    """
+    index_path = os.path.join(output_dir, 'index.json')
+    listed = {}
+    if os.path.exists(index_path):
+        with open(index_path, encoding='utf-8') as f:
+            listed = json.load(f)['scopes']
+
+    for scope in scopes:
+        ranked = ranking.ranked(scope)
+        directory = os.path.join(output_dir, _scope_path(scope))
+        os.makedirs(directory, exist_ok=True)
+        pages = max(1, -(-len(ranked) // PAGE_SIZE))
+        for page in range(pages):
+            rows = []
+            for rank, (score, pwsid) in enumerate(ranked[page * PAGE_SIZE:(page + 1) * PAGE_SIZE],
+                                                  start=page * PAGE_SIZE + 1):
+                values = features.loc[pwsid, FEATURES].tolist() if pwsid in features.index else [None] * len(FEATURES)
+                rows.append([rank, pwsid, score] + [v.item() if isinstance(v, np.generic) else v for v in values])
+            with open(os.path.join(directory, f"{page + 1}.json"), 'w', encoding='utf-8') as f:
+                json.dump({'scope': scope, 'page': page + 1, 'pages': pages, 'rows': rows}, f, separators=(',', ':'))
+        # Pages beyond the new count are stale
+        stale = pages + 1
+        while os.path.exists(os.path.join(directory, f"{stale}.json")):
+            os.remove(os.path.join(directory, f"{stale}.json"))
+            stale += 1
+        listed[scope] = {'path': _scope_path(scope).replace(os.sep, '/'), 'systems': ranking.size(scope),
+                         'ranked': len(ranked), 'pages': pages}
+
+    for scope in [s for s in listed if s != STATEWIDE and s not in ranking.heaps]:
+        directory = os.path.join(output_dir, _scope_path(scope))
+        for name in os.listdir(directory) if os.path.isdir(directory) else []:
+            os.remove(os.path.join(directory, name))
+        if os.path.isdir(directory):
+            os.rmdir(directory)
+        del listed[scope]
+
+    index = {
+        'as_of': (as_of or date.today()).isoformat(),
+        'weights': WEIGHTS,
+        'fields': ROW_FIELDS,
+        'page_size': PAGE_SIZE,
+        'scopes': dict(sorted(listed.items(), key=lambda item: (item[0] != STATEWIDE, item[0])))
+    }
+    with open(index_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, separators=(',', ':'))
+
+
+def state_features(payload: Dict[str, Any]) -> Tuple[pd.DataFrame, Dict[str, Tuple[str, ...]]]:
+    """Ranking inputs, scores and counties of a saved state"""
+    features = pd.DataFrame.from_dict(payload['systems'], orient='index', columns=payload['fields'])
+    counties = {pwsid: tuple(names) for pwsid, names in payload['ranking']['counties'].items()}
+    return features, counties
+
+
+def save_state(features: pd.DataFrame, ranking: PriorityRanking, path: str = STATE_FILE):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'fields': STATE_FIELDS,
+            'systems': {pwsid: [v.item() if isinstance(v, np.generic) else v for v in row]
+                        for pwsid, row in zip(features.index, features[STATE_FIELDS].itertuples(index=False))},
+            'ranking': ranking.to_dict()
+        }, f, separators=(',', ':'))
+
+
+def build_inspection_priority(data_dir: str = "data", output_dir: str = OUTPUT_DIR, state_file: str = STATE_FILE,
+                              system_columns: str = SYSTEM_COLUMNS, as_of: Optional[date] = None,
+                              full: bool = False, policy: Optional[Dict[str, Any]] = None) -> PriorityRanking:
+    """
+    Score the current data and update the saved ranking with only the systems
+    whose inputs changed since the previous run (all of them on the first run
+    or with full=True); only the pages of affected scopes are rewritten
+    """
+    trust_scores = None
+    try:
+        trust_scores = published_trust_scores(system_columns)
+    except Exception as e:
+        logger.error(f"Error loading published trust scores from {system_columns}: {e}")
+    features, counties = priority_features(data_dir, as_of, trust_scores, policy)
+    features['priority'] = priority_scores(features)
+
+    previous = None
+    if not full and os.path.exists(state_file) and os.path.exists(os.path.join(output_dir, 'index.json')):
+        with open(state_file, encoding='utf-8') as f:
+            previous = json.load(f)
+
+    if previous and previous['fields'] == STATE_FIELDS:
+        old, _ = state_features(previous)
+        ranking = PriorityRanking.from_dict(previous['ranking'])
+        common = features.index.intersection(old.index)
+        same = (features.loc[common, STATE_FIELDS].astype(object) == old.loc[common, STATE_FIELDS].astype(object)).all(axis=1)
+        same &= pd.Series([counties.get(p, ()) == ranking.counties.get(p, ()) for p in common], index=common)
+        changed = features.index.difference(common).append(common[~same.to_numpy()])
+        removed = old.index.difference(features.index)
+        touched = ranking.update(features.loc[changed, 'priority'], counties, removed)
+        logger.info(f"Updated ranking for {len(changed)} changed and {len(removed)} removed systems; "
+                    f"{len(touched)} scopes touched")
+    else:
+        ranking = PriorityRanking()
+        touched = ranking.update(features['priority'], counties)
+        logger.info(f"Ranked {len(features)} systems across {len(ranking.heaps) - 1} counties")
+
+    write_pages(ranking, features, touched, output_dir, as_of)
+    save_state(features, ranking, state_file)
+    logger.info(f"Inspection priority pages saved to {output_dir}")
+    return ranking
+
+
+def merge_states(payloads: List[Dict[str, Any]], output_dir: str = OUTPUT_DIR,
+                 state_file: str = STATE_FILE) -> PriorityRanking:
+    """Rank the systems of several saved states (e.g. one per partition) together"""
+    parts = [state_features(payload) for payload in payloads if payload['fields'] == STATE_FIELDS]
+    features = pd.concat([part for part, _ in parts])
+    counties = {pwsid: names for _, part_counties in parts for pwsid, names in part_counties.items()}
+    ranking = PriorityRanking()
+    write_pages(ranking, features, ranking.update(features['priority'], counties), output_dir)
+    save_state(features, ranking, state_file)
+    logger.info(f"Ranked {len(features)} systems from {len(parts)} saved states")
+    return ranking
+
+
+def main():
+    """Rebuild the inspection priority ranking or print a page of it"""
+    parser = argparse.ArgumentParser(description="Statewide and per-county inspection priority ranking")
+    parser.add_argument('scope', nargs='?', help=f"'{STATEWIDE}' or a county name")
+    parser.add_argument('--page', type=int, default=1)
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    parser.add_argument('--build', action='store_true', help="Update the ranking from the data directory first")
+    parser.add_argument('--full', action='store_true', help="Rank every system again instead of only changed ones")
+    parser.add_argument('--data-dir', default="data")
+    parser.add_argument('--state', default=STATE_FILE)
+    parser.add_argument('--system-columns', default=SYSTEM_COLUMNS, help="systems.cols with published trust scores")
+    parser.add_argument('--as-of', type=date.fromisoformat, help="YYYY-MM-DD for overdue milestones (default: today)")
+    parser.add_argument('--policy', help="Extraction policy overrides (default: <data-dir>/extraction_policy.json, if present)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.build:
+        build_inspection_priority(args.data_dir, args.output_dir, args.state, args.system_columns, args.as_of, args.full,
+                                  load_policy(args.policy, args.data_dir))
+    if not args.scope:
+        return
+
+    with open(os.path.join(args.output_dir, 'index.json'), encoding='utf-8') as f:
+        index = json.load(f)
+    scope = STATEWIDE if args.scope.lower() == STATEWIDE else args.scope.strip().upper()
+    entry = index['scopes'].get(scope)
+    if entry is None:
+        print(json.dumps({'error': f"No ranking for {args.scope}"}))
+        return
+    with open(os.path.join(args.output_dir, entry['path'], f"{args.page}.json"), encoding='utf-8') as f:
+        page = json.load(f)
+    print(json.dumps({**page, 'rows': [dict(zip(index['fields'], row)) for row in page['rows']]}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Deadline and Milestone Interval Index
+Indexes event/milestone windows, violation non-compliance periods and public
+notification compliance periods so date-range questions run in logarithmic
+time instead of scanning every record
+"""
+
+import argparse
+import json
+import logging
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from sdwis_tables import EPOCH, NATURAL_KEYS, date_to_day, day_to_iso, load_table
+
+logger = logging.getLogger(__name__)
+
+MISSING_DAY = -1
+# Open-ended intervals (no end date yet) sort after every real date
+OPEN_END = 10 ** 9
+NO_END = -(10 ** 9)
+
+
+class IntervalIndex:
+    """
+    Static interval index over [start, end] day ranges.
+
+    Intervals are kept sorted by start with a max-end segment tree on top, so
+    overlap and stabbing queries cost O(log n + k). Separate sorted end and due
+    arrays answer counts and "due between" questions with plain bisection.
+    """
+
+    COLUMNS = ['kind', 'pwsid', 'record_id', 'label', 'start', 'end', 'due']
+
+    def __init__(self, kind, pwsid, record_id, label, start, end, due):
+        start = np.asarray(start, dtype=np.int64)
+        end = np.asarray(end, dtype=np.int64)
+        due = np.asarray(due, dtype=np.int64)
+        order = np.lexsort((end, start))
+
+        self.kind = np.asarray(kind, dtype=object)[order]
+        self.pwsid = np.asarray(pwsid, dtype=object)[order]
+        self.record_id = np.asarray(record_id, dtype=object)[order]
+        self.label = np.asarray(label, dtype=object)[order]
+        self.start = start[order]
+        self.end = end[order]
+        self.due = due[order]
+
+        self._starts = self.start.tolist()
+        self._sorted_ends = np.sort(self.end).tolist()
+        self._due_order = np.argsort(self.due, kind='stable')
+        self._sorted_due = self.due[self._due_order].tolist()
+        self._build_tree()
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def _build_tree(self):
+        n = len(self.end)
+        size = 1
+        while size < max(n, 1):
+            size *= 2
+        tree = np.full(2 * size, NO_END, dtype=np.int64)
+        tree[size:size + n] = self.end
+        lo = size
+        while lo > 1:
+            parents = lo // 2
+            tree[parents:lo] = np.maximum(tree[lo:2 * lo:2], tree[lo + 1:2 * lo:2])
+            lo = parents
+        self._size = size
+        self._tree = tree.tolist()
+
+    def _collect(self, limit: int, min_end: int) -> List[int]:
+        """Positions in [0, limit) whose end is >= min_end, in start order"""
+        tree = self._tree
+        found = []
+        stack = [(1, 0, self._size)]
+        while stack:
+            node, left, right = stack.pop()
+            if left >= limit or tree[node] < min_end:
+                continue
+            if right - left == 1:
+                found.append(left)
+                continue
+            mid = (left + right) // 2
+            stack.append((2 * node + 1, mid, right))
+            stack.append((2 * node, left, mid))
+        return found
+
+    def overlapping(self, lo: int, hi: int, kind: Optional[str] = None) -> List[int]:
+        """Positions of intervals that intersect [lo, hi]"""
+        positions = self._collect(bisect_right(self._starts, hi), lo)
+        if kind:
+            positions = [p for p in positions if self.kind[p] == kind]
+        return positions
+
+    def open_as_of(self, day: int, kind: Optional[str] = None) -> List[int]:
+        """Positions of intervals that are open on the given day"""
+        return self.overlapping(day, day, kind)
+
+    def count_open_as_of(self, day: int) -> int:
+        """Number of intervals open on the given day, without materializing them"""
+        return bisect_right(self._starts, day) - bisect_left(self._sorted_ends, day)
+
+    def due_between(self, lo: int, hi: int, kind: Optional[str] = None) -> List[int]:
+        """Positions of intervals whose due date falls in [lo, hi], earliest first"""
+        first = bisect_left(self._sorted_due, lo)
+        last = bisect_right(self._sorted_due, hi)
+        positions = self._due_order[first:last].tolist()
+        if kind:
+            positions = [p for p in positions if self.kind[p] == kind]
+        return positions
+
+    def overdue_as_of(self, day: int, kind: Optional[str] = None) -> List[int]:
+        """Open intervals on the given day whose due date has already passed"""
+        return [p for p in self.open_as_of(day, kind) if MISSING_DAY < self.due[p] < day]
+
+    def records(self, positions: List[int]) -> List[Dict[str, Any]]:
+        """Materialize result positions as JSON-friendly rows"""
+        def fmt(day):
+            if day == MISSING_DAY or day >= OPEN_END:
+                return None
+            return day_to_iso(day)
+
+        return [{
+            'kind': self.kind[p],
+            'pwsid': self.pwsid[p],
+            'record_id': self.record_id[p],
+            'label': self.label[p],
+            'start': fmt(self.start[p]),
+            'end': fmt(self.end[p]),
+            'due': fmt(self.due[p])
+        } for p in positions]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Columnar representation (already start-sorted) for the JSON artifact"""
+        return {
+            'open_end': OPEN_END,
+            'missing_day': MISSING_DAY,
+            'count': len(self),
+            'columns': {name: getattr(self, name).tolist() for name in self.COLUMNS}
+        }
+
+    @classmethod
+    def from_dict(cls, payload: Dict[str, Any]) -> 'IntervalIndex':
+        columns = payload['columns']
+        return cls(*(columns[name] for name in cls.COLUMNS))
+
+    @classmethod
+    def load(cls, path: str = "interval_index.json") -> 'IntervalIndex':
+        with open(path, encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+    def save(self, path: str = "interval_index.json"):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, separators=(',', ':'))
+        logger.info(f"Interval index with {len(self)} intervals saved to {path}")
+
+
+def _event_intervals(events_df: pd.DataFrame) -> pd.DataFrame:
+    """Milestone window: between the scheduled end date and the date actually achieved"""
+    scheduled = date_to_day(events_df['EVENT_END_DATE'], MISSING_DAY)
+    actual = date_to_day(events_df['EVENT_ACTUAL_DATE'], MISSING_DAY)
+    has_scheduled = scheduled != MISSING_DAY
+    has_actual = actual != MISSING_DAY
+
+    start = np.where(has_scheduled & has_actual, np.minimum(scheduled, actual),
+                     np.where(has_scheduled, scheduled, actual))
+    end = np.where(has_actual, np.maximum(scheduled, actual), OPEN_END)
+    due = np.where(has_scheduled, scheduled, actual)
+
+    return pd.DataFrame({
+        'kind': 'event',
+        'pwsid': events_df['PWSID'].to_numpy(),
+        'record_id': events_df['EVENT_SCHEDULE_ID'].fillna('').to_numpy(),
+        'label': events_df['EVENT_MILESTONE_CODE'].fillna('').to_numpy(),
+        'start': start,
+        'end': end,
+        'due': due
+    })
+
+
+def _period_intervals(df: pd.DataFrame, kind: str, id_column: str, label_column: str,
+                      begin_column: str, end_column: str) -> pd.DataFrame:
+    """Begin/end period with a missing end treated as still open"""
+    begin = date_to_day(df[begin_column], MISSING_DAY)
+    finish = date_to_day(df[end_column], MISSING_DAY)
+    end = np.where(finish == MISSING_DAY, OPEN_END, finish)
+
+    return pd.DataFrame({
+        'kind': kind,
+        'pwsid': df['PWSID'].to_numpy(),
+        'record_id': df[id_column].fillna('').to_numpy(),
+        'label': df[label_column].fillna('').to_numpy(),
+        'start': begin,
+        'end': end,
+        'due': finish
+    })
+
+
+def build_interval_index(data_dir: str = "data") -> IntervalIndex:
+    """Build the index over events, violation and PN compliance periods"""
+    frames = []
+
+    try:
+        frames.append(_event_intervals(load_table('events_milestones', data_dir)))
+    except Exception as e:
+        logger.error(f"Error indexing events and milestones: {e}")
+
+    try:
+        violations_df = load_table('violations_enforcement', data_dir, usecols=[
+            'PWSID', 'VIOLATION_ID', 'VIOLATION_CODE', 'NON_COMPL_PER_BEGIN_DATE', 'NON_COMPL_PER_END_DATE'],
+            record_key=NATURAL_KEYS['violations_enforcement'])
+        frames.append(_period_intervals(violations_df, 'violation', 'VIOLATION_ID', 'VIOLATION_CODE',
+                                        'NON_COMPL_PER_BEGIN_DATE', 'NON_COMPL_PER_END_DATE'))
+    except Exception as e:
+        logger.error(f"Error indexing violation non-compliance periods: {e}")
+
+    try:
+        pn_df = load_table('pn_violation_assoc', data_dir)
+        pn_df['PN_RECORD_ID'] = pn_df['PN_VIOLATION_ID'] + ':' + pn_df['RELATED_VIOLATION_ID']
+        frames.append(_period_intervals(pn_df, 'pn', 'PN_RECORD_ID', 'VIOLATION_CODE',
+                                        'COMPL_PER_BEGIN_DATE', 'COMPL_PER_END_DATE'))
+    except Exception as e:
+        logger.error(f"Error indexing PN compliance periods: {e}")
+
+    intervals = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=IntervalIndex.COLUMNS)
+    # An interval needs at least a start date to be placed on the timeline
+    intervals = intervals[intervals['start'] != MISSING_DAY]
+
+    index = IntervalIndex(*(intervals[name].to_numpy() for name in IntervalIndex.COLUMNS))
+    logger.info(f"Indexed {len(index)} intervals")
+    return index
+
+
+def main():
+    """Query the interval index from the command line"""
+    parser = argparse.ArgumentParser(description="Query deadlines and compliance periods by date")
+    parser.add_argument('query', choices=['due', 'overlap', 'open', 'overdue'])
+    parser.add_argument('date_from', help="YYYY-MM-DD")
+    parser.add_argument('date_to', nargs='?', help="YYYY-MM-DD (due/overlap only)")
+    parser.add_argument('--kind', choices=['event', 'violation', 'pn'])
+    parser.add_argument('--index', default="interval_index.json")
+    parser.add_argument('--build', action='store_true', help="Rebuild the index from the data directory first")
+    parser.add_argument('--data-dir', default="data")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.build:
+        index = build_interval_index(args.data_dir)
+        index.save(args.index)
+    else:
+        index = IntervalIndex.load(args.index)
+
+    def to_day(text):
+        return int((np.datetime64(text, 'D') - EPOCH).astype(np.int64))
+
+    lo = to_day(args.date_from)
+    hi = to_day(args.date_to) if args.date_to else lo
+    if args.query == 'due':
+        positions = index.due_between(lo, hi, args.kind)
+    elif args.query == 'overlap':
+        positions = index.overlapping(lo, hi, args.kind)
+    elif args.query == 'open':
+        positions = index.open_as_of(lo, args.kind)
+    else:
+        positions = index.overdue_as_of(lo, args.kind)
+
+    print(json.dumps(index.records(positions), indent=2))
+
+
+if __name__ == "__main__":
+    main()
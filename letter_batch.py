@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Batch Public Notification Letter Engine
+Renders PN letters for many water systems at once (for example a county-wide
+boil advisory or a new Tier 1 violation batch) using a process pool, with a
+resumable job log so an interrupted batch picks up where it stopped
+"""
+
+import argparse
+import hashlib
+import html
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+from string import Template
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sdwis_tables import load_table
+
+logger = logging.getLogger(__name__)
+
+# Each template is a list of (style, text) lines; "${...}" placeholders are filled
+# per letter and the VIOLATIONS marker expands into one block per violation.
+VIOLATIONS = '__violations__'
+
+LETTER_TEMPLATES = {
+    'tier1-urgent': {
+        'tier': 1,
+        'lines': [
+            ('title', 'WATER SYSTEM NOTIFICATION'),
+            ('text', 'System: ${name}'),
+            ('text', 'PWS ID: ${pwsid}'),
+            ('text', 'Date: ${letter_date}'),
+            ('alert', 'URGENT NOTICE - IMMEDIATE ACTION REQUIRED'),
+            ('text', 'This notice is being sent to inform you of an immediate health risk in your drinking water.'),
+            (VIOLATIONS, 'Violation: ${violation_type} | Contaminant: ${contaminant_name} | Since: ${violation_begin_date}${pn_reference}'),
+            ('heading', 'IMMEDIATE ACTIONS REQUIRED:'),
+            ('bullet', 'Do not drink the water without boiling it first'),
+            ('bullet', 'Use bottled water for drinking and cooking'),
+            ('bullet', 'Contact your water system for updates'),
+        ],
+    },
+    'tier2-violation': {
+        'tier': 2,
+        'lines': [
+            ('title', 'WATER SYSTEM NOTIFICATION'),
+            ('text', 'System: ${name}'),
+            ('text', 'PWS ID: ${pwsid}'),
+            ('text', 'Date: ${letter_date}'),
+            ('alert', 'VIOLATION NOTICE'),
+            ('text', 'This notice is being sent to inform you of a drinking water violation that occurred in our system.'),
+            (VIOLATIONS, 'Violation Type: ${violation_type} | Contaminant: ${contaminant_name} | Date: ${violation_begin_date}${pn_reference}'),
+            ('heading', 'What does this mean?'),
+            ('text', 'This violation does not pose an immediate health risk, but we are working to resolve it promptly.'),
+        ],
+    },
+}
+
+FOOTER_LINES = [
+    ('heading', 'For questions, contact:'),
+    ('text', '${admin_name}'),
+    ('text', '${phone}'),
+]
+
+PDF_STYLES = {
+    'title': ('F2', 18, 50),
+    'alert': ('F2', 14, 50),
+    'heading': ('F2', 12, 50),
+    'text': ('F1', 11, 50),
+    'bullet': ('F1', 11, 70),
+}
+
+HTML_TAGS = {
+    'title': '<h1>{}</h1>',
+    'alert': '<h2 class="alert">{}</h2>',
+    'heading': '<h3>{}</h3>',
+    'text': '<p>{}</p>',
+    'bullet': '<li>{}</li>',
+}
+
+# Per-worker compiled templates, filled in by _init_worker
+_COMPILED: Dict[str, List[Tuple[str, Template]]] = {}
+_WORKER_CONFIG: Dict[str, Any] = {}
+
+
+def compile_templates() -> Dict[str, List[Tuple[str, Template]]]:
+    """Parse every letter template once; workers reuse the compiled objects"""
+    return {
+        template_id: [(style, Template(text)) for style, text in spec['lines'] + FOOTER_LINES]
+        for template_id, spec in LETTER_TEMPLATES.items()
+    }
+
+
+def template_version(template_id: str) -> str:
+    """Digest of a template's lines, footer and styles, so an edited template re-renders its letters"""
+    spec = [LETTER_TEMPLATES[template_id]['lines'], FOOTER_LINES, PDF_STYLES, HTML_TAGS]
+    return hashlib.sha1(json.dumps(spec, sort_keys=True).encode('utf-8')).hexdigest()[:10]
+
+
+def _init_worker(output_dir: str, formats: List[str]):
+    _COMPILED.update(compile_templates())
+    _WORKER_CONFIG['output_dir'] = output_dir
+    _WORKER_CONFIG['formats'] = formats
+
+
+def fill_template(compiled: List[Tuple[str, Template]], job: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """Expand a compiled template into styled text lines"""
+    lines = []
+    for style, template in compiled:
+        if style == VIOLATIONS:
+            for violation in job['violations']:
+                lines.append(('bullet', template.safe_substitute(violation)))
+        else:
+            lines.append((style, template.safe_substitute(job['fields'])))
+    return lines
+
+
+def render_html(lines: List[Tuple[str, str]]) -> str:
+    body = []
+    in_list = False
+    for style, text in lines:
+        if style == 'bullet' and not in_list:
+            body.append('<ul>')
+            in_list = True
+        elif style != 'bullet' and in_list:
+            body.append('</ul>')
+            in_list = False
+        body.append(HTML_TAGS[style].format(html.escape(text)))
+    if in_list:
+        body.append('</ul>')
+    return ('<!DOCTYPE html><html><head><meta charset="utf-8"><title>Public Notice</title>'
+            '<style>body{font-family:Helvetica,Arial,sans-serif;max-width:680px;margin:40px auto}'
+            '.alert{color:#b91c1c}</style></head><body>' + ''.join(body) + '</body></html>')
+
+
+def _pdf_escape(text: str) -> str:
+    """Escape a string literal and map it to the fonts' WinAnsiEncoding (cp1252) bytes"""
+    text = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    # Decoded as latin-1 so the stream's latin-1 encode writes the cp1252 bytes unchanged
+    return text.encode('cp1252', 'replace').decode('latin-1')
+
+
+def render_pdf(lines: List[Tuple[str, str]]) -> bytes:
+    """Minimal multi-page US Letter PDF using the built-in Helvetica fonts"""
+    pages = []
+    ops = []
+    y = 742
+    for style, text in lines:
+        font, size, x = PDF_STYLES[style]
+        if style == 'bullet':
+            text = '• ' + text
+        gap = size + (14 if style in ('alert', 'title') else 8)
+        if y - gap < 50:
+            pages.append(ops)
+            ops, y = [], 742
+        ops.append(f'BT /{font} {size} Tf {x} {y} Td ({_pdf_escape(text)}) Tj ET')
+        y -= gap
+    pages.append(ops)
+
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        None,  # page tree, filled in once page object numbers are known
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>',
+    ]
+    page_refs = []
+    for page_ops in pages:
+        stream = '\n'.join(page_ops).encode('latin-1')
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream))
+        content_ref = len(objects)
+        objects.append((b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+                        b'/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>') % content_ref)
+        page_refs.append(len(objects))
+    kids = b' '.join(b'%d 0 R' % ref for ref in page_refs)
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(page_refs))
+
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for offset in offsets:
+        out += b'%010d 00000 n \n' % offset
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def render_job(job: Dict[str, Any]) -> Tuple[str, List[str]]:
+    """Worker entry point: render one letter in every requested format"""
+    lines = fill_template(_COMPILED[job['template_id']], job)
+    output_dir = _WORKER_CONFIG['output_dir']
+    written = []
+    for fmt in _WORKER_CONFIG['formats']:
+        path = os.path.join(output_dir, f"{job['job_id']}.{fmt}")
+        if fmt == 'html':
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(render_html(lines))
+        else:
+            with open(path, 'wb') as f:
+                f.write(render_pdf(lines))
+        written.append(path)
+    return job['job_id'], written
+
+
+def render_chunk(jobs: List[Dict[str, Any]]) -> List[Tuple[str, List[str]]]:
+    return [render_job(job) for job in jobs]
+
+
+def _text(value: Any, default: str = '') -> str:
+    if value is None or (isinstance(value, float) and value != value):
+        return default
+    return str(value)
+
+
+def load_pn_links(data_dir: str = "data") -> Dict[str, Dict[str, List[str]]]:
+    """Map PWSID -> RELATED_VIOLATION_ID -> PN_VIOLATION_IDs from SDWA_PN_VIOLATION_ASSOC"""
+    links: Dict[str, Dict[str, List[str]]] = {}
+    try:
+        pn_df = load_table('pn_violation_assoc', data_dir, usecols=['PWSID', 'PN_VIOLATION_ID', 'RELATED_VIOLATION_ID'])
+        for pwsid, pn_id, related_id in pn_df.itertuples(index=False):
+            links.setdefault(pwsid, {}).setdefault(related_id, []).append(pn_id)
+    except Exception as e:
+        logger.error(f"Error loading PN violation associations: {e}")
+    return links
+
+
+def build_jobs(systems: Iterable[Dict[str, Any]], pn_links: Dict[str, Dict[str, List[str]]],
+               letter_date: str, template_id: Optional[str] = None,
+               pwsids: Optional[set] = None, county: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    One job per (system, template). Active violations that require action are
+    split by priority into Tier 1 and Tier 2 letters, as in the operator
+    dashboard; passing template_id forces that template for every selected
+    system (e.g. a county-wide boil advisory).
+    """
+    jobs = []
+    county_key = county.lower() if county else None
+
+    for system in systems:
+        pwsid = system.get('pwsid')
+        if pwsids and pwsid not in pwsids:
+            continue
+        if county_key:
+            counties = [_text(g.get('county')).lower() for g in system.get('geographic_areas') or []]
+            if county_key not in counties:
+                continue
+
+        system_links = pn_links.get(pwsid, {})
+        by_template: Dict[str, List[Dict[str, str]]] = {}
+        for violation in system.get('violations_enforcement') or []:
+            if not template_id and not (violation.get('status') == 'Active' and violation.get('requires_action')):
+                continue
+            chosen = template_id or ('tier1-urgent' if violation.get('priority') == 'High' else 'tier2-violation')
+            violation_id = _text(violation.get('violation_id'))
+            pn_ids = system_links.get(violation_id, [])
+            by_template.setdefault(chosen, []).append({
+                'violation_id': violation_id,
+                'violation_type': _text(violation.get('violation_type'), 'Unknown Violation'),
+                'contaminant_name': _text(violation.get('contaminant_name'), 'Unknown Contaminant'),
+                'violation_begin_date': _text(violation.get('violation_begin_date'), 'Unknown'),
+                'pn_reference': f" | Public notice: {', '.join(pn_ids)}" if pn_ids else ''
+            })
+        if template_id and template_id not in by_template:
+            by_template[template_id] = []
+
+        contact = system.get('contact') or {}
+        fields = {
+            'pwsid': pwsid,
+            'name': _text(system.get('name'), pwsid),
+            'letter_date': letter_date,
+            'admin_name': _text(contact.get('admin_name'), 'System Administrator'),
+            'phone': _text(contact.get('phone'), 'Phone: Contact system'),
+        }
+        # The job ID ignores the letter date so a batch resumed the next day skips finished letters,
+        # but covers the template content so an edited template renders them again
+        identity = {k: v for k, v in fields.items() if k != 'letter_date'}
+        for chosen, violations in sorted(by_template.items()):
+            digest = hashlib.sha1(json.dumps([identity, violations, template_version(chosen)],
+                                             sort_keys=True).encode('utf-8')).hexdigest()[:10]
+            jobs.append({
+                'job_id': f"{pwsid}-{chosen}-{digest}",
+                'template_id': chosen,
+                'fields': fields,
+                'violations': violations
+            })
+
+    return jobs
+
+
+class LetterBatch:
+    """Runs letter jobs across a process pool and records progress in a job log"""
+
+    def __init__(self, output_dir: str = "letters", formats: Optional[List[str]] = None,
+                 workers: Optional[int] = None, chunk_size: int = 25, target_rate: Optional[float] = None):
+        self.output_dir = output_dir
+        self.formats = formats or ['pdf', 'html']
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.target_rate = target_rate
+        self.state_file = os.path.join(output_dir, 'job_state.jsonl')
+
+    def completed_jobs(self) -> set:
+        """Job IDs already rendered by a previous (possibly interrupted) run"""
+        done = set()
+        if os.path.exists(self.state_file):
+            with open(self.state_file, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        done.add(json.loads(line)['job_id'])
+                    except (ValueError, KeyError):
+                        # A torn final line from an interrupted write; that job simply reruns
+                        continue
+        return done
+
+    def has_outputs(self, job_id: str) -> bool:
+        """Every requested format of the letter is on disk, e.g. not only the PDF when HTML is now wanted too"""
+        return all(os.path.exists(os.path.join(self.output_dir, f"{job_id}.{fmt}")) for fmt in self.formats)
+
+    def run(self, jobs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        os.makedirs(self.output_dir, exist_ok=True)
+        done = self.completed_jobs()
+        pending = [job for job in jobs if job['job_id'] not in done or not self.has_outputs(job['job_id'])]
+        logger.info(f"{len(jobs)} letters requested, {len(jobs) - len(pending)} already done, {len(pending)} to render")
+
+        started = time.perf_counter()
+        rendered = 0
+        chunks = [pending[i:i + self.chunk_size] for i in range(0, len(pending), self.chunk_size)]
+
+        with open(self.state_file, 'a', encoding='utf-8') as state, \
+                ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                    initargs=(self.output_dir, self.formats)) as pool:
+            futures = [pool.submit(render_chunk, chunk) for chunk in chunks]
+            for future in as_completed(futures):
+                for job_id, paths in future.result():
+                    state.write(json.dumps({'job_id': job_id, 'files': paths}) + '\n')
+                    rendered += 1
+                state.flush()
+                os.fsync(state.fileno())
+
+        elapsed = time.perf_counter() - started
+        rate = rendered / elapsed if elapsed > 0 else 0.0
+        logger.info(f"Rendered {rendered} letters in {elapsed:.2f}s ({rate:.1f} letters/s, {self.workers} workers)")
+        if self.target_rate and rendered and rate < self.target_rate:
+            logger.warning(f"Throughput {rate:.1f} letters/s is below the target of {self.target_rate:.1f}")
+
+        return {
+            'requested': len(jobs),
+            'skipped': len(jobs) - len(pending),
+            'rendered': rendered,
+            'seconds': round(elapsed, 3),
+            'letters_per_second': round(rate, 1)
+        }
+
+
+def main():
+    """Render public notification letters for many systems from extracted dashboard data"""
+    parser = argparse.ArgumentParser(description="Batch-render public notification letters")
+    parser.add_argument('--input', default="dashboard_data.json", help="Output of extract_dashboard_data.py")
+    parser.add_argument('--data-dir', default="data")
+    parser.add_argument('--output-dir', default="letters")
+    parser.add_argument('--template', choices=sorted(LETTER_TEMPLATES), help="Force one template for every selected system")
+    parser.add_argument('--county', help="Only systems serving this county")
+    parser.add_argument('--pwsid', action='append', help="Only these systems (repeatable)")
+    parser.add_argument('--format', action='append', choices=['pdf', 'html'], dest='formats')
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--chunk-size', type=int, default=25)
+    parser.add_argument('--target-rate', type=float, help="Warn when letters/second falls below this")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    with open(args.input, encoding='utf-8') as f:
+        systems = json.load(f)
+
+    jobs = build_jobs(systems, load_pn_links(args.data_dir), date.today().strftime('%m/%d/%Y'),
+                      template_id=args.template, pwsids=set(args.pwsid) if args.pwsid else None,
+                      county=args.county)
+    batch = LetterBatch(args.output_dir, args.formats, args.workers, args.chunk_size, args.target_rate)
+    print(json.dumps(batch.run(jobs), indent=2))
+
+
+if __name__ == "__main__":
+    main()
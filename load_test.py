@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+"""
+Dashboard Load Test
+Replays a weighted mix of page views against a local server: the public
+dashboard's artifact fetches, per-query ZIP and PWSID lookups, or the warm
+data daemon's endpoints. Query values are drawn in proportion to the
+population behind them in the SDWIS tables, and throughput, p50/p95/p99
+latency, payload bytes and error rates are written as a JSON report that
+later runs can be compared against
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
+from urllib.parse import quote, urlparse
+
+import numpy as np
+import pandas as pd
+
+from data_validation import normalize_zip
+from sdwis_tables import load_table
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = [50, 95, 99]
+
+# Requests one page view issues, per target: a GET path, or (method, path, body).
+# '{artifact:NAME}' resolves through the target's artifact-manifest.json;
+# '{zip}', '{county}', '{pwsid}' and '{contaminant}' are drawn per session.
+PROFILES = {
+    # The public dashboard's production server (or any static server over its
+    # build). The frontend searches in the browser, so every page view fetches
+    # the same fixed files whatever is searched for; the drawn values are unused.
+    'static': {
+        'page_load': ['/artifact-manifest.json', '/{artifact:contaminant_info.json}',
+                      '/{artifact:water_systems_data.json}', '/{artifact:name_search_index.json}'],
+        'zip_fallback': ['/{artifact:zip_nearest.json}'],
+    },
+    # batch_lookup.py serve: one drawn ZIP or PWSID per request
+    'lookup': {
+        'zip': [('POST', '/lookup?key=zip', 'zip\n{zip}\n')],
+        'pwsid': [('POST', '/lookup?key=pwsid', 'pwsid\n{pwsid}\n')],
+    },
+    # warm_data.py: the full system list and reports are fixed payloads
+    'warm': {
+        'system': ['/systems/{pwsid}'],
+        'system_list': ['/systems'],
+        'violations_report': ['/reports/violations'],
+        'systems_report': ['/reports/systems'],
+    },
+}
+
+# Default share of page views per kind, per profile
+PROFILE_MIX = {
+    'static': {'page_load': 0.8, 'zip_fallback': 0.2},
+    'lookup': {'zip': 0.8, 'pwsid': 0.2},
+    'warm': {'system': 0.7, 'system_list': 0.1, 'violations_report': 0.1, 'systems_report': 0.1},
+}
+
+
+class QueryPopulation:
+    """
+    What residents search for, weighted by how many people each value covers:
+    a system's population is split evenly over the ZIPs and counties it
+    serves. A hotspot system (e.g. one under a boil-water advisory) can be
+    given a fixed share of all draws.
+    """
+
+    def __init__(self, values: Dict[str, Tuple[np.ndarray, np.ndarray]], hotspot: Optional[Dict[str, List[str]]] = None,
+                 hotspot_share: float = 0.0):
+        # kind -> (values, cumulative weights ending at 1)
+        self.values = values
+        self.hotspot = hotspot or {}
+        self.hotspot_share = hotspot_share
+
+    @staticmethod
+    def _weighted(keys: pd.Series, weights: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+        totals = pd.Series(weights.to_numpy(dtype=np.float64), index=keys.to_numpy()).groupby(level=0).sum()
+        totals = totals[totals > 0] if (totals > 0).any() else totals + 1
+        cumulative = np.cumsum(totals.to_numpy())
+        return totals.index.to_numpy(dtype=object), cumulative / cumulative[-1]
+
+    @classmethod
+    def from_data(cls, data_dir: str = "data", hotspot: Optional[str] = None,
+                  hotspot_share: float = 0.0) -> 'QueryPopulation':
+        systems = load_table('pub_water_systems', data_dir, usecols=[
+            'PWSID', 'PWS_ACTIVITY_CODE', 'POPULATION_SERVED_COUNT', 'ZIP_CODE'])
+        systems = systems[systems['PWS_ACTIVITY_CODE'] == 'A']
+        population = pd.to_numeric(systems['POPULATION_SERVED_COUNT'], errors='coerce').fillna(0)
+        served = pd.Series(population.to_numpy(), index=systems['PWSID'].to_numpy())
+        served = served[~served.index.duplicated()]
+
+        geo = load_table('geographic_areas', data_dir, usecols=['PWSID', 'GEO_ID', 'ZIP_CODE_SERVED', 'COUNTY_SERVED'])
+        geo = geo[geo['PWSID'].isin(served.index)]
+        zips = pd.DataFrame({'pwsid': geo['PWSID'], 'value': normalize_zip(geo['ZIP_CODE_SERVED'])}).dropna()
+        # Systems without a ZIP served are searched by their mailing ZIP
+        unzipped = systems[~systems['PWSID'].isin(zips['pwsid'])]
+        zips = pd.concat([zips, pd.DataFrame({'pwsid': unzipped['PWSID'], 'value': normalize_zip(unzipped['ZIP_CODE'])})
+                          .dropna()], ignore_index=True)
+        counties = pd.DataFrame({'pwsid': geo['PWSID'], 'value': geo['COUNTY_SERVED'].str.strip()}).dropna()
+
+        values = {}
+        hotspot_values = {}
+        for kind, frame in (('zip', zips), ('county', counties)):
+            frame = frame.drop_duplicates()
+            share = served.reindex(frame['pwsid']).fillna(0).to_numpy() / frame.groupby('pwsid')['pwsid'].transform('size').to_numpy()
+            values[kind] = cls._weighted(frame['value'], pd.Series(share))
+            if hotspot:
+                hotspot_values[kind] = sorted(frame.loc[frame['pwsid'] == hotspot, 'value'].unique())
+        values['pwsid'] = cls._weighted(pd.Series(served.index), pd.Series(served.to_numpy()))
+        if hotspot:
+            hotspot_values['pwsid'] = [hotspot]
+
+        try:
+            violations = load_table('violations_enforcement', data_dir, usecols=['PWSID', 'VIOLATION_ID', 'CONTAMINANT_CODE'])
+            codes = violations['CONTAMINANT_CODE'].dropna()
+        except Exception as e:
+            logger.warning(f"No violation contaminants ({e}); weighting LCR sample contaminants")
+            codes = load_table('lcr_samples', data_dir, usecols=['PWSID', 'CONTAMINANT_CODE'])['CONTAMINANT_CODE'].dropna()
+        values['contaminant'] = cls._weighted(codes.str.strip(), pd.Series(np.ones(len(codes))))
+
+        logger.info("Query population: " + ', '.join(f"{len(v[0])} {kind} values" for kind, v in values.items()))
+        return cls(values, {k: v for k, v in hotspot_values.items() if v}, hotspot_share)
+
+    def draw(self, rng: np.random.Generator) -> Dict[str, str]:
+        """One value per placeholder; binary search over the cumulative weights"""
+        drawn = {}
+        use_hotspot = self.hotspot and rng.random() < self.hotspot_share
+        for kind, (values, cumulative) in self.values.items():
+            if use_hotspot and kind in self.hotspot:
+                drawn[kind] = self.hotspot[kind][int(rng.integers(len(self.hotspot[kind])))]
+            else:
+                drawn[kind] = values[min(int(np.searchsorted(cumulative, rng.random(), side='right')), len(values) - 1)]
+        return drawn
+
+
+class LoadTest:
+    """
+    Sessions (one page view: a kind's request sequence over one persistent
+    connection per worker) run either closed-loop, each worker starting the
+    next session when the last finishes, or open-loop at a fixed arrival rate.
+    Open-loop latency is measured from each session's scheduled start, so
+    time spent waiting behind a saturated server is counted rather than hidden.
+    """
+
+    def __init__(self, base_url: str, requests: Dict[str, List[Union[str, Tuple[str, str, str]]]], mix: Dict[str, float],
+                 population: QueryPopulation, concurrency: int = 16, rate: Optional[float] = None,
+                 duration: float = 30.0, sessions: Optional[int] = None, seed: int = 0,
+                 accept_encoding: str = 'br, gzip', timeout: float = 30.0):
+        url = urlparse(base_url)
+        self.scheme, self.host, self.port = url.scheme or 'http', url.hostname, url.port
+        self.base_path = url.path.rstrip('/')
+        self.requests = requests
+        self.kinds = [kind for kind in mix if mix[kind] > 0 and kind in requests]
+        weights = np.array([mix[kind] for kind in self.kinds], dtype=np.float64)
+        self.kind_cumulative = np.cumsum(weights) / weights.sum()
+        self.population = population
+        self.concurrency = concurrency
+        self.rate = rate
+        self.duration = duration
+        self.sessions = sessions
+        self.seed = seed
+        self.accept_encoding = accept_encoding
+        self.timeout = timeout
+        self.artifacts: Dict[str, str] = {}
+        self.results: List[Tuple[str, str, int, float, float, int]] = []
+        self.lock = threading.Lock()
+        self.started = 0
+
+    def _connect(self) -> http.client.HTTPConnection:
+        connection = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        return connection(self.host, self.port, timeout=self.timeout)
+
+    def resolve_artifacts(self):
+        """Hashed artifact names from the target's manifest, fetched once up front like a returning browser"""
+        if not any('{artifact:' in self._label(template) for templates in self.requests.values() for template in templates):
+            return
+        connection = self._connect()
+        try:
+            connection.request('GET', f"{self.base_path}/artifact-manifest.json")
+            response = connection.getresponse()
+            body = response.read()
+            if response.status == 200:
+                self.artifacts = {name: entry['file'] for name, entry in json.loads(body)['artifacts'].items()}
+            else:
+                logger.warning(f"No artifact manifest ({response.status}); requesting fixed artifact names")
+        except Exception as e:
+            logger.error(f"Error fetching the artifact manifest: {e}")
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _label(template: Union[str, Tuple[str, str, str]]) -> str:
+        """How a request template is listed in the report"""
+        if isinstance(template, str):
+            return template
+        method, path, body = template
+        return f"{method} {path} {body.splitlines()[0] if body else ''}".rstrip()
+
+    def _path(self, template: str, values: Dict[str, str]) -> str:
+        path = template
+        while '{artifact:' in path:
+            start = path.index('{artifact:')
+            end = path.index('}', start)
+            name = path[start + len('{artifact:'):end]
+            path = path[:start] + self.artifacts.get(name, name) + path[end + 1:]
+        for key, value in values.items():
+            path = path.replace('{' + key + '}', quote(str(value), safe=''))
+        return self.base_path + path
+
+    def _next_session(self) -> bool:
+        with self.lock:
+            if self.sessions is not None and self.started >= self.sessions:
+                return False
+            self.started += 1
+            return True
+
+    def _session(self, connection_holder: List[Optional[http.client.HTTPConnection]], kind: str,
+                 values: Dict[str, str], scheduled: float, records: List[Tuple[str, str, int, float, float, int]]):
+        start_mark = scheduled
+        for template in self.requests[kind]:
+            method, path, body = ('GET', template, None) if isinstance(template, str) else template
+            headers = {'Accept-Encoding': self.accept_encoding}
+            if body is not None:
+                for key, value in values.items():
+                    body = body.replace('{' + key + '}', str(value))
+                body = body.encode('utf-8')
+                headers['Content-Type'] = 'text/csv'
+            sent = time.perf_counter()
+            status, size = 0, 0
+            try:
+                if connection_holder[0] is None:
+                    connection_holder[0] = self._connect()
+                connection_holder[0].request(method, self._path(path, values), body=body, headers=headers)
+                response = connection_holder[0].getresponse()
+                # http.client does not decode Content-Encoding, so this is what crossed the wire
+                size = len(response.read())
+                status = response.status
+                if response.will_close:
+                    connection_holder[0].close()
+                    connection_holder[0] = None
+            except Exception:
+                if connection_holder[0] is not None:
+                    connection_holder[0].close()
+                connection_holder[0] = None
+            done = time.perf_counter()
+            records.append((kind, self._label(template), status, done - start_mark, done - sent, size))
+            start_mark = done
+
+    def _closed_worker(self, worker: int, deadline: float):
+        rng = np.random.default_rng([self.seed, worker])
+        holder: List[Optional[http.client.HTTPConnection]] = [None]
+        records: List[Tuple[str, str, int, float, float, int]] = []
+        while time.perf_counter() < deadline and self._next_session():
+            kind = self.kinds[int(np.searchsorted(self.kind_cumulative, rng.random(), side='right'))]
+            self._session(holder, kind, self.population.draw(rng), time.perf_counter(), records)
+        if holder[0] is not None:
+            holder[0].close()
+        with self.lock:
+            self.results.extend(records)
+
+    def _open_worker(self, arrivals: "queue.Queue"):
+        holder: List[Optional[http.client.HTTPConnection]] = [None]
+        records: List[Tuple[str, str, int, float, float, int]] = []
+        while True:
+            item = arrivals.get()
+            if item is None:
+                break
+            scheduled, kind, values = item
+            self._session(holder, kind, values, scheduled, records)
+        if holder[0] is not None:
+            holder[0].close()
+        with self.lock:
+            self.results.extend(records)
+
+    def run(self) -> Dict[str, Any]:
+        self.resolve_artifacts()
+        started = time.perf_counter()
+        deadline = started + self.duration if self.sessions is None else float('inf')
+        if self.rate:
+            # Poisson arrivals, scheduled by one dispatcher and served by a fixed worker pool
+            arrivals: "queue.Queue" = queue.Queue()
+            threads = [threading.Thread(target=self._open_worker, args=(arrivals,), daemon=True)
+                       for _ in range(self.concurrency)]
+            for thread in threads:
+                thread.start()
+            rng = np.random.default_rng([self.seed, self.concurrency])
+            scheduled = started
+            while scheduled < deadline and self._next_session():
+                scheduled += rng.exponential(1 / self.rate)
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                kind = self.kinds[int(np.searchsorted(self.kind_cumulative, rng.random(), side='right'))]
+                arrivals.put((scheduled, kind, self.population.draw(rng)))
+            for _ in threads:
+                arrivals.put(None)
+        else:
+            threads = [threading.Thread(target=self._closed_worker, args=(worker, deadline), daemon=True)
+                       for worker in range(self.concurrency)]
+            for thread in threads:
+                thread.start()
+        for thread in threads:
+            thread.join()
+        return self.report(time.perf_counter() - started)
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        frame = pd.DataFrame(self.results, columns=['kind', 'request', 'status', 'latency', 'service', 'bytes'])
+        frame['error'] = (frame['status'] == 0) | (frame['status'] >= 400)
+
+        def stats(group: pd.DataFrame) -> Dict[str, Any]:
+            ok = group[~group['error']]
+            latency = ok['latency'].to_numpy() * 1000
+            service = ok['service'].to_numpy() * 1000
+            return {
+                'requests': len(group),
+                'errors': int(group['error'].sum()),
+                'error_rate': round(float(group['error'].mean()), 4) if len(group) else 0.0,
+                'throughput_rps': round(len(group) / elapsed, 2) if elapsed else 0.0,
+                'latency_ms': dict(zip([f"p{p}" for p in PERCENTILES],
+                                       (round(float(v), 2) for v in np.percentile(latency, PERCENTILES))))
+                if len(latency) else None,
+                'service_ms': dict(zip([f"p{p}" for p in PERCENTILES],
+                                       (round(float(v), 2) for v in np.percentile(service, PERCENTILES))))
+                if len(service) else None,
+                'max_ms': round(float(latency.max()), 2) if len(latency) else None,
+                'bytes': int(group['bytes'].sum()),
+                'mean_bytes': int(group['bytes'].mean()) if len(group) else 0,
+                'statuses': {str(k): int(v) for k, v in group['status'].value_counts().items()}
+            }
+
+        return {
+            'target': f"{self.scheme}://{self.host}:{self.port}{self.base_path}",
+            'mode': f"open {self.rate}/s" if self.rate else f"closed x{self.concurrency}",
+            'concurrency': self.concurrency,
+            'seconds': round(elapsed, 2),
+            'sessions': self.started,
+            'total': stats(frame),
+            'kinds': {kind: stats(group) for kind, group in frame.groupby('kind', sort=True)},
+            'requests': {template: stats(group) for template, group in frame.groupby('request', sort=True)}
+        }
+
+
+def compare_reports(current: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Any]:
+    """Relative change per kind (and overall) in throughput, p95/p99 latency, bytes and error rate"""
+    def delta(new, old):
+        if new is None or old in (None, 0):
+            return None
+        return round((new - old) / old * 100, 1)
+
+    def entry(new: Dict[str, Any], old: Dict[str, Any]) -> Dict[str, Any]:
+        new_latency, old_latency = new.get('latency_ms') or {}, old.get('latency_ms') or {}
+        return {
+            'throughput_pct': delta(new['throughput_rps'], old['throughput_rps']),
+            'p95_pct': delta(new_latency.get('p95'), old_latency.get('p95')),
+            'p99_pct': delta(new_latency.get('p99'), old_latency.get('p99')),
+            'mean_bytes_pct': delta(new['mean_bytes'], old['mean_bytes']),
+            'error_rate': [old['error_rate'], new['error_rate']]
+        }
+
+    kinds = {kind: entry(stats, baseline['kinds'][kind]) for kind, stats in current['kinds'].items()
+             if kind in baseline['kinds']}
+    return {'total': entry(current['total'], baseline['total']), 'kinds': kinds}
+
+
+def _print_summary(report: Dict[str, Any]):
+    print(f"{report['target']}  {report['mode']}  {report['seconds']}s  {report['sessions']} sessions")
+    print(f"{'kind':<14}{'req':>8}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'KB/req':>10}{'err %':>8}")
+    rows = list(report['kinds'].items()) + [('TOTAL', report['total'])]
+    for kind, stats in rows:
+        latency = stats['latency_ms'] or {'p50': float('nan'), 'p95': float('nan'), 'p99': float('nan')}
+        print(f"{kind:<14}{stats['requests']:>8}{stats['throughput_rps']:>9.1f}{latency['p50']:>10.1f}"
+              f"{latency['p95']:>10.1f}{latency['p99']:>10.1f}{stats['mean_bytes'] / 1024:>10.1f}"
+              f"{stats['error_rate'] * 100:>8.2f}")
+
+
+def _print_comparison(comparison: Dict[str, Any], baseline: str):
+    def pct(value):
+        return f"{value:+.1f}%" if value is not None else "n/a"
+
+    print(f"vs {baseline}")
+    print(f"{'kind':<14}{'rps':>10}{'p95':>10}{'p99':>10}{'bytes':>10}{'err %':>16}")
+    for kind, delta in list(comparison['kinds'].items()) + [('TOTAL', comparison['total'])]:
+        errors = f"{delta['error_rate'][0] * 100:.2f}->{delta['error_rate'][1] * 100:.2f}"
+        print(f"{kind:<14}{pct(delta['throughput_pct']):>10}{pct(delta['p95_pct']):>10}{pct(delta['p99_pct']):>10}"
+              f"{pct(delta['mean_bytes_pct']):>10}{errors:>16}")
+
+
+def main():
+    """Run a load test against a local server and write the report"""
+    parser = argparse.ArgumentParser(description="Replay dashboard query mixes against a local server")
+    parser.add_argument('url', help="Base URL, e.g. http://localhost:3001")
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='static')
+    parser.add_argument('--request', action='append', default=[], metavar='KIND=PATH',
+                        help="Request template for a kind, replacing the profile's (repeat for a sequence)")
+    parser.add_argument('--mix', action='append', default=[], metavar='KIND=WEIGHT', help="Share of sessions per kind")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--rate', type=float, help="Open-loop sessions per second (default: closed loop)")
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds to run")
+    parser.add_argument('--sessions', type=int, help="Stop after this many sessions instead of --duration")
+    parser.add_argument('--hotspot', help="PWSID drawing --hotspot-share of all lookups (e.g. under an advisory)")
+    parser.add_argument('--hotspot-share', type=float, default=0.8)
+    parser.add_argument('--accept-encoding', default='br, gzip')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', default="data")
+    parser.add_argument('--output', default="load_test_report.json")
+    parser.add_argument('--compare', help="Earlier report to compare against")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    requests = {kind: list(templates) for kind, templates in PROFILES[args.profile].items()}
+    overridden = set()
+    for item in args.request:
+        kind, template = item.split('=', 1)
+        if kind not in overridden:
+            requests[kind] = []
+            overridden.add(kind)
+        requests[kind].append(template if template.startswith('/') else '/' + template)
+    mix = dict(PROFILE_MIX[args.profile])
+    for item in args.mix:
+        kind, weight = item.split('=', 1)
+        mix[kind] = float(weight)
+    skipped = [kind for kind in mix if mix[kind] > 0 and kind not in requests]
+    if skipped:
+        logger.info(f"No {args.profile} requests for {', '.join(skipped)}; leaving them out of the mix")
+    unweighted = [kind for kind in requests if kind not in mix]
+    if unweighted:
+        logger.warning(f"No --mix weight for {', '.join(unweighted)}; leaving them out of the mix")
+
+    population = QueryPopulation.from_data(args.data_dir, args.hotspot, args.hotspot_share if args.hotspot else 0.0)
+    test = LoadTest(args.url, requests, mix, population, args.concurrency, args.rate, args.duration,
+                    args.sessions, args.seed, args.accept_encoding)
+    report = test.run()
+    report['profile'] = args.profile
+    report['mix'] = {kind: mix[kind] for kind in test.kinds}
+    if args.hotspot:
+        report['hotspot'] = {'pwsid': args.hotspot, 'share': args.hotspot_share}
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            report['comparison'] = compare_reports(report, json.load(f))
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    _print_summary(report)
+    if 'comparison' in report:
+        _print_comparison(report['comparison'], args.compare)
+    logger.info(f"Report saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Water System Name Search
+Normalizes PWS_NAME values (abbreviation expansion, "CITY OF"-style prefix
+stripping) and indexes them by character trigram, so misspelled or partial
+names return ranked candidates within a bounded edit distance. The same index
+is published for the public dashboard (src/nameSearch.ts)
+"""
+
+import argparse
+import json
+import logging
+import re
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from sdwis_tables import load_table
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "name_search_index.json"
+
+# Whole-token abbreviations seen in PWS_NAME; ambiguous ones (ST, CO) are left alone
+ABBREVIATIONS = {
+    'APT': 'APARTMENTS', 'APTS': 'APARTMENTS', 'ASSN': 'ASSOCIATION', 'ASSOC': 'ASSOCIATION',
+    'AUTH': 'AUTHORITY', 'CNTY': 'COUNTY', 'COMM': 'COMMUNITY', 'CTR': 'CENTER', 'DEPT': 'DEPARTMENT',
+    'DIST': 'DISTRICT', 'ELEM': 'ELEMENTARY', 'ESTS': 'ESTATES', 'HTS': 'HEIGHTS', 'MHP': 'MOBILE HOME PARK',
+    'MHC': 'MOBILE HOME COMMUNITY', 'MT': 'MOUNT', 'MTN': 'MOUNTAIN', 'PK': 'PARK',
+    'S/D': 'SUBDIVISION', 'SUBD': 'SUBDIVISION', 'SCH': 'SCHOOL', 'SYS': 'SYSTEM',
+    'TWP': 'TOWNSHIP', 'UTIL': 'UTILITIES', 'UTILS': 'UTILITIES', 'WS': 'WATER SYSTEM', 'WSA': 'WATER AND SEWER AUTHORITY',
+    'WTR': 'WATER', 'WW': 'WATERWORKS', '&': 'AND',
+}
+
+# Leading words dropped when something is left after them
+PREFIXES = ['CITY OF', 'TOWN OF', 'VILLAGE OF', 'COUNTY OF', 'BOROUGH OF']
+
+_TOKEN = re.compile(r"S/D|&|[A-Z0-9]+")
+
+
+def normalize_name(name: str) -> str:
+    """'CITY OF  X WTR AUTH' -> 'x water authority'"""
+    tokens = _TOKEN.findall(str(name or '').upper().replace("'", '').replace('`', ''))
+    expanded = ' '.join(ABBREVIATIONS.get(token, token) for token in tokens)
+    for prefix in PREFIXES:
+        if expanded.startswith(prefix + ' '):
+            expanded = expanded[len(prefix) + 1:]
+            break
+    return expanded.lower()
+
+
+def trigrams(text: str) -> List[str]:
+    """Distinct trigrams of the padded text; word starts weigh double through the padding"""
+    padded = f"  {text} "
+    return list(dict.fromkeys(padded[i:i + 3] for i in range(len(padded) - 2)))
+
+
+def bounded_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance, or limit + 1 as soon as it must exceed limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def max_edits(query: str) -> int:
+    return 0 if len(query) <= 3 else 1 if len(query) <= 6 else 2 if len(query) <= 12 else 3
+
+
+def name_distance(query: str, name: str, limit: int) -> int:
+    """
+    Sum over query words of the edit distance to their closest name word, so
+    words can be misspelled, reordered or skipped in the name. The last query
+    word is also matched as a prefix, for partially typed names.
+    """
+    name_words = name.split()
+    query_words = query.split()
+    total = 0
+    for position, word in enumerate(query_words):
+        is_last = position == len(query_words) - 1
+        best = limit + 1
+        for candidate in name_words:
+            best = min(best, bounded_distance(word, candidate, limit - total))
+            if is_last and len(candidate) > len(word):
+                best = min(best, bounded_distance(word, candidate[:len(word)], limit - total))
+            if best == 0:
+                break
+        total += best
+        if total > limit:
+            return limit + 1
+    return total
+
+
+class NameIndex:
+    """Trigram postings over normalized system names"""
+
+    def __init__(self, pwsids: List[str], names: List[str]):
+        self.pwsids = list(pwsids)
+        self.names = list(names)
+        self.normalized = [normalize_name(name) for name in self.names]
+        postings: Dict[str, List[int]] = {}
+        for doc, text in enumerate(self.normalized):
+            for gram in trigrams(text):
+                postings.setdefault(gram, []).append(doc)
+        self.postings = {gram: np.asarray(docs, dtype=np.int32) for gram, docs in postings.items()}
+        self.gram_counts = np.asarray([len(trigrams(text)) for text in self.normalized], dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.pwsids)
+
+    def search(self, query: str, k: int = 10, candidates: int = 100) -> List[Dict[str, Any]]:
+        """Top-k systems by edit distance, then trigram similarity"""
+        normalized = normalize_name(query)
+        grams = trigrams(normalized)
+        hits = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not normalized or not hits:
+            return []
+        shared = np.bincount(np.concatenate(hits), minlength=len(self))
+        # Dice coefficient over trigram sets ranks the candidates worth an edit-distance check
+        similarity = 2.0 * shared / (len(grams) + self.gram_counts)
+        pool = np.flatnonzero(shared)
+        if len(pool) > candidates:
+            pool = pool[np.argpartition(-similarity[pool], candidates - 1)[:candidates]]
+
+        limit = max_edits(normalized)
+        results = []
+        for doc in pool:
+            distance = name_distance(normalized, self.normalized[doc], limit)
+            if distance <= limit:
+                results.append((distance, -similarity[doc], len(self.normalized[doc]), int(doc)))
+        results.sort()
+        return [{
+            'pwsid': self.pwsids[doc],
+            'name': self.names[doc],
+            'distance': distance,
+            'score': round(float(-negative_similarity), 3)
+        } for distance, negative_similarity, _, doc in results[:k]]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Artifact for the dashboard; the normalization rules travel with the index"""
+        return {
+            'abbreviations': ABBREVIATIONS,
+            'prefixes': PREFIXES,
+            'pwsids': self.pwsids,
+            'names': self.names,
+            # Ascending document numbers, delta-encoded to keep the file small
+            'postings': {gram: np.diff(docs, prepend=0).tolist() for gram, docs in sorted(self.postings.items())}
+        }
+
+    @classmethod
+    def from_systems(cls, systems: List[Dict[str, Any]]) -> 'NameIndex':
+        """Index the public dashboard records (water_systems_data.json)"""
+        return cls([s['pwsid'] for s in systems], [s.get('name') or '' for s in systems])
+
+    @classmethod
+    def from_table(cls, data_dir: str = "data") -> 'NameIndex':
+        df = load_table('pub_water_systems', data_dir, usecols=['PWSID', 'PWS_NAME'])
+        return cls(df['PWSID'].tolist(), df['PWS_NAME'].fillna('').tolist())
+
+    @classmethod
+    def load(cls, path: str = INDEX_FILE) -> 'NameIndex':
+        with open(path, encoding='utf-8') as f:
+            payload = json.load(f)
+        return cls(payload['pwsids'], payload['names'])
+
+    def save(self, path: str = INDEX_FILE):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, separators=(',', ':'))
+        logger.info(f"Name search index with {len(self)} systems, {len(self.postings)} trigrams saved to {path}")
+
+
+def main():
+    """Build the name index or search it"""
+    parser = argparse.ArgumentParser(description="Fuzzy water system name search")
+    parser.add_argument('query', nargs='?', help="Name to search for")
+    parser.add_argument('-k', type=int, default=10, help="Number of results")
+    parser.add_argument('--data-dir', default="data")
+    parser.add_argument('--save', metavar='PATH', help="Write the index artifact")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    index = NameIndex.from_table(args.data_dir)
+    if args.save:
+        index.save(args.save)
+    if args.query:
+        started = time.perf_counter()
+        results = index.search(args.query, args.k)
+        logger.info(f"{len(results)} results in {(time.perf_counter() - started) * 1000:.1f} ms")
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -39,6 +39,7 @@ import {
 } from "recharts";
 import { saveAs } from "file-saver";
 import { LetterGenerator } from "./components/LetterGenerator";
+import { fetchArtifact } from "./shared/artifacts";
 
 // Icon typing
 const Icons = {
@@ -157,7 +158,7 @@ export default function App() {
 
   // Load dashboard data
   useEffect(() => {
-    fetch("/dashboard_data.json")
+    fetchArtifact("dashboard_data.json")
       .then((res) => {
         if (!res.ok) throw new Error("Failed to load dashboard data");
         return res.json();
@@ -211,62 +212,85 @@ export default function App() {
   const generateTasksFromViolations = (violations: any[]): any[] => {
     if (!violations || violations.length === 0) return [];
     
-    const uniqueViolations = new Map();
-    
-    violations.forEach((violation, index) => {
-      const uniqueKey = `${violation.violation_id || 'unknown'}-${violation.violation_type || 'unknown'}-${violation.contaminant_code || 'unknown'}`;
+    // Rows arrive one per violation (latest enforcement action) from the extractors
+    return violations.map((violation, index) => {
+      const dueDate = violation.violation_begin_date || violation.first_reported || '2024-12-31';
+      const daysLeft = calculateDaysLeft(dueDate);
       
-      if (!uniqueViolations.has(uniqueKey)) {
-        const dueDate = violation.violation_begin_date || violation.first_reported || '2024-12-31';
-        const daysLeft = calculateDaysLeft(dueDate);
-        
-        let taskStatus = 'Upcoming';
-        if (violation.status === 'Resolved' || violation.status === 'Closed') {
-          taskStatus = 'Completed';
-        } else if (daysLeft < 0) {
-          taskStatus = 'Overdue';
-        } else if (daysLeft <= 7) {
-          taskStatus = 'Due Soon';
-        }
-        
-        const task = {
-          id: `violation-${violation.violation_id || index}`,
-          name: `${violation.violation_type} - ${violation.contaminant_name}`,
-          type: 'Violation',
-          due: dueDate,
-          status: taskStatus,
-          daysLeft: daysLeft,
-          locations: violation.requires_action ? '1' : '0',
-          priority: violation.priority || 'Medium',
-          description: `Violation ID: ${violation.violation_id}, Code: ${violation.violation_code}`,
-          violation: violation
-        };
-        
-        uniqueViolations.set(uniqueKey, task);
+      let taskStatus = 'Upcoming';
+      if (violation.status === 'Resolved' || violation.status === 'Closed') {
+        taskStatus = 'Completed';
+      } else if (daysLeft < 0) {
+        taskStatus = 'Overdue';
+      } else if (daysLeft <= 7) {
+        taskStatus = 'Due Soon';
       }
+      
+      return {
+        id: `violation-${violation.violation_id || index}`,
+        name: `${violation.violation_type} - ${violation.contaminant_name}`,
+        type: 'Violation',
+        due: dueDate,
+        status: taskStatus,
+        daysLeft: daysLeft,
+        locations: violation.requires_action ? '1' : '0',
+        priority: violation.priority || 'Medium',
+        description: `Violation ID: ${violation.violation_id}, Code: ${violation.violation_code}`,
+        violation: violation
+      };
     });
-    
-    return Array.from(uniqueViolations.values());
   };
 
-  const tasks = generateTasksFromViolations(violations);
-
-  // Add event tasks
-  events.forEach((e: any) => {
-    tasks.push({
-      name: e.event_milestone_code || "Event",
-      due: e.event_end_date || e.event_actual_date || "",
-      locations: 1,
-      daysLeft: e.event_end_date ? calculateDaysLeft(e.event_end_date) : 0,
-      status: e.event_end_date && new Date(e.event_end_date) < new Date() ? 'Overdue' : 'On Track',
-      details: e,
-      type: 'Event',
+  // Days since 1970-01-01 for today's local date, the unit of a task's due_day
+  const now = new Date();
+  const today = Math.round(Date.UTC(now.getFullYear(), now.getMonth(), now.getDate()) / (1000 * 60 * 60 * 24));
+
+  const calendarTaskStatus = (t: any, daysLeft: number): string => {
+    if (t.type === 'Event') {
+      return t.due_day != null && daysLeft < 0 ? 'Overdue' : 'On Track';
+    }
+    if (t.completed) return 'Completed';
+    if (daysLeft < 0) return 'Overdue';
+    if (daysLeft <= 7) return 'Due Soon';
+    return 'Upcoming';
+  };
+
+  // Prefer the task calendar precomputed by the extraction engine; it carries
+  // due dates only, so days left and status are worked out here from today.
+  // Fall back to building tasks in the browser for older data files.
+  const calendar = system.task_calendar;
+  let tasks: any[];
+  if (calendar) {
+    tasks = calendar.tasks.map((t: any) => {
+      const daysLeft = t.due_day != null ? t.due_day - today : 0;
+      return {
+        ...t,
+        daysLeft,
+        status: calendarTaskStatus(t, daysLeft),
+        violation: t.source === 'violations_enforcement' ? violations[t.source_index] : undefined,
+        details: t.source === 'events_milestones' ? events[t.source_index] : undefined,
+      };
+    });
+  } else {
+    tasks = generateTasksFromViolations(violations);
+
+    // Add event tasks
+    events.forEach((e: any) => {
+      tasks.push({
+        name: e.event_milestone_code || "Event",
+        due: e.event_end_date || e.event_actual_date || "",
+        locations: 1,
+        daysLeft: e.event_end_date ? calculateDaysLeft(e.event_end_date) : 0,
+        status: e.event_end_date && new Date(e.event_end_date) < new Date() ? 'Overdue' : 'On Track',
+        details: e,
+        type: 'Event',
+      });
     });
-  });
+  }
 
-  const filteredTaskList = tasks.filter((t: any) => 
+  const statusTasks = tasks.filter((t: any) => !filter || t.status === filter);
+  const filteredTaskList = statusTasks.filter((t: any) => 
     t.name && 
-    (!filter || t.status === filter) && 
     (!search || t.name.toLowerCase().includes(search.toLowerCase()))
   );
 
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Partitioned Extraction
+Splits every SDWIS table by primacy agency (state) or by a PWSID hash into
+self-contained partition directories, runs the extraction pipeline in each
+partition as an independent process (or on other machines sharing the
+partition root), and merges the per-partition outputs, indexes and rollups
+back into the single-extract layout the dashboards read
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from artifacts import minify, publish_artifacts
+from columnar_export import dataset_artifacts, system_columns
+from comment_search import CommentIndex
+from contaminant_index import ContaminantIndex, save_contaminant_index
+from extraction_policy import POLICY_FILE
+from inspection_priority import OUTPUT_DIR as PRIORITY_DIR, STATE_FILE as PRIORITY_STATE, merge_states
+from interval_index import IntervalIndex
+from name_search import NameIndex
+from pn_timeliness import notices_frame, save_pn_timeliness, summarize_notices
+from pipeline import CODE_DIR, OPERATOR_PUBLIC, PUBLIC_DIR
+from sdwis_tables import TABLE_FILES, table_path
+from task_calendar import save_due_index
+from zip_locator import COUNTY_CENTROIDS, PLACE_CENTROIDS, ZIP_CENTROIDS, merge_nearest_tables
+
+logger = logging.getLogger(__name__)
+
+PARTITION_ROOT = "partitions"
+PARTITION_MANIFEST = "partitions.json"
+CHUNK_SIZE = 200_000
+# Tables every partition needs in full rather than split by PWSID
+SHARED_TABLES = ['ref_code_values']
+# Optional centroid files and policy overrides, also copied whole
+SHARED_FILES = [os.path.basename(path) for path in (ZIP_CENTROIDS, COUNTY_CENTROIDS, PLACE_CENTROIDS)] + [POLICY_FILE]
+
+
+def _partition_keys(pwsids: pd.Series, by: str, partitions: int, owners: Dict[str, str]) -> pd.Series:
+    if by == 'hash':
+        # pandas' object hashing uses a fixed key, so the split is stable across runs
+        buckets = pd.util.hash_pandas_object(pwsids.fillna(''), index=False).to_numpy() % partitions
+        return pd.Series([f"part{bucket:03d}" for bucket in buckets], index=pwsids.index)
+    # PWSIDs start with the two-character state or EPA region code, which
+    # covers child rows whose system is missing from PUB_WATER_SYSTEMS
+    return pwsids.map(owners).fillna(pwsids.str[:2]).fillna('XX')
+
+
+def split_tables(data_dir: str = "data", root: str = PARTITION_ROOT, by: str = 'state',
+                 partitions: int = 8, chunksize: int = CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    Stream every table into <root>/<partition>/data/. Rows are written back
+    as read, so a partition whose rows did not change keeps identical files
+    and its pipeline stages stay up to date.
+    """
+    owners = {}
+    if by == 'state':
+        systems = pd.read_csv(table_path('pub_water_systems', data_dir), dtype=str, keep_default_na=False,
+                              usecols=lambda c: c.strip() in ('PWSID', 'PRIMACY_AGENCY_CODE'))
+        systems.columns = systems.columns.str.strip()
+        owners = dict(zip(systems['PWSID'], systems['PRIMACY_AGENCY_CODE'].str.strip().replace('', None)))
+
+    rows: Dict[str, Dict[str, int]] = {}
+    written = set()
+    for name, filename in TABLE_FILES.items():
+        if name in SHARED_TABLES:
+            continue
+        path = table_path(name, data_dir)
+        if not os.path.exists(path):
+            logger.error(f"Error splitting {name}: {filename} not found")
+            continue
+        for chunk in pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunksize):
+            pwsid_column = next(c for c in chunk.columns if c.strip() == 'PWSID')
+            pwsids = chunk[pwsid_column].replace('', None)
+            for key, part in chunk.groupby(_partition_keys(pwsids, by, partitions, owners), sort=False):
+                partition_dir = os.path.join(root, key, 'data')
+                target = os.path.join(partition_dir, filename)
+                if target not in written:
+                    os.makedirs(partition_dir, exist_ok=True)
+                part.to_csv(target, index=False, mode='a' if target in written else 'w', header=target not in written)
+                written.add(target)
+                rows.setdefault(key, {})[name] = rows.get(key, {}).get(name, 0) + len(part)
+        logger.info(f"Split {name} into {sum(1 for counts in rows.values() if name in counts)} partitions")
+
+    for key in rows:
+        for name in SHARED_TABLES:
+            if os.path.exists(table_path(name, data_dir)):
+                shutil.copyfile(table_path(name, data_dir), table_path(name, os.path.join(root, key, 'data')))
+        for filename in SHARED_FILES:
+            if os.path.exists(os.path.join(data_dir, filename)):
+                shutil.copyfile(os.path.join(data_dir, filename), os.path.join(root, key, 'data', filename))
+        # A table can be absent from one partition but present in the source;
+        # leftovers from an earlier split would otherwise be read as current
+        for name, filename in TABLE_FILES.items():
+            stale = table_path(name, os.path.join(root, key, 'data'))
+            if name not in SHARED_TABLES and name not in rows[key] and os.path.exists(stale):
+                os.remove(stale)
+
+    manifest = {
+        'by': by,
+        'partitions': {key: {'rows': counts, 'bytes': _data_bytes(os.path.join(root, key, 'data'))}
+                       for key, counts in sorted(rows.items())}
+    }
+    with open(os.path.join(root, PARTITION_MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    logger.info(f"Split {data_dir} into {len(rows)} partitions by {by} under {root}")
+    return manifest
+
+
+def _data_bytes(data_dir: str) -> int:
+    return sum(os.path.getsize(os.path.join(data_dir, f)) for f in os.listdir(data_dir))
+
+
+def load_partition_manifest(root: str = PARTITION_ROOT) -> Dict[str, Any]:
+    with open(os.path.join(root, PARTITION_MANIFEST), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def shard_partitions(manifest: Dict[str, Any], shard: int = 0, shards: int = 1) -> List[str]:
+    """
+    Partitions assigned to one worker node, largest first. Dealing them out
+    round-robin by size keeps the nodes' total input roughly even.
+    """
+    ordered = sorted(manifest['partitions'], key=lambda key: -manifest['partitions'][key]['bytes'])
+    return ordered[shard::shards]
+
+
+def run_partition(partition_dir: str, stages: Optional[List[str]] = None, force: bool = False) -> bool:
+    """Run the pipeline inside one partition directory as a separate process"""
+    command = [sys.executable, os.path.join(CODE_DIR, 'pipeline.py'), '--jobs', '1'] + (stages or [])
+    if force:
+        command.append('--force')
+    result = subprocess.run(command, cwd=partition_dir, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        logger.error(f"Error running partition {partition_dir}: {result.stderr.strip().splitlines()[-1:]}")
+    return result.returncode == 0
+
+
+def run_partitions(root: str = PARTITION_ROOT, workers: int = 4, partitions: Optional[List[str]] = None,
+                   stages: Optional[List[str]] = None, force: bool = False) -> Dict[str, bool]:
+    """Run the pipeline for each partition, `workers` processes at a time"""
+    manifest = load_partition_manifest(root)
+    keys = partitions or shard_partitions(manifest)
+    outcome = {}
+
+    def run(key):
+        started = time.time()
+        ok = run_partition(os.path.join(root, key), stages, force)
+        logger.info(f"Partition {key}: {'finished' if ok else 'failed'} in {time.time() - started:.1f}s")
+        return key, ok
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for key, ok in executor.map(run, keys):
+            outcome[key] = ok
+    return outcome
+
+
+def _read_json(path: str) -> Optional[Any]:
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def merge_contaminant_indexes(indexes: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Union the per-partition reverse indexes; PWSIDs never span partitions"""
+    fields = indexes[0]['fields'] if indexes else []
+    violations, notices = fields.index('violations'), fields.index('pn_notices')
+    latest, population = fields.index('latest_violation'), fields.index('population')
+
+    merged: Dict[str, Dict[str, Any]] = {}
+    for index in indexes:
+        for code, entry in index['contaminants'].items():
+            target = merged.setdefault(code, {'name': entry['name'], 'by_pwsid': {}})
+            target['by_pwsid'].update(entry['by_pwsid'])
+
+    contaminants = {}
+    for code in sorted(merged):
+        by_pwsid = merged[code]['by_pwsid']
+        violating = [v for v in by_pwsid.values() if v[violations] > 0 or v[notices] > 0]
+        dates = [v[latest] for v in by_pwsid.values() if v[latest]]
+        contaminants[code] = {
+            'name': merged[code]['name'],
+            'systems': len(by_pwsid),
+            'violating_systems': len(violating),
+            'population_affected': sum(v[population] for v in violating),
+            # ISO dates compare correctly as strings
+            'latest_violation': max(dates) if dates else None,
+            'by_pwsid': by_pwsid
+        }
+    return {
+        'fields': fields,
+        'contaminants': contaminants,
+        'by_name': {entry['name']: code for code, entry in contaminants.items()}
+    }
+
+
+def merge_partitions(root: str = PARTITION_ROOT, output_dir: str = ".") -> Dict[str, Any]:
+    """Combine every partition's outputs into output_dir and republish the dashboard artifacts"""
+    manifest = load_partition_manifest(root)
+    keys = sorted(manifest['partitions'])
+    dirs = {key: os.path.join(root, key) for key in keys}
+    rollups = {}
+
+    # Operator dashboard records, deadline index, interval and comment indexes
+    systems = []
+    tasks = []
+    due_index = None
+    intervals = {name: [] for name in IntervalIndex.COLUMNS}
+    comments = {name: [] for name in CommentIndex.COLUMNS}
+    for key in keys:
+        records = _read_json(os.path.join(dirs[key], 'dashboard_data.json')) or []
+        systems.extend(records)
+        calendar = _read_json(os.path.join(dirs[key], 'task_calendar_index.json'))
+        if calendar:
+            due_index = due_index or {k: v for k, v in calendar.items() if k not in ('total', 'tasks')}
+            tasks.extend(calendar['tasks'])
+        interval_payload = _read_json(os.path.join(dirs[key], 'interval_index.json'))
+        if interval_payload:
+            for name in IntervalIndex.COLUMNS:
+                intervals[name].extend(interval_payload['columns'][name])
+        comment_payload = _read_json(os.path.join(dirs[key], 'comment_search_index.json'))
+        if comment_payload:
+            for name in CommentIndex.COLUMNS:
+                comments[name].extend(comment_payload['columns'][name])
+        rollups[key] = {
+            'systems': len(records),
+            'population': sum(r.get('population_served') or 0 for r in records),
+            'violations': sum(r.get('summary_stats', {}).get('total_violations', 0) for r in records),
+            'active_violations': sum(r.get('summary_stats', {}).get('active_violations', 0) for r in records),
+            'days_out_of_compliance': sum(r.get('summary_stats', {}).get('days_out_of_compliance', 0) for r in records),
+            'population_days': sum(r.get('summary_stats', {}).get('population_days', 0) for r in records),
+            'tasks_due': calendar['total'] if calendar else 0
+        }
+
+    with open(os.path.join(output_dir, 'dashboard_data.json'), 'wb') as f:
+        f.write(minify(systems))
+    if due_index is not None:
+        tasks.sort(key=lambda r: (r['due'], r['pwsid'], r['task_id']))
+        save_due_index({**due_index, 'total': len(tasks), 'tasks': tasks},
+                       os.path.join(output_dir, 'task_calendar_index.json'))
+    IntervalIndex(*(intervals[name] for name in IntervalIndex.COLUMNS)).save(
+        os.path.join(output_dir, 'interval_index.json'))
+    # BM25 statistics are corpus-wide, so the merged index is rebuilt from the documents
+    CommentIndex(*(comments[name] for name in CommentIndex.COLUMNS)).save(
+        os.path.join(output_dir, 'comment_search_index.json'))
+
+    # Quarantined values keep their partition-local row numbers
+    quarantines = []
+    for key in keys:
+        path = os.path.join(dirs[key], 'validation_quarantine.csv')
+        if os.path.exists(path):
+            quarantines.append(pd.read_csv(path, dtype=str, keep_default_na=False).assign(partition=key))
+    if quarantines:
+        pd.concat(quarantines, ignore_index=True).to_csv(
+            os.path.join(output_dir, 'validation_quarantine.csv'), index=False)
+
+    contaminant_index = merge_contaminant_indexes(
+        [index for index in (_read_json(os.path.join(dirs[key], 'contaminant_systems.json')) for key in keys) if index])
+    save_contaminant_index(contaminant_index, os.path.join(output_dir, 'contaminant_systems.json'))
+
+    # Percentiles do not combine, so the lag tables are recomputed from every partition's notices
+    notices = [notices_frame(payload) for payload in
+               (_read_json(os.path.join(dirs[key], 'pn_timeliness.json')) for key in keys) if payload]
+    if notices:
+        save_pn_timeliness(summarize_notices(pd.concat(notices, ignore_index=True)),
+                           os.path.join(output_dir, 'pn_timeliness.json'))
+
+    # Top-K heaps do not combine either; every partition's saved scores are ranked together
+    priority_states = [payload for payload in
+                       (_read_json(os.path.join(dirs[key], PRIORITY_STATE)) for key in keys) if payload]
+    if priority_states:
+        merge_states(priority_states, os.path.join(output_dir, PRIORITY_DIR), os.path.join(output_dir, PRIORITY_STATE))
+
+    publish_artifacts(os.path.join(output_dir, OPERATOR_PUBLIC), {'dashboard_data.json': systems})
+
+    # Public dashboard: systems concatenate; the contaminant guide is the same
+    # in every partition apart from its exposure summaries, rebuilt here
+    public_systems = []
+    contaminant_info = None
+    for key in keys:
+        public_systems.extend(_read_json(os.path.join(dirs[key], PUBLIC_DIR, 'water_systems_data.json')) or [])
+        contaminant_info = contaminant_info or _read_json(os.path.join(dirs[key], PUBLIC_DIR, 'contaminant_info.json'))
+    lookup = ContaminantIndex(contaminant_index)
+    for info in (contaminant_info or {}).values():
+        info.pop('exposure', None)
+        exposure = lookup.summary(info['code'])
+        if exposure:
+            info['exposure'] = exposure
+    public_artifacts = {
+        'water_systems_data.json': public_systems,
+        'name_search_index.json': NameIndex.from_systems(public_systems).to_dict(),
+        **dataset_artifacts({'systems': system_columns(public_systems)}),
+        'contaminant_info.json': contaminant_info or {},
+        'contaminant_systems.json': contaminant_index
+    }
+    zip_tables = [table for table in (_read_json(os.path.join(dirs[key], PUBLIC_DIR, 'zip_nearest.json'))
+                                      for key in keys) if table]
+    if zip_tables:
+        public_artifacts['zip_nearest.json'] = merge_nearest_tables(zip_tables)
+    publish_artifacts(os.path.join(output_dir, PUBLIC_DIR), public_artifacts)
+
+    manifest['rollups'] = rollups
+    manifest['totals'] = {field: sum(r[field] for r in rollups.values())
+                          for field in ('systems', 'population', 'violations', 'active_violations',
+                                        'days_out_of_compliance', 'population_days', 'tasks_due')}
+    with open(os.path.join(root, PARTITION_MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    logger.info(f"Merged {len(keys)} partitions: {manifest['totals']['systems']} systems, "
+                f"{len(tasks)} tasks due, {len(contaminant_index['contaminants'])} contaminants")
+    return manifest
+
+
+def main():
+    """Split, run and merge a partitioned extraction"""
+    parser = argparse.ArgumentParser(description="Partitioned multi-state extraction")
+    parser.add_argument('command', choices=['split', 'run', 'merge', 'all'])
+    parser.add_argument('--data-dir', default="data")
+    parser.add_argument('--root', default=PARTITION_ROOT, help="Partition root (a shared filesystem for multi-node runs)")
+    parser.add_argument('--by', choices=['state', 'hash'], default='state')
+    parser.add_argument('--partitions', type=int, default=8, help="Number of hash partitions")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Partitions to run at once")
+    parser.add_argument('--partition', action='append', dest='only', help="Run only these partitions")
+    parser.add_argument('--shard', default="0/1", help="This node's share of the partitions, as INDEX/COUNT")
+    parser.add_argument('--stage', action='append', dest='stages', help="Pipeline stages to run (default: all)")
+    parser.add_argument('--force', action='store_true')
+    parser.add_argument('--output-dir', default=".")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    started = time.time()
+    if args.command in ('split', 'all'):
+        split_tables(args.data_dir, args.root, args.by, args.partitions)
+    if args.command in ('run', 'all'):
+        shard, shards = (int(part) for part in args.shard.split('/'))
+        keys = args.only or shard_partitions(load_partition_manifest(args.root), shard, shards)
+        outcome = run_partitions(args.root, args.workers, keys, args.stages, args.force)
+        if not all(outcome.values()):
+            raise SystemExit(1)
+    if args.command in ('merge', 'all'):
+        merge_partitions(args.root, args.output_dir)
+    logger.info(f"{args.command} finished in {time.time() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+Data Pipeline
+Single entry point for the extraction stages. Each stage declares its input
+and output files; stages whose inputs, code and outputs are unchanged since
+their last successful run are skipped, and independent stages run in parallel
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE = ".pipeline_state.json"
+# Stage code lives next to this file; inputs and outputs are relative to the working directory
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+TABLES = {
+    'events_milestones': 'data/SDWA_EVENTS_MILESTONES.csv',
+    'facilities': 'data/SDWA_FACILITIES.csv',
+    'geographic_areas': 'data/SDWA_GEOGRAPHIC_AREAS.csv',
+    'lcr_samples': 'data/SDWA_LCR_SAMPLES.csv',
+    'pn_violation_assoc': 'data/SDWA_PN_VIOLATION_ASSOC.csv',
+    'pub_water_systems': 'data/SDWA_PUB_WATER_SYSTEMS.csv',
+    'ref_code_values': 'data/SDWA_REF_CODE_VALUES.csv',
+    'service_areas': 'data/SDWA_SERVICE_AREAS.csv',
+    'site_visits': 'data/SDWA_SITE_VISITS.csv',
+    'violations_enforcement': 'data/SDWA_VIOLATIONS_ENFORCEMENT.csv',
+}
+SDWIS_TABLES = list(TABLES.values())
+
+
+def tables(*names: str) -> List[str]:
+    """Paths of the SDWIS tables a stage reads, so it reruns only when one of those changes"""
+    return [TABLES[name] for name in names]
+
+
+# Optional, locally supplied centroid files for the nearest-system ZIP table
+CENTROID_FILES = ['data/zip_centroids.csv', 'data/county_centroids.csv', 'data/place_centroids.csv']
+
+# Written by the validate stage; every later stage loads the tables without the
+# rows and values it quarantines (data_validation.validated_tables)
+QUARANTINE = 'validation_quarantine.csv'
+
+# Optional overrides of extraction_policy.py's scoring and classification rules
+POLICY = 'data/extraction_policy.json'
+
+OPERATOR_PUBLIC = 'operator-dashboard/public'
+PUBLIC_DIR = 'water-safety-dashboard/public'
+
+
+# Stage bodies import their modules lazily so that a no-change run, which only
+# stats files, does not pay for importing pandas
+
+def run_validate():
+    from data_validation import validate_tables
+    validate_tables()
+
+
+def run_contaminant_index():
+    from contaminant_index import build_contaminant_index, save_contaminant_index
+    from data_validation import validated_tables
+    with validated_tables():
+        save_contaminant_index(build_contaminant_index())
+
+
+def run_pn_timeliness():
+    from data_validation import validated_tables
+    from pn_timeliness import build_pn_timeliness, save_pn_timeliness
+    with validated_tables():
+        save_pn_timeliness(build_pn_timeliness())
+
+
+def run_inspection_priority():
+    from data_validation import validated_tables
+    from inspection_priority import build_inspection_priority
+    with validated_tables():
+        build_inspection_priority()
+
+
+def run_batch_index():
+    from batch_lookup import build_lookup_index, save_lookup_index
+    save_lookup_index(build_lookup_index())
+
+
+def run_interval_index():
+    from data_validation import validated_tables
+    from interval_index import build_interval_index
+    with validated_tables():
+        build_interval_index().save('interval_index.json')
+
+
+def run_comment_search():
+    from comment_search import build_comment_index
+    from data_validation import validated_tables
+    with validated_tables():
+        build_comment_index().save('comment_search_index.json')
+
+
+def run_export():
+    from contaminant_index import load_contaminant_index
+    from extraction_engine import ExtractionEngine
+    # Publish the contaminant_index stage's output rather than building it a second time
+    ExtractionEngine().run(public_dir=PUBLIC_DIR, operator_dir=OPERATOR_PUBLIC,
+                           contaminant_index=load_contaminant_index('contaminant_systems.json'), indexes=False)
+
+
+class Stage:
+    """A pipeline step with its declared input and output files"""
+
+    def __init__(self, name: str, run: Callable[[], None], inputs: List[str], outputs: List[str],
+                 code: List[str], after: Optional[List[str]] = None, description: str = ""):
+        self.name = name
+        self.run = run
+        self.inputs = inputs
+        self.outputs = outputs
+        # Source files whose changes invalidate the stage
+        self.code = code
+        # Ordering-only dependencies in addition to the ones implied by inputs/outputs
+        self.after = after or []
+        self.description = description
+
+
+# get-public-data.py, extract_dashboard_data.py and extract_water_systems.py
+# are single-output views over the export stage's engine, kept as manual tools.
+# Each stage lists only the tables it reads. Export joins every table into the
+# per-system records and scores and rolls them up from the same in-memory
+# frames, so it still reads them all; the indexes that do not need the joined
+# records are stages of their own.
+STAGES = [
+    Stage('validate', run_validate,
+          inputs=SDWIS_TABLES,
+          outputs=[QUARANTINE],
+          code=['data_validation.py', 'sdwis_tables.py'],
+          description="Check PWSIDs, ZIPs, dates and codes; write the quarantine file"),
+    Stage('contaminant_index', run_contaminant_index,
+          inputs=tables('violations_enforcement', 'lcr_samples', 'pn_violation_assoc', 'ref_code_values',
+                        'pub_water_systems') + [QUARANTINE],
+          outputs=['contaminant_systems.json'],
+          code=['contaminant_index.py', 'data_validation.py', 'sdwis_tables.py'],
+          description="Contaminant to systems reverse index"),
+    Stage('pn_timeliness', run_pn_timeliness,
+          inputs=tables('pn_violation_assoc', 'violations_enforcement') + [QUARANTINE],
+          outputs=['pn_timeliness.json'],
+          code=['pn_timeliness.py', 'data_validation.py', 'sdwis_tables.py'],
+          description="Public notification lag per system and statewide"),
+    Stage('interval_index', run_interval_index,
+          inputs=tables('events_milestones', 'violations_enforcement', 'pn_violation_assoc') + [QUARANTINE],
+          outputs=['interval_index.json'],
+          code=['interval_index.py', 'data_validation.py', 'sdwis_tables.py'],
+          description="Event, violation and notice intervals per system"),
+    Stage('comment_search', run_comment_search,
+          inputs=tables('site_visits', 'events_milestones') + [QUARANTINE],
+          outputs=['comment_search_index.json'],
+          code=['comment_search.py', 'data_validation.py', 'sdwis_tables.py'],
+          description="Full-text index over site visit and event comments"),
+    Stage('export', run_export,
+          inputs=SDWIS_TABLES + [QUARANTINE, POLICY, 'contaminant_systems.json'] + CENTROID_FILES,
+          outputs=['dashboard_data.json', 'task_calendar_index.json', f'{OPERATOR_PUBLIC}/artifact-manifest.json',
+                   f'{PUBLIC_DIR}/artifact-manifest.json'],
+          code=['extraction_engine.py', 'extraction_policy.py', 'system_repository.py', 'task_calendar.py',
+                'contaminant_index.py', 'compliance_days.py', 'name_search.py', 'zip_locator.py', 'artifacts.py',
+                'columnar_export.py', 'data_validation.py', 'sdwis_tables.py'],
+          description="Join and score the systems; write the operator dataset and the public dashboard artifacts"),
+    Stage('batch_index', run_batch_index,
+          inputs=tables('ref_code_values', 'pub_water_systems', 'geographic_areas', 'violations_enforcement',
+                        'site_visits', 'pn_violation_assoc') + [QUARANTINE, POLICY],
+          outputs=['batch_index/systems.cols', 'batch_index/zips.cols'],
+          code=['batch_lookup.py', 'extraction_engine.py', 'extraction_policy.py', 'compliance_days.py',
+                'data_validation.py', 'columnar_export.py', 'sdwis_tables.py'],
+          description="ZIP and PWSID index for batch list lookups"),
+    Stage('inspection_priority', run_inspection_priority,
+          inputs=tables('pub_water_systems', 'violations_enforcement', 'events_milestones', 'site_visits',
+                        'geographic_areas') + [QUARANTINE, POLICY, f'{PUBLIC_DIR}/artifact-manifest.json'],
+          outputs=[f'{OPERATOR_PUBLIC}/inspection_priority/index.json', 'inspection_priority_state.json'],
+          code=['inspection_priority.py', 'extraction_policy.py', 'columnar_export.py', 'data_validation.py',
+                'sdwis_tables.py'],
+          description="Statewide and per-county inspection priority top-K pages"),
+]
+
+
+class FileFingerprints:
+    """
+    Content hashes keyed by path, reused while a file's size and mtime are
+    unchanged so that an idle rebuild only stats its inputs
+    """
+
+    def __init__(self, cache: Optional[Dict[str, List[Any]]] = None):
+        self.cache = cache or {}
+
+    def digest(self, path: str) -> Optional[str]:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        cached = self.cache.get(path)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha.update(block)
+        digest = sha.hexdigest()
+        self.cache[path] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+
+def expand(patterns: List[str]) -> List[str]:
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if any(ch in pattern for ch in '*?[') else [pattern]
+        paths.extend(matches)
+    return paths
+
+
+class Pipeline:
+    """Schedules stages by dependency and skips the ones that are up to date"""
+
+    def __init__(self, stages: List[Stage] = None, state_file: str = STATE_FILE, jobs: int = 2):
+        self.stages = {stage.name: stage for stage in (stages or STAGES)}
+        self.state_file = state_file
+        self.jobs = jobs
+        self.state = self._load_state()
+        self.fingerprints = FileFingerprints(self.state.get('files'))
+        self.dependencies = self._dependencies()
+
+    def _load_state(self) -> Dict[str, Any]:
+        try:
+            with open(self.state_file, encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {'stages': {}, 'files': {}}
+
+    def _save_state(self):
+        self.state['files'] = self.fingerprints.cache
+        tmp_path = f"{self.state_file}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.state_file)
+
+    def _dependencies(self) -> Dict[str, set]:
+        producers = {}
+        for stage in self.stages.values():
+            for output in stage.outputs:
+                producers[output] = stage.name
+        dependencies = {}
+        for stage in self.stages.values():
+            deps = {producers[path] for path in stage.inputs if path in producers}
+            deps.update(name for name in stage.after if name in self.stages)
+            deps.discard(stage.name)
+            dependencies[stage.name] = deps
+        return dependencies
+
+    def _closure(self, targets: List[str]) -> List[str]:
+        """Targets plus everything they depend on, in a valid run order"""
+        ordered, visiting = [], set()
+
+        def visit(name):
+            if name in ordered:
+                return
+            if name in visiting:
+                raise ValueError(f"Dependency cycle through stage {name}")
+            visiting.add(name)
+            for dep in sorted(self.dependencies[name]):
+                visit(dep)
+            visiting.discard(name)
+            ordered.append(name)
+
+        for name in targets:
+            if name not in self.stages:
+                raise ValueError(f"Unknown stage {name}")
+            visit(name)
+        return ordered
+
+    def fingerprint(self, stage: Stage) -> str:
+        sha = hashlib.sha256(stage.name.encode())
+        code = [os.path.join(CODE_DIR, path) for path in stage.code]
+        for path in expand(stage.inputs) + code:
+            sha.update(f"{path}={self.fingerprints.digest(path)}\n".encode())
+        return sha.hexdigest()
+
+    def _outputs_intact(self, stage: Stage, recorded: Dict[str, Any]) -> bool:
+        outputs = recorded.get('outputs', {})
+        return all(outputs.get(path) is not None and self.fingerprints.digest(path) == outputs[path]
+                   for path in stage.outputs)
+
+    def is_fresh(self, stage: Stage, fingerprint: str) -> bool:
+        recorded = self.state['stages'].get(stage.name)
+        return bool(recorded) and recorded.get('fingerprint') == fingerprint and self._outputs_intact(stage, recorded)
+
+    def _record(self, stage: Stage, fingerprint: str, seconds: float):
+        self.state['stages'][stage.name] = {
+            'fingerprint': fingerprint,
+            'outputs': {path: self.fingerprints.digest(path) for path in stage.outputs},
+            'seconds': round(seconds, 3),
+            'finished': time.strftime('%Y-%m-%dT%H:%M:%S')
+        }
+        self._save_state()
+
+    def run(self, targets: Optional[List[str]] = None, force: bool = False, dry_run: bool = False) -> Dict[str, str]:
+        """Run the target stages (all by default); returns each stage's outcome"""
+        order = self._closure(targets or list(self.stages))
+        outcome: Dict[str, str] = {}
+        pending = list(order)
+        running = {}
+        started = {}
+
+        executor = None
+        try:
+            while pending or running:
+                for name in list(pending):
+                    deps = self.dependencies[name]
+                    if any(outcome.get(dep) == 'failed' for dep in deps):
+                        outcome[name] = 'failed'
+                        logger.error(f"{name}: skipped because a dependency failed")
+                        pending.remove(name)
+                        continue
+                    if not all(dep in outcome for dep in deps):
+                        continue
+                    pending.remove(name)
+                    stage = self.stages[name]
+                    fingerprint = self.fingerprint(stage)
+                    if not force and self.is_fresh(stage, fingerprint):
+                        outcome[name] = 'fresh'
+                        logger.info(f"{name}: up to date")
+                        continue
+                    if dry_run:
+                        outcome[name] = 'stale'
+                        logger.info(f"{name}: would run")
+                        continue
+                    if executor is None:
+                        executor = ProcessPoolExecutor(max_workers=self.jobs)
+                    logger.info(f"{name}: running")
+                    started[name] = (time.time(), fingerprint)
+                    running[executor.submit(stage.run)] = name
+
+                if not running:
+                    continue
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    began, fingerprint = started[name]
+                    try:
+                        future.result()
+                    except Exception as e:
+                        outcome[name] = 'failed'
+                        logger.error(f"Error running stage {name}: {e}")
+                        continue
+                    seconds = time.time() - began
+                    outcome[name] = 'ran'
+                    self._record(self.stages[name], fingerprint, seconds)
+                    logger.info(f"{name}: finished in {seconds:.1f}s")
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            if not dry_run:
+                self._save_state()
+        return outcome
+
+
+def main():
+    """Run the pipeline"""
+    parser = argparse.ArgumentParser(description="Run the extraction pipeline, rerunning only stale stages")
+    parser.add_argument('stages', nargs='*', help="Stages to bring up to date (default: all)")
+    parser.add_argument('--force', action='store_true', help="Rerun stages even if they are up to date")
+    parser.add_argument('--dry-run', action='store_true', help="Report which stages would run")
+    parser.add_argument('--jobs', type=int, default=2, help="Stages to run in parallel")
+    parser.add_argument('--list', action='store_true', help="List stages and their dependencies")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    pipeline = Pipeline(jobs=args.jobs)
+    if args.list:
+        for name, stage in pipeline.stages.items():
+            deps = ', '.join(sorted(pipeline.dependencies[name])) or '-'
+            print(f"{name:20} after: {deps:20} {stage.description}")
+        return
+
+    started = time.time()
+    outcome = pipeline.run(args.stages, force=args.force, dry_run=args.dry_run)
+    counts = {state: sum(1 for v in outcome.values() if v == state) for state in ('ran', 'fresh', 'stale', 'failed')}
+    logger.info(f"Pipeline finished in {time.time() - started:.2f}s: "
+                + ', '.join(f"{count} {state}" for state, count in counts.items() if count))
+    if counts['failed']:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
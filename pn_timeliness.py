@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Public Notification Timeliness
+Hash-joins each SDWA_PN_VIOLATION_ASSOC row to the public-notification
+violation it records and to the violation it covers, measures how long the
+system took to notify the public, and precomputes per-system and statewide
+lag percentiles
+"""
+
+import argparse
+import json
+import logging
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from sdwis_tables import NATURAL_KEYS, date_to_day, load_table
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_FILE = "pn_timeliness.json"
+
+MISSING_DAY = -1
+
+PERCENTILES = [50, 75, 90, 95]
+
+# Per-notice table, one row per PN association
+NOTICE_COLUMNS = ['pwsid', 'pn_violation_id', 'related_violation_id', 'violation_code',
+                  'violation_day', 'period_end_day', 'notified_day']
+
+# Order of the values stored per system (lags are lists aligned with PERCENTILES)
+SYSTEM_FIELDS = ['notices', 'notified', 'pending', 'lag_days', 'period_end_lag_days']
+
+
+def group_percentiles(keys: np.ndarray, values: np.ndarray, percentiles: List[float]) -> pd.DataFrame:
+    """
+    Linear-interpolated percentiles of values per key (numpy's default method),
+    from one sort: each key's values are a contiguous sorted run, so every
+    percentile is a gather at fractional positions within the runs
+    """
+    codes, uniques = pd.factorize(np.asarray(keys, dtype=object))
+    values = np.asarray(values, dtype=np.float64)
+    order = np.lexsort((values, codes))
+    values = values[order]
+    counts = np.bincount(codes, minlength=len(uniques))
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+    result = {}
+    for p in percentiles:
+        position = starts + (counts - 1) * (p / 100)
+        lo = np.floor(position).astype(np.int64)
+        hi = np.ceil(position).astype(np.int64)
+        result[p] = values[lo] + (values[hi] - values[lo]) * (position - lo)
+    return pd.DataFrame(result, index=uniques)
+
+
+def _first_day(df: pd.DataFrame, columns: List[str]) -> np.ndarray:
+    """First non-missing date among the columns present, as day numbers"""
+    day = np.full(len(df), MISSING_DAY, dtype=np.int64)
+    for column in reversed(columns):
+        if column in df.columns:
+            parsed = date_to_day(df[column], MISSING_DAY)
+            day = np.where(parsed != MISSING_DAY, parsed, day)
+    return day
+
+
+def join_notices(pn_df: pd.DataFrame, violations_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Link every PN association to two violations rows with hash joins on
+    (PWSID, VIOLATION_ID): the PN violation, whose return to compliance is the
+    day the notice went out, and the related violation, whose non-compliance
+    period the notice covers. The association's own period dates stand in when
+    the related violation is missing.
+    """
+    violations = violations_df.set_index(['PWSID', 'VIOLATION_ID'])
+    violations = violations[~violations.index.duplicated(keep='last')]
+    notified = pd.Series(_first_day(violations, ['CALCULATED_RTC_DATE', 'NON_COMPL_PER_END_DATE']), index=violations.index)
+    began = pd.Series(_first_day(violations, ['NON_COMPL_PER_BEGIN_DATE']), index=violations.index)
+    ended = pd.Series(_first_day(violations, ['NON_COMPL_PER_END_DATE']), index=violations.index)
+
+    pn_key = pd.MultiIndex.from_arrays([pn_df['PWSID'], pn_df['PN_VIOLATION_ID']])
+    related_key = pd.MultiIndex.from_arrays([pn_df['PWSID'], pn_df['RELATED_VIOLATION_ID']])
+    # get_indexer probes the hash table built over the violations' keys; -1 means no match
+    pn_rows = violations.index.get_indexer(pn_key)
+    related_rows = violations.index.get_indexer(related_key)
+
+    def gather(series: pd.Series, rows: np.ndarray) -> np.ndarray:
+        values = series.to_numpy()
+        return np.where(rows >= 0, values[np.maximum(rows, 0)] if len(values) else MISSING_DAY, MISSING_DAY)
+
+    violation_day = gather(began, related_rows)
+    violation_day = np.where(violation_day == MISSING_DAY,
+                             _first_day(pn_df, ['NON_COMPL_PER_BEGIN_DATE', 'COMPL_PER_BEGIN_DATE']), violation_day)
+    period_end_day = _first_day(pn_df, ['COMPL_PER_END_DATE', 'NON_COMPL_PER_END_DATE'])
+    period_end_day = np.where(period_end_day == MISSING_DAY, gather(ended, related_rows), period_end_day)
+
+    return pd.DataFrame({
+        'pwsid': pn_df['PWSID'].to_numpy(),
+        'pn_violation_id': pn_df['PN_VIOLATION_ID'].fillna('').to_numpy(),
+        'related_violation_id': pn_df['RELATED_VIOLATION_ID'].fillna('').to_numpy(),
+        'violation_code': pn_df['VIOLATION_CODE'].fillna('').to_numpy(),
+        'violation_day': violation_day,
+        'period_end_day': period_end_day,
+        'notified_day': gather(notified, pn_rows)
+    })
+
+
+def _lag_table(notices: pd.DataFrame, column: str) -> Tuple[pd.DataFrame, np.ndarray]:
+    measured = notices[(notices['notified_day'] != MISSING_DAY) & (notices[column] != MISSING_DAY)]
+    lags = (measured['notified_day'] - measured[column]).to_numpy()
+    return group_percentiles(measured['pwsid'].to_numpy(), lags, PERCENTILES), lags
+
+
+def _rounded(values) -> List[float]:
+    return [round(float(v), 1) for v in values]
+
+
+def summarize_notices(notices: pd.DataFrame) -> Dict[str, Any]:
+    """Per-system and statewide lag distributions over the joined notices"""
+    lag_by_system, lags = _lag_table(notices, 'violation_day')
+    period_lag_by_system, period_lags = _lag_table(notices, 'period_end_day')
+    is_notified = notices['notified_day'] != MISSING_DAY
+    counts = pd.DataFrame({'notices': 1, 'notified': is_notified.astype(np.int64), 'pwsid': notices['pwsid']}) \
+        .groupby('pwsid', sort=True)[['notices', 'notified']].sum()
+
+    systems = {}
+    for pwsid, (total, notified) in zip(counts.index, counts.itertuples(index=False)):
+        systems[pwsid] = [
+            int(total), int(notified), int(total - notified),
+            _rounded(lag_by_system.loc[pwsid]) if pwsid in lag_by_system.index else None,
+            _rounded(period_lag_by_system.loc[pwsid]) if pwsid in period_lag_by_system.index else None
+        ]
+
+    total_notified = int(is_notified.sum())
+    return {
+        'percentiles': PERCENTILES,
+        'fields': SYSTEM_FIELDS,
+        'statewide': {
+            'notices': len(notices),
+            'notified': total_notified,
+            'pending': len(notices) - total_notified,
+            'lag_days': _rounded(np.percentile(lags, PERCENTILES)) if len(lags) else None,
+            'period_end_lag_days': _rounded(np.percentile(period_lags, PERCENTILES)) if len(period_lags) else None
+        },
+        'systems': systems,
+        'notices': {name: notices[name].tolist() for name in NOTICE_COLUMNS}
+    }
+
+
+def build_pn_timeliness(data_dir: str = "data") -> Dict[str, Any]:
+    """Join PN associations to their violations and summarize the notification lags"""
+    pn_df = load_table('pn_violation_assoc', data_dir)
+    try:
+        violations_df = load_table('violations_enforcement', data_dir, usecols=[
+            'PWSID', 'VIOLATION_ID', 'NON_COMPL_PER_BEGIN_DATE', 'NON_COMPL_PER_END_DATE', 'CALCULATED_RTC_DATE'],
+            record_key=NATURAL_KEYS['violations_enforcement'])
+    except Exception as e:
+        logger.error(f"Error loading violations for PN timeliness: {e}")
+        violations_df = pd.DataFrame(columns=['PWSID', 'VIOLATION_ID'])
+
+    notices = join_notices(pn_df, violations_df)
+    summary = summarize_notices(notices)
+    logger.info(f"Joined {len(notices)} PN associations: {summary['statewide']['notified']} with a notification date "
+                f"across {len(summary['systems'])} systems")
+    return summary
+
+
+def notices_frame(payload: Dict[str, Any]) -> pd.DataFrame:
+    """Per-notice table of a saved summary, e.g. to re-summarize merged partitions"""
+    return pd.DataFrame({name: payload['notices'][name] for name in NOTICE_COLUMNS})
+
+
+def save_pn_timeliness(summary: Dict[str, Any], path: str = OUTPUT_FILE):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, separators=(',', ':'))
+    logger.info(f"PN timeliness tables saved to {path}")
+
+
+def main():
+    """Build the PN timeliness tables or look up a system"""
+    parser = argparse.ArgumentParser(description="Public notification lag per system and statewide")
+    parser.add_argument('pwsid', nargs='?', help="System to show")
+    parser.add_argument('--output', default=OUTPUT_FILE)
+    parser.add_argument('--build', action='store_true', help="Rebuild the tables from the data directory first")
+    parser.add_argument('--data-dir', default="data")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.build:
+        save_pn_timeliness(build_pn_timeliness(args.data_dir), args.output)
+    with open(args.output, encoding='utf-8') as f:
+        summary = json.load(f)
+
+    result = {'percentiles': summary['percentiles'], 'statewide': summary['statewide']}
+    if args.pwsid:
+        values = summary['systems'].get(args.pwsid)
+        result[args.pwsid] = dict(zip(summary['fields'], values)) if values else None
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
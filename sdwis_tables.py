@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+SDWIS Table Loading Helpers
+Shared CSV loading, supersession of repeated records and date parsing used by
+the extraction stages
+"""
+
+import logging
+import os
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+TABLE_FILES = {
+    'events_milestones': 'SDWA_EVENTS_MILESTONES.csv',
+    'facilities': 'SDWA_FACILITIES.csv',
+    'geographic_areas': 'SDWA_GEOGRAPHIC_AREAS.csv',
+    'lcr_samples': 'SDWA_LCR_SAMPLES.csv',
+    'pn_violation_assoc': 'SDWA_PN_VIOLATION_ASSOC.csv',
+    'pub_water_systems': 'SDWA_PUB_WATER_SYSTEMS.csv',
+    'ref_code_values': 'SDWA_REF_CODE_VALUES.csv',
+    'service_areas': 'SDWA_SERVICE_AREAS.csv',
+    'site_visits': 'SDWA_SITE_VISITS.csv',
+    'violations_enforcement': 'SDWA_VIOLATIONS_ENFORCEMENT.csv',
+}
+
+# Natural key of each table's logical record. Some keys span several rows
+# (a violation with many enforcement actions, a sample with lead and copper results)
+NATURAL_KEYS = {
+    'pub_water_systems': ['PWSID'],
+    'violations_enforcement': ['PWSID', 'VIOLATION_ID'],
+    'lcr_samples': ['PWSID', 'SAMPLE_ID'],
+    'site_visits': ['PWSID', 'VISIT_ID'],
+    'facilities': ['PWSID', 'FACILITY_ID'],
+    'events_milestones': ['PWSID', 'EVENT_SCHEDULE_ID'],
+    'pn_violation_assoc': ['PWSID', 'PN_VIOLATION_ID', 'RELATED_VIOLATION_ID'],
+    'geographic_areas': ['PWSID', 'GEO_ID'],
+    'service_areas': ['PWSID', 'SERVICE_AREA_TYPE_CODE'],
+    'ref_code_values': ['VALUE_TYPE', 'VALUE_CODE'],
+}
+
+# Columns telling the rows within one natural key apart
+ROW_KEYS = {
+    'violations_enforcement': NATURAL_KEYS['violations_enforcement'] + ['ENFORCEMENT_ID'],
+    'lcr_samples': NATURAL_KEYS['lcr_samples'] + ['SAR_ID'],
+}
+
+QUARTER_COLUMN = 'SUBMISSIONYEARQUARTER'
+# Dates ordering repeated versions of a row, most significant first; whichever are present are used
+VERSION_DATES = ['VIOL_LAST_REPORTED_DATE', 'LAST_REPORTED_DATE', 'ENFORCEMENT_DATE', 'ENFORCEMENT_ACTION_DATE']
+
+SDWIS_DATE_FORMAT = '%m/%d/%Y'
+EPOCH = np.datetime64('1970-01-01', 'D')
+
+
+def table_path(name: str, data_dir: str = "data") -> str:
+    """Path of the CSV file backing a table"""
+    return os.path.join(data_dir, TABLE_FILES[name])
+
+
+def latest_versions(df: pd.DataFrame, name: str, record_key: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Resolve repeated rows to the latest version of each record, in one
+    sort-and-drop pass. A natural key keeps only its rows from the newest
+    SUBMISSIONYEARQUARTER; rows sharing `record_key` (default: the table's row
+    key) then collapse to the one with the latest reported dates. Pass the
+    natural key as `record_key` to get one row per record, e.g. a violation
+    with its latest enforcement action. Row order is otherwise preserved.
+    """
+    natural = NATURAL_KEYS.get(name)
+    record_key = record_key or ROW_KEYS.get(name, natural)
+    if not natural or not all(c in df.columns for c in natural):
+        return df
+    record_key = [c for c in record_key if c in df.columns]
+
+    if QUARTER_COLUMN in df.columns and df[QUARTER_COLUMN].nunique() > 1:
+        # 'YYYYQn' quarters sort correctly as text
+        quarter = df[QUARTER_COLUMN].astype(str)
+        newest = quarter.groupby([df[c] for c in natural], dropna=False, sort=False).transform('max')
+        df = df[quarter == newest]
+
+    if not df.duplicated(record_key).any():
+        return df
+    versions = pd.DataFrame({c: date_to_day(df[c]) for c in VERSION_DATES if c in df.columns}, index=df.index)
+    order = versions.sort_values(list(versions.columns), kind='stable').index if len(versions.columns) else df.index
+    return df.loc[order].drop_duplicates(record_key, keep='last').sort_index()
+
+
+# Frames read while shared_tables() is active, keyed by file and whether the
+# quarantine was applied (and record key for resolved versions)
+_shared: Optional[Dict[Tuple, pd.DataFrame]] = None
+
+# validation_quarantine.csv entries load_table applies while quarantined_tables() is active
+_quarantine: Optional[pd.DataFrame] = None
+
+
+def _read_table(name: str, data_dir: str) -> pd.DataFrame:
+    df = pd.read_csv(table_path(name, data_dir), dtype=str, low_memory=False)
+    df.columns = df.columns.str.strip()
+    return df
+
+
+@contextmanager
+def quarantined_tables(quarantine: pd.DataFrame) -> Iterator[pd.DataFrame]:
+    """
+    Within this block load_table drops the rows the validation stage rejected
+    and blanks the values it nulled (see data_validation.validated_tables)
+    """
+    global _quarantine
+    outer = _quarantine
+    _quarantine = quarantine
+    try:
+        yield quarantine
+    finally:
+        _quarantine = outer
+
+
+def active_quarantine() -> Optional[pd.DataFrame]:
+    """The quarantine load_table is applying, if any"""
+    return _quarantine
+
+
+def apply_quarantine(name: str, df: pd.DataFrame) -> pd.DataFrame:
+    """
+    A freshly read table without its rejected rows and with its nulled values
+    blanked. Entries whose value no longer matches the row they name (the file
+    changed since validation) are skipped with a warning.
+    """
+    entries = _quarantine[(_quarantine['table'] == name) & _quarantine['action'].isin(['reject', 'null'])]
+    if not len(entries):
+        return df
+    positions = entries['row'].to_numpy(dtype=np.int64) - 2  # CSV line numbers, counting the header
+    in_range = (positions >= 0) & (positions < len(df))
+    current = np.full(len(entries), None, dtype=object)
+    for column in entries['column'].unique():
+        rows = (entries['column'] == column).to_numpy() & in_range
+        if column in df.columns:
+            current[rows] = df[column].to_numpy(dtype=object)[positions[rows]]
+    matches = pd.Series(current, index=entries.index).eq(entries['value']).to_numpy()
+    if not matches.all():
+        logger.warning(f"{name}: skipping {int((~matches).sum())} quarantine entries that no longer match the data; "
+                       f"re-run data_validation.py")
+    entries, positions = entries[matches], positions[matches]
+
+    df = df.copy()
+    for column in entries.loc[entries['action'] == 'null', 'column'].unique():
+        rows = positions[((entries['action'] == 'null') & (entries['column'] == column)).to_numpy()]
+        df.iloc[rows, df.columns.get_loc(column)] = np.nan
+    rejected = np.unique(positions[(entries['action'] == 'reject').to_numpy()])
+    if len(rejected):
+        logger.info(f"{name}: excluding {len(rejected)} quarantined rows")
+    return df.drop(index=df.index[rejected])
+
+
+@contextmanager
+def shared_tables() -> Iterator[Dict[Tuple, pd.DataFrame]]:
+    """
+    Within this block load_table reads each CSV once, in full, and serves every
+    later call (any usecols) from memory, so several builders run in one process
+    make a single pass over the data
+    """
+    global _shared
+    outer = _shared
+    _shared = {} if outer is None else outer
+    try:
+        yield _shared
+    finally:
+        _shared = outer
+
+
+def _shared_table(name: str, data_dir: str, usecols: Union[List[str], Callable[[str], bool], None],
+                  latest: bool, record_key: Optional[List[str]]) -> pd.DataFrame:
+    path = os.path.abspath(table_path(name, data_dir))
+    quarantined = _quarantine is not None
+    if (path, quarantined) not in _shared:
+        df = _read_table(name, data_dir)
+        _shared[(path, quarantined)] = apply_quarantine(name, df) if quarantined else df
+    df = _shared[(path, quarantined)]
+    if latest:
+        key = (path, quarantined, tuple(record_key or ()))
+        if key not in _shared:
+            _shared[key] = latest_versions(df, name, record_key)
+        df = _shared[key]
+    if usecols is not None:
+        if not callable(usecols) and not set(usecols) <= set(df.columns):
+            raise ValueError(f"Usecols do not match columns, columns expected but not found: "
+                             f"{sorted(set(usecols) - set(df.columns))}")
+        df = df[[c for c in df.columns if (usecols(c) if callable(usecols) else c in usecols)]]
+    # Callers add columns to what they get back; copy-on-write keeps the shared frame intact
+    return df.copy(deep=False)
+
+
+def _version_columns(name: str, record_key: Optional[List[str]]) -> set:
+    return (set(NATURAL_KEYS.get(name, [])) | set(record_key or ROW_KEYS.get(name, []))
+            | {QUARTER_COLUMN} | set(VERSION_DATES))
+
+
+def load_table(name: str, data_dir: str = "data", usecols: Union[List[str], Callable[[str], bool], None] = None,
+               latest: bool = True, record_key: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Load a SDWIS table with every column read as text, resolved to the latest
+    version of each record (see latest_versions) unless latest is False.
+    IDs and codes keep their leading zeros; callers convert numeric columns explicitly.
+    """
+    if _shared is not None:
+        return _shared_table(name, data_dir, usecols, latest, record_key)
+    if _quarantine is not None:
+        # Quarantine rows are CSV line numbers, so the whole table is read first
+        df = apply_quarantine(name, _read_table(name, data_dir))
+        if latest:
+            df = latest_versions(df, name, record_key)
+        return df if usecols is None else df[[c for c in df.columns if (usecols(c) if callable(usecols) else c in usecols)]]
+    read_columns = usecols
+    if latest and usecols is not None:
+        # The key and version columns are read for the dedup pass, then dropped
+        extra = _version_columns(name, record_key)
+        wanted = usecols if callable(usecols) else (lambda c, listed=set(usecols): c.strip() in listed)
+        read_columns = lambda c: wanted(c) or c.strip() in extra
+    df = pd.read_csv(table_path(name, data_dir), dtype=str, usecols=read_columns, low_memory=False)
+    df.columns = df.columns.str.strip()
+    if latest:
+        df = latest_versions(df, name, record_key)
+        if usecols is not None:
+            df = df[[c for c in df.columns if (usecols(c) if callable(usecols) else c in usecols)]]
+    return df
+
+
+def parse_dates(series: pd.Series) -> pd.Series:
+    """Vectorized MM/DD/YYYY parse; invalid or missing values become NaT"""
+    return pd.to_datetime(series, format=SDWIS_DATE_FORMAT, errors='coerce')
+
+
+def date_to_day(series: pd.Series, missing: int = -1) -> np.ndarray:
+    """Convert a SDWIS date column to int64 days since 1970-01-01"""
+    parsed = parse_dates(series)
+    days = parsed.values.astype('datetime64[D]')
+    out = (days - EPOCH).astype(np.int64)
+    out[pd.isna(parsed).to_numpy()] = missing
+    return out
+
+
+def day_to_iso(day: int) -> str:
+    """Format a day number as YYYY-MM-DD"""
+    return str(EPOCH + np.timedelta64(int(day), 'D'))
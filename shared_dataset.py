@@ -0,0 +1,607 @@
+#!/usr/bin/env python3
+"""
+Shared Memory-Mapped Dataset
+Publishes the repository's tables, PWSID offsets, code dictionaries and
+per-system rollups once as versioned typed-array files, which any number of
+serving or analysis workers map read-only and share through the page cache.
+A publish writes a new version directory and then flips the current pointer,
+so attached workers swap to it on their next poll without a restart
+"""
+
+import argparse
+import bisect
+import json
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+
+from columnar_export import MISSING_CODE, encode_dictionary, read_columns, write_columns
+from data_validation import QUARANTINE_FILE
+from extraction_policy import active_mask, load_policy
+from system_repository import SystemRepository
+
+logger = logging.getLogger(__name__)
+
+SHARED_ROOT = "shared_data"
+CURRENT_FILE = "current.json"
+MANIFEST_FILE = "dataset.json"
+# Versions kept on disk; older ones are removed after a publish (workers still
+# mapping them keep their pages until they swap)
+KEEP_VERSIONS = 2
+# Columns with at most this many distinct values are dictionary-encoded in the
+# file header; the rest are stored as UTF-8 buffers with per-row offsets
+DICTIONARY_LIMIT = 256
+MISSING_OFFSET = -1
+DEFAULT_PORT = 8766
+POLL_SECONDS = 2.0
+REFERENCE_KEY_SEPARATOR = '\x1f'
+
+
+def _text_columns(values: pd.Series) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+    """Row offsets and lengths into one UTF-8 buffer (offset -1 for missing)"""
+    encoded = [None if value is None or (isinstance(value, float) and pd.isna(value)) else str(value).encode('utf-8')
+               for value in values]
+    lengths = np.fromiter((0 if value is None else len(value) for value in encoded), dtype=np.int64, count=len(encoded))
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1])) if len(lengths) else lengths
+    if len(lengths) and offsets[-1] + lengths[-1] > np.iinfo(np.int32).max:
+        raise ValueError(f"Text column {values.name} exceeds 2 GiB")
+    missing = np.array([value is None for value in encoded], dtype=bool)
+    offsets = np.where(missing, MISSING_OFFSET, offsets).astype('<i4')
+    blob = np.frombuffer(b''.join(value for value in encoded if value is not None), dtype='u1')
+    return {values.name: offsets, f"{values.name}:length": lengths.astype('<i4')}, blob
+
+
+def write_table(prefix: str, df: pd.DataFrame, extra: Optional[Dict[str, np.ndarray]] = None,
+                text: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Write a table as <prefix>.cols plus one <prefix>.<column>.utf8.cols per text
+    column; returns the table's manifest entry. Columns listed in text are
+    always stored as text (e.g. keys that are searched by value).
+    """
+    columns, dictionaries, nulls, text_columns = {}, {}, {}, []
+    for column in df.columns:
+        values = df[column]
+        if column not in (text or []) and values.nunique(dropna=True) <= DICTIONARY_LIMIT:
+            columns[column], dictionaries[column] = encode_dictionary(values)
+            continue
+        arrays, blob = _text_columns(values)
+        columns.update(arrays)
+        nulls[column] = MISSING_OFFSET
+        write_columns(f"{prefix}.{column}.utf8.cols", column, {'utf8': blob})
+        text_columns.append(column)
+    for name, values in (extra or {}).items():
+        columns[name] = values
+    write_columns(f"{prefix}.cols", os.path.basename(prefix), columns, dictionaries, nulls)
+    return {'rows': len(df), 'columns': list(df.columns), 'text': text_columns, 'extra': list(extra or {})}
+
+
+def _frame(index) -> pd.DataFrame:
+    """The sorted rows behind an OffsetIndex"""
+    return pd.DataFrame(dict(zip(index.columns, index.arrays)), columns=index.columns)
+
+
+def _span_counts(mask: np.ndarray, starts: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """Per-system count of the flagged rows in each system's span"""
+    cumulative = np.concatenate(([0], np.cumsum(mask, dtype=np.int64)))
+    return (cumulative[starts + rows] - cumulative[starts]).astype('<i4')
+
+
+def _next_version(root: str) -> int:
+    versions = [int(name[1:]) for name in os.listdir(root) if re.fullmatch(r'v\d+', name)]
+    return max(versions, default=0) + 1
+
+
+def current_version(root: str = SHARED_ROOT) -> Optional[Dict[str, Any]]:
+    """The published version pointer ({'version', 'path'}), or None before the first publish"""
+    try:
+        with open(os.path.join(root, CURRENT_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def publish_dataset(repository: SystemRepository, root: str = SHARED_ROOT, keep: int = KEEP_VERSIONS,
+                    policy: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Write the repository's systems, detail sections and reference codes (as
+    validated when the repository loaded them) as a new version under root, point current.json at it and prune old versions.
+    The rollups follow policy (default: the repository's), which is recorded
+    in the manifest for the workers' detail records. Returns the new version
+    number.
+    """
+    policy = policy or repository.policy
+    started = time.perf_counter()
+    os.makedirs(root, exist_ok=True)
+    version = _next_version(root)
+    name = f"v{version:06d}"
+    tmp_dir = os.path.join(root, f".{name}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    systems = _frame(repository._system_rows)
+    systems = systems[systems['PWSID'].notna() & ~systems['PWSID'].duplicated()].reset_index(drop=True)
+    pwsids = systems['PWSID'].to_numpy().astype(str)
+    population = pd.to_numeric(systems['POPULATION_SERVED_COUNT'], errors='coerce')
+    rollups = {'population': population.fillna(MISSING_CODE).to_numpy(dtype='<i4')}
+
+    tables = {}
+    for section, index in repository.indexes.items():
+        frame = _frame(index)
+        section_pwsids = frame['PWSID'].to_numpy().astype(str) if len(frame) else np.array([], dtype=str)
+        starts = np.searchsorted(section_pwsids, pwsids, side='left')
+        rows = np.searchsorted(section_pwsids, pwsids, side='right') - starts
+        rollups[f"{section}.start"] = starts.astype('<i4')
+        rollups[f"{section}.rows"] = rows.astype('<i4')
+        if section == 'violations_enforcement' and {'VIOLATION_STATUS', 'IS_HEALTH_BASED_IND'} <= set(frame.columns):
+            active = active_mask(frame['VIOLATION_STATUS'], policy).to_numpy()
+            health_based = (frame['IS_HEALTH_BASED_IND'] == policy['health_based_indicator']).to_numpy()
+            rollups['active_violations'] = _span_counts(active, starts, rows)
+            rollups['health_based_violations'] = _span_counts(health_based, starts, rows)
+        tables[section] = write_table(os.path.join(tmp_dir, section), frame)
+
+    tables['systems'] = write_table(os.path.join(tmp_dir, 'systems'), systems, extra=rollups, text=['PWSID'])
+    references = pd.DataFrame(
+        [(f"{value_type}{REFERENCE_KEY_SEPARATOR}{code}", description)
+         for value_type, codes in repository.reference_codes.items() for code, description in codes.items()],
+        columns=['KEY', 'DESCRIPTION']).drop_duplicates('KEY').sort_values('KEY', kind='stable')
+    tables['reference_codes'] = write_table(os.path.join(tmp_dir, 'reference_codes'), references,
+                                            text=['KEY', 'DESCRIPTION'])
+
+    manifest = {'version': version, 'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'policy': policy,
+                'tables': tables}
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_dir, os.path.join(root, name))
+
+    # Flip the pointer last: a reader sees either the old or the new version, complete
+    pointer_tmp = os.path.join(root, f"{CURRENT_FILE}.tmp")
+    with open(pointer_tmp, 'w', encoding='utf-8') as f:
+        json.dump({'version': version, 'path': name}, f)
+    os.replace(pointer_tmp, os.path.join(root, CURRENT_FILE))
+
+    kept = sorted((entry for entry in os.listdir(root) if re.fullmatch(r'v\d+', entry)), reverse=True)[:keep]
+    for entry in os.listdir(root):
+        if re.fullmatch(r'v\d+', entry) and entry not in kept:
+            shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+    size = sum(os.path.getsize(os.path.join(root, name, f)) for f in os.listdir(os.path.join(root, name)))
+    logger.info(f"Published shared dataset version {version} ({len(systems)} systems, {size:,} bytes) "
+                f"to {root} in {time.perf_counter() - started:.1f}s")
+    return version
+
+
+class SharedTable:
+    """One mapped table; values are decoded only for the rows asked for"""
+
+    def __init__(self, prefix: str, entry: Dict[str, Any]):
+        header, self.arrays = read_columns(f"{prefix}.cols")
+        self.length = header['rows']
+        self.columns = entry['columns']
+        self.dictionaries = {c['name']: c['dictionary'] for c in header['columns'] if 'dictionary' in c}
+        self.text = {column: read_columns(f"{prefix}.{column}.utf8.cols")[1]['utf8'] for column in entry['text']}
+
+    def __len__(self) -> int:
+        return self.length
+
+    def value(self, column: str, row: int) -> Optional[str]:
+        if column in self.text:
+            offset = int(self.arrays[column][row])
+            if offset == MISSING_OFFSET:
+                return None
+            return self.text[column][offset:offset + int(self.arrays[f"{column}:length"][row])].tobytes().decode('utf-8')
+        code = int(self.arrays[column][row])
+        return None if code == MISSING_CODE else self.dictionaries[column][code]
+
+    def values(self, column: str, start: int = 0, stop: Optional[int] = None) -> List[Optional[str]]:
+        stop = self.length if stop is None else stop
+        if column in self.text:
+            blob = self.text[column]
+            offsets = self.arrays[column][start:stop].tolist()
+            lengths = self.arrays[f"{column}:length"][start:stop].tolist()
+            return [None if offset == MISSING_OFFSET else blob[offset:offset + length].tobytes().decode('utf-8')
+                    for offset, length in zip(offsets, lengths)]
+        dictionary = self.dictionaries[column]
+        return [None if code == MISSING_CODE else dictionary[code] for code in self.arrays[column][start:stop].tolist()]
+
+    def slice(self, start: int, stop: int) -> List[Dict[str, Any]]:
+        columns = self.columns
+        return [dict(zip(columns, values)) for values in zip(*(self.values(c, start, stop) for c in columns))]
+
+
+class _Column:
+    """A sorted text column as a sequence, for bisect"""
+
+    def __init__(self, table: SharedTable, column: str):
+        self.table = table
+        self.column = column
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def __getitem__(self, row: int) -> Optional[str]:
+        return self.table.value(self.column, row)
+
+
+class SectionIndex:
+    """OffsetIndex over a mapped section: a system's rows are the span recorded in the systems table"""
+
+    def __init__(self, dataset: "DatasetVersion", section: str):
+        self.dataset = dataset
+        self.table = dataset.tables[section]
+        self.starts = dataset.systems.arrays[f"{section}.start"]
+        self.counts = dataset.systems.arrays[f"{section}.rows"]
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def count(self, pwsid: str) -> int:
+        row = self.dataset.locate(pwsid)
+        return 0 if row is None else int(self.counts[row])
+
+    def rows(self, pwsid: str) -> List[Dict[str, Any]]:
+        row = self.dataset.locate(pwsid)
+        if row is None or not self.counts[row]:
+            return []
+        start = int(self.starts[row])
+        return self.table.slice(start, start + int(self.counts[row]))
+
+
+class SystemIndex:
+    """OffsetIndex over the mapped systems table (one row per PWSID)"""
+
+    def __init__(self, dataset: "DatasetVersion"):
+        self.dataset = dataset
+
+    def __len__(self) -> int:
+        return len(self.dataset.systems)
+
+    def rows(self, pwsid: str) -> List[Dict[str, Any]]:
+        row = self.dataset.locate(pwsid)
+        return [] if row is None else self.dataset.systems.slice(row, row + 1)
+
+
+class _ValueTypeCodes(Mapping):
+    """{code: description} for one value type: a span of the sorted reference keys"""
+
+    def __init__(self, dataset: "DatasetVersion", prefix: str, start: int, stop: int):
+        self.dataset = dataset
+        self.prefix = prefix
+        self.start = start
+        self.stop = stop
+
+    def __getitem__(self, code: str) -> str:
+        key = f"{self.prefix}{code}"
+        keys = self.dataset._reference_keys
+        row = bisect.bisect_left(keys, key, self.start, self.stop)
+        if row < self.stop and keys[row] == key:
+            return self.dataset.reference_codes.value('DESCRIPTION', row)
+        raise KeyError(code)
+
+    def __iter__(self) -> Iterator[str]:
+        for key in self.dataset.reference_codes.values('KEY', self.start, self.stop):
+            yield key[len(self.prefix):]
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+
+class ReferenceCodes(Mapping):
+    """
+    {value type: {code: description}} over the mapped reference table, the
+    shape SystemRepository.reference_codes has, looked up by bisection
+    """
+
+    def __init__(self, dataset: "DatasetVersion"):
+        self.dataset = dataset
+        self._spans: Dict[str, Tuple[int, int]] = {}
+
+    def __getitem__(self, value_type: str) -> _ValueTypeCodes:
+        prefix = f"{value_type}{REFERENCE_KEY_SEPARATOR}"
+        span = self._spans.get(value_type)
+        if span is None:
+            keys = self.dataset._reference_keys
+            # Every key of the type sorts between its prefix and the prefix's successor
+            span = (bisect.bisect_left(keys, prefix),
+                    bisect.bisect_left(keys, f"{value_type}{chr(ord(REFERENCE_KEY_SEPARATOR) + 1)}"))
+            self._spans[value_type] = span
+        if span[0] == span[1]:
+            raise KeyError(value_type)
+        return _ValueTypeCodes(self.dataset, prefix, *span)
+
+    def __iter__(self) -> Iterator[str]:
+        seen = set()
+        for key in self.dataset.reference_codes.values('KEY'):
+            value_type = key.split(REFERENCE_KEY_SEPARATOR, 1)[0]
+            if value_type not in seen:
+                seen.add(value_type)
+                yield value_type
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+class DatasetVersion:
+    """Every table of one published version, mapped read-only"""
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, MANIFEST_FILE), encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        self.path = path
+        self.version = self.manifest['version']
+        self.tables = {name: SharedTable(os.path.join(path, name), entry)
+                       for name, entry in self.manifest['tables'].items()}
+        self.systems = self.tables.pop('systems')
+        self.reference_codes = self.tables.pop('reference_codes')
+        self._pwsids = _Column(self.systems, 'PWSID')
+        self._reference_keys = _Column(self.reference_codes, 'KEY')
+        self.codes = ReferenceCodes(self)
+        # A detail record looks the same PWSID up once per section
+        self._located: Tuple[Optional[str], Optional[int]] = (None, None)
+
+    def locate(self, pwsid: str) -> Optional[int]:
+        located = self._located
+        if located[0] == pwsid:
+            return located[1]
+        row = bisect.bisect_left(self._pwsids, pwsid)
+        row = row if row < len(self._pwsids) and self._pwsids[row] == pwsid else None
+        self._located = (pwsid, row)
+        return row
+
+    def describe(self, value_type: str, code: str) -> str:
+        return self.codes.get(value_type, {}).get(code, code)
+
+    def mapped_bytes(self) -> int:
+        return sum(os.path.getsize(os.path.join(self.path, f)) for f in os.listdir(self.path))
+
+
+def attach(root: str = SHARED_ROOT) -> DatasetVersion:
+    """Map the current version, retrying once if a publish pruned it in between"""
+    for _ in range(2):
+        pointer = current_version(root)
+        if pointer is None:
+            raise FileNotFoundError(f"No shared dataset published under {root}")
+        try:
+            return DatasetVersion(os.path.join(root, pointer['path']))
+        except FileNotFoundError:
+            continue
+    raise FileNotFoundError(f"Shared dataset version {pointer['version']} under {root} disappeared while attaching")
+
+
+class SharedRepository(SystemRepository):
+    """
+    SystemRepository over an attached dataset version instead of per-process
+    frames: the same detail records, built with the policy the version was
+    published with, and only the LRU of built records held per worker. sync()
+    swaps to a newer published version.
+    """
+
+    def __init__(self, root: str = SHARED_ROOT, cache_size: int = 256):
+        self.root = root
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.RLock()
+        self.data_dir = None
+        self._attach(attach(root))
+
+    def _attach(self, dataset: DatasetVersion):
+        with self.lock:
+            self.dataset = dataset
+            # Versions published before the manifest carried the policy
+            self.policy = dataset.manifest.get('policy') or load_policy()
+            self.reference_codes = dataset.codes
+            self._system_rows = SystemIndex(dataset)
+            self.indexes = {section: SectionIndex(dataset, section) for section in dataset.tables}
+            self._cache.clear()
+        logger.info(f"Attached shared dataset version {dataset.version} ({len(dataset.systems)} systems)")
+
+    @property
+    def version(self) -> int:
+        return self.dataset.version
+
+    def sync(self) -> bool:
+        """Swap to the current published version if it is newer; True when swapped"""
+        pointer = current_version(self.root)
+        if pointer is None or pointer['version'] == self.dataset.version:
+            return False
+        self._attach(attach(self.root))
+        return True
+
+    def __contains__(self, pwsid: str) -> bool:
+        return self.dataset.locate(pwsid) is not None
+
+    def get(self, pwsid: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            return super().get(pwsid)
+
+    def summaries(self) -> List[Dict[str, Any]]:
+        """The summary view straight from the mapped columns and span counts"""
+        with self.lock:
+            systems = self.dataset.systems
+            sections = list(self.indexes)
+        columns = {
+            'name': systems.values('PWS_NAME'),
+            'type_code': systems.values('PWS_TYPE_CODE'),
+            'activity_status': systems.values('PWS_ACTIVITY_CODE'),
+            'population_served': [None if p == MISSING_CODE else p for p in systems.arrays['population'].tolist()],
+        }
+        counts = {section: systems.arrays[f"{section}.rows"].tolist() for section in sections}
+        summaries = []
+        for i, pwsid in enumerate(systems.values('PWSID')):
+            summary = {'pwsid': pwsid}
+            summary.update({key: values[i] for key, values in columns.items()})
+            summary['counts'] = {section: counts[section][i] for section in sections}
+            summaries.append(summary)
+        return summaries
+
+    def refresh(self, table: str = None, pwsids=None):
+        """Tables are replaced by publishing a new version; this only picks it up"""
+        self.sync()
+
+
+def _resident_kb() -> Dict[str, int]:
+    """This process's resident and proportional set sizes (Linux), for /status"""
+    usage = {}
+    try:
+        with open('/proc/self/smaps_rollup', encoding='utf-8') as f:
+            for line in f:
+                field, _, value = line.partition(':')
+                if field in ('Rss', 'Pss', 'Private_Dirty'):
+                    usage[field.lower()] = int(value.split()[0])
+    except OSError:
+        pass
+    return usage
+
+
+class _SharedHandler(BaseHTTPRequestHandler):
+    """
+    GET /status           dataset version, worker PID and memory
+    GET /systems          summary of every system
+    GET /systems/<PWSID>  detailed record of one system
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+    def _send_json(self, payload: Any, status: int = 200):
+        body = json.dumps(payload, separators=(',', ':'), default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        repository: SharedRepository = self.server.repository
+        path = urlparse(self.path).path.rstrip('/')
+        try:
+            if path == '/status':
+                hits, misses, cached = repository.cache_info()
+                self._send_json({'version': repository.version, 'pid': os.getpid(), 'systems': len(repository),
+                                 'mapped_bytes': repository.dataset.mapped_bytes(), 'memory_kb': _resident_kb(),
+                                 'cache': {'hits': hits, 'misses': misses, 'records': cached}})
+            elif path == '/systems':
+                self._send_json(repository.summaries())
+            elif path.startswith('/systems/'):
+                record = repository.get(path.split('/', 2)[2].upper())
+                self._send_json(record if record else {'error': 'Unknown PWSID'}, 200 if record else 404)
+            else:
+                self._send_json({'error': 'Not found'}, 404)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except Exception as e:
+            logger.error(f"Error serving {self.path}: {e}")
+            self._send_json({'error': str(e)}, 500)
+
+
+class SharedDataServer(ThreadingHTTPServer):
+    """HTTP server over a SharedRepository; forked workers share its listening socket"""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, root: str = SHARED_ROOT, host: str = '127.0.0.1', port: int = DEFAULT_PORT):
+        self.root = root
+        self.repository: Optional[SharedRepository] = None
+        super().__init__((host, port), _SharedHandler)
+
+
+def _serve_worker(server: SharedDataServer, interval: float, cache_size: int):
+    # Attach after the fork so every worker maps the files itself
+    server.repository = SharedRepository(server.root, cache_size)
+    stop = threading.Event()
+
+    def poll():
+        while not stop.wait(interval):
+            try:
+                server.repository.sync()
+            except Exception as e:
+                logger.error(f"Error swapping shared dataset: {e}")
+
+    threading.Thread(target=poll, daemon=True).start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+
+
+def serve(root: str = SHARED_ROOT, workers: int = 2, host: str = '127.0.0.1', port: int = DEFAULT_PORT,
+          interval: float = POLL_SECONDS, cache_size: int = 256):
+    """Fork workers that accept on one socket, each serving the shared dataset and polling for new versions"""
+    attach(root)
+    server = SharedDataServer(root, host, port)
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=_serve_worker, args=(server, interval, cache_size), daemon=True)
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    logger.info(f"Serving {root} on http://{host}:{port} with {workers} workers (polling every {interval}s)")
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        server.server_close()
+
+
+def main():
+    """Publish the shared dataset, or serve it from several worker processes"""
+    parser = argparse.ArgumentParser(description="Versioned memory-mapped SDWIS dataset shared by worker processes")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    publish = subparsers.add_parser('publish', help="Load the tables and publish them as the next version")
+    publish.add_argument('--data-dir', default="data")
+    publish.add_argument('--root', default=SHARED_ROOT)
+    publish.add_argument('--keep', type=int, default=KEEP_VERSIONS, help="Versions kept on disk")
+    publish.add_argument('--policy', help="Extraction policy overrides (default: <data-dir>/extraction_policy.json, if present)")
+    publish.add_argument('--quarantine', default=QUARANTINE_FILE, help="Validation quarantine to apply ('' to load raw tables)")
+
+    serve_parser = subparsers.add_parser('serve', help="Serve the current version from forked workers")
+    serve_parser.add_argument('--root', default=SHARED_ROOT)
+    serve_parser.add_argument('--workers', type=int, default=2)
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    serve_parser.add_argument('--interval', type=float, default=POLL_SECONDS, help="Seconds between version polls")
+    serve_parser.add_argument('--cache-size', type=int, default=256, help="Detail records kept per worker")
+
+    status = subparsers.add_parser('status', help="Print the current version and its tables")
+    status.add_argument('--root', default=SHARED_ROOT)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.command == 'publish':
+        repository = SystemRepository(args.data_dir, policy=load_policy(args.policy, args.data_dir),
+                                      quarantine_file=args.quarantine or None)
+        publish_dataset(repository, args.root, args.keep)
+    elif args.command == 'serve':
+        serve(args.root, args.workers, args.host, args.port, args.interval, args.cache_size)
+    else:
+        dataset = attach(args.root)
+        print(json.dumps({'version': dataset.version, 'created': dataset.manifest['created'],
+                          'mapped_bytes': dataset.mapped_bytes(),
+                          'tables': {name: entry['rows'] for name, entry in dataset.manifest['tables'].items()}},
+                         indent=2))
+
+
+if __name__ == "__main__":
+    main()
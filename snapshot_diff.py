@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+SDWIS Snapshot Diff
+Compares two data drops table by table on each table's natural key and
+classifies rows as inserted, deleted or modified using vectorized row hashes
+"""
+
+import argparse
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from sdwis_tables import NATURAL_KEYS, TABLE_FILES, load_table
+
+logger = logging.getLogger(__name__)
+
+# Columns that change with every drop without the record itself changing
+IGNORED_COLUMNS = ['SUBMISSIONYEARQUARTER']
+
+
+def keyed_hashes(df: pd.DataFrame, key_columns: List[str], ignore: List[str],
+                 columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    One row per natural key with a 64-bit content hash. Keys that span several
+    rows (e.g. a violation with many enforcement actions, a sample with lead and
+    copper results) combine their row hashes order-independently. The hash
+    covers columns (default: every non-key column) in sorted order, so it does
+    not depend on the drop's column order.
+    """
+    value_columns = sorted(c for c in (df.columns if columns is None else columns)
+                           if c not in key_columns and c not in ignore)
+    key_hash = pd.util.hash_pandas_object(df[key_columns], index=False).to_numpy()
+    row_hash = pd.util.hash_pandas_object(df[value_columns], index=False).to_numpy()
+
+    frame = pd.DataFrame({'key_hash': key_hash, 'row_hash': row_hash, 'rows': 1, 'position': np.arange(len(df))})
+    # uint64 sums wrap around, which is exactly what an order-independent combine needs
+    grouped = frame.groupby('key_hash', sort=False).agg(
+        row_hash=('row_hash', 'sum'), rows=('rows', 'sum'), position=('position', 'first'))
+    return grouped
+
+
+def _key_records(df: pd.DataFrame, key_columns: List[str], positions: np.ndarray) -> List[List[Any]]:
+    return df.iloc[positions][key_columns].astype(object).where(lambda x: x.notna(), None).values.tolist()
+
+
+def _value_changes(old_df: pd.DataFrame, new_df: pd.DataFrame, old_pos: np.ndarray, new_pos: np.ndarray,
+                   key_columns: List[str], ignore: List[str]) -> List[Dict[str, Any]]:
+    """Column-level old/new values for modified single-row keys"""
+    columns = [c for c in new_df.columns if c in old_df.columns and c not in key_columns and c not in ignore]
+    old_rows = old_df.iloc[old_pos][columns].reset_index(drop=True)
+    new_rows = new_df.iloc[new_pos][columns].reset_index(drop=True)
+    differs = ~((old_rows == new_rows) | (old_rows.isna() & new_rows.isna()))
+
+    keys = _key_records(new_df, key_columns, new_pos)
+    changes = []
+    for i, row_mask in enumerate(differs.to_numpy()):
+        changed = {}
+        for column, flag in zip(columns, row_mask):
+            if flag:
+                before, after = old_rows.at[i, column], new_rows.at[i, column]
+                changed[column] = [None if pd.isna(before) else before, None if pd.isna(after) else after]
+        changes.append({'key': keys[i], 'changes': changed})
+    return changes
+
+
+def diff_table(old_df: pd.DataFrame, new_df: pd.DataFrame, key_columns: List[str],
+               ignore: Optional[List[str]] = None, detail_limit: int = 1000) -> Dict[str, Any]:
+    """Classify keys of one table as inserted, deleted or modified"""
+    ignore = IGNORED_COLUMNS if ignore is None else ignore
+    # Rows are compared on the columns both drops have; a column that was added
+    # or removed is reported once instead of marking every row modified
+    shared = [c for c in new_df.columns if c in old_df.columns]
+    old_keys = keyed_hashes(old_df, key_columns, ignore, shared)
+    new_keys = keyed_hashes(new_df, key_columns, ignore, shared)
+
+    # Align on the key hash with index set operations; an outer join would turn
+    # the uint64 hashes into floats and lose precision
+    common = old_keys.index.intersection(new_keys.index)
+    inserted = new_keys.loc[new_keys.index.difference(old_keys.index)]
+    deleted = old_keys.loc[old_keys.index.difference(new_keys.index)]
+    old_common = old_keys.loc[common]
+    new_common = new_keys.loc[common]
+    changed = old_common['row_hash'].to_numpy() != new_common['row_hash'].to_numpy()
+    modified_old = old_common[changed]
+    modified_new = new_common[changed]
+
+    result = {
+        'key': key_columns,
+        'old_rows': len(old_df),
+        'new_rows': len(new_df),
+        'columns': {
+            'added': sorted(set(new_df.columns) - set(old_df.columns)),
+            'removed': sorted(set(old_df.columns) - set(new_df.columns))
+        },
+        'counts': {
+            'inserted': len(inserted),
+            'deleted': len(deleted),
+            'modified': int(changed.sum()),
+            'unchanged': int(len(common) - changed.sum())
+        },
+        'inserted': _key_records(new_df, key_columns, inserted['position'].to_numpy()[:detail_limit]),
+        'deleted': _key_records(old_df, key_columns, deleted['position'].to_numpy()[:detail_limit]),
+    }
+
+    # Keys backed by a single row on both sides get column-level detail; multi-row
+    # keys (e.g. a violation whose enforcement actions changed) are flagged as a whole
+    single = ((modified_old['rows'] == 1) & (modified_new['rows'] == 1)).to_numpy()
+    result['modified'] = _value_changes(old_df, new_df,
+                                        modified_old['position'].to_numpy()[single][:detail_limit],
+                                        modified_new['position'].to_numpy()[single][:detail_limit],
+                                        key_columns, ignore)
+    result['modified'] += [{'key': key, 'changes': 'rows'} for key in _key_records(
+        new_df, key_columns, modified_new['position'].to_numpy()[~single][:detail_limit])]
+    result['truncated'] = any(result['counts'][kind] > detail_limit for kind in ('inserted', 'deleted', 'modified'))
+    return result
+
+
+def diff_snapshots(old_dir: str, new_dir: str, tables: Optional[List[str]] = None,
+                   detail_limit: int = 1000) -> Dict[str, Any]:
+    """Diff every table present in both data directories"""
+    change_set = {'old': old_dir, 'new': new_dir, 'tables': {}}
+    for name in tables or NATURAL_KEYS:
+        old_path = os.path.join(old_dir, TABLE_FILES[name])
+        new_path = os.path.join(new_dir, TABLE_FILES[name])
+        if not (os.path.exists(old_path) and os.path.exists(new_path)):
+            logger.warning(f"Skipping {name}: not present in both snapshots")
+            continue
+        # Raw rows: superseded versions inside a drop are part of what changed
+        old_df = load_table(name, old_dir, latest=False)
+        new_df = load_table(name, new_dir, latest=False)
+        change_set['tables'][name] = diff_table(old_df, new_df, NATURAL_KEYS[name], detail_limit=detail_limit)
+        counts = change_set['tables'][name]['counts']
+        logger.info(f"{name}: +{counts['inserted']} -{counts['deleted']} ~{counts['modified']}")
+        columns = change_set['tables'][name]['columns']
+        if columns['added'] or columns['removed']:
+            logger.warning(f"{name}: columns added {columns['added']}, removed {columns['removed']}")
+    return change_set
+
+
+def main():
+    """Compare two SDWIS data directories"""
+    parser = argparse.ArgumentParser(description="Diff two SDWIS data drops on natural keys")
+    parser.add_argument('old_dir')
+    parser.add_argument('new_dir')
+    parser.add_argument('--table', action='append', choices=sorted(NATURAL_KEYS), dest='tables')
+    parser.add_argument('--output', default="snapshot_changes.json")
+    parser.add_argument('--detail-limit', type=int, default=1000, help="Max keys listed per change type")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    change_set = diff_snapshots(args.old_dir, args.new_dir, args.tables, args.detail_limit)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(change_set, f, separators=(',', ':'), default=str)
+    logger.info(f"Change set saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Quarterly Snapshot Store
+Append-only history of the SDWIS tables keyed by SUBMISSIONYEARQUARTER. Each
+quarter stores, per table, only the records that were inserted or changed
+since the previous quarter plus the keys that disappeared, as dictionary-encoded
+typed-array files, so storage grows with the amount of change. Any quarter can
+be rebuilt with as_of() and a system's changes listed with history()
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from columnar_export import encode_dictionary, read_frame, write_columns
+from sdwis_tables import NATURAL_KEYS, QUARTER_COLUMN, TABLE_FILES, load_table, table_path
+from snapshot_diff import keyed_hashes
+
+logger = logging.getLogger(__name__)
+
+STORE_ROOT = "snapshots"
+MANIFEST = "manifest.json"
+
+
+def _write_frame(path: str, name: str, df: pd.DataFrame) -> int:
+    """Every SDWIS column is text, so each one is stored as int32 dictionary codes"""
+    columns, dictionaries = {}, {}
+    for column in df.columns:
+        columns[column], dictionaries[column] = encode_dictionary(df[column])
+    return write_columns(path, name, columns, dictionaries)
+
+
+def _read_frame(path: str) -> pd.DataFrame:
+    frame = read_frame(path)
+    return frame.astype(object).where(frame.notna(), np.nan)
+
+
+def _key_hashes(df: pd.DataFrame, key_columns: List[str]) -> np.ndarray:
+    return pd.util.hash_pandas_object(df[key_columns], index=False).to_numpy()
+
+
+class SnapshotStore:
+    """
+    Quarters are applied in order: a quarter's delta removes its deleted and
+    changed keys from the previous state, then appends its upserted rows (every
+    row of a changed key, since keys such as a violation with several
+    enforcement actions span rows)
+    """
+
+    def __init__(self, root: str = STORE_ROOT):
+        self.root = root
+        self.manifest_path = os.path.join(root, MANIFEST)
+        self.manifest = {'quarters': [], 'tables': {}}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding='utf-8') as f:
+                self.manifest = json.load(f)
+        self._states: Dict[str, Dict[str, pd.DataFrame]] = {}
+
+    @property
+    def quarters(self) -> List[str]:
+        return [entry['quarter'] for entry in self.manifest['quarters']]
+
+    def _delta_path(self, quarter: str, table: str, kind: str) -> str:
+        return os.path.join(self.root, quarter, f"{table}.{kind}.cols")
+
+    def _save_manifest(self):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def resolve(self, quarter: Optional[str] = None) -> Optional[str]:
+        """Latest stored quarter at or before the given one (the newest by default)"""
+        eligible = [q for q in self.quarters if quarter is None or q <= quarter]
+        return eligible[-1] if eligible else None
+
+    def table_as_of(self, table: str, quarter: Optional[str] = None) -> pd.DataFrame:
+        """One table as it stood in a quarter"""
+        target = self.resolve(quarter)
+        key_columns = NATURAL_KEYS[table]
+        state = pd.DataFrame()
+        for entry in self.manifest['quarters']:
+            if target is None or entry['quarter'] > target:
+                break
+            counts = entry['tables'].get(table)
+            if counts is None:
+                continue
+            upserts_path = self._delta_path(entry['quarter'], table, 'upserts')
+            deletes_path = self._delta_path(entry['quarter'], table, 'deletes')
+            upserts = _read_frame(upserts_path) if counts['upserted_rows'] else pd.DataFrame()
+            removed = []
+            if counts['deleted_keys']:
+                removed.append(_key_hashes(_read_frame(deletes_path), key_columns))
+            if len(upserts):
+                removed.append(_key_hashes(upserts, key_columns))
+            if len(state) and removed:
+                state = state[~np.isin(_key_hashes(state, key_columns), np.concatenate(removed))]
+            if len(upserts):
+                state = pd.concat([state, upserts], ignore_index=True) if len(state) else upserts
+        return state.reset_index(drop=True)
+
+    def as_of(self, quarter: Optional[str] = None, tables: Optional[List[str]] = None) -> Dict[str, pd.DataFrame]:
+        """Every stored table as it stood in a quarter; rebuilt states are cached per quarter"""
+        target = self.resolve(quarter)
+        cached = self._states.setdefault(target, {})
+        for table in tables or self.manifest['tables']:
+            if table not in cached:
+                cached[table] = self.table_as_of(table, target)
+        return {table: cached[table] for table in tables or self.manifest['tables']}
+
+    def export(self, quarter: str, output_dir: str, tables: Optional[List[str]] = None) -> str:
+        """Write a quarter's tables as a data directory the extractors can read"""
+        target = self.resolve(quarter)
+        os.makedirs(output_dir, exist_ok=True)
+        for table, df in self.as_of(target, tables).items():
+            df.assign(**{QUARTER_COLUMN: target}).to_csv(table_path(table, output_dir), index=False)
+        logger.info(f"Exported {target} to {output_dir}")
+        return target
+
+    def history(self, pwsid: str, tables: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Changes to one system, oldest first. Only the rows of that PWSID are
+        decoded from each delta, via the PWSID dictionary code.
+        """
+        events = []
+        for entry in self.manifest['quarters']:
+            for table, counts in entry['tables'].items():
+                if (tables and table not in tables) or 'PWSID' not in NATURAL_KEYS[table]:
+                    continue
+                for kind, count_field in (('deletes', 'deleted_keys'), ('upserts', 'upserted_rows')):
+                    if not counts[count_field]:
+                        continue
+                    frame = read_frame(self._delta_path(entry['quarter'], table, kind))
+                    rows = frame[frame['PWSID'] == pwsid]
+                    if not len(rows):
+                        continue
+                    rows = rows.astype(object).where(rows.notna(), None)
+                    change = 'deleted' if kind == 'deletes' else 'upserted'
+                    events.extend({'quarter': entry['quarter'], 'table': table, 'change': change, 'record': record}
+                                  for record in rows.to_dict('records'))
+        return events
+
+    def append(self, data_dir: str = "data", quarter: Optional[str] = None,
+               tables: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Store a data drop as the delta against the previous quarter. The quarter
+        defaults to the drop's newest SUBMISSIONYEARQUARTER. Re-appending the
+        newest stored quarter replaces it; older quarters are never rewritten.
+        """
+        frames = {}
+        for table in tables or NATURAL_KEYS:
+            if os.path.exists(table_path(table, data_dir)):
+                frames[table] = load_table(table, data_dir)
+        if quarter is None:
+            quarter = max(df[QUARTER_COLUMN].dropna().max() for df in frames.values() if QUARTER_COLUMN in df)
+        if self.quarters and quarter < self.quarters[-1]:
+            raise ValueError(f"Quarter {quarter} is older than the newest stored quarter {self.quarters[-1]}")
+        if self.quarters and quarter == self.quarters[-1]:
+            logger.info(f"Replacing stored quarter {quarter}")
+            self.manifest['quarters'].pop()
+            shutil.rmtree(os.path.join(self.root, quarter), ignore_errors=True)
+        previous = self.resolve()
+        self._states.clear()
+
+        os.makedirs(os.path.join(self.root, quarter), exist_ok=True)
+        entry = {'quarter': quarter, 'tables': {}}
+        for table, df in frames.items():
+            key_columns = NATURAL_KEYS[table]
+            # The store is keyed by quarter, so the drop's quarter column is not stored per row
+            df = df.drop(columns=[QUARTER_COLUMN], errors='ignore').astype(object)
+            old = self.table_as_of(table, previous) if previous else pd.DataFrame(columns=df.columns)
+            old = old.reindex(columns=df.columns.union(old.columns, sort=False))
+            new = df.reindex(columns=old.columns)
+
+            old_keys = keyed_hashes(old, key_columns, [])
+            new_keys = keyed_hashes(new, key_columns, [])
+            deleted = old_keys.index.difference(new_keys.index)
+            common = new_keys.index.intersection(old_keys.index)
+            changed = common[old_keys.loc[common, 'row_hash'].to_numpy() != new_keys.loc[common, 'row_hash'].to_numpy()]
+            upserted = new_keys.index.difference(old_keys.index).append(changed)
+
+            upserts = new[np.isin(_key_hashes(new, key_columns), upserted.to_numpy())]
+            deletes = old.iloc[old_keys.loc[deleted, 'position'].to_numpy()][key_columns]
+            written = 0
+            if len(upserts):
+                written += _write_frame(self._delta_path(quarter, table, 'upserts'), f"{table} {quarter} upserts", upserts)
+            if len(deletes):
+                written += _write_frame(self._delta_path(quarter, table, 'deletes'), f"{table} {quarter} deletes", deletes)
+            entry['tables'][table] = {
+                'rows': len(new),
+                'inserted_keys': len(upserted) - len(changed),
+                'modified_keys': len(changed),
+                'deleted_keys': len(deleted),
+                'upserted_rows': len(upserts),
+                'bytes': written
+            }
+            self.manifest['tables'][table] = TABLE_FILES[table]
+            logger.info(f"{quarter} {table}: +{entry['tables'][table]['inserted_keys']} ~{len(changed)} "
+                        f"-{len(deleted)} keys, {written} bytes")
+
+        self.manifest['quarters'].append(entry)
+        self._save_manifest()
+        return entry
+
+
+def main():
+    """Append a data drop to the snapshot store or query it"""
+    parser = argparse.ArgumentParser(description="Append-only quarterly SDWIS snapshot store")
+    parser.add_argument('--root', default=STORE_ROOT)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    append = subparsers.add_parser('append', help="Store a data directory as the next quarter")
+    append.add_argument('--data-dir', default="data")
+    append.add_argument('--quarter', help="YYYYQn (default: newest SUBMISSIONYEARQUARTER in the drop)")
+
+    as_of = subparsers.add_parser('as-of', help="Rebuild the tables as of a quarter")
+    as_of.add_argument('quarter')
+    as_of.add_argument('--output-dir', required=True, help="Directory to write the SDWA_*.csv files into")
+    as_of.add_argument('--table', action='append', choices=sorted(NATURAL_KEYS), dest='tables')
+
+    history = subparsers.add_parser('history', help="Changes to one system across quarters")
+    history.add_argument('pwsid')
+    history.add_argument('--table', action='append', choices=sorted(NATURAL_KEYS), dest='tables')
+
+    subparsers.add_parser('list', help="Stored quarters and delta sizes")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    store = SnapshotStore(args.root)
+    if args.command == 'append':
+        store.append(args.data_dir, args.quarter)
+    elif args.command == 'as-of':
+        store.export(args.quarter, args.output_dir, args.tables)
+    elif args.command == 'history':
+        print(json.dumps(store.history(args.pwsid, args.tables), indent=2, default=str))
+    else:
+        print(json.dumps(store.manifest['quarters'], indent=2))
+
+
+if __name__ == "__main__":
+    main()
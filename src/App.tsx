@@ -40,38 +40,33 @@ const App: React.FC = () => {
 
   const generateTasksFromViolations = (violations: any[]): any[] => {
     if (!violations || violations.length === 0) return [];
-    const uniqueViolations = new Map();
-    violations.forEach((violation, index) => {
-      const uniqueKey = `${violation.violation_id || 'unknown'}-${violation.violation_type || 'unknown'}-${violation.contaminant_code || 'unknown'}`;
-      if (!uniqueViolations.has(uniqueKey)) {
-        const dueDate = violation.violation_begin_date || violation.first_reported || '2024-12-31';
-        const daysLeft = calculateDaysLeft(dueDate);
-        let taskStatus = 'Upcoming';
-        if (violation.status === 'Resolved' || violation.status === 'Closed') {
-          taskStatus = 'Completed';
-        } else if (daysLeft < 0) {
-          taskStatus = 'Overdue';
-        } else if (daysLeft <= 7) {
-          taskStatus = 'Due Soon';
-        }
-        const contaminantDetails = getContaminantDetails(violation.contaminant_name || violation.contaminant_code);
-        const task = {
-          id: `violation-${violation.violation_id || index}`,
-          name: `${violation.violation_type_desc || violation.violation_type || ''} - ${contaminantDetails?.name || violation.contaminant_name || violation.contaminant_code}`,
-          type: 'Violation',
-          due: dueDate,
-          status: taskStatus,
-          daysLeft: daysLeft,
-          locations: violation.requires_action ? '1' : '0',
-          priority: violation.priority || 'Medium',
-          description: `Violation ID: ${violation.violation_id}, Code: ${violation.violation_code}`,
-          violation: violation,
-          contaminantDetails: contaminantDetails || null
-        };
-        uniqueViolations.set(uniqueKey, task);
+    // Rows arrive one per violation (latest enforcement action) from the extractors
+    return violations.map((violation, index) => {
+      const dueDate = violation.violation_begin_date || violation.first_reported || '2024-12-31';
+      const daysLeft = calculateDaysLeft(dueDate);
+      let taskStatus = 'Upcoming';
+      if (violation.status === 'Resolved' || violation.status === 'Closed') {
+        taskStatus = 'Completed';
+      } else if (daysLeft < 0) {
+        taskStatus = 'Overdue';
+      } else if (daysLeft <= 7) {
+        taskStatus = 'Due Soon';
       }
+      const contaminantDetails = getContaminantDetails(violation.contaminant_name || violation.contaminant_code);
+      return {
+        id: `violation-${violation.violation_id || index}`,
+        name: `${violation.violation_type_desc || violation.violation_type || ''} - ${contaminantDetails?.name || violation.contaminant_name || violation.contaminant_code}`,
+        type: 'Violation',
+        due: dueDate,
+        status: taskStatus,
+        daysLeft: daysLeft,
+        locations: violation.requires_action ? '1' : '0',
+        priority: violation.priority || 'Medium',
+        description: `Violation ID: ${violation.violation_id}, Code: ${violation.violation_code}`,
+        violation: violation,
+        contaminantDetails: contaminantDetails || null
+      };
     });
-    return Array.from(uniqueViolations.values());
   };
 
   return (
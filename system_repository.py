@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+"""
+Water System Repository
+Serves a cheap summary of every system and builds the detailed per-system
+record on demand from per-table offset indexes, memoizing recent records in a
+bounded LRU so memory follows the working set instead of the dataset
+"""
+
+import argparse
+import json
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from data_validation import QUARANTINE_FILE, validated_tables
+from extraction_policy import POLICY, is_active, load_policy
+from sdwis_tables import NATURAL_KEYS, load_table
+
+logger = logging.getLogger(__name__)
+
+# Output field -> CSV column for each detail section; system_detail builds the
+# eager records in extraction_engine.py from the same mappings
+SYSTEM_FIELDS = {
+    'pwsid': 'PWSID',
+    'name': 'PWS_NAME',
+    'type_code': 'PWS_TYPE_CODE',
+    'primary_source_code': 'PRIMARY_SOURCE_CODE',
+    'population_served': 'POPULATION_SERVED_COUNT',
+    'service_connections': 'SERVICE_CONNECTIONS_COUNT',
+    'activity_status': 'PWS_ACTIVITY_CODE',
+    'owner_type': 'OWNER_TYPE_CODE',
+    'address': {
+        'line1': 'ADDRESS_LINE1',
+        'line2': 'ADDRESS_LINE2',
+        'city': 'CITY_NAME',
+        'zip': 'ZIP_CODE',
+        'state': 'STATE_CODE'
+    },
+    'contact': {
+        'organization': 'ORG_NAME',
+        'admin_name': 'ADMIN_NAME',
+        'email': 'EMAIL_ADDR',
+        'phone': 'PHONE_NUMBER',
+        'fax': 'FAX_NUMBER'
+    },
+    'first_reported': 'FIRST_REPORTED_DATE',
+    'last_reported': 'LAST_REPORTED_DATE',
+    'is_grant_eligible': 'IS_GRANT_ELIGIBLE_IND',
+    'is_wholesaler': 'IS_WHOLESALER_IND',
+    'is_school_or_daycare': 'IS_SCHOOL_OR_DAYCARE_IND'
+}
+
+CHILD_FIELDS = {
+    'geographic_areas': {
+        'geo_id': 'GEO_ID',
+        'area_type': 'AREA_TYPE_CODE',
+        'state_served': 'STATE_SERVED',
+        'zip_code': 'ZIP_CODE_SERVED',
+        'city': 'CITY_SERVED',
+        'county': 'COUNTY_SERVED',
+        'last_reported': 'LAST_REPORTED_DATE'
+    },
+    'service_areas': {
+        'service_area_type': 'SERVICE_AREA_TYPE_CODE',
+        'is_primary': 'IS_PRIMARY_SERVICE_AREA_CODE',
+        'first_reported': 'FIRST_REPORTED_DATE',
+        'last_reported': 'LAST_REPORTED_DATE'
+    },
+    'events_milestones': {
+        'event_schedule_id': 'EVENT_SCHEDULE_ID',
+        'event_end_date': 'EVENT_END_DATE',
+        'event_actual_date': 'EVENT_ACTUAL_DATE',
+        'event_comments': 'EVENT_COMMENTS_TEXT',
+        'event_milestone_code': 'EVENT_MILESTONE_CODE',
+        'event_reason_code': 'EVENT_REASON_CODE',
+        'first_reported': 'FIRST_REPORTED_DATE',
+        'last_reported': 'LAST_REPORTED_DATE'
+    },
+    'lcr_samples': {
+        'sample_id': 'SAMPLE_ID',
+        'contaminant_code': 'CONTAMINANT_CODE',
+        'sample_date': 'SAMPLE_DATE',
+        'sample_result': 'SAMPLE_RESULT',
+        'unit_of_measure': 'UNIT_OF_MEASURE',
+        'sample_point_type': 'SAMPLE_POINT_TYPE_CODE',
+        'first_reported': 'FIRST_REPORTED_DATE',
+        'last_reported': 'LAST_REPORTED_DATE'
+    },
+    'site_visits': {
+        'visit_id': 'VISIT_ID',
+        'visit_date': 'VISIT_DATE',
+        'agency_type': 'AGENCY_TYPE_CODE',
+        'visit_reason': 'VISIT_REASON_CODE',
+        'management_ops_eval': 'MANAGEMENT_OPS_EVAL_CODE',
+        'source_water_eval': 'SOURCE_WATER_EVAL_CODE',
+        'security_eval': 'SECURITY_EVAL_CODE',
+        'pumps_eval': 'PUMPS_EVAL_CODE',
+        'compliance_eval': 'COMPLIANCE_EVAL_CODE',
+        'treatment_eval': 'TREATMENT_EVAL_CODE',
+        'distribution_eval': 'DISTRIBUTION_EVAL_CODE',
+        'financial_eval': 'FINANCIAL_EVAL_CODE',
+        'visit_comments': 'VISIT_COMMENTS',
+        'first_reported': 'FIRST_REPORTED_DATE',
+        'last_reported': 'LAST_REPORTED_DATE'
+    },
+    'facilities': {
+        'facility_id': 'FACILITY_ID',
+        'facility_name': 'FACILITY_NAME',
+        'facility_type': 'FACILITY_TYPE_CODE',
+        'facility_status': 'FACILITY_STATUS_CODE',
+        'facility_begin_date': 'FACILITY_BEGIN_DATE',
+        'facility_end_date': 'FACILITY_END_DATE',
+        'first_reported': 'FIRST_REPORTED_DATE',
+        'last_reported': 'LAST_REPORTED_DATE'
+    },
+    'pn_violations': {
+        'violation_id': 'VIOLATION_ID',
+        'pn_type': 'PN_TYPE_CODE',
+        'pn_date': 'PN_DATE',
+        'first_reported': 'FIRST_REPORTED_DATE',
+        'last_reported': 'LAST_REPORTED_DATE'
+    }
+}
+
+# Violation columns a detail record reads besides the policy's date columns
+VIOLATION_COLUMNS = [
+    'PWSID', 'VIOLATION_ID', 'VIOLATION_CODE', 'VIOLATION_CATEGORY_CODE', 'CONTAMINANT_CODE', 'VIOLATION_STATUS',
+    'IS_HEALTH_BASED_IND', 'ENFORCEMENT_ACTION_TYPE_CODE', 'FIRST_REPORTED_DATE', 'LAST_REPORTED_DATE'
+]
+
+# Detail section -> SDWIS table it is read from
+SECTION_TABLES = {
+    'geographic_areas': 'geographic_areas',
+    'service_areas': 'service_areas',
+    'events_milestones': 'events_milestones',
+    'violations_enforcement': 'violations_enforcement',
+    'lcr_samples': 'lcr_samples',
+    'site_visits': 'site_visits',
+    'facilities': 'facilities',
+    'pn_violations': 'pn_violation_assoc',
+}
+
+
+def map_fields(row: Dict[str, Any], fields: Dict[str, Any], default: Any = '') -> Dict[str, Any]:
+    """Build an output record from a CSV row using a (possibly nested) field mapping"""
+    return {key: map_fields(row, column, default) if isinstance(column, dict) else row.get(column, default)
+            for key, column in fields.items()}
+
+
+def _mapped_columns(fields: Dict[str, Any]) -> List[str]:
+    columns = []
+    for column in fields.values():
+        columns.extend(_mapped_columns(column) if isinstance(column, dict) else [column])
+    return columns
+
+
+def parse_violation_date(date_str) -> Optional[str]:
+    """Normalize the date formats seen in violation exports to YYYY-MM-DD"""
+    if pd.isna(date_str) or str(date_str).strip() == '':
+        return None
+    for fmt in ['%Y-%m-%d', '%m/%d/%Y', '%Y%m%d']:
+        try:
+            return pd.to_datetime(date_str, format=fmt).strftime('%Y-%m-%d')
+        except (ValueError, TypeError):
+            continue
+    return None
+
+
+def violation_record(row: Dict[str, Any], describe: Callable[[str, str], str],
+                     policy: Dict[str, Any] = POLICY) -> Dict[str, Any]:
+    """Violation detail with code descriptions and a status derived by the extraction policy"""
+    violation_code = str(row.get('VIOLATION_CODE', ''))
+    violation_type = describe('VIOLATION_CODE', violation_code)
+    contaminant_code = str(row.get('CONTAMINANT_CODE', ''))
+    contaminant_name = describe('CONTAMINANT_CODE', contaminant_code)
+
+    dates = policy['violation_dates']
+    begin_date = parse_violation_date(row.get(dates['begin'], ''))
+    end_date = parse_violation_date(row.get(dates['end'], ''))
+    resolved_date = parse_violation_date(row.get(dates['resolved'], ''))
+    violation_status = row.get('VIOLATION_STATUS')
+    if violation_status in (None, '') or (isinstance(violation_status, float) and pd.isna(violation_status)):
+        violation_status = None
+    if is_active(violation_status, policy):
+        status = 'Active'
+    elif violation_status:
+        status = violation_status
+    elif resolved_date:
+        status = 'Resolved'
+    else:
+        status = 'Closed' if end_date else 'Unknown'
+
+    return {
+        'violation_id': str(row.get('VIOLATION_ID', '')),
+        'violation_code': violation_code,
+        'violation_category': row.get('VIOLATION_CATEGORY_CODE', ''),
+        'violation_type': violation_type or 'Unknown Violation',
+        'contaminant_code': contaminant_code,
+        'contaminant_name': contaminant_name or 'Unknown Contaminant',
+        'violation_status': violation_status,
+        'status': status,
+        'is_health_based': row.get('IS_HEALTH_BASED_IND') == policy['health_based_indicator'],
+        'violation_begin_date': begin_date,
+        'violation_end_date': end_date,
+        'violation_resolved_date': resolved_date,
+        'enforcement_action': row.get('ENFORCEMENT_ACTION_TYPE_CODE', ''),
+        'enforcement_action_date': parse_violation_date(row.get(dates['enforcement'], '')),
+        'first_reported': parse_violation_date(row.get('FIRST_REPORTED_DATE', '')),
+        'last_reported': parse_violation_date(row.get('LAST_REPORTED_DATE', '')),
+        'priority': 'High' if violation_code in ['71', '72', '73'] else 'Medium',
+        'requires_action': status in ['Active', 'Unknown']
+    }
+
+
+def _count(value) -> int:
+    number = pd.to_numeric(value, errors='coerce')
+    return 0 if pd.isna(number) else int(number)
+
+
+def _described(record: Dict[str, Any], fields: Dict[str, Any], codes: Mapping[str, Mapping[str, str]]) -> Dict[str, Any]:
+    """Add a <field>_desc next to every coded field the reference table describes"""
+    for key, column in fields.items():
+        if isinstance(column, str) and column in codes and record.get(key) is not None:
+            record[f"{key}_desc"] = codes[column].get(record[key])
+    return record
+
+
+def system_detail(row: Dict[str, Any], section_rows: Dict[str, List[Dict[str, Any]]],
+                  codes: Mapping[str, Mapping[str, str]], policy: Dict[str, Any] = POLICY
+                  ) -> Tuple[Dict[str, Any], Dict[str, List[Dict[str, Any]]]]:
+    """
+    A system's record and its detail sections from its pub_water_systems row
+    and its rows per section, described with codes ({value type: {code:
+    description}}). The extraction engine and the repositories both build
+    their records here, so a system reads the same in dashboard_data.json and
+    from the servers.
+    """
+    def describe(value_type: str, code: str) -> str:
+        return codes.get(value_type, {}).get(code, code)
+
+    record = map_fields(row, SYSTEM_FIELDS, None)
+    record['type'] = describe('PWS_TYPE_CODE', record['type_code'])
+    record['primary_source'] = describe('PRIMARY_SOURCE_CODE', record['primary_source_code'])
+    record['population_served'] = _count(record['population_served'])
+    record['service_connections'] = _count(record['service_connections'])
+
+    sections = {}
+    for section, rows in section_rows.items():
+        if section == 'violations_enforcement':
+            sections[section] = [violation_record(r, describe, policy) for r in rows]
+        else:
+            fields = CHILD_FIELDS[section]
+            sections[section] = [_described(map_fields(r, fields, None), fields, codes) for r in rows]
+    return record, sections
+
+
+def with_sections(record: Dict[str, Any], sections: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+    """The record plus every section the system has rows in, as dashboard_data.json lists it"""
+    record = dict(record)
+    record.update({section: rows for section, rows in sections.items() if rows})
+    return record
+
+
+class OffsetIndex:
+    """
+    A table sorted by PWSID, held as one object array per column, plus a
+    {pwsid: (start, stop)} map, so one system's rows are a slice instead of a
+    filter over the whole table
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        df = df.sort_values('PWSID', kind='stable').reset_index(drop=True)
+        self.columns = list(df.columns)
+        self.arrays = [df[c].astype(object).where(df[c].notna(), None).to_numpy() for c in self.columns]
+        self.length = len(df)
+        if len(df):
+            uniques, starts = np.unique(df['PWSID'].to_numpy().astype(str), return_index=True)
+            stops = np.append(starts[1:], len(df))
+            self.offsets = {pwsid: (int(a), int(b)) for pwsid, a, b in zip(uniques, starts, stops)}
+        else:
+            self.offsets = {}
+
+    def __len__(self) -> int:
+        return self.length
+
+    def count(self, pwsid: str) -> int:
+        start, stop = self.offsets.get(pwsid, (0, 0))
+        return stop - start
+
+    def rows(self, pwsid: str) -> List[Dict[str, Any]]:
+        if pwsid not in self.offsets:
+            return []
+        start, stop = self.offsets[pwsid]
+        columns = self.columns
+        return [dict(zip(columns, values)) for values in zip(*(a[start:stop] for a in self.arrays))]
+
+
+class SystemRepository:
+    """
+    Summary view of all systems plus lazily built, LRU-cached detail records.
+
+    Only the columns the detail records use are kept, as text, sorted by
+    PWSID per table; a detail record costs one slice per table. Tables load
+    without the rows and values the validation stage quarantined.
+    """
+
+    def __init__(self, data_dir: str = "data", cache_size: int = 256, policy: Optional[Dict[str, Any]] = None,
+                 quarantine_file: Optional[str] = QUARANTINE_FILE):
+        self.data_dir = data_dir
+        self.cache_size = cache_size
+        self.policy = policy or load_policy(data_dir=data_dir)
+        # None loads the tables as they are
+        self.quarantine_file = quarantine_file
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        with validated_tables(self.quarantine_file):
+            self.reference_codes = self._load_reference_codes()
+            system_columns = set(_mapped_columns(SYSTEM_FIELDS))
+            self.systems = self._load('pub_water_systems', system_columns)
+            self._system_rows = OffsetIndex(self.systems)
+
+            self.indexes: Dict[str, OffsetIndex] = {}
+            for section in SECTION_TABLES:
+                self.indexes[section] = self._section_index(section)
+        logger.info(f"Repository ready: {len(self.systems)} systems, "
+                    + ', '.join(f"{section} {len(index)}" for section, index in self.indexes.items()))
+
+    def _load(self, table: str, columns: set) -> pd.DataFrame:
+        try:
+            # One row per violation, carrying its latest enforcement action
+            record_key = NATURAL_KEYS['violations_enforcement'] if table == 'violations_enforcement' else None
+            return load_table(table, self.data_dir, usecols=lambda c: c.strip() in columns, record_key=record_key)
+        except Exception as e:
+            logger.error(f"Error loading {table}: {e}")
+            return pd.DataFrame(columns=['PWSID'])
+
+    def _section_index(self, section: str) -> OffsetIndex:
+        columns = set(VIOLATION_COLUMNS) | set(self.policy['violation_dates'].values()) \
+            if section == 'violations_enforcement' else set(_mapped_columns(CHILD_FIELDS[section])) | {'PWSID'}
+        return OffsetIndex(self._load(SECTION_TABLES[section], columns))
+
+    def _load_reference_codes(self) -> Dict[str, Dict[str, str]]:
+        try:
+            ref_df = load_table('ref_code_values', self.data_dir)
+        except Exception as e:
+            logger.error(f"Error loading reference codes: {e}")
+            return {}
+        return {value_type: dict(zip(group['VALUE_CODE'], group['VALUE_DESCRIPTION']))
+                for value_type, group in ref_df.groupby('VALUE_TYPE')}
+
+    def describe(self, value_type: str, code: str) -> str:
+        return self.reference_codes.get(value_type, {}).get(code, code)
+
+    def __contains__(self, pwsid: str) -> bool:
+        return pwsid in self._system_rows.offsets
+
+    def __len__(self) -> int:
+        return len(self._system_rows)
+
+    def summaries(self) -> List[Dict[str, Any]]:
+        """One small record per system with the size of each detail section"""
+        frame = self.systems
+        population = pd.to_numeric(frame['POPULATION_SERVED_COUNT'], errors='coerce')
+        columns = {
+            'name': frame['PWS_NAME'].tolist(),
+            'type_code': frame['PWS_TYPE_CODE'].tolist(),
+            'activity_status': frame['PWS_ACTIVITY_CODE'].tolist(),
+            'population_served': [None if pd.isna(p) else int(p) for p in population],
+        }
+        summaries = []
+        for i, pwsid in enumerate(frame['PWSID'].tolist()):
+            summary = {'pwsid': pwsid}
+            summary.update({key: values[i] for key, values in columns.items()})
+            summary['counts'] = {section: index.count(pwsid) for section, index in self.indexes.items()}
+            summaries.append(summary)
+        return summaries
+
+    def _build(self, pwsid: str) -> Dict[str, Any]:
+        row = self._system_rows.rows(pwsid)[0]
+        section_rows = {section: index.rows(pwsid) for section, index in self.indexes.items()}
+        return with_sections(*system_detail(row, section_rows, self.reference_codes, self.policy))
+
+    def get(self, pwsid: str) -> Optional[Dict[str, Any]]:
+        """Detailed record for one system, built on first use and cached"""
+        if pwsid in self._cache:
+            self._cache.move_to_end(pwsid)
+            self.hits += 1
+            return self._cache[pwsid]
+        if pwsid not in self:
+            return None
+        self.misses += 1
+        record = self._build(pwsid)
+        self._cache[pwsid] = record
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return record
+
+    def refresh(self, table: str, pwsids: Optional[Iterable[str]] = None):
+        """
+        Reload one table's index and drop the cached records of the given
+        systems (every cached record when None, or when code descriptions change)
+        """
+        with validated_tables(self.quarantine_file):
+            if table == 'ref_code_values':
+                self.reference_codes = self._load_reference_codes()
+                pwsids = None
+            elif table == 'pub_water_systems':
+                self.systems = self._load('pub_water_systems', set(_mapped_columns(SYSTEM_FIELDS)))
+                self._system_rows = OffsetIndex(self.systems)
+            for section, source in SECTION_TABLES.items():
+                if source == table:
+                    self.indexes[section] = self._section_index(section)
+
+        if pwsids is None:
+            self._cache.clear()
+        else:
+            for pwsid in pwsids:
+                self._cache.pop(pwsid, None)
+
+    def cache_info(self) -> Tuple[int, int, int]:
+        """(hits, misses, cached records)"""
+        return self.hits, self.misses, len(self._cache)
+
+
+def main():
+    """Print one or more system records, or the summary view"""
+    parser = argparse.ArgumentParser(description="Look up water system details on demand")
+    parser.add_argument('pwsids', nargs='*')
+    parser.add_argument('--data-dir', default="data")
+    parser.add_argument('--summary', action='store_true', help="Print the summary view of all systems")
+    parser.add_argument('--policy', help="Extraction policy overrides (default: <data-dir>/extraction_policy.json, if present)")
+    parser.add_argument('--quarantine', default=QUARANTINE_FILE, help="Validation quarantine to apply ('' to load raw tables)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    repository = SystemRepository(args.data_dir, policy=load_policy(args.policy, args.data_dir),
+                                  quarantine_file=args.quarantine or None)
+    if args.summary:
+        print(json.dumps(repository.summaries(), indent=2, default=str))
+    for pwsid in args.pwsids:
+        print(json.dumps(repository.get(pwsid), indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Compliance Task Calendar
+Precomputes the operator dashboard's compliance tasks from violations and
+events/milestones so the browser only renders rows instead of rebuilding them
+on every state change. Tasks carry due dates, not days left or a status: the
+outputs are only rebuilt when the data changes, so anything relative to today
+is worked out by the dashboard when it renders
+"""
+
+import json
+import logging
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DATE_FORMATS = ['%Y-%m-%d', '%m/%d/%Y', '%Y%m%d']
+DEFAULT_VIOLATION_DUE = '2024-12-31'
+EPOCH = date(1970, 1, 1)
+
+
+def parse_due_date(value: Any) -> Optional[date]:
+    """Parse a SDWIS date string in any of the formats the extractors emit"""
+    if value is None:
+        return None
+    text = str(value).strip()
+    if not text or text.lower() == 'nan':
+        return None
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+class TaskCalendarBuilder:
+    """Builds per-system task calendars and the statewide deadline index"""
+
+    def __init__(self, as_of: Optional[date] = None, horizon_days: int = 30):
+        self.as_of = as_of or date.today()
+        self.horizon_days = horizon_days
+
+    def build_violation_tasks(self, pwsid: str, violations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Create one task per distinct violation (first occurrence of each dedup key wins)"""
+        tasks = []
+        seen = set()
+
+        for index, violation in enumerate(violations):
+            dedup_key = '-'.join([
+                str(violation.get('violation_id') or 'unknown'),
+                str(violation.get('violation_type') or 'unknown'),
+                str(violation.get('contaminant_code') or 'unknown'),
+            ])
+            if dedup_key in seen:
+                continue
+            seen.add(dedup_key)
+
+            due = (parse_due_date(violation.get('violation_begin_date'))
+                   or parse_due_date(violation.get('first_reported'))
+                   or parse_due_date(DEFAULT_VIOLATION_DUE))
+
+            tasks.append({
+                'id': f"violation-{pwsid}-{violation.get('violation_id') or index}",
+                'dedup_key': dedup_key,
+                'name': f"{violation.get('violation_type')} - {violation.get('contaminant_name')}",
+                'type': 'Violation',
+                'due': due.isoformat(),
+                'due_day': (due - EPOCH).days,
+                # violation_record derives 'Active' from the extraction policy
+                'completed': violation.get('status') != 'Active',
+                'locations': '1' if violation.get('requires_action') else '0',
+                'priority': violation.get('priority') or 'Medium',
+                'description': f"Violation ID: {violation.get('violation_id')}, Code: {violation.get('violation_code')}",
+                'source': 'violations_enforcement',
+                'source_index': index
+            })
+
+        return tasks
+
+    def build_event_tasks(self, pwsid: str, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Create one task per event/milestone schedule entry"""
+        tasks = []
+        seen = set()
+
+        for index, event in enumerate(events):
+            schedule_id = event.get('event_schedule_id')
+            dedup_key = str(schedule_id if schedule_id not in (None, '') else f'row{index}')
+            if dedup_key in seen:
+                continue
+            seen.add(dedup_key)
+
+            end_date = parse_due_date(event.get('event_end_date'))
+            due = end_date or parse_due_date(event.get('event_actual_date'))
+
+            tasks.append({
+                'id': f"event-{pwsid}-{dedup_key}",
+                'dedup_key': dedup_key,
+                'name': event.get('event_milestone_code') or 'Event',
+                'type': 'Event',
+                'due': due.isoformat() if due else '',
+                # Only an end date is a deadline; an event known by its actual date has none
+                'due_day': (end_date - EPOCH).days if end_date else None,
+                'completed': False,
+                'locations': 1,
+                'priority': 'Medium',
+                'source': 'events_milestones',
+                'source_index': index
+            })
+
+        return tasks
+
+    def build_system_calendar(self, pwsid: str, system: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the task list for one system"""
+        tasks = self.build_violation_tasks(pwsid, system.get('violations_enforcement') or [])
+        tasks.extend(self.build_event_tasks(pwsid, system.get('events_milestones') or []))
+        return {'tasks': tasks}
+
+    def build_due_index(self, calendars: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Statewide list of open tasks with a deadline on or after as_of, sorted
+        by deadline. Readers keep the rows from today through horizon_days
+        ahead, so the index stays usable however long the data goes unchanged.
+        """
+        as_of_day = (self.as_of - EPOCH).days
+        rows = []
+
+        for pwsid, calendar in calendars.items():
+            for task in calendar['tasks']:
+                if task['completed'] or task['due_day'] is None or task['due_day'] < as_of_day:
+                    continue
+                rows.append({
+                    'due': task['due'],
+                    'due_day': task['due_day'],
+                    'pwsid': pwsid,
+                    'task_id': task['id'],
+                    'name': task['name'],
+                    'type': task['type'],
+                    'priority': task['priority']
+                })
+
+        rows.sort(key=lambda r: (r['due'], r['pwsid'], r['task_id']))
+        return {
+            'as_of': self.as_of.isoformat(),
+            'horizon_days': self.horizon_days,
+            'total': len(rows),
+            'tasks': rows
+        }
+
+    def apply(self, water_systems: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """Attach a task calendar to every system and return the statewide index"""
+        logger.info("Building compliance task calendars...")
+        calendars = {}
+        for pwsid, system in water_systems.items():
+            calendar = self.build_system_calendar(pwsid, system)
+            system['task_calendar'] = calendar
+            calendars[pwsid] = calendar
+
+        due_index = self.build_due_index(calendars)
+        horizon_end = (self.as_of - EPOCH).days + self.horizon_days
+        due_soon = sum(1 for row in due_index['tasks'] if row['due_day'] <= horizon_end)
+        logger.info(f"Built task calendars for {len(calendars)} systems; {due_index['total']} open tasks "
+                    f"with upcoming deadlines, {due_soon} in the next {self.horizon_days} days")
+        return due_index
+
+
+def save_due_index(due_index: Dict[str, Any], output_file: str = "task_calendar_index.json"):
+    """Write the statewide deadline index"""
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(due_index, f, indent=2, ensure_ascii=False)
+    logger.info(f"Task calendar index saved to {output_file}")
@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+"""
+Warm Data Daemon
+Loads the SDWIS tables once and keeps them resident, polls the data directory
+and reloads only the tables whose files changed, and serves analyse.py-style
+reports and per-system records over local HTTP, with server-sent events telling
+open dashboards which systems changed. With --publish it also republishes the
+shared memory-mapped dataset (shared_dataset.py) after every reload
+"""
+
+import argparse
+import json
+import logging
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+from data_validation import QUARANTINE_FILE, validated_tables
+from extraction_policy import POLICY, active_mask, load_policy
+from pipeline import FileFingerprints
+from sdwis_tables import NATURAL_KEYS, TABLE_FILES, latest_versions, load_table, table_path
+from shared_dataset import publish_dataset
+from snapshot_diff import IGNORED_COLUMNS, keyed_hashes
+from system_repository import SystemRepository
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8765
+POLL_SECONDS = 2.0
+# Seconds between SSE comments that keep idle connections (and proxies) open
+KEEPALIVE_SECONDS = 15
+# Reload events kept for clients reconnecting with Last-Event-ID
+EVENT_HISTORY = 100
+# Events list the changed PWSIDs up to this many; beyond it clients refetch everything
+MAX_EVENT_PWSIDS = 1000
+
+
+def _counts(series: pd.Series) -> Dict[str, int]:
+    return {str(k): int(v) for k, v in series.value_counts().items()}
+
+
+def systems_report(pws_df: pd.DataFrame, policy: Dict[str, Any] = POLICY) -> Dict[str, Any]:
+    """System types, activity, population served, ownership and source (analyse.py's overview)"""
+    population = pd.to_numeric(pws_df['POPULATION_SERVED_COUNT'], errors='coerce')
+    return {
+        'systems': len(pws_df),
+        'types': _counts(pws_df['PWS_TYPE_CODE']),
+        'activity': _counts(pws_df['PWS_ACTIVITY_CODE']),
+        'population_served': int(population[population > 0].sum()),
+        'population_mean': round(float(population.mean()), 1) if population.notna().any() else None,
+        'population_median': float(population.median()) if population.notna().any() else None,
+        'population_categories': _counts(pws_df['POP_CAT_5_CODE']),
+        'owner_types': _counts(pws_df['OWNER_TYPE_CODE']),
+        'primary_sources': _counts(pws_df['PRIMARY_SOURCE_CODE'])
+    }
+
+
+def violations_report(violations_df: pd.DataFrame, policy: Dict[str, Any] = POLICY) -> Dict[str, Any]:
+    """Violation categories, health-based share, status and enforcement actions, classified by the policy"""
+    health_based = int((violations_df['IS_HEALTH_BASED_IND'] == policy['health_based_indicator']).sum())
+    return {
+        'records': len(violations_df),
+        'violations': int(violations_df[NATURAL_KEYS['violations_enforcement']].drop_duplicates().shape[0]),
+        'categories': _counts(violations_df['VIOLATION_CATEGORY_CODE']),
+        'health_based_records': health_based,
+        'health_based_pct': round(health_based / len(violations_df) * 100, 1) if len(violations_df) else 0.0,
+        'status': _counts(violations_df['VIOLATION_STATUS']),
+        'active_records': int(active_mask(violations_df['VIOLATION_STATUS'], policy).sum()),
+        'with_enforcement': int(violations_df['ENFORCEMENT_ID'].notna().sum()) if 'ENFORCEMENT_ID' in violations_df else 0,
+        'enforcement_categories': _counts(violations_df['ENF_ACTION_CATEGORY']) if 'ENF_ACTION_CATEGORY' in violations_df else {}
+    }
+
+
+def lead_copper_report(lcr_df: pd.DataFrame, policy: Dict[str, Any] = POLICY) -> Dict[str, Any]:
+    return {'samples': len(lcr_df), 'contaminants': _counts(lcr_df['CONTAMINANT_CODE'])}
+
+
+def site_visits_report(visits_df: pd.DataFrame, policy: Dict[str, Any] = POLICY) -> Dict[str, Any]:
+    """Findings per evaluation area, counting deficiency results only"""
+    findings = {'N': 'No deficiencies', 'R': 'Recommendations', 'M': 'Minor deficiencies',
+                'S': 'Significant deficiencies', 'D': 'Sanitary defect'}
+    areas = {}
+    for column in [c for c in visits_df.columns if c.endswith('_EVAL_CODE')]:
+        area = column.replace('_EVAL_CODE', '').replace('_', ' ').title()
+        counts = visits_df[column].value_counts()
+        areas[area] = {findings[code]: int(count) for code, count in counts.items() if code in findings}
+    return {'visits': len(visits_df), 'findings': areas}
+
+
+# Report name -> (table it reads, report function of that table and the extraction policy)
+REPORTS: Dict[str, Tuple[str, Callable[[pd.DataFrame, Dict[str, Any]], Dict[str, Any]]]] = {
+    'systems': ('pub_water_systems', systems_report),
+    'violations': ('violations_enforcement', violations_report),
+    'lead_copper': ('lcr_samples', lead_copper_report),
+    'site_visits': ('site_visits', site_visits_report),
+}
+
+
+def changed_pwsids(old_df: Optional[pd.DataFrame], new_df: pd.DataFrame, table: str) -> Optional[Set[str]]:
+    """
+    PWSIDs whose records were inserted, deleted or modified between two
+    versions of a table, or None when that cannot be narrowed down (first
+    load, tables not keyed by PWSID, a changed column layout)
+    """
+    key_columns = NATURAL_KEYS.get(table)
+    if old_df is None or not key_columns or 'PWSID' not in key_columns or list(old_df.columns) != list(new_df.columns):
+        return None
+    old_keys = keyed_hashes(old_df, key_columns, IGNORED_COLUMNS)
+    new_keys = keyed_hashes(new_df, key_columns, IGNORED_COLUMNS)
+    common = new_keys.index.intersection(old_keys.index)
+    modified = common[old_keys.loc[common, 'row_hash'].to_numpy() != new_keys.loc[common, 'row_hash'].to_numpy()]
+    # A key's first row carries its PWSID
+    new_positions = new_keys.loc[new_keys.index.difference(old_keys.index).append(modified), 'position'].to_numpy()
+    old_positions = old_keys.loc[old_keys.index.difference(new_keys.index), 'position'].to_numpy()
+    return set(new_df['PWSID'].iloc[new_positions].dropna()) | set(old_df['PWSID'].iloc[old_positions].dropna())
+
+
+class WarmRepository(SystemRepository):
+    """
+    SystemRepository whose tables come from the resident frames instead of the
+    CSV files; WarmState has already left the quarantined rows and values out
+    """
+
+    def __init__(self, tables: Dict[str, pd.DataFrame], cache_size: int = 256,
+                 policy: Optional[Dict[str, Any]] = None):
+        self.tables = tables
+        super().__init__(data_dir=None, cache_size=cache_size, policy=policy or load_policy(), quarantine_file=None)
+
+    def _load(self, table: str, columns: set) -> pd.DataFrame:
+        df = self.tables.get(table)
+        if df is None:
+            return pd.DataFrame(columns=['PWSID'])
+        if table == 'violations_enforcement':
+            # One row per violation, carrying its latest enforcement action
+            df = latest_versions(df, table, NATURAL_KEYS[table])
+        return df[[c for c in df.columns if c in columns]]
+
+    def _load_reference_codes(self) -> Dict[str, Dict[str, str]]:
+        ref_df = self.tables.get('ref_code_values')
+        if ref_df is None:
+            return {}
+        return {value_type: dict(zip(group['VALUE_CODE'], group['VALUE_DESCRIPTION']))
+                for value_type, group in ref_df.groupby('VALUE_TYPE')}
+
+
+class ChangeFeed:
+    """Numbered reload events; subscribers block until one newer than the last they saw arrives"""
+
+    def __init__(self, history: int = EVENT_HISTORY):
+        self.events: "deque[Tuple[int, Dict[str, Any]]]" = deque(maxlen=history)
+        self.condition = threading.Condition()
+        self.last_id = 0
+
+    def publish(self, payload: Dict[str, Any]) -> int:
+        with self.condition:
+            self.last_id += 1
+            self.events.append((self.last_id, payload))
+            self.condition.notify_all()
+            return self.last_id
+
+    def since(self, event_id: int) -> List[Tuple[int, Dict[str, Any]]]:
+        with self.condition:
+            return [(i, payload) for i, payload in self.events if i > event_id]
+
+    def wait(self, event_id: int, timeout: float) -> List[Tuple[int, Dict[str, Any]]]:
+        with self.condition:
+            self.condition.wait_for(lambda: self.last_id > event_id, timeout)
+        return self.since(event_id)
+
+
+class WarmState:
+    """
+    The resident tables, the detail repository built over them and cached
+    reports. Changed tables are parsed outside the lock and swapped in under
+    it, so requests keep being answered from the previous version meanwhile.
+    Tables load without what the validation quarantine rejects or nulls, and a
+    changed quarantine file reloads every table. With publish_root, every
+    version is also published for shared-dataset workers.
+    """
+
+    def __init__(self, data_dir: str = "data", cache_size: int = 256, publish_root: Optional[str] = None,
+                 policy: Optional[Dict[str, Any]] = None, quarantine_file: Optional[str] = QUARANTINE_FILE):
+        self.data_dir = data_dir
+        self.publish_root = publish_root
+        self.policy = policy or load_policy(data_dir=data_dir)
+        # None loads the tables as they are
+        self.quarantine_file = quarantine_file
+        self.shared_version: Optional[int] = None
+        self.lock = threading.RLock()
+        self.feed = ChangeFeed()
+        self.fingerprints = FileFingerprints()
+        self.tables: Dict[str, pd.DataFrame] = {}
+        self.table_versions: Dict[str, int] = {}
+        self.digests: Dict[str, Optional[str]] = {}
+        self._pending: Dict[str, Optional[str]] = {}
+        self._reports: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+        self._summaries: Optional[Tuple[int, List[Dict[str, Any]]]] = None
+        self.version = 0
+        self.loaded_at = time.time()
+
+        started = time.perf_counter()
+        with validated_tables(self.quarantine_file):
+            for table in TABLE_FILES:
+                self.digests[table] = self._digest(table)
+                frame = self._read(table)
+                if frame is not None:
+                    self.tables[table] = frame
+                    self.table_versions[table] = 0
+        self.repository = WarmRepository(self.tables, cache_size, self.policy)
+        logger.info(f"Loaded {len(self.tables)} tables in {time.perf_counter() - started:.1f}s")
+        self._publish()
+
+    def _publish(self):
+        if not self.publish_root:
+            return
+        try:
+            self.shared_version = publish_dataset(self.repository, self.publish_root)
+        except Exception as e:
+            logger.error(f"Error publishing the shared dataset: {e}")
+
+    def _digest(self, table: str) -> Optional[str]:
+        digest = self.fingerprints.digest(table_path(table, self.data_dir))
+        if digest is None or not self.quarantine_file:
+            return digest
+        # A new validation run changes which rows and values every table keeps
+        return f"{digest}:{self.fingerprints.digest(self.quarantine_file)}"
+
+    def _read(self, table: str) -> Optional[pd.DataFrame]:
+        if self.digests.get(table) is None:
+            return None
+        try:
+            with validated_tables(self.quarantine_file):
+                return load_table(table, self.data_dir)
+        except Exception as e:
+            logger.error(f"Error loading {table}: {e}")
+            return None
+
+    def changed_tables(self) -> List[str]:
+        """
+        Tables whose file content changed and then held still for one poll, so
+        a file that is still being copied in is not loaded half-written
+        """
+        ready = []
+        for table in TABLE_FILES:
+            digest = self._digest(table)
+            if digest == self.digests.get(table):
+                self._pending.pop(table, None)
+            elif table in self._pending and self._pending[table] == digest:
+                ready.append(table)
+            else:
+                self._pending[table] = digest
+        return ready
+
+    def modified_tables(self) -> List[str]:
+        """Tables whose file content differs from the loaded version, without waiting for it to settle"""
+        return [table for table in TABLE_FILES if self._digest(table) != self.digests.get(table)]
+
+    def reload(self, tables: List[str]) -> Optional[Dict[str, Any]]:
+        """Reload the given tables, refresh what depends on them and publish a change event"""
+        loaded = {}
+        with validated_tables(self.quarantine_file):
+            for table in tables:
+                self.digests[table] = self._digest(table)
+                self._pending.pop(table, None)
+                loaded[table] = self._read(table)
+        if not loaded:
+            return None
+
+        summary = {}
+        pwsids: Optional[Set[str]] = set()
+        with self.lock:
+            for table, frame in loaded.items():
+                changed = None if frame is None else changed_pwsids(self.tables.get(table), frame, table)
+                if frame is None:
+                    self.tables.pop(table, None)
+                else:
+                    self.tables[table] = frame
+                self.table_versions[table] = self.table_versions.get(table, 0) + 1
+                self.repository.refresh(table, changed)
+                pwsids = None if pwsids is None or changed is None else pwsids | changed
+                summary[table] = {'rows': 0 if frame is None else len(frame),
+                                  'changed_systems': None if changed is None else len(changed)}
+            self._publish()
+            self.version += 1
+            self.loaded_at = time.time()
+            event = {
+                'version': self.version,
+                'tables': summary,
+                'pwsids': sorted(pwsids) if pwsids is not None and len(pwsids) <= MAX_EVENT_PWSIDS else None
+            }
+        self.feed.publish(event)
+        logger.info(f"Reloaded {', '.join(summary)} (version {self.version}): "
+                    + ', '.join(f"{t} {s['changed_systems'] if s['changed_systems'] is not None else 'all'} systems"
+                                for t, s in summary.items()))
+        return event
+
+    def status(self) -> Dict[str, Any]:
+        with self.lock:
+            hits, misses, cached = self.repository.cache_info()
+            return {
+                'version': self.version,
+                'loaded_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.loaded_at)),
+                'tables': {table: {'rows': len(df), 'version': self.table_versions[table]}
+                           for table, df in self.tables.items()},
+                'cache': {'hits': hits, 'misses': misses, 'records': cached},
+                'shared_version': self.shared_version,
+                'last_event': self.feed.last_id
+            }
+
+    def system(self, pwsid: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            return self.repository.get(pwsid)
+
+    def summaries(self) -> List[Dict[str, Any]]:
+        with self.lock:
+            if self._summaries is None or self._summaries[0] != self.version:
+                self._summaries = (self.version, self.repository.summaries())
+            return self._summaries[1]
+
+    def report(self, name: str) -> Optional[Dict[str, Any]]:
+        """A report over the current tables, recomputed only after its table reloads"""
+        table, build = REPORTS[name]
+        with self.lock:
+            if table not in self.tables:
+                return None
+            version = self.table_versions[table]
+            cached = self._reports.get(name)
+            if cached and cached[0] == version:
+                return cached[1]
+            frame = self.tables[table]
+        result = build(frame, self.policy)
+        with self.lock:
+            self._reports[name] = (version, result)
+        return result
+
+
+def watch(state: WarmState, interval: float = POLL_SECONDS, stop: Optional[threading.Event] = None):
+    """Poll the data directory and reload changed tables until stopped"""
+    stop = stop or threading.Event()
+    while not stop.wait(interval):
+        try:
+            changed = state.changed_tables()
+            if changed:
+                state.reload(changed)
+        except Exception as e:
+            logger.error(f"Error reloading tables: {e}")
+
+
+class _WarmHandler(BaseHTTPRequestHandler):
+    """
+    GET  /status                 tables, versions and cache counters
+    GET  /systems                summary of every system
+    GET  /systems/<PWSID>        detailed record of one system
+    GET  /reports[/<name>]       report names, or one report
+    GET  /events                 server-sent reload events (honours Last-Event-ID)
+    POST /reload[?table=<name>]  reload changed tables now (or the named ones)
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+    def _send_json(self, payload: Any, status: int = 200):
+        body = json.dumps(payload, separators=(',', ':'), default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        # The dashboards' dev servers run on other local ports
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        state: WarmState = self.server.state
+        path = urlparse(self.path).path.rstrip('/')
+        try:
+            if path == '/status':
+                self._send_json(state.status())
+            elif path == '/systems':
+                self._send_json(state.summaries())
+            elif path.startswith('/systems/'):
+                record = state.system(path.split('/', 2)[2].upper())
+                self._send_json(record if record else {'error': 'Unknown PWSID'}, 200 if record else 404)
+            elif path == '/reports':
+                self._send_json(sorted(REPORTS))
+            elif path.startswith('/reports/') and path.split('/', 2)[2] in REPORTS:
+                report = state.report(path.split('/', 2)[2])
+                self._send_json(report if report is not None else {'error': 'Table not loaded'},
+                                200 if report is not None else 404)
+            elif path == '/events':
+                self._stream_events(state)
+            else:
+                self._send_json({'error': 'Not found'}, 404)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except Exception as e:
+            logger.error(f"Error serving {self.path}: {e}")
+            self._send_json({'error': str(e)}, 500)
+
+    def do_POST(self):
+        state: WarmState = self.server.state
+        url = urlparse(self.path)
+        if url.path.rstrip('/') != '/reload':
+            self._send_json({'error': 'Not found'}, 404)
+            return
+        requested = parse_qs(url.query).get('table')
+        unknown = [t for t in requested or [] if t not in TABLE_FILES]
+        if unknown:
+            self._send_json({'error': f"Unknown tables: {', '.join(unknown)}"}, 400)
+            return
+        tables = requested or state.modified_tables()
+        event = state.reload(tables) if tables else None
+        self._send_json(event or {'version': state.version, 'tables': {}})
+
+    def _stream_events(self, state: WarmState):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        # Without Last-Event-ID only events after connecting are sent
+        last_seen = self.headers.get('Last-Event-ID')
+        last_id = int(last_seen) if last_seen and re.fullmatch(r'\d+', last_seen) else state.feed.last_id
+        self.wfile.write(f"retry: 3000\n: version {state.version}\n\n".encode('utf-8'))
+        self.wfile.flush()
+        while True:
+            events = state.feed.wait(last_id, KEEPALIVE_SECONDS)
+            if not events:
+                self.wfile.write(b": keepalive\n\n")
+            for event_id, payload in events:
+                data = json.dumps(payload, separators=(',', ':'))
+                self.wfile.write(f"id: {event_id}\nevent: reload\ndata: {data}\n\n".encode('utf-8'))
+                last_id = event_id
+            self.wfile.flush()
+
+
+class WarmDataServer(ThreadingHTTPServer):
+    """Local HTTP server over a WarmState"""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, state: WarmState, host: str = '127.0.0.1', port: int = DEFAULT_PORT):
+        self.state = state
+        super().__init__((host, port), _WarmHandler)
+
+
+def main():
+    """Load the tables once and serve them until interrupted"""
+    parser = argparse.ArgumentParser(description="Resident SDWIS data daemon with hot reload")
+    parser.add_argument('--data-dir', default="data")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--interval', type=float, default=POLL_SECONDS, help="Seconds between data directory polls")
+    parser.add_argument('--cache-size', type=int, default=256, help="Detail records kept in the LRU")
+    parser.add_argument('--publish', metavar='ROOT',
+                        help="Publish every loaded version as a shared dataset under ROOT (see shared_dataset.py serve)")
+    parser.add_argument('--policy', help="Extraction policy overrides (default: <data-dir>/extraction_policy.json, if present)")
+    parser.add_argument('--quarantine', default=QUARANTINE_FILE, help="Validation quarantine to apply ('' to load raw tables)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    state = WarmState(args.data_dir, args.cache_size, args.publish, load_policy(args.policy, args.data_dir),
+                      args.quarantine or None)
+    stop = threading.Event()
+    watcher = threading.Thread(target=watch, args=(state, args.interval, stop), daemon=True)
+    watcher.start()
+    with WarmDataServer(state, args.host, args.port) as server:
+        logger.info(f"Serving {args.data_dir} on http://{args.host}:{args.port} (polling every {args.interval}s)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stop.set()
+
+
+if __name__ == "__main__":
+    main()
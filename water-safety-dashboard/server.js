@@ -1,5 +1,7 @@
 const express = require('express');
 const cors = require('cors');
+const fs = require('fs');
+const path = require('path');
 const sgMail = require('@sendgrid/mail');
 require('dotenv').config();
 
@@ -13,10 +15,13 @@ app.use(express.json());
 // Set SendGrid API key
 sgMail.setApiKey(process.env.SENDGRID_API_KEY);
 
+// Subscriber store read by alert_fanout.py to notify subscribers when the data changes
+const SUBSCRIBERS_FILE = process.env.SUBSCRIBERS_FILE || path.join(__dirname, 'subscribers.jsonl');
+
 // Email sending endpoint
 app.post('/api/send-email', async (req, res) => {
   try {
-    const { email, phone, waterSystem, county } = req.body;
+    const { email, phone, waterSystem, county, pwsid, zipCodes } = req.body;
 
     // Validate email
     if (!email || !email.includes('@')) {
@@ -91,24 +96,37 @@ app.post('/api/send-email', async (req, res) => {
       `
     };
 
-    // Send email using SendGrid
-    await sgMail.send(msg);
+    // Record the subscription; alert delivery happens out of band in alert_fanout.py
+    const subscriber = {
+      email: email.trim().toLowerCase(),
+      phone: phone || null,
+      pwsid: pwsid || null,
+      zipCodes: Array.isArray(zipCodes) ? zipCodes : [],
+      waterSystem: waterSystem || null,
+      county: county || null,
+      createdAt: new Date().toISOString()
+    };
+    await fs.promises.appendFile(SUBSCRIBERS_FILE, JSON.stringify(subscriber) + '\n');
+
+    // Send the confirmation in the background so SendGrid latency never blocks the signup request
+    sgMail.send(msg).catch((error) => {
+      console.error('Email sending error:', error);
+      if (error.response) {
+        console.error('SendGrid error details:', error.response.body);
+      }
+    });
 
     res.json({ 
       success: true, 
-      message: 'Email sent successfully! Check your inbox for confirmation.' 
+      message: 'Signup received! Check your inbox for confirmation.' 
     });
 
   } catch (error) {
-    console.error('Email sending error:', error);
-    
-    if (error.response) {
-      console.error('SendGrid error details:', error.response.body);
-    }
+    console.error('Signup error:', error);
     
     res.status(500).json({ 
       success: false, 
-      message: 'Failed to send email. Please try again.' 
+      message: 'Failed to save your signup. Please try again.' 
     });
   }
 });
@@ -118,6 +136,40 @@ app.get('/api/health', (req, res) => {
   res.json({ status: 'OK', message: 'Email server is running' });
 });
 
+// Serve the production build. Data artifacts published by artifacts.py carry a
+// content hash in their name, so they can be cached forever; their .br/.gz
+// siblings are sent as-is to clients that accept them instead of compressing
+// on every request.
+const STATIC_DIR = process.env.STATIC_DIR || path.join(__dirname, 'build');
+const HASHED_ARTIFACT = /\.[0-9a-f]{12}\.(json|cols)$/;
+
+function artifactCacheControl(file) {
+  return HASHED_ARTIFACT.test(file) ? 'public, max-age=31536000, immutable' : 'no-cache';
+}
+
+app.get(/\.(json|cols)$/, (req, res, next) => {
+  const file = path.join(STATIC_DIR, path.basename(req.path));
+  const accepted = req.headers['accept-encoding'] || '';
+  for (const [encoding, suffix] of [['br', '.br'], ['gzip', '.gz']]) {
+    if (accepted.includes(encoding) && fs.existsSync(file + suffix)) {
+      res.set({
+        'Content-Type': file.endsWith('.cols') ? 'application/octet-stream' : 'application/json; charset=utf-8',
+        'Content-Encoding': encoding,
+        'Cache-Control': artifactCacheControl(file),
+        'Vary': 'Accept-Encoding'
+      });
+      return res.sendFile(file + suffix);
+    }
+  }
+  next();
+});
+
+app.use(express.static(STATIC_DIR, {
+  setHeaders: (res, file) => {
+    if (/\.(json|cols)$/.test(file)) res.set('Cache-Control', artifactCacheControl(file));
+  }
+}));
+
 app.listen(PORT, () => {
   console.log(`Email server running on port ${PORT}`);
   console.log(`SendGrid API Key configured: ${process.env.SENDGRID_API_KEY ? 'Yes' : 'No'}`);
@@ -1,5 +1,8 @@
 import React, { useState, useEffect } from 'react';
 import { Search, AlertCircle, CheckCircle, XCircle, Info, Bell, Droplets, MapPin, Users, BookOpen, Filter } from 'lucide-react';
+import { fetchArtifact } from './shared/artifacts';
+import { loadNameSearch, NameSearch } from './nameSearch';
+import { nearestForZip } from './zipNearest';
 
 interface Violation {
   id: number;
@@ -36,6 +39,12 @@ interface ContaminantInfo {
   sources: string[];
   mcl: string;
   category: string;
+  exposure?: {
+    systems: number;
+    violating_systems: number;
+    population_affected: number;
+    latest_violation: string | null;
+  };
 }
 
 function App() {
@@ -55,24 +64,31 @@ function App() {
   const [isSendingEmail, setIsSendingEmail] = useState(false);
   const [emailStatus, setEmailStatus] = useState<'idle' | 'success' | 'error'>('idle');
   const [emailMessage, setEmailMessage] = useState('');
+  const [nameSearch, setNameSearch] = useState<NameSearch | null>(null);
+  const [nearbyNotice, setNearbyNotice] = useState('');
 
   // Load data from JSON files
   useEffect(() => {
     const loadData = async () => {
       try {
         // Load contaminant information
-        const contaminantResponse = await fetch('/contaminant_info.json');
+        const contaminantResponse = await fetchArtifact('contaminant_info.json');
         const contaminantData = await contaminantResponse.json();
         setContaminantInfo(contaminantData);
         console.log('Loaded contaminant info:', contaminantData);
         
         // Load water systems data
-        const waterSystemsResponse = await fetch('/water_systems_data.json');
+        const waterSystemsResponse = await fetchArtifact('water_systems_data.json');
         const waterSystemsData = await waterSystemsResponse.json();
         setWaterSystems(waterSystemsData);
         console.log('Loaded water systems:', waterSystemsData);
         console.log('Number of water systems loaded:', Array.isArray(waterSystemsData) ? waterSystemsData.length : 'Not an array');
         
+        // Name search falls back to substring matching if the index is unavailable
+        loadNameSearch()
+          .then(setNameSearch)
+          .catch(error => console.error('Error loading name search index:', error));
+        
       } catch (error) {
         console.error('Error loading data:', error);
         // Fallback to basic data if JSON loading fails
@@ -134,6 +150,17 @@ function App() {
 
   const handleSearch = () => {
     if (!searchTerm) return;
+    setNearbyNotice('');
+    
+    if (searchType === 'name' && nameSearch) {
+      // Ranked, typo-tolerant matches from the trigram index
+      const systemsById: Record<string, WaterSystem> = {};
+      waterSystems.forEach(system => { systemsById[system.pwsid] = system; });
+      const matches = nameSearch.search(searchTerm, 25);
+      setSearchResults(matches.map(match => systemsById[match.pwsid]).filter(Boolean));
+      setSelectedSystem(null);
+      return;
+    }
     
     const results = waterSystems.filter(system => {
       if (searchType === 'zip') {
@@ -149,6 +176,26 @@ function App() {
     
     setSearchResults(results);
     setSelectedSystem(null);
+    
+    // No system lists this ZIP: fall back to the systems serving or nearest to it
+    if (searchType === 'zip' && results.length === 0) {
+      const zip = searchTerm.trim();
+      nearestForZip(zip).then(answer => {
+        if (!answer) return;
+        const systemsById: Record<string, WaterSystem> = {};
+        waterSystems.forEach(system => { systemsById[system.pwsid] = system; });
+        const pwsids = answer.serving.concat(answer.nearest.map(n => n.pwsid));
+        const nearby = pwsids
+          .filter((pwsid, i) => pwsids.indexOf(pwsid) === i && systemsById[pwsid])
+          .map(pwsid => systemsById[pwsid]);
+        if (!nearby.length) return;
+        const closest = answer.nearest[0];
+        setNearbyNotice(closest
+          ? `No water system lists ZIP ${zip}; showing systems near it (closest about ${closest.distanceKm} km away).`
+          : `Showing systems that serve ZIP ${zip}.`);
+        setSearchResults(nearby);
+      });
+    }
   };
 
   // Debug logging for state
@@ -209,24 +256,6 @@ function App() {
     return null;
   };
 
-  // Remove duplicate violations
-  const deduplicateViolations = (violations: Violation[]): Violation[] => {
-    const seen = new Set<string>();
-    const uniqueViolations: Violation[] = [];
-    
-    violations.forEach(violation => {
-      // Create a unique key based on contaminant, type, and date
-      const key = `${violation.contaminant}-${violation.type}-${violation.date}`;
-      
-      if (!seen.has(key)) {
-        seen.add(key);
-        uniqueViolations.push(violation);
-      }
-    });
-    
-    return uniqueViolations;
-  };
-
   // Get unique categories from contaminant info
   const getContaminantCategories = (): string[] => {
     const categories = new Set<string>();
@@ -280,7 +309,9 @@ function App() {
           email: emailAddress,
           phone: phoneNumber,
           waterSystem: selectedSystem?.name,
-          county: selectedSystem?.county
+          county: selectedSystem?.county,
+          pwsid: selectedSystem?.pwsid,
+          zipCodes: selectedSystem?.zipCodes
         }),
       });
 
@@ -396,6 +427,12 @@ function App() {
           <h3 className="text-lg font-semibold mb-4">
             Found {searchResults.length} water system{searchResults.length > 1 ? 's' : ''}
           </h3>
+          {nearbyNotice && (
+            <p className="text-sm text-gray-600 mb-4 flex items-center gap-2">
+              <MapPin className="w-4 h-4" />
+              {nearbyNotice}
+            </p>
+          )}
           
           <div className="space-y-4">
             {searchResults.map(system => (
@@ -580,7 +617,7 @@ function App() {
                 <div>
                   <h4 className="text-lg font-semibold mb-3">Recent Violations & Issues</h4>
                   <div className="space-y-4">
-                    {deduplicateViolations(selectedSystem.recentViolations).map(violation => {
+                    {selectedSystem.recentViolations.map(violation => {
                       const severity = getViolationSeverity(violation);
                       const info = getContaminantInfo(violation.contaminant);
                       
@@ -767,6 +804,14 @@ function App() {
                         <strong>MCL:</strong> {info.mcl}
                       </div>
                       
+                      {info.exposure && info.exposure.violating_systems > 0 && (
+                        <div>
+                          <strong>In Georgia:</strong> {info.exposure.violating_systems} system(s) with violations,
+                          {' '}{info.exposure.population_affected.toLocaleString()} people served
+                          {info.exposure.latest_violation && <> (latest {info.exposure.latest_violation})</>}
+                        </div>
+                      )}
+                      
                       {info.healthEffects && (
                         <div>
                           <strong>Health Effects:</strong> {info.healthEffects}
@@ -0,0 +1,165 @@
+import { fetchArtifact } from './shared/artifacts';
+
+// Fuzzy system-name search over the trigram index written by name_search.py.
+// Names are normalized with the abbreviation and prefix rules shipped in the
+// index, candidates are ranked by shared trigrams, and only those within a
+// small edit distance of the query are returned.
+
+interface NameSearchPayload {
+  abbreviations: Record<string, string>;
+  prefixes: string[];
+  pwsids: string[];
+  names: string[];
+  // Ascending document numbers, delta-encoded
+  postings: Record<string, number[]>;
+}
+
+export interface NameMatch {
+  pwsid: string;
+  name: string;
+  distance: number;
+  score: number;
+}
+
+const TOKEN = /S\/D|&|[A-Z0-9]+/g;
+
+function trigrams(text: string): string[] {
+  const padded = `  ${text} `;
+  const seen: Record<string, boolean> = {};
+  const grams: string[] = [];
+  for (let i = 0; i + 3 <= padded.length; i++) {
+    const gram = padded.slice(i, i + 3);
+    if (!seen[gram]) {
+      seen[gram] = true;
+      grams.push(gram);
+    }
+  }
+  return grams;
+}
+
+// Levenshtein distance, or limit + 1 as soon as it must exceed limit
+function boundedDistance(a: string, b: string, limit: number): number {
+  if (Math.abs(a.length - b.length) > limit) return limit + 1;
+  let previous: number[] = [];
+  for (let j = 0; j <= b.length; j++) previous.push(j);
+  for (let i = 1; i <= a.length; i++) {
+    const current = [i];
+    let rowMin = i;
+    for (let j = 1; j <= b.length; j++) {
+      const cost = a[i - 1] === b[j - 1] ? 0 : 1;
+      const value = Math.min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost);
+      current.push(value);
+      rowMin = Math.min(rowMin, value);
+    }
+    if (rowMin > limit) return limit + 1;
+    previous = current;
+  }
+  return previous[b.length];
+}
+
+function maxEdits(query: string): number {
+  if (query.length <= 3) return 0;
+  if (query.length <= 6) return 1;
+  return query.length <= 12 ? 2 : 3;
+}
+
+// Sum over query words of the distance to their closest name word; the last
+// query word also matches as a prefix, for partially typed names
+function nameDistance(query: string, name: string, limit: number): number {
+  const nameWords = name.split(' ');
+  const queryWords = query.split(' ');
+  let total = 0;
+  for (let q = 0; q < queryWords.length; q++) {
+    const word = queryWords[q];
+    const isLast = q === queryWords.length - 1;
+    let best = limit + 1;
+    for (let n = 0; n < nameWords.length && best > 0; n++) {
+      const candidate = nameWords[n];
+      best = Math.min(best, boundedDistance(word, candidate, limit - total));
+      if (isLast && candidate.length > word.length) {
+        best = Math.min(best, boundedDistance(word, candidate.slice(0, word.length), limit - total));
+      }
+    }
+    total += best;
+    if (total > limit) return limit + 1;
+  }
+  return total;
+}
+
+export class NameSearch {
+  private payload: NameSearchPayload;
+  private normalized: string[];
+  private gramCounts: Int32Array;
+  private postings: Record<string, Int32Array> = {};
+
+  constructor(payload: NameSearchPayload) {
+    this.payload = payload;
+    this.normalized = payload.names.map(name => this.normalize(name));
+    this.gramCounts = new Int32Array(this.normalized.map(text => trigrams(text).length));
+    Object.keys(payload.postings).forEach(gram => {
+      const deltas = payload.postings[gram];
+      const docs = new Int32Array(deltas.length);
+      let doc = 0;
+      for (let i = 0; i < deltas.length; i++) {
+        doc += deltas[i];
+        docs[i] = doc;
+      }
+      this.postings[gram] = docs;
+    });
+  }
+
+  // 'CITY OF  X WTR AUTH' -> 'x water authority' (mirrors name_search.normalize_name)
+  normalize(name: string): string {
+    const tokens = (name || '').toUpperCase().replace(/['`]/g, '').match(TOKEN) || [];
+    let expanded = tokens.map(token => this.payload.abbreviations[token] || token).join(' ');
+    for (let i = 0; i < this.payload.prefixes.length; i++) {
+      const prefix = this.payload.prefixes[i] + ' ';
+      if (expanded.indexOf(prefix) === 0) {
+        expanded = expanded.slice(prefix.length);
+        break;
+      }
+    }
+    return expanded.toLowerCase();
+  }
+
+  search(query: string, k: number = 10, candidates: number = 100): NameMatch[] {
+    const normalized = this.normalize(query);
+    if (!normalized) return [];
+    const grams = trigrams(normalized);
+    const shared = new Int32Array(this.normalized.length);
+    const pool: number[] = [];
+    grams.forEach(gram => {
+      const docs = this.postings[gram];
+      if (!docs) return;
+      for (let i = 0; i < docs.length; i++) {
+        if (shared[docs[i]]++ === 0) pool.push(docs[i]);
+      }
+    });
+
+    // Dice coefficient over trigram sets picks the candidates worth an edit-distance check
+    const similarity = (doc: number) => (2 * shared[doc]) / (grams.length + this.gramCounts[doc]);
+    pool.sort((a, b) => similarity(b) - similarity(a));
+
+    const limit = maxEdits(normalized);
+    const ranked: { doc: number; distance: number }[] = [];
+    pool.slice(0, candidates).forEach(doc => {
+      const distance = nameDistance(normalized, this.normalized[doc], limit);
+      if (distance <= limit) ranked.push({ doc, distance });
+    });
+    ranked.sort((a, b) => a.distance - b.distance
+      || similarity(b.doc) - similarity(a.doc)
+      || this.normalized[a.doc].length - this.normalized[b.doc].length);
+    return ranked.slice(0, k).map(({ doc, distance }) => ({
+      pwsid: this.payload.pwsids[doc],
+      name: this.payload.names[doc],
+      distance,
+      score: Math.round(similarity(doc) * 1000) / 1000,
+    }));
+  }
+}
+
+export async function loadNameSearch(): Promise<NameSearch> {
+  const response = await fetchArtifact('name_search_index.json');
+  if (!response.ok) throw new Error(`Failed to load name search index: ${response.status}`);
+  return new NameSearch(await response.json());
+}
@@ -0,0 +1,45 @@
+import { fetchArtifact } from './shared/artifacts';
+
+// Precomputed "systems serving or nearest to this ZIP" table written by
+// zip_locator.py from locally supplied ZIP, city and county centroids, so a
+// ZIP no system lists still finds the systems around it without geocoding.
+
+export interface NearbySystem {
+  pwsid: string;
+  distanceKm: number;
+  locatedBy: 'zip_served' | 'city_served' | 'county_served' | 'address';
+}
+
+export interface ZipAnswer {
+  serving: string[];
+  nearest: NearbySystem[];
+}
+
+interface ZipNearestPayload {
+  fields: string[];
+  k: number;
+  max_km: number;
+  zips: Record<string, { serving: string[]; nearest: [string, number, NearbySystem['locatedBy']][] }>;
+}
+
+let tablePromise: Promise<ZipNearestPayload | null> | null = null;
+
+function loadTable(): Promise<ZipNearestPayload | null> {
+  if (!tablePromise) {
+    tablePromise = fetchArtifact('zip_nearest.json')
+      .then(res => (res.ok ? res.json() : null))
+      .catch(() => null);
+  }
+  return tablePromise;
+}
+
+// Null when the ZIP is unknown or the table was not published
+export async function nearestForZip(zip: string): Promise<ZipAnswer | null> {
+  const table = await loadTable();
+  const entry = table?.zips[zip.trim().slice(0, 5)];
+  if (!entry) return null;
+  return {
+    serving: entry.serving,
+    nearest: entry.nearest.map(([pwsid, distanceKm, locatedBy]) => ({ pwsid, distanceKm, locatedBy })),
+  };
+}
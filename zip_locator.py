@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+ZIP Nearest-System Locator
+Places each water system at the centroids of the ZIPs, cities and counties it
+serves (SDWA_GEOGRAPHIC_AREAS), falling back to its address ZIP, using
+locally supplied centroid CSVs (e.g. the Census Gazetteer files), and answers
+"systems serving or nearest to this ZIP" from a grid spatial index without
+any network geocoding
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from data_validation import normalize_zip
+from sdwis_tables import load_table
+
+logger = logging.getLogger(__name__)
+
+ZIP_CENTROIDS = "data/zip_centroids.csv"
+COUNTY_CENTROIDS = "data/county_centroids.csv"
+PLACE_CENTROIDS = "data/place_centroids.csv"
+
+EARTH_RADIUS_KM = 6371.0
+CELL_DEGREES = 0.25
+NEAREST_K = 5
+# ZIPs farther than this from every system are left out of the published table
+MAX_DISTANCE_KM = 80.0
+
+# Column names accepted in the centroid files (Gazetteer names first)
+LAT_COLUMNS = ['INTPTLAT', 'LAT', 'LATITUDE']
+LON_COLUMNS = ['INTPTLONG', 'LON', 'LNG', 'LONG', 'LONGITUDE']
+ZIP_COLUMNS = ['GEOID', 'ZCTA5', 'ZCTA', 'ZIP', 'ZIP_CODE', 'ZIPCODE']
+NAME_COLUMNS = ['NAME', 'COUNTY', 'PLACE', 'CITY']
+STATE_COLUMNS = ['USPS', 'STATE', 'STATE_CODE']
+
+# Ranking of the location a system was placed at, most specific first
+POINT_KINDS = ['zip_served', 'city_served', 'county_served', 'address']
+
+_PLACE_SUFFIXES = (' city', ' town', ' village', ' cdp', ' borough', ' municipality')
+
+
+def _column(df: pd.DataFrame, candidates: List[str], path: str) -> str:
+    for name in candidates:
+        if name in df.columns:
+            return name
+    raise ValueError(f"{path} has none of the columns {candidates}")
+
+
+def _area_name(name: str) -> str:
+    """'Appling County' / 'Baxley city' / 'BAXLEY' -> 'appling' / 'baxley' / 'baxley'"""
+    name = str(name).strip().lower()
+    for suffix in (' county',) + _PLACE_SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+def _read_centroids(path: str) -> pd.DataFrame:
+    # The Gazetteer files are tab-separated with padded headers; sniff the delimiter
+    df = pd.read_csv(path, dtype=str, sep=None, engine='python')
+    df.columns = df.columns.str.strip().str.upper()
+    lat = pd.to_numeric(df[_column(df, LAT_COLUMNS, path)], errors='coerce')
+    lon = pd.to_numeric(df[_column(df, LON_COLUMNS, path)], errors='coerce')
+    return df.assign(_lat=lat, _lon=lon).dropna(subset=['_lat', '_lon'])
+
+
+def load_zip_centroids(path: str = ZIP_CENTROIDS) -> Dict[str, Tuple[float, float]]:
+    df = _read_centroids(path)
+    raw = df[_column(df, ZIP_COLUMNS, path)].str.strip()
+    # Spreadsheet round-trips drop leading zeros ('601' for 00601)
+    zips = normalize_zip(raw.where(~raw.str.fullmatch(r'\d{3,4}').fillna(False), raw.str.zfill(5)))
+    df = df.assign(_key=zips).dropna(subset=['_key'])
+    return dict(zip(df['_key'], zip(df['_lat'].tolist(), df['_lon'].tolist())))
+
+
+def load_area_centroids(path: str) -> Dict[Tuple[str, str], Tuple[float, float]]:
+    """County or place centroids keyed by (state, normalized name)"""
+    df = _read_centroids(path)
+    names = df[_column(df, NAME_COLUMNS, path)].map(_area_name)
+    states = df[_column(df, STATE_COLUMNS, path)].str.strip().str.upper()
+    return dict(zip(zip(states, names), zip(df['_lat'].tolist(), df['_lon'].tolist())))
+
+
+def haversine_km(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class ZipLocator:
+    """
+    Uniform lat/lon grid over system location points. A nearest query scans
+    rings of cells outward from the query cell and stops once the k-th
+    closest system is nearer than anything an unscanned ring could hold.
+    """
+
+    def __init__(self, points: pd.DataFrame, zip_centroids: Dict[str, Tuple[float, float]],
+                 serving: Optional[Dict[str, List[str]]] = None, cell_degrees: float = CELL_DEGREES):
+        self.zip_centroids = zip_centroids
+        self.serving = serving or {}
+        self.cell_degrees = cell_degrees
+
+        codes, self.pwsids = pd.factorize(points['pwsid'])
+        self.system = codes.astype(np.int32)
+        self.lat = points['lat'].to_numpy(dtype=np.float64)
+        self.lon = points['lon'].to_numpy(dtype=np.float64)
+        self.kind = points['kind'].to_numpy(dtype=object)
+
+        rows = np.floor(self.lat / cell_degrees).astype(np.int64)
+        cols = np.floor(self.lon / cell_degrees).astype(np.int64)
+        self.cells: Dict[Tuple[int, int], np.ndarray] = {}
+        if len(points):
+            order = np.lexsort((cols, rows))
+            keys = np.stack([rows[order], cols[order]], axis=1)
+            starts = np.flatnonzero(np.any(np.diff(keys, axis=0) != 0, axis=1)) + 1
+            for block in np.split(order, starts):
+                self.cells[(int(rows[block[0]]), int(cols[block[0]]))] = block
+            self.row_range = (int(rows.min()), int(rows.max()))
+            self.col_range = (int(cols.min()), int(cols.max()))
+            # Smallest width of a cell in km anywhere on the grid, a safe lower bound per ring
+            widest_lat = math.radians(max(abs(self.lat.min()), abs(self.lat.max())) + cell_degrees)
+            self.cell_km = cell_degrees * min(110.57, 111.32 * max(math.cos(widest_lat), 0.01))
+        else:
+            self.row_range = self.col_range = (0, -1)
+            self.cell_km = 0.0
+
+    def __len__(self) -> int:
+        return len(self.pwsids)
+
+    def _ring(self, row: int, col: int, radius: int) -> List[np.ndarray]:
+        if radius == 0:
+            block = self.cells.get((row, col))
+            return [block] if block is not None else []
+        blocks = []
+        for r in range(row - radius, row + radius + 1):
+            step = 1 if r in (row - radius, row + radius) else 2 * radius
+            for c in range(col - radius, col + radius + 1, step):
+                block = self.cells.get((r, c))
+                if block is not None:
+                    blocks.append(block)
+        return blocks
+
+    def nearest(self, lat: float, lon: float, k: int = NEAREST_K,
+                max_km: Optional[float] = None) -> List[Dict[str, Any]]:
+        """The k closest distinct systems to a point, each at its closest location"""
+        if not self.cells:
+            return []
+        row = int(math.floor(lat / self.cell_degrees))
+        col = int(math.floor(lon / self.cell_degrees))
+        # Rings beyond this one lie entirely outside the grid
+        last_ring = max(abs(row - self.row_range[0]), abs(row - self.row_range[1]),
+                        abs(col - self.col_range[0]), abs(col - self.col_range[1]))
+        found: List[np.ndarray] = []
+        ranked: List[Tuple[float, int]] = []
+        for radius in range(last_ring + 1):
+            blocks = self._ring(row, col, radius)
+            if blocks:
+                found.extend(blocks)
+                candidates = np.concatenate(found)
+                distances = haversine_km(lat, lon, self.lat[candidates], self.lon[candidates])
+                order = np.argsort(distances, kind='stable')
+                _, first = np.unique(self.system[candidates[order]], return_index=True)
+                closest = order[np.sort(first)][:k]
+                ranked = [(float(distances[i]), int(candidates[i])) for i in closest]
+            # Points in unscanned rings are at least radius cells away
+            bound = radius * self.cell_km
+            if len(ranked) >= k and ranked[-1][0] <= bound:
+                break
+            if max_km is not None and bound > max_km:
+                break
+        return [{
+            'pwsid': self.pwsids[self.system[point]],
+            'distance_km': round(distance, 1),
+            'located_by': self.kind[point]
+        } for distance, point in ranked if max_km is None or distance <= max_km]
+
+    def lookup(self, zip_code: str, k: int = NEAREST_K, max_km: Optional[float] = None) -> Dict[str, Any]:
+        """Systems that list the ZIP as served, plus the nearest systems to its centroid"""
+        zip_code = str(zip_code).strip()[:5]
+        centroid = self.zip_centroids.get(zip_code)
+        return {
+            'zip': zip_code,
+            'serving': sorted(self.serving.get(zip_code, [])),
+            'nearest': self.nearest(centroid[0], centroid[1], k, max_km) if centroid else [],
+            'known_zip': centroid is not None
+        }
+
+    def nearest_table(self, k: int = NEAREST_K, max_km: float = MAX_DISTANCE_KM) -> Dict[str, Any]:
+        """Precomputed answers for every centroid ZIP near a system, for the dashboard"""
+        table = {}
+        for zip_code in sorted(self.zip_centroids):
+            lat, lon = self.zip_centroids[zip_code]
+            nearest = self.nearest(lat, lon, k, max_km)
+            if nearest or zip_code in self.serving:
+                table[zip_code] = {
+                    'serving': sorted(self.serving.get(zip_code, [])),
+                    'nearest': [[n['pwsid'], n['distance_km'], n['located_by']] for n in nearest]
+                }
+        return {'fields': ['pwsid', 'distance_km', 'located_by'], 'k': k, 'max_km': max_km, 'zips': table}
+
+    @classmethod
+    def from_data(cls, data_dir: str = "data", zip_file: str = ZIP_CENTROIDS,
+                  county_file: Optional[str] = COUNTY_CENTROIDS, place_file: Optional[str] = PLACE_CENTROIDS,
+                  active_only: bool = True) -> 'ZipLocator':
+        zips = load_zip_centroids(zip_file)
+        counties = load_area_centroids(county_file) if county_file and os.path.exists(county_file) else {}
+        places = load_area_centroids(place_file) if place_file and os.path.exists(place_file) else {}
+
+        systems = load_table('pub_water_systems', data_dir, usecols=['PWSID', 'PWS_ACTIVITY_CODE', 'ZIP_CODE'])
+        if active_only:
+            systems = systems[systems['PWS_ACTIVITY_CODE'] == 'A']
+        wanted = set(systems['PWSID'])
+
+        geo = load_table('geographic_areas', data_dir, usecols=[
+            'PWSID', 'STATE_SERVED', 'ZIP_CODE_SERVED', 'CITY_SERVED', 'COUNTY_SERVED'])
+        geo = geo[geo['PWSID'].isin(wanted)]
+        # County rows usually leave STATE_SERVED blank; the PWSID prefix is the primacy state
+        state = geo['STATE_SERVED'].fillna(geo['PWSID'].str[:2]).str.upper()
+        served_zip = normalize_zip(geo['ZIP_CODE_SERVED'])
+
+        frames = []
+
+        def add(pwsids: pd.Series, keys: pd.Series, centroids: Dict[Any, Tuple[float, float]], kind: str):
+            located = [(p, centroids[key]) for p, key in zip(pwsids, keys) if key in centroids]
+            if located:
+                frames.append(pd.DataFrame({
+                    'pwsid': [p for p, _ in located],
+                    'lat': [c[0] for _, c in located],
+                    'lon': [c[1] for _, c in located],
+                    'kind': kind
+                }))
+
+        add(geo['PWSID'], served_zip, zips, 'zip_served')
+        city = geo['CITY_SERVED'].notna()
+        add(geo['PWSID'][city], list(zip(state[city], geo['CITY_SERVED'][city].map(_area_name))), places, 'city_served')
+        county = geo['COUNTY_SERVED'].notna()
+        add(geo['PWSID'][county], list(zip(state[county], geo['COUNTY_SERVED'][county].map(_area_name))),
+            counties, 'county_served')
+        # The address ZIP only places systems that no served area could
+        placed = set().union(*(set(f['pwsid']) for f in frames)) if frames else set()
+        unplaced = systems[~systems['PWSID'].isin(placed)]
+        add(unplaced['PWSID'], normalize_zip(unplaced['ZIP_CODE']), zips, 'address')
+
+        points = (pd.concat(frames, ignore_index=True).drop_duplicates() if frames
+                  else pd.DataFrame(columns=['pwsid', 'lat', 'lon', 'kind']))
+        serving = geo.assign(zip=served_zip).dropna(subset=['zip']).groupby('zip')['PWSID'].unique()
+        kinds = points['kind'].value_counts().to_dict()
+        logger.info(f"Located {points['pwsid'].nunique()} of {len(wanted)} systems at {len(points)} points "
+                    f"({', '.join(f'{kinds[k]} {k}' for k in POINT_KINDS if k in kinds)})")
+        return cls(points, zips, {z: list(p) for z, p in serving.items()})
+
+
+def merge_nearest_tables(tables: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Combine tables built over disjoint sets of systems (e.g. partitions): the
+    overall k nearest to a ZIP are among each table's own k nearest
+    """
+    if not tables:
+        return {'fields': ['pwsid', 'distance_km', 'located_by'], 'k': NEAREST_K, 'max_km': MAX_DISTANCE_KM, 'zips': {}}
+    k = tables[0]['k']
+    merged: Dict[str, Dict[str, Any]] = {}
+    for table in tables:
+        for zip_code, entry in table['zips'].items():
+            target = merged.setdefault(zip_code, {'serving': set(), 'nearest': []})
+            target['serving'].update(entry['serving'])
+            target['nearest'].extend(entry['nearest'])
+    return {**{key: tables[0][key] for key in ('fields', 'k', 'max_km')}, 'zips': {
+        zip_code: {'serving': sorted(entry['serving']),
+                   'nearest': sorted(entry['nearest'], key=lambda n: (n[1], n[0]))[:k]}
+        for zip_code, entry in sorted(merged.items())
+    }}
+
+
+def main():
+    """Look up systems serving or nearest to ZIP codes"""
+    parser = argparse.ArgumentParser(description="Offline ZIP to nearest water system lookup")
+    parser.add_argument('zips', nargs='*', help="ZIP codes to look up")
+    parser.add_argument('-k', type=int, default=NEAREST_K)
+    parser.add_argument('--max-km', type=float, default=None)
+    parser.add_argument('--data-dir', default="data")
+    parser.add_argument('--zip-centroids', default=ZIP_CENTROIDS)
+    parser.add_argument('--county-centroids', default=COUNTY_CENTROIDS)
+    parser.add_argument('--place-centroids', default=PLACE_CENTROIDS)
+    parser.add_argument('--save', metavar='PATH', help="Write the precomputed ZIP table")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    locator = ZipLocator.from_data(args.data_dir, args.zip_centroids, args.county_centroids, args.place_centroids)
+    if args.save:
+        table = locator.nearest_table(args.k, args.max_km or MAX_DISTANCE_KM)
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(table, f, separators=(',', ':'))
+        logger.info(f"Nearest systems for {len(table['zips'])} ZIPs saved to {args.save}")
+    for zip_code in args.zips:
+        started = time.perf_counter()
+        result = locator.lookup(zip_code, args.k, args.max_km)
+        logger.info(f"{zip_code}: {(time.perf_counter() - started) * 1e6:.0f} us")
+        print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()